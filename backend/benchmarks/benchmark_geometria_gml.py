@@ -0,0 +1,198 @@
+"""
+Benchmark del lector de geometrías INSPIRE.
+
+Compara el parser anterior (ElementTree completo, primera gml:posList y
+bucle de float()) con logic.geometria_gml.leer_geometria sobre lotes de XML
+sintéticos con la estructura de las respuestas GetParcel de Catastro. Como el
+parser anterior descarta huecos y partes, se mide también su extensión
+directa a todas las gml:posList (mismo trabajo que el parser nuevo) y la
+memoria que ocupan las geometrías resultantes.
+
+Uso (desde backend/):
+    python -m benchmarks.benchmark_geometria_gml --parcelas 2000 --vertices 400
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import random
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+from logic.geometria_gml import leer_geometria
+
+NS_CP = "http://inspire.ec.europa.eu/schemas/cp/4.0"
+NS_GML = "http://www.opengis.net/gml/3.2"
+SRS = "http://www.opengis.net/def/crs/EPSG/0/4258"
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# DATOS SINTÉTICOS
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def _anillo(lat: float, lon: float, radio: float, vertices: int, horario: bool) -> str:
+    """posList lat/lon de un anillo cerrado aproximadamente circular."""
+    pasos = range(vertices - 1, -1, -1) if horario else range(vertices)
+    valores = []
+    for k in pasos:
+        angulo = 2 * math.pi * k / vertices
+        r = radio * (1 + 0.1 * random.random())
+        valores.append(f"{lat + r * math.sin(angulo):.9f} {lon + r * math.cos(angulo):.9f}")
+    valores.append(valores[0])
+    return " ".join(valores)
+
+
+def _parcela_xml(rc: str, vertices: int, partes: int, huecos: int) -> str:
+    """XML GetParcel con `partes` polígonos y `huecos` anillos interiores cada uno."""
+    lat, lon = 40 + random.random(), -4 + random.random()
+    parches = []
+    for p in range(partes):
+        lat_p, lon_p = lat + p * 0.01, lon
+        anillos = [
+            f"<gml:exterior><gml:LinearRing><gml:posList srsDimension=\"2\" count=\"{vertices + 1}\">"
+            f"{_anillo(lat_p, lon_p, 0.004, vertices, False)}</gml:posList></gml:LinearRing></gml:exterior>"
+        ]
+        for h in range(huecos):
+            anillos.append(
+                "<gml:interior><gml:LinearRing><gml:posList srsDimension=\"2\">"
+                f"{_anillo(lat_p + 0.001 * h, lon_p, 0.0004, max(vertices // 10, 4), True)}"
+                "</gml:posList></gml:LinearRing></gml:interior>"
+            )
+        parches.append(f"<gml:PolygonPatch>{''.join(anillos)}</gml:PolygonPatch>")
+
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        f'<FeatureCollection xmlns="http://www.opengis.net/wfs/2.0" xmlns:cp="{NS_CP}" '
+        f'xmlns:gml="{NS_GML}" numberMatched="1" numberReturned="1"><member>'
+        f'<cp:CadastralParcel gml:id="ES.SDGC.CP.{rc}">'
+        f'<cp:areaValue uom="m2">{random.randint(1000, 90000)}</cp:areaValue>'
+        f'<cp:geometry><gml:MultiSurface gml:id="MultiSurface_{rc}" srsName="{SRS}">'
+        f'<gml:surfaceMember><gml:Surface gml:id="Surface_{rc}" srsName="{SRS}"><gml:patches>'
+        f'{"".join(parches)}'
+        '</gml:patches></gml:Surface></gml:surfaceMember></gml:MultiSurface></cp:geometry>'
+        f'<cp:nationalCadastralReference>{rc}</cp:nationalCadastralReference>'
+        '</cp:CadastralParcel></member></FeatureCollection>'
+    )
+
+
+def generar_lote(carpeta: Path, parcelas: int, vertices: int) -> List[Path]:
+    """Escribe un lote de XML: 1 de cada 5 multiparte y 1 de cada 3 con huecos."""
+    rutas = []
+    for i in range(parcelas):
+        rc = f"45900A{i // 1000:03d}{i % 1000:05d}0000XX"[:20]
+        ruta = carpeta / f"{rc}_INSPIRE.xml"
+        ruta.write_text(
+            _parcela_xml(rc, vertices, partes=2 if i % 5 == 0 else 1, huecos=1 if i % 3 == 0 else 0),
+            encoding="utf-8",
+        )
+        rutas.append(ruta)
+    return rutas
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# PARSER ANTERIOR (REFERENCIA)
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def parser_anterior(ruta_xml: Path) -> Tuple[float, List[Tuple[float, float]]]:
+    """Copia del _extraer_geometria original del orquestador."""
+    superficie = 0.0
+    coords: List[Tuple[float, float]] = []
+    root = ET.parse(str(ruta_xml)).getroot()
+    ns = {"cp": NS_CP, "gml": NS_GML}
+    area_node = root.find(".//cp:areaValue", ns)
+    if area_node is not None:
+        superficie = float(area_node.text)
+    pos_list = root.find(".//gml:posList", ns)
+    if pos_list is not None:
+        raw = pos_list.text.split()
+        for i in range(0, len(raw), 2):
+            coords.append((float(raw[i + 1]), float(raw[i])))
+    return superficie, coords
+
+
+def parser_anterior_completo(ruta_xml: Path) -> Tuple[float, List[List[Tuple[float, float]]]]:
+    """El parser anterior extendido a todos los anillos (lista de tuplas por anillo)."""
+    root = ET.parse(str(ruta_xml)).getroot()
+    ns = {"cp": NS_CP, "gml": NS_GML}
+    area_node = root.find(".//cp:areaValue", ns)
+    superficie = float(area_node.text) if area_node is not None else 0.0
+    anillos = []
+    for pos_list in root.iterfind(".//gml:posList", ns):
+        raw = pos_list.text.split()
+        anillos.append([(float(raw[i + 1]), float(raw[i])) for i in range(0, len(raw), 2)])
+    return superficie, anillos
+
+
+def _memoria(funcion, rutas: List[Path]) -> float:
+    """Memoria (MB) retenida por las geometrías de todo el lote."""
+    tracemalloc.start()
+    resultado = [funcion(ruta) for ruta in rutas]
+    actual, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del resultado
+    return actual / 1024 / 1024
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# EJECUCIÓN
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def _cronometrar(funcion, rutas: List[Path], repeticiones: int) -> float:
+    mejor = math.inf
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for ruta in rutas:
+            funcion(ruta)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parcelas", type=int, default=1000)
+    parser.add_argument("--vertices", type=int, default=300)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        rutas = generar_lote(Path(tmp), args.parcelas, args.vertices)
+        mb = sum(r.stat().st_size for r in rutas) / 1024 / 1024
+
+        # Comprobación: el anillo exterior coincide con el del parser anterior
+        for ruta in rutas[:50]:
+            sup_a, coords_a = parser_anterior(ruta)
+            sup_n, forma = leer_geometria(ruta)
+            assert sup_a == sup_n
+            assert np.allclose(np.asarray(coords_a), forma.exterior)
+
+        t_anterior = _cronometrar(parser_anterior, rutas, args.repeticiones)
+        t_completo = _cronometrar(parser_anterior_completo, rutas, args.repeticiones)
+        t_nuevo = _cronometrar(leer_geometria, rutas, args.repeticiones)
+        mb_completo = _memoria(parser_anterior_completo, rutas)
+        mb_nuevo = _memoria(leer_geometria, rutas)
+
+        formas = [leer_geometria(r)[1] for r in rutas]
+        anillos = sum(f.num_anillos for f in formas)
+        partes = sum(f.num_partes for f in formas)
+
+    print(f"📦 {args.parcelas} XML ({mb:.1f} MB), {args.vertices} vértices por anillo exterior")
+    print(f"   Parser anterior          : {t_anterior:8.3f} s  (solo primer anillo)")
+    print(f"   Anterior, todos anillos  : {t_completo:8.3f} s  {mb_completo:8.1f} MB en listas de tuplas")
+    print(f"   leer_geometria           : {t_nuevo:8.3f} s  {mb_nuevo:8.1f} MB en arrays "
+          f"({partes} partes, {anillos} anillos)")
+    print(f"   Aceleración (mismo trabajo): x{t_completo / t_nuevo:.2f}, "
+          f"memoria x{mb_completo / mb_nuevo:.1f} menor")
+
+
+if __name__ == "__main__":
+    main()
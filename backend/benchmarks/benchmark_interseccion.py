@@ -0,0 +1,133 @@
+"""
+Benchmark del motor de intersección de afecciones.
+
+Compara el cálculo anterior (gpd.overlay(how="intersection") + groupby/apply
+por etiqueta) con logic.interseccion.intersecar sobre una capa sintética
+grande en EPSG:25830: una malla de polígonos irregulares con etiqueta y
+unos cuantos polígonos grandes que cubren parcelas enteras (como los
+espacios Natura 2000). Comprueba antes que ambos dan los mismos pares,
+superficie total y superficies por etiqueta.
+
+Uso (desde backend/):
+    python -m benchmarks.benchmark_interseccion --celdas 200000 --parcelas 300
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import time
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from logic.interseccion import intersecar
+
+ORIGEN = np.array([400000.0, 4400000.0])
+ETIQUETAS = np.array(["ZEPA", "LIC", "ZEC", "MUP", "VP", None], dtype=object)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# DATOS SINTÉTICOS
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def _poligonos(centros: np.ndarray, radio: float, vertices: int, rng: np.random.Generator) -> np.ndarray:
+    """Polígonos estrellados (irregulares, válidos) alrededor de cada centro."""
+    angulos = np.linspace(0, 2 * math.pi, vertices, endpoint=False)
+    radios = radio * (0.7 + 0.3 * rng.random((len(centros), vertices)))
+    x = centros[:, :1] + radios * np.cos(angulos)
+    y = centros[:, 1:] + radios * np.sin(angulos)
+    anillos = np.stack([x, y], axis=-1)
+    anillos = np.concatenate([anillos, anillos[:, :1]], axis=1)
+    return shapely.polygons(anillos)
+
+
+def generar_capa(celdas: int, rng: np.random.Generator) -> gpd.GeoDataFrame:
+    """Malla de `celdas` polígonos de ~100 m y 20 polígonos grandes de ~3 km."""
+    lado = int(math.sqrt(celdas))
+    xs, ys = np.meshgrid(np.arange(lado), np.arange(lado))
+    centros = np.column_stack([xs.ravel(), ys.ravel()]) * 150.0 + ORIGEN
+    pequenos = _poligonos(centros, 90.0, 24, rng)
+    grandes = _poligonos(ORIGEN + rng.random((20, 2)) * lado * 150.0, 3000.0, 200, rng)
+    geometrias = np.concatenate([pequenos, grandes])
+    return gpd.GeoDataFrame(
+        {"nombre": ETIQUETAS[rng.integers(0, len(ETIQUETAS), len(geometrias))]},
+        geometry=geometrias,
+        crs=25830,
+    )
+
+
+def generar_parcelas(parcelas: int, extension: float, rng: np.random.Generator) -> gpd.GeoDataFrame:
+    """Parcelas de ~250 m agrupadas en una zona de 5 km dentro de la capa."""
+    centros = ORIGEN + extension / 2 + (rng.random((parcelas, 2)) - 0.5) * 5000.0
+    return gpd.GeoDataFrame(
+        {"refcat": [f"RC{i:05d}" for i in range(parcelas)], "m2": 0.0},
+        geometry=_poligonos(centros, 250.0, 60, rng),
+        crs=25830,
+    )
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# CÁLCULO ANTERIOR (REFERENCIA)
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def calculo_anterior(parcelas: gpd.GeoDataFrame, capa: gpd.GeoDataFrame):
+    """Copia del cálculo original de _procesar_afecciones."""
+    interseccion = gpd.overlay(parcelas, capa, how="intersection", keep_geom_type=False)
+    grupos = interseccion.groupby("nombre").apply(lambda x: x.area.sum())
+    return interseccion.area.sum(), grupos, len(interseccion)
+
+
+def calculo_nuevo(parcelas: gpd.GeoDataFrame, capa: gpd.GeoDataFrame):
+    resultado = intersecar(parcelas, capa, "nombre")
+    return resultado.area_total, resultado.areas_por_etiqueta(), resultado.n_geometrias
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# EJECUCIÓN
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def _cronometrar(funcion, repeticiones: int, *args) -> float:
+    mejor = math.inf
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(*args)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--celdas", type=int, default=100000)
+    parser.add_argument("--parcelas", type=int, default=200)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    capa = generar_capa(args.celdas, rng)
+    extension = math.sqrt(args.celdas) * 150.0
+    parcelas = generar_parcelas(args.parcelas, extension, rng)
+
+    # Comprobación: mismos pares y mismas superficies (redondeo del informe)
+    total_a, grupos_a, n_a = calculo_anterior(parcelas, capa)
+    total_n, grupos_n, n_n = calculo_nuevo(parcelas, capa)
+    assert n_a == n_n, (n_a, n_n)
+    assert round(total_a / 10000, 4) == round(total_n / 10000, 4), (total_a, total_n)
+    assert list(grupos_a.index) == list(grupos_n.index)
+    assert np.allclose(grupos_a.to_numpy(), grupos_n.to_numpy(), rtol=1e-9)
+
+    t_anterior = _cronometrar(calculo_anterior, args.repeticiones, parcelas, capa)
+    t_nuevo = _cronometrar(calculo_nuevo, args.repeticiones, parcelas, capa)
+
+    print(f"🗺️  Capa de {len(capa)} polígonos, {len(parcelas)} parcelas, {n_n} pares que se tocan")
+    print(f"   Superficie afectada: {total_n / 10000:.4f} ha en {len(grupos_n)} etiquetas")
+    print(f"   overlay + groupby   : {t_anterior:8.3f} s")
+    print(f"   intersecar          : {t_nuevo:8.3f} s")
+    print(f"   Aceleración         : x{t_anterior / t_nuevo:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+Almacén de capas de FUENTES preparadas para el análisis.
+
+Cada capa del catálogo se convierte una sola vez a FlatGeobuf en los CRS
+que usa el pipeline (EPSG:25830 para las superficies y EPSG:3857 para los
+mapas), con las entidades ordenadas por curva de Hilbert y el índice
+espacial empaquetado de FlatGeobuf. Los trabajos leen después solo la
+ventana de su zona, sin reproyectar.
+
+Las conversiones se identifican por la huella (SHA-256) del archivo de
+origen y el nombre de la subcapa; el mtime y el tamaño solo sirven para no
+recalcular la huella si el archivo no ha cambiado.
+
+Varios procesos comparten el almacén: el manifiesto se actualiza bajo un
+bloqueo de archivo, releyéndolo y fusionando la entrada nueva con lo que
+hayan escrito los demás, y las carpetas [huella]/ que ya no cita ninguna
+entrada (capas cambiadas o retiradas de FUENTES) se eliminan.
+
+Estructura en disco:
+    [raiz]/
+    ├── manifiesto.json          ← {archivo::subcapa: {mtime, tamano, huella}}
+    ├── .manifiesto.lock         ← Bloqueo entre procesos del manifiesto
+    └── [huella]/[epsg].fgb      ← Capa reproyectada y ordenada
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import geopandas as gpd
+
+try:
+    import fcntl
+except ImportError:  # Windows: el manifiesto solo se coordina entre hilos
+    fcntl = None
+
+from .catalogo_fuentes import CatalogoFuentes, EntradaCapa
+
+# CRS en los que se preparan las capas: análisis (UTM 30N) y mapas (Web Mercator)
+EPSG_ALMACEN: Tuple[int, ...] = (25830, 3857)
+
+_BLOQUE_HUELLA = 1 << 20
+
+# Nombre de las carpetas de conversión (huella truncada a 32 caracteres hex)
+_CARPETA_HUELLA = re.compile(r"^[0-9a-f]{32}$")
+
+
+def huella_archivo(ruta: Path) -> str:
+    """SHA-256 del contenido de un archivo (leído por bloques)."""
+    resumen = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(_BLOQUE_HUELLA), b""):
+            resumen.update(bloque)
+    return resumen.hexdigest()
+
+
+class AlmacenCapas:
+    """
+    Conversión perezosa de capas a FlatGeobuf reproyectado y lectura por ventanas.
+
+    Es seguro entre hilos (un lock por capa para no convertir dos veces la
+    misma) y entre procesos (los archivos se escriben de forma atómica, su
+    nombre depende solo del contenido de origen y el manifiesto se fusiona
+    bajo un bloqueo de archivo).
+    """
+
+    def __init__(self, raiz: Path) -> None:
+        """
+        Args:
+            raiz: Carpeta del almacén (se crea si no existe)
+        """
+        self.raiz = Path(raiz)
+        self.raiz.mkdir(parents=True, exist_ok=True)
+        self._ruta_manifiesto = self.raiz / "manifiesto.json"
+        self._ruta_bloqueo = self.raiz / ".manifiesto.lock"
+        self._lock = threading.Lock()
+        self._locks_capa: Dict[str, threading.Lock] = {}
+        self._manifiesto: Dict[str, dict] = self._cargar_manifiesto()
+
+    def _cargar_manifiesto(self) -> Dict[str, dict]:
+        try:
+            return json.loads(self._ruta_manifiesto.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    @contextmanager
+    def _bloqueo_manifiesto(self) -> Iterator[None]:
+        """Sección exclusiva sobre el manifiesto entre hilos y procesos (llamar con self._lock)."""
+        if fcntl is None:
+            yield
+            return
+        with open(self._ruta_bloqueo, "a+b") as archivo:
+            fcntl.flock(archivo, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(archivo, fcntl.LOCK_UN)
+
+    def _escribir_manifiesto(self) -> None:
+        fd, temporal = tempfile.mkstemp(dir=self.raiz, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._manifiesto, f, ensure_ascii=False)
+        os.replace(temporal, self._ruta_manifiesto)
+
+    def _guardar_manifiesto(self, clave: str, entrada: dict) -> None:
+        """
+        Añade o sustituye una entrada fusionándola con el manifiesto en disco.
+
+        Se relee el manifiesto bajo el bloqueo, de modo que no se pierden las
+        entradas que otros procesos hayan escrito desde la última lectura; si
+        la entrada sustituye a una huella que ya no cita nadie, se borra su
+        carpeta.
+        """
+        with self._lock, self._bloqueo_manifiesto():
+            self._manifiesto = self._cargar_manifiesto()
+            previa = self._manifiesto.get(clave, {}).get("huella")
+            self._manifiesto[clave] = entrada
+            self._escribir_manifiesto()
+            if previa and previa != entrada["huella"]:
+                self._borrar_carpetas({previa} - self._huellas_citadas())
+
+    def _huellas_citadas(self) -> Set[str]:
+        return {entrada["huella"] for entrada in self._manifiesto.values()}
+
+    def _borrar_carpetas(self, huellas: Iterable[str]) -> None:
+        for huella in huellas:
+            shutil.rmtree(self.raiz / huella, ignore_errors=True)
+
+    def _lock_capa(self, clave: str) -> threading.Lock:
+        with self._lock:
+            return self._locks_capa.setdefault(clave, threading.Lock())
+
+    # ───────────────────────────────────────────────────────────────────────
+    # Preparación
+    # ───────────────────────────────────────────────────────────────────────
+
+    def huella(self, capa: EntradaCapa, origen: Path) -> str:
+        """Huella de la subcapa, recalculada solo si cambia mtime o tamaño."""
+        clave = f"{capa.ruta}::{capa.capa}"
+        estado = origen.stat()
+        with self._lock:
+            previo = self._manifiesto.get(clave)
+        if previo and previo["mtime"] == estado.st_mtime and previo["tamano"] == estado.st_size:
+            return previo["huella"]
+
+        # Otro proceso puede haber calculado ya la huella de esta versión
+        with self._lock, self._bloqueo_manifiesto():
+            self._manifiesto = self._cargar_manifiesto()
+            previo = self._manifiesto.get(clave)
+        if previo and previo["mtime"] == estado.st_mtime and previo["tamano"] == estado.st_size:
+            return previo["huella"]
+
+        contenido = huella_archivo(origen)
+        huella = hashlib.sha256(f"{contenido}::{capa.capa}".encode("utf-8")).hexdigest()[:32]
+        self._guardar_manifiesto(clave, {
+            "mtime": estado.st_mtime,
+            "tamano": estado.st_size,
+            "huella": huella,
+        })
+        return huella
+
+    def preparar(self, capa: EntradaCapa, origen: Path) -> Dict[int, Path]:
+        """
+        Garantiza que la capa está convertida en todos los CRS de EPSG_ALMACEN.
+
+        Args:
+            capa: Entrada del catálogo
+            origen: Ruta absoluta del archivo de origen
+
+        Returns:
+            {epsg: ruta del FlatGeobuf}
+        """
+        clave = f"{capa.ruta}::{capa.capa}"
+        with self._lock_capa(clave):
+            carpeta = self.raiz / self.huella(capa, origen)
+            rutas = {epsg: carpeta / f"{epsg}.fgb" for epsg in EPSG_ALMACEN}
+            if all(r.exists() for r in rutas.values()):
+                return rutas
+
+            gdf = gpd.read_file(str(origen), layer=capa.capa)
+            gdf = gdf[~(gdf.geometry.isna() | gdf.geometry.is_empty)]
+            if gdf.crs is None:
+                gdf = gdf.set_crs(epsg=25830)
+
+            carpeta.mkdir(parents=True, exist_ok=True)
+            for epsg, ruta in rutas.items():
+                if ruta.exists():
+                    continue
+                proyectada = gdf.to_crs(epsg=epsg)
+                # Orden de Hilbert: las entidades cercanas quedan contiguas en disco
+                proyectada = proyectada.iloc[proyectada.geometry.hilbert_distance().argsort()]
+                temporal = carpeta / f".{epsg}.{os.getpid()}.{threading.get_ident()}.fgb"
+                proyectada.to_file(str(temporal), driver="FlatGeobuf", SPATIAL_INDEX="YES")
+                os.replace(temporal, ruta)
+            return rutas
+
+    def preparar_catalogo(self, catalogo: CatalogoFuentes) -> Tuple[int, List[str]]:
+        """
+        Prepara todas las capas del catálogo (ingesta en segundo plano).
+
+        Al terminar purga las entradas y carpetas de capas que ya no están
+        en el catálogo.
+
+        Returns:
+            (capas preparadas, nombres de las capas que fallaron)
+        """
+        preparadas, fallidas = 0, []
+        capas = catalogo.capas()
+        for capa in capas:
+            if not capa.entidades:
+                continue
+            try:
+                self.preparar(capa, catalogo.ruta_absoluta(capa))
+                preparadas += 1
+            except Exception:
+                fallidas.append(capa.nombre)
+        self.purgar({f"{capa.ruta}::{capa.capa}" for capa in capas})
+        return preparadas, fallidas
+
+    def purgar(self, claves_vigentes: Optional[Set[str]] = None) -> int:
+        """
+        Elimina las carpetas [huella]/ que no cita ninguna entrada del manifiesto.
+
+        Args:
+            claves_vigentes: Claves archivo::subcapa que siguen en FUENTES; las
+                demás se retiran antes del manifiesto (None = conservarlas)
+
+        Returns:
+            Carpetas eliminadas
+        """
+        with self._lock, self._bloqueo_manifiesto():
+            self._manifiesto = self._cargar_manifiesto()
+            if claves_vigentes is not None:
+                retiradas = set(self._manifiesto) - claves_vigentes
+                for clave in retiradas:
+                    del self._manifiesto[clave]
+                if retiradas:
+                    self._escribir_manifiesto()
+            citadas = self._huellas_citadas()
+            huerfanas = [
+                hijo.name for hijo in self.raiz.iterdir()
+                if hijo.is_dir() and _CARPETA_HUELLA.match(hijo.name) and hijo.name not in citadas
+            ]
+            self._borrar_carpetas(huerfanas)
+        return len(huerfanas)
+
+    # ───────────────────────────────────────────────────────────────────────
+    # Lectura
+    # ───────────────────────────────────────────────────────────────────────
+
+    def leer(
+        self,
+        capa: EntradaCapa,
+        origen: Path,
+        epsg: int,
+        limites: Sequence[float],
+        columnas: Optional[List[str]] = None
+    ) -> gpd.GeoDataFrame:
+        """
+        Lee la ventana `limites` de una capa ya proyectada a `epsg`.
+
+        Args:
+            capa: Entrada del catálogo
+            origen: Ruta absoluta del archivo de origen
+            epsg: Uno de EPSG_ALMACEN
+            limites: (minx, miny, maxx, maxy) en `epsg`
+            columnas: Atributos a leer (None = todos)
+
+        Returns:
+            GeoDataFrame en `epsg` con las entidades que tocan la ventana
+        """
+        if epsg not in EPSG_ALMACEN:
+            raise ValueError(f"EPSG:{epsg} no está en el almacén de capas")
+        ruta = self.preparar(capa, origen)[epsg]
+        return gpd.read_file(str(ruta), bbox=tuple(limites), columns=columnas)
+
+
+_almacenes: Dict[str, AlmacenCapas] = {}
+_lock_almacenes = threading.Lock()
+
+
+def obtener_almacen_capas(raiz: Path) -> AlmacenCapas:
+    """
+    Devuelve el almacén de capas de una carpeta, creándolo si es necesario.
+
+    Todos los trabajos del proceso comparten instancia, de modo que una capa
+    nunca se convierte dos veces a la vez.
+    """
+    clave = str(Path(raiz).resolve())
+    with _lock_almacenes:
+        almacen = _almacenes.get(clave)
+        if almacen is None:
+            almacen = AlmacenCapas(Path(raiz))
+            _almacenes[clave] = almacen
+        return almacen
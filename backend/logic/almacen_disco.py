@@ -0,0 +1,365 @@
+"""
+Almacén de contenido en disco compartido entre trabajos.
+
+Guarda archivos descargados (XML/PDF de Catastro, etc.) bajo una clave dentro
+de un espacio de nombres, con caducidad (TTL) por entrada, un límite de tamaño
+total con expulsión LRU y contadores de aciertos/fallos.
+
+Estructura en disco:
+    [raiz]/
+    ├── indice.sqlite            ← Índice de entradas (clave, tamaño, accesos)
+    ├── .bloqueos/[abc]          ← Archivos de bloqueo de exclusivo()
+    └── [espacio]/[ab]/[sha1]    ← Contenido, repartido en subcarpetas
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: exclusivo() solo coordina hilos del proceso
+    fcntl = None
+
+# Caracteres del sha1 de la clave que eligen el archivo de bloqueo
+# (16^3 = 4096 bloqueos; dos claves que coinciden solo se esperan entre sí)
+_PREFIJO_BLOQUEO = 3
+
+# ═══════════════════════════════════════════════════════════════════════════
+# ALMACÉN
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+class AlmacenDisco:
+    """
+    Almacén clave → archivo con TTL, límite de tamaño (LRU) y estadísticas.
+
+    Es seguro entre hilos (un único lock por instancia) y entre procesos
+    (el índice SQLite usa modo WAL y los archivos se escriben de forma atómica).
+    """
+
+    def __init__(
+        self,
+        raiz: Path,
+        max_bytes: int,
+        ttl_segundos: Optional[float] = None
+    ) -> None:
+        """
+        Args:
+            raiz: Carpeta del almacén (se crea si no existe)
+            max_bytes: Tamaño máximo total antes de expulsar entradas antiguas
+            ttl_segundos: Caducidad por defecto de las entradas (None = sin caducidad)
+        """
+        self.raiz = Path(raiz)
+        self.max_bytes = max_bytes
+        self.ttl_segundos = ttl_segundos
+        self.raiz.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._locks_clave: Dict[str, threading.Lock] = {}
+        self._aciertos: Dict[str, int] = {}
+        self._fallos: Dict[str, int] = {}
+        self._expulsiones = 0
+
+        self._db = sqlite3.connect(
+            str(self.raiz / "indice.sqlite"), timeout=30, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entradas ("
+            " espacio TEXT NOT NULL, clave TEXT NOT NULL, ruta TEXT NOT NULL,"
+            " tamano INTEGER NOT NULL, creado REAL NOT NULL,"
+            " ultimo_acceso REAL NOT NULL, expira REAL,"
+            " PRIMARY KEY (espacio, clave))"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_entradas_acceso ON entradas (ultimo_acceso)"
+        )
+        self._db.commit()
+
+    # ───────────────────────────────────────────────────────────────────────
+    # Lectura
+    # ───────────────────────────────────────────────────────────────────────
+
+    def ruta(self, espacio: str, clave: str) -> Optional[Path]:
+        """
+        Busca una entrada vigente y marca el acceso (LRU).
+
+        Args:
+            espacio: Espacio de nombres (p. ej. "xml", "pdf")
+            clave: Clave dentro del espacio (p. ej. la referencia catastral)
+
+        Returns:
+            Ruta al contenido almacenado o None si no existe o ha caducado
+        """
+        ahora = time.time()
+        with self._lock:
+            fila = self._db.execute(
+                "SELECT ruta, expira FROM entradas WHERE espacio=? AND clave=?",
+                (espacio, clave),
+            ).fetchone()
+
+            if fila is not None:
+                ruta = self.raiz / fila[0]
+                caducada = fila[1] is not None and fila[1] < ahora
+                if caducada or not ruta.exists():
+                    self._borrar_entrada(espacio, clave, ruta)
+                    fila = None
+
+            if fila is None:
+                self._fallos[espacio] = self._fallos.get(espacio, 0) + 1
+                return None
+
+            self._db.execute(
+                "UPDATE entradas SET ultimo_acceso=? WHERE espacio=? AND clave=?",
+                (ahora, espacio, clave),
+            )
+            self._db.commit()
+            self._aciertos[espacio] = self._aciertos.get(espacio, 0) + 1
+            return ruta
+
+    def leer_bytes(self, espacio: str, clave: str) -> Optional[bytes]:
+        """Devuelve el contenido de una entrada vigente o None."""
+        ruta = self.ruta(espacio, clave)
+        if ruta is None:
+            return None
+        try:
+            return ruta.read_bytes()
+        except OSError:
+            return None
+
+    def materializar(self, espacio: str, clave: str, destino: Path) -> bool:
+        """
+        Coloca una copia de la entrada en `destino` sin volver a descargarla.
+
+        Se intenta primero un enlace duro (sin coste de espacio) y, si el
+        sistema de archivos no lo permite, una copia.
+
+        Returns:
+            True si la entrada existía y se materializó en destino
+        """
+        ruta = self.ruta(espacio, clave)
+        if ruta is None:
+            return False
+        try:
+            _enlazar_o_copiar(ruta, destino)
+            return True
+        except OSError:
+            return False
+
+    # ───────────────────────────────────────────────────────────────────────
+    # Escritura
+    # ───────────────────────────────────────────────────────────────────────
+
+    def guardar_archivo(
+        self,
+        espacio: str,
+        clave: str,
+        origen: Path,
+        ttl_segundos: Optional[float] = None
+    ) -> Optional[Path]:
+        """
+        Incorpora un archivo existente al almacén (enlace duro o copia).
+
+        Args:
+            espacio: Espacio de nombres
+            clave: Clave dentro del espacio
+            origen: Archivo a almacenar (no se modifica)
+            ttl_segundos: Caducidad de la entrada (por defecto la del almacén)
+
+        Returns:
+            Ruta del contenido almacenado o None si no pudo guardarse
+        """
+        relativa = self._ruta_relativa(espacio, clave)
+        final = self.raiz / relativa
+        final.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            fd, tmp = tempfile.mkstemp(dir=str(final.parent), suffix=".tmp")
+            os.close(fd)
+            os.unlink(tmp)
+            _enlazar_o_copiar(Path(origen), Path(tmp))
+            os.replace(tmp, final)
+        except OSError:
+            return None
+        self._registrar(espacio, clave, relativa, final.stat().st_size, ttl_segundos)
+        return final
+
+    def guardar_bytes(
+        self,
+        espacio: str,
+        clave: str,
+        datos: bytes,
+        ttl_segundos: Optional[float] = None
+    ) -> Optional[Path]:
+        """Guarda un contenido en memoria como entrada del almacén."""
+        relativa = self._ruta_relativa(espacio, clave)
+        final = self.raiz / relativa
+        final.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            fd, tmp = tempfile.mkstemp(dir=str(final.parent), suffix=".tmp")
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(datos)
+            os.replace(tmp, final)
+        except OSError:
+            return None
+        self._registrar(espacio, clave, relativa, len(datos), ttl_segundos)
+        return final
+
+    # ───────────────────────────────────────────────────────────────────────
+    # Estadísticas
+    # ───────────────────────────────────────────────────────────────────────
+
+    def estadisticas(self) -> dict:
+        """
+        Devuelve contadores de uso del almacén.
+
+        Returns:
+            Diccionario con aciertos/fallos por espacio, expulsiones,
+            número de entradas y bytes ocupados
+        """
+        with self._lock:
+            entradas, total = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(tamano), 0) FROM entradas"
+            ).fetchone()
+            aciertos = sum(self._aciertos.values())
+            fallos = sum(self._fallos.values())
+            return {
+                "aciertos": aciertos,
+                "fallos": fallos,
+                "tasa_aciertos": round(aciertos / (aciertos + fallos), 4) if aciertos + fallos else 0.0,
+                "aciertos_por_espacio": dict(self._aciertos),
+                "fallos_por_espacio": dict(self._fallos),
+                "expulsiones": self._expulsiones,
+                "entradas": entradas,
+                "bytes": total,
+                "max_bytes": self.max_bytes,
+            }
+
+    # ───────────────────────────────────────────────────────────────────────
+    # Internos
+    # ───────────────────────────────────────────────────────────────────────
+
+    @contextmanager
+    def exclusivo(self, espacio: str, clave: str) -> Iterator[None]:
+        """
+        Sección exclusiva por clave entre los hilos y procesos que usan el almacén.
+
+        Permite que solo uno de los trabajos que necesitan a la vez una
+        entrada ausente la descargue: los demás esperan y, al entrar, la
+        encuentran ya guardada. Entre procesos usa flock sobre un archivo de
+        .bloqueos (donde no hay fcntl, solo se coordinan los hilos).
+        """
+        resumen = hashlib.sha1(f"{espacio}/{clave}".encode("utf-8")).hexdigest()[:_PREFIJO_BLOQUEO]
+        with self._lock:
+            lock_clave = self._locks_clave.setdefault(resumen, threading.Lock())
+
+        with lock_clave:
+            if fcntl is None:
+                yield
+                return
+            ruta = self.raiz / ".bloqueos" / resumen
+            ruta.parent.mkdir(exist_ok=True)
+            with open(ruta, "a+b") as archivo:
+                fcntl.flock(archivo, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(archivo, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _ruta_relativa(espacio: str, clave: str) -> str:
+        resumen = hashlib.sha1(clave.encode("utf-8")).hexdigest()
+        return f"{espacio}/{resumen[:2]}/{resumen}"
+
+    def _registrar(
+        self,
+        espacio: str,
+        clave: str,
+        relativa: str,
+        tamano: int,
+        ttl_segundos: Optional[float]
+    ) -> None:
+        ahora = time.time()
+        ttl = self.ttl_segundos if ttl_segundos is None else ttl_segundos
+        expira = ahora + ttl if ttl else None
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entradas "
+                "(espacio, clave, ruta, tamano, creado, ultimo_acceso, expira) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (espacio, clave, relativa, tamano, ahora, ahora, expira),
+            )
+            self._db.commit()
+            self._expulsar_si_necesario()
+
+    def _expulsar_si_necesario(self) -> None:
+        """Elimina las entradas menos usadas hasta quedar al 90% del límite."""
+        total = self._db.execute("SELECT COALESCE(SUM(tamano), 0) FROM entradas").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        objetivo = self.max_bytes * 0.9
+        filas = self._db.execute(
+            "SELECT espacio, clave, ruta, tamano FROM entradas ORDER BY ultimo_acceso"
+        ).fetchall()
+        for espacio, clave, relativa, tamano in filas:
+            if total <= objetivo:
+                break
+            self._borrar_entrada(espacio, clave, self.raiz / relativa)
+            self._expulsiones += 1
+            total -= tamano
+
+    def _borrar_entrada(self, espacio: str, clave: str, ruta: Path) -> None:
+        self._db.execute("DELETE FROM entradas WHERE espacio=? AND clave=?", (espacio, clave))
+        self._db.commit()
+        try:
+            ruta.unlink()
+        except OSError:
+            pass
+
+
+def _enlazar_o_copiar(origen: Path, destino: Path) -> None:
+    """Crea destino como enlace duro de origen o, si no es posible, como copia."""
+    try:
+        os.link(origen, destino)
+    except OSError:
+        shutil.copy2(origen, destino)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# INSTANCIAS COMPARTIDAS POR PROCESO
+# ═══════════════════════════════════════════════════════════════════════════
+
+_almacenes: Dict[str, AlmacenDisco] = {}
+_lock_almacenes = threading.Lock()
+
+
+def obtener_almacen(
+    raiz: Path,
+    max_bytes: int,
+    ttl_segundos: Optional[float] = None
+) -> AlmacenDisco:
+    """
+    Devuelve el almacén asociado a una carpeta, creándolo si es necesario.
+
+    Todos los trabajos del proceso que usan la misma carpeta comparten
+    instancia, de modo que los contadores reflejan el uso global.
+    """
+    clave = str(Path(raiz).resolve())
+    with _lock_almacenes:
+        almacen = _almacenes.get(clave)
+        if almacen is None:
+            almacen = AlmacenDisco(Path(raiz), max_bytes, ttl_segundos)
+            _almacenes[clave] = almacen
+        else:
+            almacen.max_bytes = max_bytes
+            almacen.ttl_segundos = ttl_segundos
+        return almacen
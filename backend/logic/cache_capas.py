@@ -0,0 +1,305 @@
+"""
+Caché en memoria de capas de FUENTES compartida por los trabajos de un proceso.
+
+Cada trabajo crea su propio OrquestadorPipeline, pero las capas de FUENTES
+no cambian entre trabajos. Esta caché guarda, por capa y CRS, el
+GeoDataFrame ya proyectado, su STRtree y su columna de etiqueta, de modo
+que las lecturas de una ventana se resuelven con una consulta al árbol en
+lugar de abrir el archivo. Está limitada en memoria (expulsión LRU) y cada
+entrada se invalida si cambia el mtime o el tamaño del archivo de origen.
+
+Cada proceso tiene su propia caché (la del servidor de la API y la de cada
+proceso de los pools), y el límite configurado (CACHE_CAPAS_MB) se reparte a
+partes iguales entre todos ellos. Los procesos del pool envían sus
+estadísticas con el resultado de cada tarea y el servidor las guarda con
+registrar_estadisticas_proceso para mostrarlas junto a las suyas.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from shapely.geometry import box
+
+from .catalogo_fuentes import EntradaCapa
+
+# Memoria estimada por coordenada y por geometría de shapely (bytes)
+_BYTES_COORDENADA = 16
+_BYTES_GEOMETRIA = 120
+
+
+@dataclass
+class CapaEnMemoria:
+    """
+    Capa completa cargada en memoria en un CRS.
+
+    Attributes:
+        gdf: Entidades de la capa en el CRS de la entrada
+        arbol: STRtree de las geometrías de gdf
+        columna_etiqueta: Columna que describe la afección (o None)
+        estado: (mtime, tamaño) del archivo de origen al cargarla
+        bytes: Memoria estimada de la entrada
+    """
+    gdf: gpd.GeoDataFrame
+    arbol: shapely.STRtree
+    columna_etiqueta: Optional[str]
+    estado: Tuple[float, int]
+    bytes: int
+
+    def ventana(self, limites: Sequence[float], columnas: Optional[List[str]] = None) -> gpd.GeoDataFrame:
+        """
+        Entidades cuya envolvente toca `limites` (como la lectura por BBOX).
+
+        Args:
+            limites: (minx, miny, maxx, maxy) en el CRS de la entrada
+            columnas: Atributos a devolver (None = todos)
+
+        Returns:
+            GeoDataFrame nuevo en el orden de la capa
+        """
+        indices = np.sort(self.arbol.query(box(*limites)))
+        gdf = self.gdf.iloc[indices]
+        if columnas is not None:
+            gdf = gdf[list(columnas) + [gdf.geometry.name]]
+        return gdf.reset_index(drop=True)
+
+
+def estimar_bytes(gdf: gpd.GeoDataFrame) -> int:
+    """Memoria aproximada de un GeoDataFrame (atributos + coordenadas + árbol)."""
+    atributos = int(gdf.drop(columns=gdf.geometry.name).memory_usage(deep=True).sum())
+    geometrias = gdf.geometry.values
+    coordenadas = int(shapely.get_num_coordinates(geometrias).sum())
+    return atributos + coordenadas * _BYTES_COORDENADA + len(geometrias) * _BYTES_GEOMETRIA
+
+
+class CacheCapas:
+    """
+    Caché LRU de capas en memoria, limitada en bytes.
+
+    Es segura entre hilos: los trabajos simultáneos del proceso comparten
+    entradas y una capa que se está cargando no se carga dos veces (un lock
+    por clave, que se descarta al expulsar la entrada). Las capas que una
+    vez cargadas resultan mayores que el límite se recuerdan, con el estado
+    de su archivo, para no volver a cargarlas en cada consulta.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        """
+        Args:
+            max_bytes: Memoria máxima estimada antes de expulsar entradas
+        """
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._locks_clave: Dict[str, threading.Lock] = {}
+        self._entradas: "OrderedDict[str, CapaEnMemoria]" = OrderedDict()
+        # Claves demasiado grandes: (estado del archivo, bytes estimados)
+        self._grandes: Dict[str, Tuple[Tuple[float, int], int]] = {}
+        self._bytes = 0
+        self._aciertos = 0
+        self._fallos = 0
+        self._invalidaciones = 0
+        self._expulsiones = 0
+        self._omitidas = 0
+
+    @staticmethod
+    def clave(capa: EntradaCapa, origen: Path, epsg: int) -> str:
+        return f"{origen}::{capa.capa}::{epsg}"
+
+    def admite(self, origen: Path) -> bool:
+        """Si una capa cabe en la caché (estimando por el tamaño del archivo)."""
+        try:
+            return origen.stat().st_size * 2 <= self.max_bytes
+        except OSError:
+            return False
+
+    def obtener(
+        self,
+        capa: EntradaCapa,
+        origen: Path,
+        epsg: int,
+        cargar: Callable[[], gpd.GeoDataFrame]
+    ) -> Optional[CapaEnMemoria]:
+        """
+        Devuelve la capa en memoria, cargándola con `cargar` si no está o ha cambiado.
+
+        Args:
+            capa: Entrada del catálogo
+            origen: Ruta absoluta del archivo de origen (su mtime invalida la entrada)
+            epsg: CRS en que `cargar` devuelve la capa
+            cargar: Función que lee la capa completa en `epsg`
+
+        Returns:
+            La entrada, o None si la capa no cabe en la caché (la primera vez
+            que se carga una capa demasiado grande se devuelve igualmente)
+        """
+        if not self.admite(origen):
+            with self._lock:
+                self._omitidas += 1
+            return None
+
+        estado = origen.stat()
+        estado = (estado.st_mtime, estado.st_size)
+        clave = self.clave(capa, origen, epsg)
+        with self._lock:
+            if self._es_grande(clave, estado):
+                self._omitidas += 1
+                return None
+            lock_clave = self._locks_clave.setdefault(clave, threading.Lock())
+
+        with lock_clave:
+            with self._lock:
+                entrada = self._entradas.get(clave)
+                if entrada is not None and entrada.estado == estado:
+                    self._entradas.move_to_end(clave)
+                    self._aciertos += 1
+                    return entrada
+                if entrada is not None:
+                    self._invalidaciones += 1
+                    self._quitar(clave)
+                self._fallos += 1
+
+            gdf = cargar()
+            entrada = CapaEnMemoria(
+                gdf=gdf,
+                arbol=shapely.STRtree(gdf.geometry.values),
+                columna_etiqueta=capa.columna_etiqueta,
+                estado=estado,
+                bytes=estimar_bytes(gdf),
+            )
+            with self._lock:
+                self._quitar(clave)
+                if entrada.bytes <= self.max_bytes:
+                    self._grandes.pop(clave, None)
+                    self._entradas[clave] = entrada
+                    self._bytes += entrada.bytes
+                    self._expulsar_si_necesario()
+                else:
+                    self._grandes[clave] = (estado, entrada.bytes)
+                    self._omitidas += 1
+            return entrada
+
+    def _es_grande(self, clave: str, estado: Tuple[float, int]) -> bool:
+        """Si la clave ya se cargó, con este mismo archivo, y no cabía (llamar con self._lock)."""
+        grande = self._grandes.get(clave)
+        if grande is None:
+            return False
+        estado_grande, tamano = grande
+        if estado_grande == estado and tamano > self.max_bytes:
+            return True
+        del self._grandes[clave]  # el archivo o el límite han cambiado
+        return False
+
+    def _quitar(self, clave: str) -> None:
+        entrada = self._entradas.pop(clave, None)
+        if entrada is not None:
+            self._bytes -= entrada.bytes
+
+    def _descartar_lock(self, clave: str) -> None:
+        """Olvida el lock de una clave si nadie lo tiene (llamar con self._lock)."""
+        lock_clave = self._locks_clave.get(clave)
+        if lock_clave is not None and not lock_clave.locked():
+            del self._locks_clave[clave]
+
+    def _expulsar_si_necesario(self) -> None:
+        """Expulsa las capas menos usadas hasta quedar por debajo del límite."""
+        while self._bytes > self.max_bytes and self._entradas:
+            clave = next(iter(self._entradas))
+            self._quitar(clave)
+            self._descartar_lock(clave)
+            self._expulsiones += 1
+
+    def vaciar(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+            self._grandes.clear()
+            self._bytes = 0
+            for clave in list(self._locks_clave):
+                self._descartar_lock(clave)
+
+    def estadisticas(self) -> dict:
+        """
+        Devuelve contadores de uso de la caché.
+
+        Returns:
+            Diccionario con aciertos/fallos, tasa de aciertos, invalidaciones,
+            expulsiones, capas omitidas por tamaño, memoria ocupada y capas en memoria
+        """
+        with self._lock:
+            consultas = self._aciertos + self._fallos
+            return {
+                "aciertos": self._aciertos,
+                "fallos": self._fallos,
+                "tasa_aciertos": round(self._aciertos / consultas, 4) if consultas else 0.0,
+                "invalidaciones": self._invalidaciones,
+                "expulsiones": self._expulsiones,
+                "omitidas": self._omitidas,
+                "entradas": len(self._entradas),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "capas": [
+                    {"clave": clave, "entidades": len(e.gdf), "bytes": e.bytes}
+                    for clave, e in reversed(self._entradas.items())
+                ],
+            }
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# INSTANCIA COMPARTIDA POR PROCESO
+# ═══════════════════════════════════════════════════════════════════════════
+
+_cache: Optional[CacheCapas] = None
+_lock_cache = threading.Lock()
+_estadisticas_procesos: Dict[int, dict] = {}
+
+
+def obtener_cache_capas(max_bytes: int) -> CacheCapas:
+    """
+    Devuelve la caché de capas del proceso, creándola si es necesario.
+
+    Todos los trabajos del proceso comparten instancia; si cambia el límite
+    configurado se ajusta (expulsando si hace falta).
+    """
+    global _cache
+    with _lock_cache:
+        if _cache is None:
+            _cache = CacheCapas(max_bytes)
+        elif _cache.max_bytes != max_bytes:
+            with _cache._lock:
+                _cache.max_bytes = max_bytes
+                _cache._expulsar_si_necesario()
+        return _cache
+
+
+def registrar_estadisticas_proceso(pid: int, estadisticas: dict) -> None:
+    """Guarda las últimas estadísticas recibidas de un proceso del pool."""
+    with _lock_cache:
+        _estadisticas_procesos[pid] = estadisticas
+
+
+def estadisticas_cache_capas() -> dict:
+    """
+    Estadísticas de la caché de este proceso y de los procesos del pool.
+
+    Returns:
+        {"proceso": estadísticas locales o None si la caché no se ha usado,
+         "procesos_pool": {pid: últimas estadísticas recibidas},
+         "bytes_total" / "max_bytes_total": memoria ocupada y límite sumados
+         de todas las cachés}
+    """
+    with _lock_cache:
+        cache = _cache
+        procesos = dict(_estadisticas_procesos)
+    local = cache.estadisticas() if cache is not None else None
+    todas = [e for e in [local, *procesos.values()] if e is not None]
+    return {
+        "proceso": local,
+        "procesos_pool": procesos,
+        "bytes_total": sum(e["bytes"] for e in todas),
+        "max_bytes_total": sum(e["max_bytes"] for e in todas),
+    }
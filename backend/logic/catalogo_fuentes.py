@@ -0,0 +1,292 @@
+"""
+Catálogo persistente de las capas locales de FUENTES.
+
+Recorre la carpeta una sola vez, abre cada archivo para leer sus metadatos
+(subcapas, CRS, extensión en EPSG:25830, número de entidades, esquema,
+columna de etiqueta e índice espacial) y los guarda en un JSON. En las
+siguientes actualizaciones solo se vuelven a inspeccionar los archivos cuyo
+mtime o tamaño han cambiado, de modo que los trabajos pueden descartar las
+capas que no cubren las parcelas sin abrirlas.
+
+Estructura del JSON:
+    {"version": 1, "archivos": {ruta_relativa: {"mtime", "tamano", "capas": [...]}}}
+"""
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pyogrio
+from pyproj import CRS, Transformer
+
+# Extensiones de archivo que se consideran capas
+EXTENSIONES_CAPA = ('.gpkg', '.shp', '.geojson', '.json', '.kml', '.gml')
+
+# Columnas de las capas de afecciones que describen la afección (por orden de
+# preferencia, sin distinguir mayúsculas)
+COLUMNAS_INTERES = (
+    'nombre', 'name', 'tipo', 'type', 'uso', 'uso_sigpac',
+    'categoria', 'codigo', 'code', 'zona', 'descripcion',
+    'clase', 'class', 'espacio', 'figura',
+)
+
+# CRS de trabajo del análisis (UTM 30N) y supuesto para capas sin CRS
+EPSG_ANALISIS = 25830
+
+VERSION_CATALOGO = 1
+
+Limites = Tuple[float, float, float, float]
+
+
+@dataclass
+class EntradaCapa:
+    """
+    Metadatos de una (sub)capa de FUENTES.
+
+    Attributes:
+        ruta: Ruta relativa del archivo dentro de FUENTES
+        capa: Nombre de la subcapa dentro del archivo
+        nombre: Nombre para informes (stem del archivo, con la subcapa si hay varias)
+        crs: CRS nativo ("EPSG:xxxx" o WKT) o None si la capa no lo declara
+        limites: Extensión (minx, miny, maxx, maxy) en EPSG:25830 o None si está vacía
+        entidades: Número de entidades (-1 si el formato no lo sabe sin recorrerla)
+        esquema: {campo: tipo} de los atributos
+        columna_etiqueta: Primer campo de COLUMNAS_INTERES presente en la capa
+        indice_espacial: Si el driver puede filtrar por BBOX con índice
+    """
+    ruta: str
+    capa: str
+    nombre: str
+    crs: Optional[str]
+    limites: Optional[List[float]]
+    entidades: int
+    esquema: Dict[str, str] = field(default_factory=dict)
+    columna_etiqueta: Optional[str] = None
+    indice_espacial: bool = False
+
+    def intersecta(self, limites: Sequence[float]) -> bool:
+        """Si la extensión de la capa toca `limites` (en EPSG:25830)."""
+        if self.limites is None:
+            return False
+        minx, miny, maxx, maxy = self.limites
+        return not (maxx < limites[0] or minx > limites[2] or maxy < limites[1] or miny > limites[3])
+
+
+def detectar_columna_etiqueta(campos: Sequence[str]) -> Optional[str]:
+    """Devuelve el primer campo de COLUMNAS_INTERES presente (sin distinguir mayúsculas)."""
+    por_minusculas = {c.lower(): c for c in campos}
+    for candidata in COLUMNAS_INTERES:
+        if candidata in por_minusculas:
+            return por_minusculas[candidata]
+    return None
+
+
+def _limites_analisis(crs: Optional[str], limites: Limites) -> Optional[List[float]]:
+    """Transforma una extensión nativa a EPSG:25830 (densificando los bordes)."""
+    if any(v != v for v in limites):  # NaN: capa vacía
+        return None
+    if crs is None:
+        return [float(v) for v in limites]
+    transformador = Transformer.from_crs(CRS.from_user_input(crs), EPSG_ANALISIS, always_xy=True)
+    return [float(v) for v in transformador.transform_bounds(*limites, densify_pts=21)]
+
+
+def inspeccionar_archivo(ruta: Path, relativa: str) -> List[EntradaCapa]:
+    """
+    Lee los metadatos de todas las subcapas de un archivo.
+
+    Args:
+        ruta: Ruta absoluta del archivo
+        relativa: Ruta relativa dentro de FUENTES (clave del catálogo)
+
+    Returns:
+        Una entrada por subcapa con geometría
+    """
+    subcapas = pyogrio.list_layers(str(ruta))
+    entradas = []
+    for nombre_capa, tipo_geometria in subcapas:
+        if tipo_geometria is None:
+            continue  # tablas sin geometría
+        info = pyogrio.read_info(str(ruta), layer=nombre_capa, force_total_bounds=True)
+        campos = [str(c) for c in info["fields"]]
+        crs = info.get("crs")
+        entradas.append(EntradaCapa(
+            ruta=relativa,
+            capa=str(nombre_capa),
+            nombre=ruta.stem if len(subcapas) == 1 else f"{ruta.stem}:{nombre_capa}",
+            crs=crs,
+            limites=_limites_analisis(crs, info["total_bounds"]),
+            entidades=int(info["features"]),
+            esquema=dict(zip(campos, (str(t) for t in info["dtypes"]))),
+            columna_etiqueta=detectar_columna_etiqueta(campos),
+            indice_espacial=bool(info.get("capabilities", {}).get("fast_spatial_filter")),
+        ))
+    return entradas
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# CATÁLOGO
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+class CatalogoFuentes:
+    """
+    Catálogo de capas de una carpeta FUENTES persistido en JSON.
+
+    Es seguro entre hilos; entre procesos, cada uno mantiene su copia en
+    memoria y el JSON se reescribe de forma atómica.
+    """
+
+    def __init__(self, carpeta: Path, ruta_json: Path) -> None:
+        """
+        Args:
+            carpeta: Carpeta FUENTES con las capas
+            ruta_json: Archivo donde se persiste el catálogo
+        """
+        self.carpeta = Path(carpeta)
+        self.ruta_json = Path(ruta_json)
+        self._lock = threading.Lock()
+        self._archivos: Dict[str, dict] = self._cargar()
+        self.errores: Dict[str, str] = {}
+
+    def _cargar(self) -> Dict[str, dict]:
+        try:
+            datos = json.loads(self.ruta_json.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        if datos.get("version") != VERSION_CATALOGO:
+            return {}
+        return datos.get("archivos", {})
+
+    def _guardar(self) -> None:
+        self.ruta_json.parent.mkdir(parents=True, exist_ok=True)
+        fd, temporal = tempfile.mkstemp(dir=self.ruta_json.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"version": VERSION_CATALOGO, "archivos": self._archivos}, f, ensure_ascii=False)
+        os.replace(temporal, self.ruta_json)
+
+    def _explorar(self) -> Dict[str, os.stat_result]:
+        """Archivos de capa presentes (un único recorrido de la carpeta)."""
+        encontrados = {}
+        if not self.carpeta.exists():
+            return encontrados
+        for raiz, _, nombres in os.walk(self.carpeta):
+            for nombre in nombres:
+                if Path(nombre).suffix.lower() in EXTENSIONES_CAPA:
+                    ruta = Path(raiz) / nombre
+                    encontrados[ruta.relative_to(self.carpeta).as_posix()] = ruta.stat()
+        return encontrados
+
+    def actualizar(self) -> Tuple[int, int]:
+        """
+        Sincroniza el catálogo con la carpeta.
+
+        Solo se abren los archivos nuevos o con mtime/tamaño distintos; los
+        que ya no existen se eliminan.
+
+        Returns:
+            (archivos inspeccionados, archivos eliminados)
+        """
+        with self._lock:
+            presentes = self._explorar()
+            eliminados = [r for r in self._archivos if r not in presentes]
+            for relativa in eliminados:
+                del self._archivos[relativa]
+
+            inspeccionados = 0
+            for relativa, estado in sorted(presentes.items()):
+                previo = self._archivos.get(relativa)
+                if previo and previo["mtime"] == estado.st_mtime and previo["tamano"] == estado.st_size:
+                    continue
+                inspeccionados += 1
+                try:
+                    capas = inspeccionar_archivo(self.carpeta / relativa, relativa)
+                    self.errores.pop(relativa, None)
+                except Exception as exc:
+                    capas = []
+                    self.errores[relativa] = str(exc)
+                self._archivos[relativa] = {
+                    "mtime": estado.st_mtime,
+                    "tamano": estado.st_size,
+                    "capas": [asdict(c) for c in capas],
+                }
+
+            if inspeccionados or eliminados:
+                self._guardar()
+            return inspeccionados, len(eliminados)
+
+    def capas(self) -> List[EntradaCapa]:
+        """Todas las capas del catálogo, ordenadas por ruta."""
+        with self._lock:
+            return [
+                EntradaCapa(**capa)
+                for relativa in sorted(self._archivos)
+                for capa in self._archivos[relativa]["capas"]
+            ]
+
+    def capas_en_zona(self, limites: Sequence[float]) -> List[EntradaCapa]:
+        """
+        Capas cuya extensión toca una zona.
+
+        Args:
+            limites: (minx, miny, maxx, maxy) en EPSG:25830
+        """
+        return [c for c in self.capas() if c.intersecta(limites)]
+
+    def buscar(self, ruta_relativa: str) -> Optional[EntradaCapa]:
+        """
+        Primera capa de un archivo del catálogo.
+
+        Args:
+            ruta_relativa: Ruta dentro de FUENTES (con "/" como separador)
+        """
+        with self._lock:
+            archivo = self._archivos.get(ruta_relativa)
+            if archivo and archivo["capas"]:
+                return EntradaCapa(**archivo["capas"][0])
+        return None
+
+    def ruta_absoluta(self, capa: EntradaCapa) -> Path:
+        return self.carpeta / capa.ruta
+
+    def resumen(self) -> dict:
+        """Estadísticas para el endpoint /info."""
+        capas = self.capas()
+        with self._lock:
+            archivos = list(self._archivos)
+        por_extension: Dict[str, int] = {}
+        for relativa in archivos:
+            extension = Path(relativa).suffix.lower()
+            por_extension[extension] = por_extension.get(extension, 0) + 1
+        return {
+            "archivos": len(archivos),
+            "capas": len(capas),
+            "por_extension": por_extension,
+            "sin_indice_espacial": sorted(c.nombre for c in capas if not c.indice_espacial),
+            "errores": dict(self.errores),
+        }
+
+
+_catalogos: Dict[str, CatalogoFuentes] = {}
+_lock_catalogos = threading.Lock()
+
+
+def obtener_catalogo(carpeta: Path, ruta_json: Path) -> CatalogoFuentes:
+    """
+    Devuelve el catálogo de una carpeta FUENTES, creándolo si es necesario.
+
+    Todos los trabajos del proceso que usan la misma carpeta comparten
+    instancia (y por tanto los metadatos ya leídos).
+    """
+    clave = str(Path(carpeta).resolve())
+    with _lock_catalogos:
+        catalogo = _catalogos.get(clave)
+        if catalogo is None:
+            catalogo = CatalogoFuentes(Path(carpeta), Path(ruta_json))
+            _catalogos[clave] = catalogo
+        return catalogo
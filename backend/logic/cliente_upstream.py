@@ -0,0 +1,529 @@
+"""
+Cliente HTTP común para todos los servicios remotos del pipeline.
+
+Centraliza las peticiones a Catastro, WMS/WFS y servidores de teselas con:
+- Reintentos con espera exponencial y jitter ("full jitter")
+- Límite de concurrencia adaptativo por host (AIMD: sube +1/límite con cada
+  éxito y se divide a la mitad con cada fallo)
+- Cortocircuito (circuit breaker) por host: tras varios fallos consecutivos
+  las peticiones fallan de inmediato hasta que una petición de prueba
+  vuelve a tener éxito
+- Agrupación de peticiones idénticas en vuelo ("single-flight"): si un GET
+  igual (misma URL y parámetros) ya está en curso en el proceso, se espera
+  a su respuesta en lugar de repetirlo
+
+El estado de cada host (límite y cortocircuito) se comparte entre todos los
+trabajos del proceso; los contadores de peticiones y reintentos son propios
+de cada cliente, es decir, de cada trabajo.
+"""
+from __future__ import annotations
+
+import os
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Sequence
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+if TYPE_CHECKING:
+    from .configuracion import ConfiguracionPipeline
+
+# Códigos HTTP que indican un problema transitorio del servidor
+CODIGOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+# Tamaño de los bloques escritos a disco en las descargas en streaming
+TAMANO_BLOQUE = 64 * 1024
+
+
+class CircuitoAbiertoError(requests.ConnectionError):
+    """El host tiene el cortocircuito abierto y la petición no se ha enviado."""
+
+
+class DescargaInvalidaError(requests.RequestException):
+    """La respuesta no tiene el tipo de contenido o el tamaño esperados."""
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# ESTADO COMPARTIDO POR HOST
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+class EstadoHost:
+    """Límite de concurrencia AIMD y cortocircuito de un host remoto."""
+
+    CERRADO = "cerrado"
+    ABIERTO = "abierto"
+    SEMIABIERTO = "semiabierto"
+
+    def __init__(self, host: str, limite_inicial: int, limite_max: int) -> None:
+        self.host = host
+        self.limite = float(max(1, limite_inicial))
+        self.limite_max = max(limite_max, limite_inicial, 1)
+        self.en_vuelo = 0
+        self.circuito = self.CERRADO
+        self.fallos_consecutivos = 0
+        self.abierto_hasta = 0.0
+        self.aperturas = 0
+        self._sonda_en_curso = False
+        self._cond = threading.Condition()
+
+    # ───────────────────────────────────────────────────────────────────────
+    # Cortocircuito
+    # ───────────────────────────────────────────────────────────────────────
+
+    def permitir(self) -> bool:
+        """Indica si puede enviarse una petición según el estado del circuito."""
+        with self._cond:
+            if self.circuito == self.CERRADO:
+                return True
+            if self.circuito == self.ABIERTO and time.monotonic() >= self.abierto_hasta:
+                self.circuito = self.SEMIABIERTO
+                self._sonda_en_curso = False
+            if self.circuito == self.SEMIABIERTO and not self._sonda_en_curso:
+                self._sonda_en_curso = True
+                return True
+            return False
+
+    def registrar(self, exito: bool, umbral: int, reapertura_s: float) -> Optional[str]:
+        """
+        Registra el resultado de una petición en el circuito.
+
+        Returns:
+            Nuevo estado del circuito si ha cambiado, o None
+        """
+        with self._cond:
+            anterior = self.circuito
+            if exito:
+                self.fallos_consecutivos = 0
+                self.circuito = self.CERRADO
+            else:
+                self.fallos_consecutivos += 1
+                if self.circuito == self.SEMIABIERTO or self.fallos_consecutivos >= umbral:
+                    self.circuito = self.ABIERTO
+                    self.abierto_hasta = time.monotonic() + reapertura_s
+                    if anterior != self.ABIERTO:
+                        self.aperturas += 1
+            self._sonda_en_curso = False
+            return self.circuito if self.circuito != anterior else None
+
+    # ───────────────────────────────────────────────────────────────────────
+    # Concurrencia AIMD
+    # ───────────────────────────────────────────────────────────────────────
+
+    def adquirir(self) -> None:
+        """Espera hasta que haya hueco bajo el límite de concurrencia actual."""
+        with self._cond:
+            while self.en_vuelo >= max(1, int(self.limite)):
+                self._cond.wait()
+            self.en_vuelo += 1
+
+    def liberar(self, exito: Optional[bool]) -> None:
+        """
+        Libera el hueco ocupado y ajusta el límite.
+
+        Args:
+            exito: True (aumento aditivo), False (reducción multiplicativa)
+                o None (sin ajuste, p. ej. errores del cliente)
+        """
+        with self._cond:
+            self.en_vuelo -= 1
+            if exito is True:
+                self.limite = min(self.limite_max, self.limite + 1.0 / self.limite)
+            elif exito is False:
+                self.limite = max(1.0, self.limite / 2)
+            self._cond.notify_all()
+
+    def resumen(self) -> dict:
+        with self._cond:
+            return {
+                "circuito": self.circuito,
+                "limite": round(self.limite, 2),
+                "en_vuelo": self.en_vuelo,
+                "fallos_consecutivos": self.fallos_consecutivos,
+                "aperturas": self.aperturas,
+            }
+
+
+_hosts: Dict[str, EstadoHost] = {}
+_lock_hosts = threading.Lock()
+
+
+def estado_host(host: str, limite_inicial: int, limite_max: int) -> EstadoHost:
+    """Devuelve (creándolo si es necesario) el estado compartido de un host."""
+    with _lock_hosts:
+        estado = _hosts.get(host)
+        if estado is None:
+            estado = EstadoHost(host, limite_inicial, limite_max)
+            _hosts[host] = estado
+        return estado
+
+
+def estado_hosts() -> Dict[str, dict]:
+    """Resumen del estado de todos los hosts conocidos por el proceso."""
+    with _lock_hosts:
+        estados = list(_hosts.values())
+    return {estado.host: estado.resumen() for estado in estados}
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# PETICIONES EN VUELO COMPARTIDAS POR PROCESO
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+class _Vuelo:
+    """Petición en curso a la que pueden unirse otras idénticas."""
+
+    def __init__(self) -> None:
+        self.hecho = threading.Event()
+        self.respuesta: Optional[requests.Response] = None
+        self.error: Optional[BaseException] = None
+
+
+_vuelos: Dict[str, _Vuelo] = {}
+_lock_vuelos = threading.Lock()
+
+
+def clave_peticion(url: str, params: Optional[dict] = None) -> str:
+    """URL completa de un GET con los parámetros codificados y ordenados."""
+    if isinstance(params, dict):
+        params = sorted(params.items())
+    return requests.Request("GET", url, params=params).prepare().url
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# CLIENTE
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+class ClienteUpstream:
+    """
+    Cliente HTTP con reintentos, concurrencia adaptativa y cortocircuito.
+
+    Todas las llamadas remotas del orquestador deben pasar por aquí.
+    """
+
+    def __init__(
+        self,
+        session: requests.Session,
+        limites_por_host: Dict[str, int],
+        limite_defecto: int = 4,
+        factor_limite_max: int = 2,
+        max_reintentos: int = 3,
+        backoff_base_s: float = 0.5,
+        backoff_max_s: float = 10.0,
+        umbral_fallos: int = 5,
+        reapertura_s: float = 30.0,
+        log: Optional[Callable[[str], None]] = None
+    ) -> None:
+        """
+        Args:
+            session: Sesión HTTP a reutilizar (cabeceras, pool de conexiones)
+            limites_por_host: Concurrencia inicial por host
+            limite_defecto: Concurrencia inicial para hosts no listados
+            factor_limite_max: Máximo al que puede crecer el límite (× inicial)
+            max_reintentos: Reintentos tras el primer intento fallido
+            backoff_base_s: Espera base de la progresión exponencial
+            backoff_max_s: Espera máxima entre intentos
+            umbral_fallos: Fallos consecutivos que abren el circuito
+            reapertura_s: Tiempo con el circuito abierto antes de probar de nuevo
+            log: Función para registrar reintentos y cambios de circuito
+        """
+        self.session = session
+        self.limites_por_host = limites_por_host
+        self.limite_defecto = limite_defecto
+        self.factor_limite_max = factor_limite_max
+        self.max_reintentos = max_reintentos
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.umbral_fallos = umbral_fallos
+        self.reapertura_s = reapertura_s
+        self.log = log or (lambda mensaje: None)
+
+        self._lock = threading.Lock()
+        self._contadores: Dict[str, Dict[str, int]] = {}
+
+    # ───────────────────────────────────────────────────────────────────────
+    # Peticiones
+    # ───────────────────────────────────────────────────────────────────────
+
+    def get(
+        self,
+        url: str,
+        params: Optional[dict] = None,
+        timeout: float = 30,
+        **kwargs
+    ) -> requests.Response:
+        """
+        GET con reintentos, límite por host y cortocircuito.
+
+        Si tras agotar los reintentos el servidor sigue respondiendo con un
+        código transitorio, se devuelve esa última respuesta para que el
+        llamador la trate como hasta ahora (status_code / raise_for_status).
+
+        Los GET sin opciones adicionales (sin stream, cabeceras propias...)
+        se agrupan: si otro hilo del proceso ya está pidiendo la misma URL,
+        se espera a su resultado (respuesta o excepción) y se comparte. La
+        respuesta compartida tiene el cuerpo ya leído y debe tratarse como
+        de solo lectura.
+
+        Raises:
+            CircuitoAbiertoError: Si el host tiene el circuito abierto
+            requests.RequestException: Si fallan todos los intentos por red
+        """
+        if kwargs:
+            return self._get(url, params, timeout, **kwargs)
+
+        clave = clave_peticion(url, params)
+        with _lock_vuelos:
+            vuelo = _vuelos.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = _vuelos[clave] = _Vuelo()
+
+        if not lider:
+            self._contar(urlparse(url).hostname or "", "agrupadas")
+            vuelo.hecho.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.respuesta
+
+        try:
+            vuelo.respuesta = self._get(url, params, timeout)
+            return vuelo.respuesta
+        except BaseException as exc:
+            vuelo.error = exc
+            raise
+        finally:
+            with _lock_vuelos:
+                del _vuelos[clave]
+            vuelo.hecho.set()
+
+    def _get(
+        self,
+        url: str,
+        params: Optional[dict],
+        timeout: float,
+        **kwargs
+    ) -> requests.Response:
+        """GET real con reintentos, límite por host y cortocircuito (ver get)."""
+        host = urlparse(url).hostname or ""
+        estado = self._estado(host)
+
+        for intento in range(self.max_reintentos + 1):
+            if not estado.permitir():
+                self._contar(host, "rechazadas")
+                raise CircuitoAbiertoError(f"Circuito abierto para {host}")
+
+            self._contar(host, "peticiones")
+            estado.adquirir()
+            exito: Optional[bool] = None
+            error: Optional[Exception] = None
+            respuesta: Optional[requests.Response] = None
+            try:
+                respuesta = self.session.get(url, params=params, timeout=timeout, **kwargs)
+                exito = respuesta.status_code not in CODIGOS_REINTENTABLES
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                error = exc
+                exito = False
+            except BaseException:
+                # Otros errores (ChunkedEncodingError, TooManyRedirects...) no
+                # se reintentan, pero cuentan como fallo del host
+                self._contar(host, "errores")
+                raise
+            finally:
+                estado.liberar(exito)
+                # En todos los casos, para que la sonda del circuito
+                # semiabierto nunca quede pendiente
+                cambio = estado.registrar(bool(exito), self.umbral_fallos, self.reapertura_s)
+                if cambio:
+                    self._contar(host, "cambios_circuito")
+                    self.log(f"   🔌 Circuito {cambio.upper()} para {host}")
+
+            if exito:
+                return respuesta
+
+            self._contar(host, "errores")
+            motivo = type(error).__name__ if error else f"HTTP {respuesta.status_code}"
+            if intento == self.max_reintentos or estado.circuito == EstadoHost.ABIERTO:
+                if error is not None:
+                    raise error
+                return respuesta
+            if respuesta is not None:
+                respuesta.close()
+
+            espera = self._espera(intento, respuesta)
+            self._contar(host, "reintentos")
+            self.log(
+                f"   ↻ Reintento {intento + 1}/{self.max_reintentos} {host} "
+                f"({motivo}) en {espera:.1f}s"
+            )
+            time.sleep(espera)
+
+        raise requests.RequestException(f"Sin respuesta de {host}")  # pragma: no cover
+
+    def descargar(
+        self,
+        url: str,
+        destino: Path,
+        params: Optional[dict] = None,
+        timeout: float = 30,
+        tipos_contenido: Optional[Sequence[str]] = None,
+        tamano_minimo: int = 0,
+        tamano_maximo: Optional[int] = None
+    ) -> int:
+        """
+        Descarga una respuesta a disco por bloques, sin cargarla en memoria.
+
+        El cuerpo se escribe en un temporal junto a `destino` y solo se
+        renombra al terminar, de modo que `destino` nunca queda a medias.
+        El tipo de contenido se valida antes de leer el cuerpo y el tamaño
+        a medida que se recibe.
+
+        Args:
+            url: URL a descargar
+            destino: Ruta final del archivo
+            params: Parámetros de la petición
+            timeout: Timeout en segundos (conexión y entre bloques)
+            tipos_contenido: Fragmentos aceptados en Content-Type (p. ej. "pdf")
+            tamano_minimo: Tamaño mínimo en bytes para dar la descarga por válida
+            tamano_maximo: Tamaño a partir del cual se aborta la descarga
+
+        Returns:
+            Bytes escritos en destino
+
+        Raises:
+            DescargaInvalidaError: Si falla la validación de tipo o tamaño
+            requests.RequestException: Si falla la petición
+        """
+        respuesta = self.get(url, params=params, timeout=timeout, stream=True)
+        with respuesta:
+            respuesta.raise_for_status()
+
+            tipo = respuesta.headers.get("Content-Type", "").lower()
+            if tipos_contenido and not any(t in tipo for t in tipos_contenido):
+                raise DescargaInvalidaError(f"Tipo de contenido inesperado: {tipo or '?'}")
+
+            declarado = respuesta.headers.get("Content-Length", "")
+            if tamano_maximo and declarado.isdigit() and int(declarado) > tamano_maximo:
+                raise DescargaInvalidaError(f"Respuesta demasiado grande ({declarado} bytes)")
+
+            destino = Path(destino)
+            fd, tmp = tempfile.mkstemp(dir=str(destino.parent), prefix=f".{destino.name}.", suffix=".part")
+            escritos = 0
+            try:
+                with os.fdopen(fd, "wb") as handle:
+                    for bloque in respuesta.iter_content(chunk_size=TAMANO_BLOQUE):
+                        escritos += len(bloque)
+                        if tamano_maximo and escritos > tamano_maximo:
+                            raise DescargaInvalidaError(
+                                f"Respuesta demasiado grande (> {tamano_maximo} bytes)"
+                            )
+                        handle.write(bloque)
+                if escritos < tamano_minimo:
+                    raise DescargaInvalidaError(
+                        f"Respuesta demasiado pequeña ({escritos} bytes)"
+                    )
+                os.replace(tmp, destino)
+            except BaseException:
+                Path(tmp).unlink(missing_ok=True)
+                raise
+            return escritos
+
+    def _espera(self, intento: int, respuesta: Optional[requests.Response]) -> float:
+        """Espera exponencial con jitter completo (respeta Retry-After si llega)."""
+        if respuesta is not None:
+            retry_after = respuesta.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max_s)
+        tope = min(self.backoff_max_s, self.backoff_base_s * (2 ** intento))
+        return random.uniform(0, tope)
+
+    # ───────────────────────────────────────────────────────────────────────
+    # Métricas
+    # ───────────────────────────────────────────────────────────────────────
+
+    def estadisticas(self) -> Dict[str, dict]:
+        """
+        Métricas por host: contadores de este cliente y estado compartido.
+
+        Returns:
+            {host: {peticiones, reintentos, errores, rechazadas,
+                    cambios_circuito, agrupadas, circuito, limite, ...}}
+        """
+        contadores = self.contadores()
+        estados = estado_hosts()
+        return {
+            host: {**valores, **estados.get(host, {})}
+            for host, valores in contadores.items()
+        }
+
+    def contadores(self) -> Dict[str, Dict[str, int]]:
+        """Copia de los contadores de este cliente por host."""
+        with self._lock:
+            return {host: dict(valores) for host, valores in self._contadores.items()}
+
+    def acumular(self, contadores: Dict[str, Dict[str, int]]) -> None:
+        """
+        Suma los contadores de otro cliente (p. ej. el de un proceso hijo).
+
+        Args:
+            contadores: Resultado de contadores() del otro cliente
+        """
+        with self._lock:
+            for host, valores in contadores.items():
+                propios = self._contadores.setdefault(host, dict.fromkeys(valores, 0))
+                for nombre, valor in valores.items():
+                    propios[nombre] = propios.get(nombre, 0) + valor
+
+    def _estado(self, host: str) -> EstadoHost:
+        inicial = self.limites_por_host.get(host, self.limite_defecto)
+        return estado_host(host, inicial, inicial * self.factor_limite_max)
+
+    def _contar(self, host: str, contador: str) -> None:
+        with self._lock:
+            valores = self._contadores.setdefault(host, {
+                "peticiones": 0, "reintentos": 0, "errores": 0,
+                "rechazadas": 0, "cambios_circuito": 0, "agrupadas": 0,
+            })
+            valores[contador] += 1
+
+
+def crear_sesion(user_agent: str, pool_maxsize: int) -> requests.Session:
+    """Crea una sesión HTTP con un pool de conexiones del tamaño indicado."""
+    session = requests.Session()
+    session.headers.update({"User-Agent": user_agent})
+    adaptador = HTTPAdapter(pool_maxsize=max(10, pool_maxsize))
+    session.mount("https://", adaptador)
+    session.mount("http://", adaptador)
+    return session
+
+
+def crear_cliente(
+    session: requests.Session,
+    config: "ConfiguracionPipeline",
+    log: Optional[Callable[[str], None]] = None
+) -> ClienteUpstream:
+    """
+    Crea un cliente sobre `session` con los reintentos, límites por host y
+    cortocircuito de la configuración.
+
+    Es la única forma de construir clientes en el servidor, los trabajos y
+    las herramientas de línea de comandos, para que todos apliquen los
+    mismos ajustes a los hosts que comparten.
+    """
+    return ClienteUpstream(
+        session,
+        limites_por_host=config.limites_por_host,
+        limite_defecto=config.limite_host_defecto,
+        max_reintentos=config.reintentos_max,
+        backoff_base_s=config.backoff_base_s,
+        backoff_max_s=config.backoff_max_s,
+        umbral_fallos=config.circuito_umbral_fallos,
+        reapertura_s=config.circuito_reapertura_s,
+        log=log,
+    )
@@ -0,0 +1,371 @@
+"""
+Catálogo de Montes de Utilidad Pública (CMUP) del MITECO: WFS por páginas y espejo local.
+
+El plano de montes públicos solo necesita los montes que tocan las parcelas
+del trabajo, pero la capa IEPF_CMUP:CMUP_Poligono es nacional. En lugar de
+descargarla completa, cada trabajo la pide filtrada por el BBOX de su
+encuadre y por páginas (COUNT/STARTINDEX de WFS 2.0, con SORTBY para que
+el orden sea estable entre páginas), leyendo solo las páginas que hacen
+falta. La paginación solo termina con una página vacía o al completar el
+numberMatched del servidor; si se agota el límite de páginas antes, la
+consulta falla en lugar de devolver la capa a medias.
+
+Opcionalmente se mantiene un espejo de la capa completa dentro de FUENTES
+(un GPKG que se vuelve a descargar cuando supera su antigüedad máxima); con
+el espejo disponible, el plano lo consulta por índice espacial como
+cualquier otra capa local y no llama al WFS.
+
+Uso (desde backend/, descarga o refresca el espejo ahora):
+    python -m logic.cmup --destino CAPAS_gpkg/espejos/CMUP.gpkg
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional, Sequence, Tuple
+from urllib.parse import urlencode
+
+import geopandas as gpd
+import pandas as pd
+import pyogrio
+
+from .cliente_upstream import ClienteUpstream
+
+URL_WFS_CMUP = "https://wms.mapama.gob.es/sig/Biodiversidad/IEPF_CMUP"
+CAPA_WFS_CMUP = "IEPF_CMUP:CMUP_Poligono"
+
+# Nombre de la capa dentro del GPKG del espejo
+CAPA_ESPEJO = "CMUP_Poligono"
+
+# Páginas máximas de una consulta por BBOX (un encuadre de pocos km nunca
+# debería llegar) y de la descarga completa del espejo
+MAX_PAGINAS_BBOX = 50
+MAX_PAGINAS_ESPEJO = 10000
+
+# Atributo por el que se ordenan las páginas: sin orden explícito el
+# servidor puede devolver las entidades en otro orden en cada página y
+# STARTINDEX saltaría o repetiría montes. Si el servidor rechaza el SORTBY se
+# repite la consulta sin él (se descartan los gml:id repetidos y se comprueba
+# el total con numberMatched).
+ORDEN_WFS_CMUP = "OBJECTID"
+
+# Entidades de la página y total de la consulta, en la cabecera de la respuesta
+# (numberMatched puede ser "unknown")
+_NUMBER_RETURNED = re.compile(rb'numberReturned="(\d+)"')
+_NUMBER_MATCHED = re.compile(rb'numberMatched="(\d+)"')
+_EXCEPCION = re.compile(rb'ExceptionReport')
+_TEXTO_EXCEPCION = re.compile(rb'<(?:\w+:)?ExceptionText>(.*?)</', re.DOTALL)
+
+# Descarga de una URL a un archivo (con o sin caché)
+Descargador = Callable[[str, Path], None]
+
+
+class ErrorWFS(Exception):
+    """El WFS ha respondido con un ExceptionReport en lugar de entidades."""
+
+
+class PaginacionIncompletaError(Exception):
+    """La consulta por páginas no se ha completado (límite de páginas o total inconsistente)."""
+
+# ═══════════════════════════════════════════════════════════════════════════
+# CONSULTA WFS POR PÁGINAS
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def url_pagina(
+    inicio: int,
+    cantidad: int,
+    bbox: Optional[Sequence[float]] = None,
+    epsg_bbox: int = 3857,
+    orden: Optional[str] = ORDEN_WFS_CMUP
+) -> str:
+    """
+    URL GetFeature de una página del CMUP.
+
+    Args:
+        inicio: Primera entidad de la página (STARTINDEX)
+        cantidad: Entidades por página (COUNT)
+        bbox: (minx, miny, maxx, maxy) en `epsg_bbox` (None = toda la capa)
+        epsg_bbox: CRS del BBOX (se declara en la propia petición)
+        orden: Atributo de SORTBY (None = sin ordenar)
+    """
+    params = {
+        "SERVICE": "WFS",
+        "VERSION": "2.0.0",
+        "REQUEST": "GetFeature",
+        "TYPENAME": CAPA_WFS_CMUP,
+        "SRSNAME": "EPSG:4326",
+        "COUNT": cantidad,
+        "STARTINDEX": inicio,
+    }
+    if orden:
+        params["SORTBY"] = f"{orden} ASC"
+    if bbox is not None:
+        coords = ",".join(f"{v:.2f}" for v in bbox)
+        params["BBOX"] = f"{coords},urn:ogc:def:crs:EPSG::{epsg_bbox}"
+    return f"{URL_WFS_CMUP}?{urlencode(params, safe=':,')}"
+
+
+def leer_cabecera(ruta: Path) -> Tuple[Optional[int], Optional[int]]:
+    """
+    (numberReturned, numberMatched) de una respuesta GetFeature.
+
+    Cualquiera de los dos es None si la respuesta no lo declara (o es "unknown").
+
+    Raises:
+        ErrorWFS: Si la respuesta es un ExceptionReport
+    """
+    with open(ruta, "rb") as f:
+        cabecera = f.read(4096)
+    if _EXCEPCION.search(cabecera):
+        texto = _TEXTO_EXCEPCION.search(cabecera)
+        detalle = texto.group(1).decode("utf-8", "replace").strip() if texto else "sin detalle"
+        raise ErrorWFS(f"El WFS del CMUP ha rechazado la consulta: {detalle}")
+    devueltas = _NUMBER_RETURNED.search(cabecera)
+    coincidentes = _NUMBER_MATCHED.search(cabecera)
+    return (
+        int(devueltas.group(1)) if devueltas else None,
+        int(coincidentes.group(1)) if coincidentes else None,
+    )
+
+
+def leer_pagina(ruta: Path) -> gpd.GeoDataFrame:
+    """
+    GeoDataFrame (EPSG:4326) de una página GML; vacío si no trae entidades.
+
+    Raises:
+        ErrorWFS: Si la respuesta es un ExceptionReport
+    """
+    devueltas, _ = leer_cabecera(ruta)
+    # Sin numberReturned, una colección vacía no tiene capa que leer
+    if devueltas == 0 or len(pyogrio.list_layers(str(ruta))) == 0:
+        return gpd.GeoDataFrame(geometry=gpd.GeoSeries([], crs=4326))
+    return gpd.read_file(str(ruta))
+
+
+def descargar_paginas(
+    descargar: Descargador,
+    bbox: Optional[Sequence[float]] = None,
+    tamano_pagina: int = 1000,
+    max_paginas: int = MAX_PAGINAS_BBOX,
+    orden: Optional[str] = ORDEN_WFS_CMUP
+) -> gpd.GeoDataFrame:
+    """
+    Descarga y une todas las páginas del CMUP.
+
+    Cada página empieza en la entidad siguiente a las ya recibidas (el
+    servidor puede devolver menos de las pedidas por su propio límite de
+    COUNT), y la consulta termina con la primera página vacía o al reunir
+    las numberMatched entidades que anuncia el servidor. Si el servidor
+    rechaza el SORTBY, la consulta se repite sin ordenar.
+
+    Args:
+        descargar: Función (url, destino) que deja la respuesta en destino
+        bbox: BBOX en EPSG:3857 (None = toda la capa)
+        tamano_pagina: Entidades por página
+        max_paginas: Páginas máximas a pedir
+        orden: Atributo de SORTBY (None = sin ordenar)
+
+    Returns:
+        GeoDataFrame en EPSG:4326 (vacío si no hay montes en el BBOX)
+
+    Raises:
+        PaginacionIncompletaError: Si se agotan las páginas antes del final de
+            la consulta o faltan entidades respecto a numberMatched
+        ErrorWFS: Si el servidor rechaza la consulta
+    """
+    try:
+        return _descargar_paginas(descargar, bbox, tamano_pagina, max_paginas, orden)
+    except ErrorWFS:
+        if not orden:
+            raise
+        return _descargar_paginas(descargar, bbox, tamano_pagina, max_paginas, None)
+
+
+def _descargar_paginas(
+    descargar: Descargador,
+    bbox: Optional[Sequence[float]],
+    tamano_pagina: int,
+    max_paginas: int,
+    orden: Optional[str]
+) -> gpd.GeoDataFrame:
+    """Bucle de páginas de descargar_paginas con un orden fijo."""
+    partes = []
+    recibidas = 0
+    total = None
+    completa = False
+    with tempfile.TemporaryDirectory() as carpeta_tmp:
+        for pagina in range(max_paginas):
+            ruta = Path(carpeta_tmp) / f"pagina_{pagina}.gml"
+            descargar(url_pagina(recibidas, tamano_pagina, bbox, orden=orden), ruta)
+            _, coincidentes = leer_cabecera(ruta)
+            gdf = leer_pagina(ruta)
+            ruta.unlink()
+            if coincidentes is not None:
+                total = coincidentes
+            if gdf.empty:
+                completa = True
+                break
+            partes.append(gdf)
+            recibidas += len(gdf)
+            if total is not None and recibidas >= total:
+                completa = True
+                break
+
+    if not completa:
+        raise PaginacionIncompletaError(
+            f"El WFS del CMUP sigue devolviendo entidades tras {max_paginas} páginas "
+            f"({recibidas} montes); se descarta el resultado parcial"
+        )
+    if not partes:
+        return gpd.GeoDataFrame(geometry=gpd.GeoSeries([], crs=4326))
+
+    gdf = gpd.GeoDataFrame(pd.concat(partes, ignore_index=True), crs=partes[0].crs)
+    if "gml_id" in gdf.columns:
+        gdf = gdf.drop_duplicates(subset="gml_id", ignore_index=True)
+    if total is not None and len(gdf) < total:
+        raise PaginacionIncompletaError(
+            f"El WFS del CMUP anuncia {total} montes pero solo se han recibido "
+            f"{len(gdf)} distintos; se descarta el resultado parcial"
+        )
+    return gdf
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# ESPEJO LOCAL
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+class EspejoCMUP:
+    """
+    Copia local completa del CMUP (GPKG en FUENTES) con refresco periódico.
+
+    El GPKG se escribe en un temporal junto al destino y se renombra al
+    terminar, de modo que los trabajos nunca leen un espejo a medias; el
+    cambio de mtime hace que el catálogo, el almacén y la caché de capas
+    recojan la versión nueva.
+    """
+
+    def __init__(self, ruta: Path, refresco_horas: float, tamano_pagina: int = 1000) -> None:
+        """
+        Args:
+            ruta: Ruta absoluta del GPKG del espejo
+            refresco_horas: Antigüedad a partir de la cual se vuelve a descargar
+            tamano_pagina: Entidades por página WFS
+        """
+        self.ruta = Path(ruta)
+        self.refresco_horas = refresco_horas
+        self.tamano_pagina = tamano_pagina
+
+    def antiguedad_horas(self) -> Optional[float]:
+        """Horas desde la última descarga (None si aún no existe)."""
+        try:
+            return (time.time() - self.ruta.stat().st_mtime) / 3600
+        except OSError:
+            return None
+
+    def vigente(self) -> bool:
+        antiguedad = self.antiguedad_horas()
+        return antiguedad is not None and antiguedad < self.refresco_horas
+
+    def actualizar(self, cliente: ClienteUpstream, tamano_maximo: Optional[int] = None) -> int:
+        """
+        Descarga la capa completa por páginas y reemplaza el espejo.
+
+        Si la descarga no se completa (PaginacionIncompletaError, ErrorWFS o
+        un fallo de red) se propaga la excepción y el espejo anterior queda
+        intacto: nunca se sustituye por una capa parcial.
+
+        Args:
+            cliente: Cliente HTTP común
+            tamano_maximo: Tamaño máximo aceptado por página (bytes)
+
+        Returns:
+            Entidades del espejo
+        """
+        def descargar(url: str, destino: Path) -> None:
+            cliente.descargar(
+                url, destino, timeout=120,
+                tipos_contenido=("xml", "gml"),
+                tamano_maximo=tamano_maximo,
+            )
+
+        gdf = descargar_paginas(descargar, None, self.tamano_pagina, MAX_PAGINAS_ESPEJO)
+        if gdf.empty:
+            raise ValueError("El WFS del CMUP no ha devuelto entidades")
+
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        fd, temporal = tempfile.mkstemp(dir=str(self.ruta.parent), suffix=".gpkg.tmp")
+        os.close(fd)
+        os.unlink(temporal)
+        try:
+            gdf.to_file(temporal, driver="GPKG", layer=CAPA_ESPEJO)
+            os.replace(temporal, self.ruta)
+        finally:
+            if os.path.exists(temporal):
+                os.unlink(temporal)
+        return len(gdf)
+
+    def mantener(
+        self,
+        cliente: ClienteUpstream,
+        log: Callable[[str], None] = print,
+        tamano_maximo: Optional[int] = None,
+        detener: Optional[threading.Event] = None
+    ) -> None:
+        """
+        Refresca el espejo cada `refresco_horas` (bucle para un hilo en segundo plano).
+
+        Si una descarga falla se reintenta al cabo de una hora, conservando
+        el espejo anterior.
+        """
+        detener = detener or threading.Event()
+        while not detener.is_set():
+            espera = 3600.0
+            if self.vigente():
+                espera = max(60.0, (self.refresco_horas - self.antiguedad_horas()) * 3600)
+            else:
+                try:
+                    entidades = self.actualizar(cliente, tamano_maximo)
+                    log(f"🌲 Espejo CMUP actualizado: {entidades} montes ({self.ruta.name})")
+                    espera = max(60.0, self.refresco_horas * 3600)
+                except Exception as exc:
+                    log(f"⚠️  No se pudo actualizar el espejo CMUP: {exc}")
+            detener.wait(espera)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# HERRAMIENTA DE LÍNEA DE COMANDOS
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def main() -> None:
+    from .cliente_upstream import crear_cliente, crear_sesion
+    from .configuracion import ConfiguracionPipeline
+    from .orquestador2 import USER_AGENT
+
+    config = ConfiguracionPipeline()
+    base = Path.cwd()  # mismas rutas que main.py
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fuentes", type=Path, default=base / "FUENTES")
+    parser.add_argument("--destino", default=config.cmup_espejo,
+                        help="GPKG del espejo (ruta dentro de FUENTES)")
+    parser.add_argument("--pagina", type=int, default=config.cmup_pagina)
+    args = parser.parse_args()
+
+    if not args.destino:
+        parser.error("Indica el GPKG del espejo (--destino o CMUP_ESPEJO)")
+
+    cliente = crear_cliente(crear_sesion(USER_AGENT, 1), config, log=print)
+    espejo = EspejoCMUP(args.fuentes / args.destino, config.cmup_espejo_refresco_horas, args.pagina)
+    entidades = espejo.actualizar(cliente, config.descarga_max_mb * 1024 * 1024)
+    print(f"🌲 Espejo CMUP: {entidades} montes en {espejo.ruta}")
+
+
+if __name__ == "__main__":
+    main()
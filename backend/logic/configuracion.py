@@ -0,0 +1,186 @@
+"""
+Configuración ajustable del Pipeline GIS Catastral.
+
+Los valores por defecto pueden sobrescribirse mediante variables de entorno
+(ver .env.example) o pasando una instancia de ConfiguracionPipeline al
+OrquestadorPipeline.
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from typing import Dict
+
+# ═══════════════════════════════════════════════════════════════════════════
+# HOSTS REMOTOS CONOCIDOS
+# ═══════════════════════════════════════════════════════════════════════════
+
+HOST_CATASTRO_INSPIRE = "ovc.catastro.meh.es"
+HOST_SEDE_CATASTRO = "www1.sedecatastro.gob.es"
+
+
+def _env_int(nombre: str, defecto: int) -> int:
+    """Lee un entero desde el entorno, usando el valor por defecto si no es válido."""
+    try:
+        return int(os.environ.get(nombre, defecto))
+    except (TypeError, ValueError):
+        return defecto
+
+
+def _env_float(nombre: str, defecto: float) -> float:
+    """Lee un número real desde el entorno, usando el valor por defecto si no es válido."""
+    try:
+        return float(os.environ.get(nombre, defecto))
+    except (TypeError, ValueError):
+        return defecto
+
+
+def _env_bool(nombre: str, defecto: bool) -> bool:
+    """Lee un booleano desde el entorno (1/true/si/yes)."""
+    valor = os.environ.get(nombre)
+    if valor is None:
+        return defecto
+    return valor.strip().lower() in ("1", "true", "si", "sí", "yes")
+
+
+def _limites_por_host() -> Dict[str, int]:
+    """Concurrencia inicial por host (el cliente la ajusta con AIMD)."""
+    return {
+        HOST_CATASTRO_INSPIRE: _env_int("LIMITE_HOST_CATASTRO_INSPIRE", 6),
+        HOST_SEDE_CATASTRO: _env_int("LIMITE_HOST_SEDE_CATASTRO", 3),
+    }
+
+
+def _ttl_teselas_por_fuente() -> Dict[str, float]:
+    """Caducidad (horas) de las teselas por fuente de mapa base."""
+    return {
+        "openstreetmap": _env_float("TTL_TESELAS_OSM_HORAS", 24 * 7),
+        "arcgisonline": _env_float("TTL_TESELAS_ESRI_HORAS", 24 * 30),
+        "ign.es": _env_float("TTL_TESELAS_IGN_HORAS", 24 * 90),
+    }
+
+
+@dataclass
+class ConfiguracionPipeline:
+    """
+    Parámetros de rendimiento del pipeline.
+
+    Attributes:
+        max_descargas_simultaneas: Referencias procesadas en paralelo en la FASE 1
+        limites_por_host: Peticiones simultáneas iniciales por host remoto
+        limite_host_defecto: Límite para hosts no listados en limites_por_host
+        cache_catastro: Reutilizar XML/PDF ya descargados por otros trabajos
+        cache_catastro_ttl_horas: Caducidad de las entradas de la caché catastral
+        cache_max_mb: Tamaño máximo de la caché en disco antes de expulsar (LRU)
+        modo_adquisicion: "individual" (GetParcel por referencia) o "bbox"
+            (GetFeature por BBOX para grupos de parcelas del mismo polígono)
+        bbox_min_referencias: Referencias mínimas de un polígono para usar BBOX
+        bbox_margen_m: Margen alrededor de la parcela semilla de cada BBOX
+        bbox_lado_max_m: Lado máximo del BBOX (límite de área del servicio)
+        bbox_max_peticiones_grupo: Peticiones BBOX máximas por grupo
+        reintentos_max: Reintentos por petición remota tras un fallo transitorio
+        backoff_base_s: Espera base (exponencial con jitter) entre reintentos
+        backoff_max_s: Espera máxima entre reintentos
+        circuito_umbral_fallos: Fallos consecutivos que abren el circuito de un host
+        circuito_reapertura_s: Segundos con el circuito abierto antes de reintentar
+        descarga_max_mb: Tamaño máximo aceptado en las descargas a disco
+        procesos_planos: Procesos para generar los planos (FASES 6-12);
+            0 = según los núcleos de la máquina, 1 = secuencial en el proceso actual
+        procesos_afecciones: Procesos para analizar las capas de afecciones en
+            paralelo; 0 = según los núcleos de la máquina, 1 = secuencial
+        timeout_capa_s: Tiempo máximo de análisis de una capa de afecciones en
+            el pool, desde que un proceso empieza a analizarla (la capa se
+            descarta del informe si lo supera)
+        almacen_capas: Leer las capas de FUENTES desde copias FlatGeobuf ya
+            reproyectadas (EPSG:25830/3857) en lugar del archivo original
+        cache_capas_mb: Memoria máxima (estimada) de las cachés de capas en
+            memoria, repartida a partes iguales entre el servidor y los
+            procesos de los pools (cada uno tiene la suya); 0 = desactivada
+        cache_teselas_mb: Tamaño máximo de la caché en disco de teselas de los
+            mapas base (compartida por trabajos y procesos); 0 = desactivada
+        ttl_teselas_horas: Caducidad de las teselas por fuente (la clave se
+            busca en el nombre y la URL de la fuente)
+        ttl_teselas_defecto_horas: Caducidad de las teselas de otras fuentes
+        cache_wms_mb: Tamaño máximo de la caché en disco de respuestas WMS
+            (GetMap y leyendas) compartida entre trabajos; 0 = desactivada
+        ttl_wms_horas: Caducidad de los mapas WMS (GetMap) en caché
+        ttl_leyendas_wms_horas: Caducidad de las leyendas WMS (GetLegendGraphic)
+        wms_rejilla: Paso de la rejilla a la que se ajusta el centro de los
+            encuadres WMS, como fracción del lado del encuadre (p. ej. 0.05);
+            0 = centro exacto de las parcelas
+        precarga_planos: Descargar a las cachés, en paralelo y mientras se
+            ejecutan las FASES 3-5, todas las entradas remotas de los planos
+            (mapas WMS, leyendas, teselas y CMUP) antes de dibujarlos
+        precarga_max_simultaneas: Peticiones simultáneas de la precarga (el
+            límite por host lo aplica además el cliente)
+        cmup_pagina: Entidades por página en las consultas WFS del CMUP
+        cmup_espejo: GPKG (ruta dentro de FUENTES) con un espejo local del CMUP
+            que consulta el plano de montes públicos; vacío = WFS por BBOX
+        cmup_espejo_refresco_horas: Antigüedad a partir de la cual el servidor
+            vuelve a descargar el espejo del CMUP
+        capa_provincias: Capa de recintos provinciales (ruta dentro de FUENTES)
+            para leer las capas grandes por provincias; vacío = desactivado
+        columna_provincia: Columna de capa_provincias con el código INE de provincia
+        particion_min_entidades: Entidades mínimas de una capa para particionarla
+    """
+    max_descargas_simultaneas: int = field(
+        default_factory=lambda: _env_int("MAX_DESCARGAS_SIMULTANEAS", 8)
+    )
+    limites_por_host: Dict[str, int] = field(default_factory=_limites_por_host)
+    limite_host_defecto: int = field(
+        default_factory=lambda: _env_int("LIMITE_HOST_DEFECTO", 4)
+    )
+    cache_catastro: bool = field(default_factory=lambda: _env_bool("CACHE_CATASTRO", True))
+    cache_catastro_ttl_horas: int = field(
+        default_factory=lambda: _env_int("CACHE_CATASTRO_TTL_HORAS", 24 * 30)
+    )
+    cache_max_mb: int = field(default_factory=lambda: _env_int("CACHE_MAX_MB", 2048))
+    modo_adquisicion: str = field(
+        default_factory=lambda: os.environ.get("MODO_ADQUISICION", "individual").lower()
+    )
+    bbox_min_referencias: int = field(default_factory=lambda: _env_int("BBOX_MIN_REFERENCIAS", 3))
+    bbox_margen_m: int = field(default_factory=lambda: _env_int("BBOX_MARGEN_M", 500))
+    bbox_lado_max_m: int = field(default_factory=lambda: _env_int("BBOX_LADO_MAX_M", 2000))
+    bbox_max_peticiones_grupo: int = field(
+        default_factory=lambda: _env_int("BBOX_MAX_PETICIONES_GRUPO", 4)
+    )
+    reintentos_max: int = field(default_factory=lambda: _env_int("REINTENTOS_MAX", 3))
+    backoff_base_s: float = field(default_factory=lambda: _env_float("BACKOFF_BASE_S", 0.5))
+    backoff_max_s: float = field(default_factory=lambda: _env_float("BACKOFF_MAX_S", 10.0))
+    circuito_umbral_fallos: int = field(
+        default_factory=lambda: _env_int("CIRCUITO_UMBRAL_FALLOS", 5)
+    )
+    circuito_reapertura_s: float = field(
+        default_factory=lambda: _env_float("CIRCUITO_REAPERTURA_S", 30.0)
+    )
+    descarga_max_mb: int = field(default_factory=lambda: _env_int("DESCARGA_MAX_MB", 512))
+    procesos_planos: int = field(default_factory=lambda: _env_int("PROCESOS_PLANOS", 0))
+    almacen_capas: bool = field(default_factory=lambda: _env_bool("ALMACEN_CAPAS", True))
+    procesos_afecciones: int = field(default_factory=lambda: _env_int("PROCESOS_AFECCIONES", 0))
+    timeout_capa_s: float = field(default_factory=lambda: _env_float("TIMEOUT_CAPA_S", 300.0))
+    cache_capas_mb: int = field(default_factory=lambda: _env_int("CACHE_CAPAS_MB", 1024))
+    cache_teselas_mb: int = field(default_factory=lambda: _env_int("CACHE_TESELAS_MB", 1024))
+    ttl_teselas_horas: Dict[str, float] = field(default_factory=_ttl_teselas_por_fuente)
+    ttl_teselas_defecto_horas: float = field(
+        default_factory=lambda: _env_float("TTL_TESELAS_HORAS", 24 * 30)
+    )
+    cache_wms_mb: int = field(default_factory=lambda: _env_int("CACHE_WMS_MB", 512))
+    ttl_wms_horas: float = field(default_factory=lambda: _env_float("TTL_WMS_HORAS", 24 * 30))
+    ttl_leyendas_wms_horas: float = field(
+        default_factory=lambda: _env_float("TTL_LEYENDAS_WMS_HORAS", 24 * 365)
+    )
+    wms_rejilla: float = field(default_factory=lambda: _env_float("WMS_REJILLA", 0.0))
+    precarga_planos: bool = field(default_factory=lambda: _env_bool("PRECARGA_PLANOS", True))
+    precarga_max_simultaneas: int = field(
+        default_factory=lambda: _env_int("PRECARGA_MAX_SIMULTANEAS", 16)
+    )
+    cmup_pagina: int = field(default_factory=lambda: _env_int("CMUP_PAGINA", 1000))
+    cmup_espejo: str = field(default_factory=lambda: os.environ.get("CMUP_ESPEJO", ""))
+    cmup_espejo_refresco_horas: float = field(
+        default_factory=lambda: _env_float("CMUP_ESPEJO_REFRESCO_HORAS", 24 * 7)
+    )
+    capa_provincias: str = field(default_factory=lambda: os.environ.get("CAPA_PROVINCIAS", ""))
+    columna_provincia: str = field(default_factory=lambda: os.environ.get("COLUMNA_PROVINCIA", "CPRO"))
+    particion_min_entidades: int = field(
+        default_factory=lambda: _env_int("PARTICION_MIN_ENTIDADES", 100000)
+    )
@@ -0,0 +1,132 @@
+"""
+Contexto geométrico compartido de un trabajo.
+
+Se construye una sola vez a partir de las parcelas en memoria (FASE 1) y
+guarda, por CRS, el GeoDataFrame reproyectado, su extensión y sus
+centroides. Los pasos de análisis y los planos leen de aquí en lugar de
+volver a abrir MAPA_MAESTRO_TOTAL.kml, que queda solo como producto final.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple, Union
+
+import geopandas as gpd
+import numpy as np
+import pyproj
+
+if TYPE_CHECKING:
+    from .orquestador2 import ParcelaData
+
+# Catastro entrega las geometrías INSPIRE en ETRS89 geográficas
+CRS_PARCELAS = "EPSG:4258"
+
+CRS = Union[int, str, pyproj.CRS, None]
+
+# Clave normalizada de cada CRS ya visto ("EPSG:xxxx" o WKT si no tiene
+# código), para no volver a identificar el mismo CRS en cada consulta
+_CLAVES_CRS: Dict[Union[int, str, pyproj.CRS], str] = {}
+
+
+def clave_crs(crs: Union[int, str, pyproj.CRS]) -> str:
+    """
+    Clave única de un CRS: "EPSG:xxxx" si pyproj le encuentra código EPSG
+    y su WKT en caso contrario.
+
+    Así 25830, "epsg:25830", "EPSG:25830" y el WKT o el objeto pyproj del
+    mismo CRS comparten entrada en las cachés del contexto.
+    """
+    clave = _CLAVES_CRS.get(crs)
+    if clave is None:
+        crs_proj = pyproj.CRS.from_user_input(crs)
+        epsg = crs_proj.to_epsg()
+        clave = f"EPSG:{epsg}" if epsg is not None else crs_proj.to_wkt()
+        _CLAVES_CRS[crs] = clave
+    return clave
+
+
+class ContextoGeometrico:
+    """
+    Geometrías de las parcelas de un trabajo con cachés por CRS.
+
+    Los GeoDataFrames devueltos se comparten entre pasos: deben tratarse
+    como de solo lectura (usar .copy() antes de modificarlos).
+
+    Attributes:
+        base: GeoDataFrame (refcat, m2, geometry) en el CRS de origen
+    """
+
+    def __init__(self, base: gpd.GeoDataFrame) -> None:
+        self.base = base
+        self._por_crs: Dict[str, gpd.GeoDataFrame] = {}
+        self._limites: Dict[str, np.ndarray] = {}
+        self._centroides: Dict[str, gpd.GeoSeries] = {}
+
+    @classmethod
+    def desde_parcelas(cls, parcelas: Iterable["ParcelaData"]) -> "ContextoGeometrico":
+        """Construye el contexto desde las parcelas en memoria (sin pasar por KML)."""
+        con_geometria = [p for p in parcelas if p.has_geometry()]
+        base = gpd.GeoDataFrame(
+            {
+                "refcat": [p.refcat for p in con_geometria],
+                "m2": [p.superficie for p in con_geometria],
+            },
+            geometry=[p.forma.to_shapely() for p in con_geometria],
+            crs=CRS_PARCELAS,
+        )
+        return cls(base)
+
+    @classmethod
+    def desde_kml(cls, ruta_kml: Path) -> "ContextoGeometrico":
+        """Construye el contexto leyendo un KML maestro ya generado."""
+        gdf = gpd.read_file(str(ruta_kml), driver="KML")
+        if gdf.crs is None:
+            gdf.crs = "EPSG:4326"
+        gdf = gdf.rename(columns={"Name": "refcat"})
+        return cls(gdf[["refcat", "geometry"]])
+
+    @property
+    def vacio(self) -> bool:
+        return self.base.empty
+
+    @staticmethod
+    def _clave(crs: CRS) -> Optional[str]:
+        return None if crs is None else clave_crs(crs)
+
+    def gdf(self, crs: CRS = None) -> gpd.GeoDataFrame:
+        """
+        GeoDataFrame de las parcelas en `crs` (en el CRS de origen si es None).
+
+        Args:
+            crs: Código EPSG (3857, 25830, ...), cadena "EPSG:xxxx", WKT u
+                objeto pyproj.CRS
+        """
+        clave = self._clave(crs)
+        if clave is None:
+            return self.base
+        if clave not in self._por_crs:
+            self._por_crs[clave] = self.base.to_crs(clave)
+        return self._por_crs[clave]
+
+    def limites(self, crs: CRS = None) -> np.ndarray:
+        """Extensión total (minx, miny, maxx, maxy) en `crs`."""
+        clave = self._clave(crs)
+        if clave not in self._limites:
+            self._limites[clave] = self.gdf(crs).total_bounds
+        return self._limites[clave]
+
+    def centro(self, crs: CRS = None) -> Tuple[float, float]:
+        """Centro de la extensión total en `crs`."""
+        minx, miny, maxx, maxy = self.limites(crs)
+        return (minx + maxx) / 2, (miny + maxy) / 2
+
+    def provincias(self) -> List[str]:
+        """Códigos de provincia de las parcelas (dos primeras cifras de la referencia)."""
+        return sorted(set(self.base["refcat"].astype(str).str[:2]))
+
+    def centroides(self, crs: CRS = None) -> gpd.GeoSeries:
+        """Centroide de cada parcela en `crs`."""
+        clave = self._clave(crs)
+        if clave not in self._centroides:
+            self._centroides[clave] = self.gdf(crs).geometry.centroid
+        return self._centroides[clave]
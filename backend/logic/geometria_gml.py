@@ -0,0 +1,283 @@
+"""
+Lectura vectorizada de geometrías GML de parcelas INSPIRE (Catastro).
+
+El XML se recorre en streaming con expat (sin construir el árbol) y las
+coordenadas de todas las gml:posList se convierten a NumPy en una sola
+operación cada una, directamente en C y sin pasar por listas de str/float.
+Se conservan todos los anillos (exteriores e interiores) y todas las partes
+de las parcelas multipolígono.
+
+El resultado, GeometriaParcela, guarda las coordenadas en un único array
+(N, 2) con desplazamientos de anillos y partes (el mismo esquema que
+shapely.from_ragged_array), de modo que el resto del pipeline puede usarla
+sin volver a listas de tuplas.
+"""
+from __future__ import annotations
+
+import warnings
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import IO, Iterator, List, Optional, Tuple, Union
+from xml.parsers import expat
+
+import numpy as np
+import shapely
+from shapely.geometry.base import BaseGeometry
+
+# Nombres de elemento tal como los entrega expat con namespace_separator="}"
+GML = "http://www.opengis.net/gml/3.2}"
+CP = "http://inspire.ec.europa.eu/schemas/cp/4.0}"
+
+# Elementos que abren una parte (polígono) de la geometría
+_PARTES = {GML + "PolygonPatch", GML + "Polygon"}
+_ANILLOS = {GML + "exterior", GML + "interior"}
+_COORDENADAS = {GML + "posList", GML + "pos"}
+
+# Tamaño del búfer de texto de expat (una posList larga llega en un solo bloque)
+_BUFFER_TEXTO = 1 << 16
+
+# np.fromstring solo avisa (DeprecationWarning) cuando una posList contiene
+# texto no numérico; _a_numeros lo convierte en error para no aceptar listas
+# truncadas, sin tocar los filtros de avisos del resto del proceso
+_AVISO_NO_NUMERICO = "string or file could not be read to its end"
+
+# CRS geográficos cuyo orden de ejes en GML es lat/lon
+_CRS_LAT_LON = ("4258", "4326", "4230", "4081")
+
+# ═══════════════════════════════════════════════════════════════════════════
+# GEOMETRÍA COMPACTA
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+class GeometriaParcela:
+    """
+    Geometría (multi)poligonal respaldada por arrays NumPy.
+
+    Attributes:
+        coords: Array (N, 2) float64 con todas las coordenadas (lon, lat)
+        anillos: Desplazamientos (R + 1) del inicio de cada anillo en coords
+        partes: Desplazamientos (P + 1) del primer anillo de cada parte;
+            el primer anillo de cada parte es el exterior
+    """
+    __slots__ = ("coords", "anillos", "partes")
+
+    def __init__(self, coords: np.ndarray, anillos: np.ndarray, partes: np.ndarray) -> None:
+        self.coords = coords
+        self.anillos = anillos
+        self.partes = partes
+
+    @classmethod
+    def vacia(cls) -> "GeometriaParcela":
+        """Geometría sin coordenadas."""
+        return cls(
+            np.empty((0, 2), dtype=np.float64),
+            np.zeros(1, dtype=np.int64),
+            np.zeros(1, dtype=np.int64),
+        )
+
+    @classmethod
+    def desde_anillo(cls, coords) -> "GeometriaParcela":
+        """Crea un polígono simple a partir de una secuencia de (lon, lat)."""
+        array = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        if not len(array):
+            return cls.vacia()
+        return cls(
+            array,
+            np.array([0, len(array)], dtype=np.int64),
+            np.array([0, 1], dtype=np.int64),
+        )
+
+    def __bool__(self) -> bool:
+        return len(self.coords) > 0
+
+    def __len__(self) -> int:
+        """Número de vértices."""
+        return len(self.coords)
+
+    def __eq__(self, otra: object) -> bool:
+        """Misma geometría: mismas coordenadas, anillos y partes."""
+        if not isinstance(otra, GeometriaParcela):
+            return NotImplemented
+        return (
+            np.array_equal(self.coords, otra.coords)
+            and np.array_equal(self.anillos, otra.anillos)
+            and np.array_equal(self.partes, otra.partes)
+        )
+
+    __hash__ = None  # mutable, como los arrays que contiene
+
+    def __repr__(self) -> str:
+        return (
+            f"GeometriaParcela(vertices={len(self.coords)}, "
+            f"anillos={self.num_anillos}, partes={self.num_partes})"
+        )
+
+    @property
+    def num_anillos(self) -> int:
+        return len(self.anillos) - 1
+
+    @property
+    def num_partes(self) -> int:
+        return len(self.partes) - 1
+
+    @property
+    def exterior(self) -> np.ndarray:
+        """Anillo exterior de la primera parte (vista, sin copia)."""
+        if not self:
+            return self.coords
+        return self.anillo(0)
+
+    def anillo(self, i: int) -> np.ndarray:
+        """Coordenadas del anillo `i` (vista sobre coords)."""
+        return self.coords[self.anillos[i]:self.anillos[i + 1]]
+
+    def poligonos(self) -> Iterator[List[np.ndarray]]:
+        """Recorre las partes como listas de anillos [exterior, interiores...]."""
+        for p in range(self.num_partes):
+            yield [self.anillo(r) for r in range(self.partes[p], self.partes[p + 1])]
+
+    def limites(self) -> Tuple[float, float, float, float]:
+        """Extensión (minx, miny, maxx, maxy)."""
+        minimo = self.coords.min(axis=0)
+        maximo = self.coords.max(axis=0)
+        return float(minimo[0]), float(minimo[1]), float(maximo[0]), float(maximo[1])
+
+    def to_shapely(self) -> Optional[BaseGeometry]:
+        """Polygon (una parte) o MultiPolygon con todos los anillos."""
+        if not self:
+            return None
+        multi = shapely.from_ragged_array(
+            shapely.GeometryType.MULTIPOLYGON,
+            self.coords,
+            (self.anillos, self.partes, np.array([0, self.num_partes], dtype=np.int64)),
+        )[0]
+        return multi.geoms[0] if self.num_partes == 1 else multi
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# LECTURA DEL XML INSPIRE
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def _es_lat_lon(srs: Optional[str]) -> bool:
+    """Los CRS geográficos EPSG se escriben en GML 3.2 como lat/lon."""
+    if not srs:
+        return True  # Catastro responde en EPSG:4258 por defecto
+    codigo = srs.replace("::", ":").rstrip("/").rsplit(":", 1)[-1].rsplit("/", 1)[-1]
+    return codigo in _CRS_LAT_LON
+
+
+def _a_numeros(texto: str) -> np.ndarray:
+    """Convierte el texto de una gml:posList en un array float64."""
+    try:
+        with warnings.catch_warnings():
+            warnings.filterwarnings("error", message=_AVISO_NO_NUMERICO, category=DeprecationWarning)
+            return np.fromstring(texto, dtype=np.float64, sep=" ")
+    except DeprecationWarning as exc:
+        raise ValueError("Lista de coordenadas no numérica") from exc
+
+
+class _LectorGML:
+    """Manejadores expat que acumulan anillos, partes y superficie."""
+
+    def __init__(self) -> None:
+        self.superficie = 0.0
+        self.srs: Optional[str] = None
+        self.dimension = 2
+        self.bloques: List[np.ndarray] = []
+        self.n_valores = 0
+        self.anillos: List[int] = [0]   # en vértices
+        self.partes: List[int] = [0]    # en anillos
+        self.en_anillo = False
+        self.inicio_anillo = 0
+        self.texto: Optional[List[str]] = None
+
+    def inicio(self, nombre: str, atributos: dict) -> None:
+        if nombre in _COORDENADAS:
+            if self.en_anillo:
+                self.texto = []
+                self.dimension = int(atributos.get("srsDimension", self.dimension))
+        elif nombre in _ANILLOS:
+            self.en_anillo = True
+            self.inicio_anillo = self.n_valores
+        elif nombre == CP + "areaValue":
+            self.texto = []
+        elif self.srs is None and "srsName" in atributos:
+            self.srs = atributos["srsName"]
+
+    def fin(self, nombre: str) -> None:
+        if nombre in _COORDENADAS:
+            if self.texto is not None:
+                bloque = _a_numeros("".join(self.texto))
+                self.bloques.append(bloque)
+                self.n_valores += bloque.size
+                self.texto = None
+        elif nombre in _ANILLOS:
+            self.en_anillo = False
+            n_valores = self.n_valores - self.inicio_anillo
+            if n_valores % self.dimension:
+                raise ValueError("Lista de coordenadas incompleta")
+            if n_valores:
+                self.anillos.append(self.anillos[-1] + n_valores // self.dimension)
+        elif nombre in _PARTES:
+            self._cerrar_parte()
+        elif nombre == CP + "areaValue" and self.texto is not None:
+            texto = "".join(self.texto).strip()
+            self.superficie = float(texto) if texto else 0.0
+            self.texto = None
+
+    def caracteres(self, datos: str) -> None:
+        if self.texto is not None:
+            self.texto.append(datos)
+
+    def _cerrar_parte(self) -> None:
+        if len(self.anillos) - 1 > self.partes[-1]:
+            self.partes.append(len(self.anillos) - 1)
+
+    def geometria(self) -> GeometriaParcela:
+        if len(self.anillos) == 1:
+            return GeometriaParcela.vacia()
+        self._cerrar_parte()  # anillos fuera de un Polygon/PolygonPatch
+
+        # Conversión única de todas las coordenadas del documento
+        valores = np.concatenate(self.bloques).reshape(-1, self.dimension)[:, :2]
+        coords = valores[:, ::-1] if _es_lat_lon(self.srs) else valores
+        return GeometriaParcela(
+            np.ascontiguousarray(coords),
+            np.asarray(self.anillos, dtype=np.int64),
+            np.asarray(self.partes, dtype=np.int64),
+        )
+
+
+def leer_geometria(origen: Union[str, Path, IO[bytes]]) -> Tuple[float, GeometriaParcela]:
+    """
+    Lee superficie y geometría completa de un XML INSPIRE de parcela.
+
+    Args:
+        origen: Ruta o fichero binario con la respuesta GetParcel/GetFeature
+
+    Returns:
+        Tupla (superficie_m2, GeometriaParcela) con las coordenadas en (lon, lat)
+
+    Raises:
+        xml.etree.ElementTree.ParseError: Si el XML está mal formado
+        ValueError: Si alguna gml:posList no es numérica o está incompleta
+    """
+    lector = _LectorGML()
+    parser = expat.ParserCreate(namespace_separator="}")
+    parser.buffer_text = True
+    parser.buffer_size = _BUFFER_TEXTO
+    parser.StartElementHandler = lector.inicio
+    parser.EndElementHandler = lector.fin
+    parser.CharacterDataHandler = lector.caracteres
+
+    try:
+        if hasattr(origen, "read"):
+            parser.ParseFile(origen)
+        else:
+            with open(origen, "rb") as fichero:
+                parser.ParseFile(fichero)
+    except expat.ExpatError as exc:
+        raise ET.ParseError(str(exc)) from exc
+
+    return lector.superficie, lector.geometria()
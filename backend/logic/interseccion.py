@@ -0,0 +1,176 @@
+"""
+Motor de intersección parcelas × capa orientado a superficies.
+
+Sustituye a gpd.overlay(how="intersection") en el análisis de afecciones:
+solo se necesitan las superficies afectadas (total y por etiqueta), no el
+cruce completo de atributos. Con operaciones vectorizadas de shapely 2:
+
+1. Consulta masiva de un STRtree de la capa con todas las parcelas y
+   predicado "intersects" sobre las parcelas preparadas.
+2. Los pares en que una geometría contiene a la otra no se recortan: la
+   intersección es la geometría contenida.
+3. Solo el resto de pares se recorta con shapely.intersection.
+4. Las superficies se agregan por etiqueta con un groupby vectorizado.
+
+El GeoDataFrame con las geometrías de intersección solo se construye
+cuando se pide un mapa (ResultadoInterseccion.geometrias).
+
+Da los mismos pares y superficies que overlay(keep_geom_type=False): las
+geometrías de entrada no válidas se corrigen con make_valid igual que hace
+overlay, pero solo las candidatas.
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+_POLIGONOS = ("Polygon", "MultiPolygon")
+
+
+def _corregir(valores: np.ndarray, indices: Optional[np.ndarray] = None) -> None:
+    """Corrige con make_valid (en el sitio) las geometrías no válidas de `indices`."""
+    if indices is None:
+        indices = np.arange(len(valores))
+    invalidas = indices[~shapely.is_valid(valores[indices])]
+    if len(invalidas):
+        valores[invalidas] = shapely.make_valid(valores[invalidas])
+
+
+class ResultadoInterseccion:
+    """
+    Superficies de intersección entre una zona y una capa.
+
+    Attributes:
+        area_total: Suma de las superficies de todos los pares (unidades del CRS²)
+        n_geometrias: Número de pares zona × capa que se tocan
+        indices_zona: Índice posicional en la zona de cada par
+        indices_capa: Índice posicional en la capa de cada par
+        areas: Superficie de cada par
+        etiquetas: Etiqueta de la capa de cada par (None si no hay columna)
+    """
+
+    def __init__(
+        self,
+        indices_zona: np.ndarray,
+        indices_capa: np.ndarray,
+        recortes: np.ndarray,
+        areas: np.ndarray,
+        etiquetas: Optional[np.ndarray],
+        crs,
+    ) -> None:
+        self._recortes = recortes
+        self._crs = crs
+        self.indices_zona = indices_zona
+        self.indices_capa = indices_capa
+        self.areas = areas
+        self.etiquetas = etiquetas
+        self.area_total = float(areas.sum())
+        self.n_geometrias = len(areas)
+
+    @property
+    def vacio(self) -> bool:
+        return self.n_geometrias == 0
+
+    def areas_por_etiqueta(self) -> pd.Series:
+        """Superficie por etiqueta, ordenada por etiqueta (etiquetas nulas excluidas)."""
+        if self.etiquetas is None:
+            return pd.Series(dtype=float)
+        return pd.Series(self.areas).groupby(self.etiquetas).sum()
+
+    def areas_por_zona(self) -> pd.DataFrame:
+        """
+        Superficie por geometría de la zona y etiqueta, en formato largo.
+
+        Returns:
+            DataFrame (zona, etiqueta, area) con una fila por combinación de
+            superficie > 0; zona es el índice posicional en la zona y
+            etiqueta es nula si la capa no tiene etiqueta para ese par
+        """
+        tabla = pd.DataFrame({
+            "zona": self.indices_zona,
+            "etiqueta": self.etiquetas if self.etiquetas is not None else None,
+            "area": self.areas,
+        })
+        tabla = tabla[tabla["area"] > 0]
+        return (
+            tabla.groupby(["zona", "etiqueta"], dropna=False, sort=True)["area"]
+            .sum()
+            .reset_index()
+        )
+
+    def geometrias(self) -> gpd.GeoDataFrame:
+        """Geometrías de intersección de cada par (para mapas)."""
+        datos = {} if self.etiquetas is None else {"etiqueta": self.etiquetas}
+        return gpd.GeoDataFrame(datos, geometry=self._recortes, crs=self._crs)
+
+
+def intersecar(
+    zona: gpd.GeoDataFrame,
+    capa: gpd.GeoDataFrame,
+    columna_etiqueta: Optional[str] = None
+) -> ResultadoInterseccion:
+    """
+    Calcula las superficies de intersección entre las parcelas y una capa.
+
+    Args:
+        zona: Parcelas (CRS proyectado, p. ej. EPSG:25830)
+        capa: Capa de afección en el mismo CRS
+        columna_etiqueta: Columna de la capa para agregar superficies
+
+    Returns:
+        ResultadoInterseccion con un elemento por par que se toca
+    """
+    geometrias_zona = np.array(zona.geometry.values, dtype=object)
+    geometrias_capa = np.array(capa.geometry.values, dtype=object)
+    etiquetas_capa = (
+        capa[columna_etiqueta].to_numpy()
+        if columna_etiqueta and columna_etiqueta in capa.columns else None
+    )
+    if zona.geom_type.isin(_POLIGONOS).all():
+        _corregir(geometrias_zona)
+
+    # 1) Consulta masiva por envolventes de toda la zona contra el árbol de la
+    # capa. make_valid nunca amplía la envolvente, así que basta con corregir
+    # (como overlay) las geometrías candidatas y no toda la capa.
+    arbol = shapely.STRtree(geometrias_capa)
+    indices_zona, indices_capa = arbol.query(geometrias_zona)
+    if capa.geom_type.isin(_POLIGONOS).all():
+        _corregir(geometrias_capa, np.unique(indices_capa))
+
+    # Predicado exacto sobre la zona preparada
+    shapely.prepare(geometrias_zona)
+    tocan = shapely.intersects(geometrias_zona[indices_zona], geometrias_capa[indices_capa])
+    orden = np.lexsort((indices_capa[tocan], indices_zona[tocan]))  # mismo orden que overlay
+    indices_zona, indices_capa = indices_zona[tocan][orden], indices_capa[tocan][orden]
+
+    a = geometrias_zona[indices_zona]
+    b = geometrias_capa[indices_capa]
+    areas = np.zeros(len(a))
+    recortes = np.full(len(a), None, dtype=object)
+
+    if len(a):
+        # 2) Contención: sin recorte (las geometrías de la capa que cubren
+        # alguna parcela se preparan solo si son candidatas)
+        shapely.prepare(b)
+        zona_en_capa = shapely.contains_properly(b, a)
+        capa_en_zona = ~zona_en_capa & shapely.contains_properly(a, b)
+        recortes[zona_en_capa] = a[zona_en_capa]
+        recortes[capa_en_zona] = b[capa_en_zona]
+        areas[zona_en_capa] = shapely.area(a[zona_en_capa])
+        areas[capa_en_zona] = shapely.area(b[capa_en_zona])
+
+        # 3) Recorte solo de los pares que cruzan el borde
+        cruzan = ~(zona_en_capa | capa_en_zona)
+        if cruzan.any():
+            cortes = shapely.intersection(a[cruzan], b[cruzan])
+            poligonos = np.isin(shapely.get_type_id(cortes), (3, 6))  # Polygon, MultiPolygon
+            cortes[poligonos] = shapely.make_valid(cortes[poligonos])
+            recortes[cruzan] = cortes
+            areas[cruzan] = shapely.area(cortes)
+
+    etiquetas = etiquetas_capa[indices_capa] if etiquetas_capa is not None else None
+    return ResultadoInterseccion(indices_zona, indices_capa, recortes, areas, etiquetas, zona.crs)
@@ -115,6 +115,7 @@ OUTPUTS/
     ├── DATOS_CATASTRALES.csv         ← Tabla CSV con datos
     ├── log.txt                       ← Resumen del expediente
     ├── afecciones_resultados.xlsx    ← Análisis de afecciones
+    ├── afecciones_por_parcela.xlsx   ← Matriz parcela × capa (formato largo)
     ├── mapa_[capa].png               ← Mapas de afecciones
     ├── PLANO-EMPLAZAMIENTO.jpg       ← Plano OSM
     ├── PLANO-EMPLAZAMIENTO-ORTO.jpg  ← Plano ortofoto
@@ -133,35 +134,55 @@ OUTPUTS/
 """
 from __future__ import annotations
 
-from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Union
 import csv
+import os
+import shutil
 import tempfile
 import sys
-import io
 import warnings
 
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+import numpy as np
 import pandas as pd
 import requests
 import xml.etree.ElementTree as ET
 import geopandas as gpd
 import contextily as cx
 import fiona
+import pyogrio
 from PIL import Image
 from io import BytesIO
 from shapely.geometry import box
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from .almacen_capas import AlmacenCapas, obtener_almacen_capas
+from .almacen_disco import AlmacenDisco, obtener_almacen
+from .catalogo_fuentes import CatalogoFuentes, EntradaCapa, EXTENSIONES_CAPA, obtener_catalogo
+from .cliente_upstream import ClienteUpstream, DescargaInvalidaError, crear_cliente, crear_sesion
+from .configuracion import ConfiguracionPipeline
+from .contexto import ContextoGeometrico
+from .geometria_gml import GeometriaParcela, leer_geometria
+from .interseccion import ResultadoInterseccion, intersecar
+from .particiones import ParticionesProvinciales, obtener_particiones
+from .cache_capas import CacheCapas, obtener_cache_capas, registrar_estadisticas_proceso
+from . import cmup, planificador, siluetas, teselas, wfs_catastro
 
 # Ignorar advertencias de geometrías medidas (M) para limpiar la consola
 warnings.filterwarnings("ignore", category=UserWarning)
 
 # Configurar salida estándar a UTF-8 para evitar errores de emojis en Windows
-if sys.stdout and hasattr(sys.stdout, 'buffer'):
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
-if sys.stderr and hasattr(sys.stderr, 'buffer'):
-    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+# (reconfigurando el flujo existente: envolver su buffer en otro TextIOWrapper
+# lo cerraría al liberarse el envoltorio, p. ej. bajo la captura de pytest)
+if sys.stdout and hasattr(sys.stdout, 'reconfigure'):
+    sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+if sys.stderr and hasattr(sys.stderr, 'reconfigure'):
+    sys.stderr.reconfigure(encoding='utf-8', errors='replace')
 
 # ═══════════════════════════════════════════════════════════════════════════
 # CONFIGURACIÓN GLOBAL
@@ -176,35 +197,204 @@ USER_AGENT = (
 if 'KML' not in fiona.supported_drivers:
     fiona.drvsupport.supported_drivers['KML'] = 'rw'
 
+
+# Mapas de evidencia de afecciones: tamaño (pulgadas), resolución, margen
+# alrededor de las parcelas (proporción del lado en cada eje, con un mínimo en metros)
+# y fuente del mapa base común
+TAMANO_MAPA_AFECCION = (12, 10)
+DPI_MAPA_AFECCION = 150
+MARGEN_MAPA_AFECCION = 0.15
+MARGEN_MIN_MAPA_AFECCION_M = 200
+FUENTE_MAPA_AFECCION = cx.providers.OpenStreetMap.Mapnik
+
+
+# Espacios de la caché WMS: mapas (GetMap), leyendas (GetLegendGraphic) y
+# respuestas WFS (páginas del CMUP)
+ESPACIO_MAPAS_WMS = "getmap"
+ESPACIO_LEYENDAS_WMS = "leyendas"
+ESPACIO_WFS = "wfs"
+
+
+def _clave_wms(url: str, params: Optional[dict] = None) -> Tuple[str, str]:
+    """
+    Espacio y clave de caché de una petición WMS con parámetros normalizados.
+
+    Une la consulta de la URL y `params`, pasa los nombres a mayúsculas, los
+    ordena y escribe el BBOX con precisión fija, de modo que la misma
+    petición escrita de formas distintas comparte entrada.
+
+    Returns:
+        (espacio, clave)
+    """
+    partes = urlsplit(url)
+    consulta = {k.upper(): v.strip() for k, v in parse_qsl(partes.query, keep_blank_values=True)}
+    consulta.update({k.upper(): str(v).strip() for k, v in (params or {}).items()})
+    if "BBOX" in consulta:
+        consulta["BBOX"] = ",".join(f"{float(v):.6f}" for v in consulta["BBOX"].split(","))
+    espacio = (
+        ESPACIO_LEYENDAS_WMS if consulta.get("REQUEST", "").lower() == "getlegendgraphic"
+        else ESPACIO_MAPAS_WMS
+    )
+    base = f"{partes.scheme.lower()}://{partes.netloc.lower()}{partes.path}"
+    return espacio, f"{base}?{urlencode(sorted(consulta.items()))}"
+
+
+def _bytes_cache_capas(config: ConfiguracionPipeline) -> int:
+    """
+    Memoria de la caché de capas de cada proceso.
+
+    Cada proceso tiene su propia caché (el servidor y cada proceso de los
+    pools de planos y afecciones), así que cache_capas_mb es el total y cada
+    uno recibe una parte igual.
+    """
+    procesos = 1
+    for configurados in (config.procesos_planos, config.procesos_afecciones):
+        pool = configurados or planificador.procesos_por_defecto()
+        if pool > 1:
+            procesos += pool
+    return config.cache_capas_mb * 1024 * 1024 // procesos
+
+
+def _extension_mapa_afeccion(limites) -> Tuple[float, float, float, float]:
+    """Vista de un mapa de afección: extensión de las parcelas con margen."""
+    minx, miny, maxx, maxy = limites
+    margen_x = max(MARGEN_MAPA_AFECCION * (maxx - minx), MARGEN_MIN_MAPA_AFECCION_M)
+    margen_y = max(MARGEN_MAPA_AFECCION * (maxy - miny), MARGEN_MIN_MAPA_AFECCION_M)
+    return minx - margen_x, miny - margen_y, maxx + margen_x, maxy + margen_y
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# ENTRADAS REMOTAS DE LOS PLANOS
+# ═══════════════════════════════════════════════════════════════════════════
+
+# Cada plano obtiene sus peticiones de un método _peticiones_*/_encuadre*
+# que usa también la precarga, de modo que ambos piden exactamente lo mismo
+# (y la precarga deja las respuestas en las cachés WMS y de teselas).
+
+
+@dataclass(frozen=True)
+class PeticionWMS:
+    """Petición de imagen a un servicio WMS (GetMap o GetLegendGraphic)."""
+    url: str
+    params: Optional[dict] = None
+    timeout: float = 60
+
+
+@dataclass(frozen=True)
+class EncuadreTeselas:
+    """
+    Encuadre de un plano dibujado sobre un mapa base de teselas.
+
+    Attributes:
+        xlim: Límites X de los ejes
+        ylim: Límites Y de los ejes
+        fuente: URL XYZ/WMTS o TileProvider del mapa base
+        zoom: Nivel de zoom o "auto"
+        crs: CRS de los ejes si no es EPSG:3857
+    """
+    xlim: Tuple[float, float]
+    ylim: Tuple[float, float]
+    fuente: teselas.Fuente
+    zoom: Union[int, str] = "auto"
+    crs: Optional[str] = None
+
+    def extension(self) -> teselas.Extension:
+        """Extensión del encuadre en EPSG:3857."""
+        return teselas.extension_ejes(*self.xlim, *self.ylim, crs=self.crs)
+
+
+def _nueva_figura(figsize: Tuple[float, float]):
+    """
+    Crea una figura con un único eje sin pasar por pyplot.
+
+    Las figuras no se registran en el estado global de pyplot, por lo que los
+    planos pueden dibujarse en paralelo (hilos o procesos) y no hace falta
+    cerrarlas: se liberan al salir de ámbito.
+    """
+    fig = Figure(figsize=figsize)
+    return fig, fig.add_subplot()
+
+
 # ═══════════════════════════════════════════════════════════════════════════
 # CLASE DE DATOS: PARCELA
 # ═══════════════════════════════════════════════════════════════════════════
 
-@dataclass
 class ParcelaData:
     """
     Representa una parcela catastral con toda su información asociada.
+
+    Usa __slots__ y guarda la geometría en arrays NumPy (GeometriaParcela);
+    `info_catastral` se construye la primera vez que se consulta y
+    `registro_tabla()` en cada llamada, de modo que una parcela sin
+    consultar no mantiene listas de tuplas ni diccionarios por separado.
+
+    `geometria` devuelve una copia del anillo exterior: modificar la lista
+    devuelta no cambia la parcela; para cambiarla se asigna `geometria` o se
+    llama a actualizar_geometria. `info_catastral`, `recintos_sigpac` y
+    `afecciones` son los objetos guardados y admiten cambios en el sitio.
     
     Attributes:
         refcat: Referencia catastral (identificador único)
         provincia: Código de provincia (primeros 2 dígitos de refcat)
-        geometria: Lista de coordenadas (lon, lat) que definen el polígono
+        geometria: Copia de las coordenadas (lon, lat) del anillo exterior
+        forma: Geometría completa (todas las partes y anillos) en arrays NumPy
+        superficie: Superficie catastral en metros cuadrados
         info_catastral: Diccionario con m2, latitud, longitud
         recintos_sigpac: Lista de recintos SIGPAC asociados
         afecciones: Lista de afecciones detectadas
         rutas: Diccionario con rutas a archivos generados (xml, pdf, kml, png)
     """
-    refcat: str
-    provincia: str = field(init=False)
-    geometria: List[Tuple[float, float]] = field(default_factory=list)
-    info_catastral: dict = field(default_factory=dict)
-    recintos_sigpac: List[dict] = field(default_factory=list)
-    afecciones: List[dict] = field(default_factory=list)
-    rutas: dict = field(default_factory=dict)
-
-    def __post_init__(self) -> None:
-        """Extrae automáticamente la provincia de la referencia catastral."""
-        self.provincia = self.refcat[:2]
+    __slots__ = (
+        "refcat", "forma", "superficie", "rutas",
+        "_info_catastral", "_recintos_sigpac", "_afecciones",
+    )
+
+    def __init__(
+        self,
+        refcat: str,
+        geometria=None,
+        info_catastral: Optional[dict] = None,
+        recintos_sigpac: Optional[List[dict]] = None,
+        afecciones: Optional[List[dict]] = None,
+        rutas: Optional[dict] = None,
+    ) -> None:
+        self.refcat = refcat
+        self.forma = GeometriaParcela.vacia()
+        self.superficie = 0.0
+        self.rutas = rutas if rutas is not None else {}
+        self._info_catastral = info_catastral or None
+        self._recintos_sigpac = recintos_sigpac
+        self._afecciones = afecciones
+        if geometria is not None:
+            self.geometria = geometria
+
+    def __repr__(self) -> str:
+        return (
+            f"ParcelaData(refcat={self.refcat!r}, provincia={self.provincia!r}, "
+            f"geometria={self.geometria!r}, info_catastral={self.info_catastral!r}, "
+            f"recintos_sigpac={self.recintos_sigpac!r}, afecciones={self.afecciones!r}, "
+            f"rutas={self.rutas!r})"
+        )
+
+    def __eq__(self, otra: object) -> bool:
+        if not isinstance(otra, ParcelaData):
+            return NotImplemented
+        return (
+            self.refcat == otra.refcat
+            and self.forma == otra.forma
+            and self.superficie == otra.superficie
+            and self.info_catastral == otra.info_catastral
+            and self.recintos_sigpac == otra.recintos_sigpac
+            and self.afecciones == otra.afecciones
+            and self.rutas == otra.rutas
+        )
+
+    __hash__ = None  # mutable, como la dataclass original
+
+    @property
+    def provincia(self) -> str:
+        """Código de provincia (primeros 2 dígitos de la referencia)."""
+        return self.refcat[:2]
 
     @property
     def poligono(self) -> str:
@@ -216,42 +406,92 @@ class ParcelaData:
         """Extrae el código de parcela (caracteres 10-14)."""
         return self.refcat[9:14]
 
+    @property
+    def geometria(self) -> List[Tuple[float, float]]:
+        """Copia del anillo exterior como lista de tuplas (lon, lat)."""
+        return list(map(tuple, self.forma.exterior.tolist()))
+
+    @geometria.setter
+    def geometria(self, coords) -> None:
+        self.forma = (
+            coords if isinstance(coords, GeometriaParcela)
+            else GeometriaParcela.desde_anillo(coords)
+        )
+
+    @property
+    def info_catastral(self) -> dict:
+        """Diccionario con m2, latitud y longitud (vacío si no hay geometría)."""
+        if self._info_catastral is None:
+            self._info_catastral = {}
+            if self.forma:
+                lon, lat = self.forma.coords[0].tolist()
+                self._info_catastral.update({
+                    "m2": self.superficie,
+                    "latitud": lat,  # Primera coordenada como referencia
+                    "longitud": lon,
+                })
+        return self._info_catastral
+
+    @info_catastral.setter
+    def info_catastral(self, valor: dict) -> None:
+        self._info_catastral = valor
+
+    @property
+    def recintos_sigpac(self) -> List[dict]:
+        if self._recintos_sigpac is None:
+            self._recintos_sigpac = []
+        return self._recintos_sigpac
+
+    @recintos_sigpac.setter
+    def recintos_sigpac(self, valor: List[dict]) -> None:
+        self._recintos_sigpac = valor
+
+    @property
+    def afecciones(self) -> List[dict]:
+        if self._afecciones is None:
+            self._afecciones = []
+        return self._afecciones
+
+    @afecciones.setter
+    def afecciones(self, valor: List[dict]) -> None:
+        self._afecciones = valor
+
     def has_geometry(self) -> bool:
         """Verifica si la parcela tiene geometría cargada."""
-        return bool(self.geometria)
+        return bool(self.forma)
 
-    def actualizar_geometria(self, coords: List[Tuple[float, float]], superficie: float) -> None:
+    def actualizar_geometria(self, coords, superficie: float) -> None:
         """
         Actualiza la geometría y la información catastral de la parcela.
         
         Args:
-            coords: Lista de tuplas (longitud, latitud)
+            coords: GeometriaParcela o lista de tuplas (longitud, latitud)
             superficie: Superficie en metros cuadrados
         """
         self.geometria = coords
-        if coords:
-            self.info_catastral = {
-                "m2": superficie,
-                "latitud": coords[0][1],  # Primera coordenada como referencia
-                "longitud": coords[0][0],
-            }
+        self.superficie = superficie
+        self._info_catastral = None
 
     def registro_tabla(self) -> dict:
         """
         Genera un registro para exportación a tabla (Excel/CSV).
+
+        Cada llamada devuelve un diccionario nuevo, calculado con la
+        información catastral actual.
         
         Returns:
             Diccionario con campos: Referencia, Polígono, Parcela, m2, Ha, Latitud, Longitud
         """
-        m2 = self.info_catastral.get("m2", 0)
+        info = self.info_catastral
+        m2 = info.get("m2", 0)
         return {
             "Referencia": self.refcat,
             "Polígono": self.poligono,
             "Parcela": self.parcela,
             "m2": m2,
             "Ha": round(m2 / 10000, 4),
-            "Latitud": self.info_catastral.get("latitud"),
-            "Longitud": self.info_catastral.get("longitud"),
+            "Latitud": info.get("latitud"),
+            "Longitud": info.get("longitud"),
         }
 
 
@@ -272,7 +512,8 @@ class OrquestadorPipeline:
         base_dir: Path,
         fuentes_dir: Optional[Path] = None,
         progress_callback: Optional[callable] = None,
-        geometry_callback: Optional[callable] = None
+        geometry_callback: Optional[callable] = None,
+        config: Optional[ConfiguracionPipeline] = None
     ) -> None:
         """
         Inicializa el orquestador y crea las carpetas necesarias.
@@ -281,11 +522,14 @@ class OrquestadorPipeline:
             base_dir: Directorio base del proyecto (donde están INPUTS y OUTPUTS)
             fuentes_dir: Directorio de FUENTES (por defecto /app/FUENTES en producción)
             progress_callback: Función para reportar progreso (callable)
-            geometry_callback: Función para reportar geometrías encontradas (callable)
+            geometry_callback: Función para reportar geometrías encontradas; recibe
+                (refcat, lista de [lon, lat] del anillo exterior)
+            config: Parámetros de rendimiento (por defecto, leídos del entorno)
         """
         self.base_dir = base_dir
         self.inputs = base_dir / "INPUTS"
         self.outputs = base_dir / "OUTPUTS"
+        self.cache_dir = base_dir / "CACHE"
         
         # FUENTES puede estar en /app/FUENTES (Easypanel) o local
         if fuentes_dir:
@@ -300,9 +544,69 @@ class OrquestadorPipeline:
         self.progress_callback = progress_callback or (lambda x: print(x))
         self.geometry_callback = geometry_callback
         
-        # Sesión HTTP reutilizable para eficiencia
-        self.session = requests.Session()
-        self.session.headers.update({"User-Agent": USER_AGENT})
+        self.config = config or ConfiguracionPipeline()
+        
+        # Sesión HTTP reutilizable para eficiencia (pool dimensionado para
+        # las descargas simultáneas de la FASE 1)
+        self.session = crear_sesion(USER_AGENT, self.config.max_descargas_simultaneas)
+        
+        # Cliente común para todas las llamadas remotas: reintentos con
+        # backoff, concurrencia adaptativa por host y cortocircuito
+        self.cliente = self._crear_cliente()
+        
+        # Almacén de XML/PDF de Catastro compartido entre trabajos
+        self.almacen: Optional[AlmacenDisco] = None
+        if self.config.cache_catastro:
+            self.almacen = obtener_almacen(
+                self.cache_dir / "catastro",
+                max_bytes=self.config.cache_max_mb * 1024 * 1024,
+                ttl_segundos=self.config.cache_catastro_ttl_horas * 3600,
+            )
+        
+        # Teselas de los mapas base compartidas entre trabajos y procesos
+        self.cache_teselas: Optional[teselas.CacheTeselas] = None
+        if self.config.cache_teselas_mb > 0:
+            self.cache_teselas = teselas.CacheTeselas(
+                obtener_almacen(self.cache_dir / "teselas", max_bytes=self.config.cache_teselas_mb * 1024 * 1024),
+                self.config.ttl_teselas_horas,
+                self.config.ttl_teselas_defecto_horas,
+            )
+        
+        # Respuestas WMS (GetMap y leyendas) compartidas entre trabajos
+        self.cache_wms: Optional[AlmacenDisco] = None
+        if self.config.cache_wms_mb > 0:
+            self.cache_wms = obtener_almacen(
+                self.cache_dir / "wms", max_bytes=self.config.cache_wms_mb * 1024 * 1024
+            )
+        
+        # Catálogo de capas de FUENTES (metadatos persistidos en CACHE)
+        self.catalogo: CatalogoFuentes = obtener_catalogo(
+            self.fuentes, self.cache_dir / "catalogo_fuentes.json"
+        )
+        
+        # Copias de esas capas ya reproyectadas a EPSG:25830 y EPSG:3857
+        self.almacen_capas: Optional[AlmacenCapas] = None
+        if self.config.almacen_capas:
+            self.almacen_capas = obtener_almacen_capas(self.cache_dir / "capas")
+        
+        # Capas en memoria compartidas por todos los trabajos del proceso
+        self.cache_capas: Optional[CacheCapas] = None
+        if self.config.cache_capas_mb > 0:
+            self.cache_capas = obtener_cache_capas(_bytes_cache_capas(self.config))
+        
+        # Capas grandes divididas por provincias (dentro del almacén)
+        self.particiones: Optional[ParticionesProvinciales] = None
+        if self.almacen_capas is not None and self.config.capa_provincias:
+            self.particiones = obtener_particiones(
+                self.almacen_capas,
+                self.fuentes / self.config.capa_provincias,
+                self.config.columna_provincia,
+                self.config.particion_min_entidades,
+            )
+        
+        # Geometrías del trabajo en curso (se crea tras la FASE 1)
+        self.contexto: Optional[ContextoGeometrico] = None
+        self._carpeta_contexto: Optional[Path] = None
         
         # Crear estructura de directorios
         self.inputs.mkdir(parents=True, exist_ok=True)
@@ -322,6 +626,23 @@ class OrquestadorPipeline:
         if self.progress_callback:
             self.progress_callback(mensaje)
 
+    def _crear_cliente(self) -> ClienteUpstream:
+        """Crea un cliente remoto sobre la sesión común con la configuración actual."""
+        return crear_cliente(self.session, self.config, log=self.log)
+
+    def _registrar_metricas_upstream(self) -> None:
+        """Resume en el log las peticiones, reintentos y circuitos por host."""
+        metricas = self.cliente.estadisticas()
+        if not metricas:
+            return
+        self.log(f"📡 Servicios remotos:")
+        for host, m in sorted(metricas.items()):
+            self.log(
+                f"   • {host}: {m['peticiones']} peticiones, {m['reintentos']} reintentos, "
+                f"{m['errores']} errores, {m['rechazadas']} rechazadas | "
+                f"circuito {m.get('circuito', '?')}, límite {m.get('limite', '?')}"
+            )
+
     def procesar_archivo_txt(self, txt_path: Path) -> Optional[Path]:
         """
         Procesa un archivo .txt específico con referencias catastrales.
@@ -359,12 +680,14 @@ class OrquestadorPipeline:
             return None
 
         self.log(f"✅ {len(parcelas)} parcelas procesadas correctamente")
+        self._crear_contexto(carpeta, parcelas)
 
         # FASE 2: GENERACIÓN VECTORIAL (Pasos 4-5)
         self.log(f"{'─'*80}")
         self.log(f"FASE 2: GENERACIÓN VECTORIAL")
         self.log(f"{'─'*80}")
         self._generar_kml(carpeta, parcelas)
+        precarga = self._iniciar_precarga(carpeta)
         self._generar_png(carpeta, parcelas)
         
         # FASE 3: EXPORTACIÓN TABULAR (Paso 6)
@@ -383,52 +706,16 @@ class OrquestadorPipeline:
         self.log(f"{'─'*80}")
         self.log(f"FASE 5: ANÁLISIS ESPACIAL")
         self.log(f"{'─'*80}")
-        self._procesar_afecciones(carpeta)
-        
-        # FASE 6: PLANOS DE EMPLAZAMIENTO BÁSICOS (Pasos 9-10)
-        self.log(f"{'─'*80}")
-        self.log(f"FASE 6: PLANOS DE EMPLAZAMIENTO BÁSICOS")
-        self.log(f"{'─'*80}")
-        self._generar_plano_emplazamiento(carpeta)
-        self._generar_plano_ortofoto(carpeta)
-        
-        # FASE 7: PLANOS CATASTRALES (Paso 11)
-        self.log(f"{'─'*80}")
-        self.log(f"FASE 7: PLANOS CATASTRALES")
-        self.log(f"{'─'*80}")
-        self._generar_plano_catastral(carpeta)
-        
-        # FASE 8: PLANOS IGN DETALLADOS (Paso 12)
-        self.log(f"{'─'*80}")
-        self.log(f"FASE 8: PLANOS IGN DETALLADOS")
-        self.log(f"{'─'*80}")
-        self._generar_planos_ign(carpeta)
-        
-        # FASE 9: PLANOS DE LOCALIZACIÓN PROVINCIAL (Paso 13)
-        self.log(f"{'─'*80}")
-        self.log(f"FASE 9: PLANOS DE LOCALIZACIÓN PROVINCIAL")
-        self.log(f"{'─'*80}")
-        self._generar_planos_provinciales(carpeta)
-        
-        # FASE 10: PLANOS CARTOGRÁFICOS HISTÓRICOS (Paso 14)
-        self.log(f"{'─'*80}")
-        self.log(f"FASE 10: PLANOS CARTOGRÁFICOS HISTÓRICOS")
-        self.log(f"{'─'*80}")
-        self._generar_planos_historicos(carpeta)
+        self._procesar_afecciones(carpeta, parcelas)
         
-        # FASE 11: PLANOS TEMÁTICOS AMBIENTALES (Pasos 16-17)
+        # FASES 6-12: PLANOS CARTOGRÁFICOS (Pasos 9-19), en paralelo
         self.log(f"{'─'*80}")
-        self.log(f"FASE 11: PLANOS TEMÁTICOS AMBIENTALES")
+        self.log(f"FASES 6-12: PLANOS CARTOGRÁFICOS")
         self.log(f"{'─'*80}")
-        self._generar_plano_pendientes(carpeta)
-        self._generar_plano_natura2000(carpeta)
+        self._esperar_precarga(precarga)
+        self._generar_planos(carpeta)
         
-        # FASE 12: PLANOS DE PROTECCIÓN AMBIENTAL (Pasos 18-19)
-        self.log(f"{'─'*80}")
-        self.log(f"FASE 12: PLANOS DE PROTECCIÓN AMBIENTAL")
-        self.log(f"{'─'*80}")
-        self._generar_plano_montes_publicos(carpeta)
-        self._generar_plano_vias_pecuarias(carpeta)
+        self._registrar_metricas_upstream()
         
         self.log(f"{'═'*80}")
         self.log(f"✅ PIPELINE COMPLETO FINALIZADO: {txt_path.name}")
@@ -489,12 +776,14 @@ class OrquestadorPipeline:
                 continue
 
             print(f"\n✅ {len(parcelas)} parcelas procesadas correctamente\n")
+            self._crear_contexto(carpeta, parcelas)
 
             # FASE 2: GENERACIÓN VECTORIAL (Pasos 4-5)
             print(f"{'─'*80}")
             print(f"FASE 2: GENERACIÓN VECTORIAL")
             print(f"{'─'*80}")
             self._generar_kml(carpeta, parcelas)
+            precarga = self._iniciar_precarga(carpeta)
             self._generar_png(carpeta, parcelas)
             
             # FASE 3: EXPORTACIÓN TABULAR (Paso 6)
@@ -513,57 +802,269 @@ class OrquestadorPipeline:
             print(f"\n{'─'*80}")
             print(f"FASE 5: ANÁLISIS ESPACIAL")
             print(f"{'─'*80}")
-            self._procesar_afecciones(carpeta)
-            
-            # FASE 6: PLANOS DE EMPLAZAMIENTO BÁSICOS (Pasos 9-10)
-            print(f"\n{'─'*80}")
-            print(f"FASE 6: PLANOS DE EMPLAZAMIENTO BÁSICOS")
-            print(f"{'─'*80}")
-            self._generar_plano_emplazamiento(carpeta)
-            self._generar_plano_ortofoto(carpeta)
-            
-            # FASE 7: PLANOS CATASTRALES (Paso 11)
-            print(f"\n{'─'*80}")
-            print(f"FASE 7: PLANOS CATASTRALES")
-            print(f"{'─'*80}")
-            self._generar_plano_catastral(carpeta)
-            
-            # FASE 8: PLANOS IGN DETALLADOS (Paso 12)
-            print(f"\n{'─'*80}")
-            print(f"FASE 8: PLANOS IGN DETALLADOS")
-            print(f"{'─'*80}")
-            self._generar_planos_ign(carpeta)
-            
-            # FASE 9: PLANOS DE LOCALIZACIÓN PROVINCIAL (Paso 13)
-            print(f"\n{'─'*80}")
-            print(f"FASE 9: PLANOS DE LOCALIZACIÓN PROVINCIAL")
-            print(f"{'─'*80}")
-            self._generar_planos_provinciales(carpeta)
-            
-            # FASE 10: PLANOS CARTOGRÁFICOS HISTÓRICOS (Paso 14)
-            print(f"\n{'─'*80}")
-            print(f"FASE 10: PLANOS CARTOGRÁFICOS HISTÓRICOS")
-            print(f"{'─'*80}")
-            self._generar_planos_historicos(carpeta)
-            
-            # FASE 11: PLANOS TEMÁTICOS AMBIENTALES (Pasos 16-17)
-            print(f"\n{'─'*80}")
-            print(f"FASE 11: PLANOS TEMÁTICOS AMBIENTALES")
-            print(f"{'─'*80}")
-            self._generar_plano_pendientes(carpeta)
-            self._generar_plano_natura2000(carpeta)
+            self._procesar_afecciones(carpeta, parcelas)
             
-            # FASE 12: PLANOS DE PROTECCIÓN AMBIENTAL (Pasos 18-19) 🆕
+            # FASES 6-12: PLANOS CARTOGRÁFICOS (Pasos 9-19), en paralelo
             print(f"\n{'─'*80}")
-            print(f"FASE 12: PLANOS DE PROTECCIÓN AMBIENTAL 🆕")
+            print(f"FASES 6-12: PLANOS CARTOGRÁFICOS")
             print(f"{'─'*80}")
-            self._generar_plano_montes_publicos(carpeta)
-            self._generar_plano_vias_pecuarias(carpeta)
+            self._esperar_precarga(precarga)
+            self._generar_planos(carpeta)
             
             print(f"\n{'═'*80}")
             print(f"✅ PIPELINE COMPLETO FINALIZADO: {txt_path.name}")
             print(f"{'═'*80}\n")
 
+    # ═══════════════════════════════════════════════════════════════════════
+    # FASES 6-12: EJECUCIÓN DE LOS PLANOS COMO GRAFO
+    # ═══════════════════════════════════════════════════════════════════════
+
+    def _generar_planos(self, carpeta: Path) -> Dict[str, str]:
+        """
+        Genera todos los planos (FASES 6-12) según el grafo PASOS_PLANOS.
+
+        Con config.procesos_planos > 1 los pasos listos se ejecutan a la vez en
+        el pool de procesos compartido; cada proceso reutiliza su propio
+        orquestador y recibe el contexto geométrico del trabajo. Los mensajes
+        de cada paso (también los de un paso que falla) se reenvían al log al
+        terminar. Con 1 proceso se ejecutan aquí mismo, uno a uno y en el
+        orden de sus dependencias. Un fallo solo afecta a su paso (y a los
+        que dependan de él).
+
+        Args:
+            carpeta: Carpeta de resultados del trabajo
+
+        Returns:
+            {nombre del paso: "ok" | "error" | "omitido"}
+        """
+        procesos = self.config.procesos_planos or planificador.procesos_por_defecto()
+        contexto = self._obtener_contexto(carpeta)
+        inicio = datetime.now()
+
+        if contexto is None:
+            self.log("⚠️  Sin parcelas con geometría (MAPA_MAESTRO_TOTAL.kml): no se generan planos")
+            return {paso.nombre: planificador.ESTADO_OMITIDO for paso in PASOS_PLANOS}
+
+        en_pool = procesos > 1
+        if en_pool:
+            pool = planificador.obtener_pool(planificador.POOL_PLANOS, procesos)
+            self.log(f"⚙️  {len(PASOS_PLANOS)} planos en {procesos} procesos")
+
+        def ejecutar_aqui(metodo: str) -> dict:
+            inicio_paso = datetime.now()
+            getattr(self, metodo)(carpeta)  # sus mensajes van directamente al log
+            return {"mensajes": [], "segundos": (datetime.now() - inicio_paso).total_seconds()}
+
+        def lanzar(paso: planificador.Paso):
+            if not en_pool:
+                return planificador.ejecutar_en_linea(ejecutar_aqui, paso.nombre)
+            return pool.submit(
+                _ejecutar_paso_en_proceso, paso.nombre,
+                self.base_dir, self.fuentes, self.config, carpeta, contexto,
+            )
+
+        def al_terminar(paso: planificador.Paso, estado: str, futuro) -> None:
+            if estado == planificador.ESTADO_OMITIDO:
+                self.log(f"   ⏭️  {paso.titulo}: omitido (falló una dependencia)")
+                return
+            if estado == planificador.ESTADO_ERROR:
+                error = planificador.error_de(futuro)
+                for mensaje in getattr(error, "mensajes", ()):
+                    self.log(mensaje)
+                self.log(f"   ❌ {paso.titulo}: {error}")
+                return
+            resultado = futuro.result()
+            for mensaje in resultado["mensajes"]:
+                self.log(mensaje)
+            if en_pool:
+                self.cliente.acumular(resultado["contadores"])
+                registrar_estadisticas_proceso(resultado["pid"], resultado["cache_capas"])
+            self.log(f"   ✓ {paso.titulo} ({resultado['segundos']:.1f} s)")
+
+        estados = planificador.ejecutar_grafo(PASOS_PLANOS, lanzar, al_terminar)
+        correctos = sum(e == planificador.ESTADO_OK for e in estados.values())
+        self.log(
+            f"🗺️  Planos: {correctos}/{len(estados)} pasos correctos en "
+            f"{(datetime.now() - inicio).total_seconds():.1f} s"
+        )
+        return estados
+
+    # ═══════════════════════════════════════════════════════════════════════
+    # PRECARGA DE LAS ENTRADAS REMOTAS DE LOS PLANOS
+    # ═══════════════════════════════════════════════════════════════════════
+
+    def _planificar_precarga(
+        self,
+        contexto: ContextoGeometrico
+    ) -> Tuple[List[PeticionWMS], List[EncuadreTeselas]]:
+        """
+        Reúne las peticiones WMS y los mapas base de teselas de todos los planos.
+
+        Usa los mismos métodos _peticiones_*/_encuadre* que los planos, de
+        modo que la precarga pide exactamente lo que luego se dibuja.
+
+        Returns:
+            (peticiones WMS, encuadres de teselas)
+        """
+        wms: List[PeticionWMS] = []
+        for peticiones_plano in (
+            self._peticiones_catastral, self._peticiones_historicos,
+            self._peticiones_pendientes, self._peticiones_natura2000,
+            self._peticiones_montes_publicos,
+        ):
+            _, peticiones = peticiones_plano(contexto)
+            wms.extend(peticiones.values())
+
+        encuadres = [
+            self._encuadre_emplazamiento(contexto, cx.providers.OpenStreetMap.Mapnik),
+            self._encuadre_emplazamiento(contexto, cx.providers.Esri.WorldImagery),
+        ]
+        encuadres.extend(encuadre for _, _, encuadre in self._encuadres_ign(contexto))
+        encuadres.extend(self._encuadres_provinciales(contexto).values())
+        if (self.fuentes / "CAPAS_gpkg" / "afecciones" / "RGVP2024.gpkg").exists():
+            encuadres.append(self._encuadre_vias_pecuarias(contexto))
+        return wms, encuadres
+
+    def _precargar_planos(self, carpeta: Path) -> None:
+        """
+        Descarga a las cachés todas las entradas remotas de los planos.
+
+        Las peticiones WMS (mapas y leyendas), las teselas de cada mapa base
+        y el CMUP (si no hay espejo local) se piden a la vez, sin repetir las
+        comunes a varios planos, con config.precarga_max_simultaneas
+        peticiones en curso (el cliente aplica además su límite por host). Al dibujar, los planos encuentran
+        sus entradas en las cachés WMS y de teselas. Un fallo no interrumpe
+        la precarga: ese plano volverá a pedir la entrada al dibujarse.
+
+        Args:
+            carpeta: Carpeta de resultados del trabajo
+        """
+        contexto = self._obtener_contexto(carpeta)
+        if contexto is None:
+            return
+        inicio = datetime.now()
+        wms, encuadres = self._planificar_precarga(contexto)
+
+        def precargar_wms(peticion: PeticionWMS) -> bool:
+            return self._descargar_imagen_wms(peticion.url, peticion.params, peticion.timeout) is not None
+
+        def precargar_cmup(bbox: List[float]) -> bool:
+            self._descargar_cmup_wfs(bbox)
+            return True
+
+        def precargar_tesela(prov, tesela) -> bool:
+            teselas.precargar_tesela(self.cliente, prov, tesela, self.cache_teselas)
+            return True
+
+        # Tareas (función, argumentos), sin repetir las entradas comunes a varios planos
+        tareas = []
+        if self.cache_wms is not None:
+            unicas = {_clave_wms(p.url, p.params): p for p in wms}
+            tareas += [(precargar_wms, (p,)) for p in unicas.values()]
+            if self._capa_espejo_cmup() is None:
+                bbox_montes, _ = self._peticiones_montes_publicos(contexto)
+                tareas.append((precargar_cmup, (bbox_montes,)))
+        n_wms = len(tareas)
+        if self.cache_teselas is not None:
+            unicas = {}
+            for encuadre in encuadres:
+                lista, prov = teselas.teselas_para_extension(
+                    encuadre.extension(), encuadre.zoom, encuadre.fuente
+                )
+                for tesela in lista:
+                    unicas[(teselas.CacheTeselas.espacio(prov), tesela)] = prov
+            tareas += [(precargar_tesela, (prov, tesela)) for (_, tesela), prov in unicas.items()]
+        if not tareas:
+            return
+
+        fallidas = 0
+        with ThreadPoolExecutor(max_workers=max(1, self.config.precarga_max_simultaneas)) as pool:
+            futuros = [pool.submit(funcion, *args) for funcion, args in tareas]
+            for futuro in as_completed(futuros):
+                try:
+                    if not futuro.result():
+                        fallidas += 1
+                except Exception:
+                    fallidas += 1
+
+        self.log(
+            f"📥 Precarga de planos: {n_wms} peticiones WMS/WFS y "
+            f"{len(tareas) - n_wms} teselas en "
+            f"{(datetime.now() - inicio).total_seconds():.1f} s"
+            + (f" ({fallidas} fallidas)" if fallidas else "")
+        )
+
+    def _iniciar_precarga(self, carpeta: Path) -> Optional[Future]:
+        """
+        Lanza _precargar_planos en segundo plano (mientras se ejecutan las FASES 3-5).
+
+        Returns:
+            Futuro de la precarga o None si está desactivada
+        """
+        if not self.config.precarga_planos:
+            return None
+        ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="precarga")
+        futuro = ejecutor.submit(self._precargar_planos, carpeta)
+        ejecutor.shutdown(wait=False)
+        return futuro
+
+    def _esperar_precarga(self, precarga: Optional[Future]) -> None:
+        """Espera a que termine la precarga antes de dibujar los planos."""
+        if precarga is None:
+            return
+        try:
+            precarga.result()
+        except Exception as exc:
+            self.log(f"⚠️ Precarga de planos interrumpida: {exc}")
+
+    # ═══════════════════════════════════════════════════════════════════════
+    # CONTEXTO GEOMÉTRICO DEL TRABAJO
+    # ═══════════════════════════════════════════════════════════════════════
+
+    def _crear_contexto(self, carpeta: Path, parcelas: List[ParcelaData]) -> None:
+        """
+        Crea el contexto geométrico del trabajo a partir de las parcelas en memoria.
+
+        Args:
+            carpeta: Carpeta de resultados del trabajo
+            parcelas: Parcelas con geometría obtenidas en la FASE 1
+        """
+        self.contexto = ContextoGeometrico.desde_parcelas(parcelas)
+        self._carpeta_contexto = carpeta
+
+    def _obtener_contexto(self, carpeta: Path) -> Optional[ContextoGeometrico]:
+        """
+        Devuelve el contexto geométrico de `carpeta`.
+
+        Si el paso se ejecuta fuera de procesar_archivo_txt (sin FASE 1 en
+        memoria), el contexto se construye una vez desde MAPA_MAESTRO_TOTAL.kml.
+
+        Args:
+            carpeta: Carpeta de resultados del trabajo
+
+        Returns:
+            ContextoGeometrico o None si no hay parcelas disponibles
+        """
+        if self.contexto is None or self._carpeta_contexto != carpeta:
+            ruta_kml = carpeta / "MAPA_MAESTRO_TOTAL.kml"
+            if not ruta_kml.exists():
+                return None
+            self.contexto = ContextoGeometrico.desde_kml(ruta_kml)
+            self._carpeta_contexto = carpeta
+        return None if self.contexto.vacio else self.contexto
+
+    def _contexto_plano(self, carpeta: Path) -> ContextoGeometrico:
+        """
+        Contexto geométrico que necesita un plano.
+
+        Raises:
+            ValueError: Si no hay parcelas con geometría (el plano no puede generarse)
+        """
+        contexto = self._obtener_contexto(carpeta)
+        if contexto is None:
+            raise ValueError("Sin parcelas con geometría (MAPA_MAESTRO_TOTAL.kml)")
+        return contexto
+
     # ═══════════════════════════════════════════════════════════════════════
     # PASO 1: LECTURA Y ORGANIZACIÓN
     # ═══════════════════════════════════════════════════════════════════════
@@ -613,83 +1114,268 @@ class OrquestadorPipeline:
     def _procesar_referencias(self, referencias: List[str], carpeta: Path) -> List[ParcelaData]:
         """
         Procesa cada referencia catastral: descarga XML y PDF, extrae geometría.
-        
+
+        Las referencias se procesan en paralelo (config.max_descargas_simultaneas)
+        y cada host remoto respeta su propio límite de concurrencia. Los mensajes
+        de progreso y el geometry_callback se emiten, desde este hilo, a medida
+        que cada referencia termina. El resultado conserva el orden de entrada.
+
         Args:
             referencias: Lista de referencias catastrales
             carpeta: Carpeta donde guardar los archivos descargados
-            
+
         Returns:
             Lista de ParcelaData con geometría válida
         """
-        parcelas: List[ParcelaData] = []
-        
-        for i, rc in enumerate(referencias, 1):
-            self.log(f"📍 [{i}/{len(referencias)}] Procesando {rc}...")
-            
-            parcela = ParcelaData(rc)
-            xml_path = carpeta / f"{rc}_INSPIRE.xml"
-            pdf_path = carpeta / f"{rc}_CDyG.pdf"
-
-            # Descargar archivos
-            self._descargar_xml(rc, xml_path)
-            self._descargar_pdf(rc, pdf_path)
-
-            # Extraer geometría del XML
-            if xml_path.exists():
-                superficie, coords = self._extraer_geometria(xml_path)
-                if coords:
-                    parcela.actualizar_geometria(coords, superficie)
-                    
+        # Los contadores del almacén son del proceso: se registra solo lo de este trabajo
+        inicio = self.almacen.estadisticas() if self.almacen else None
+
+        if self.config.modo_adquisicion == "bbox":
+            self._adquirir_por_bloques(referencias, carpeta)
+
+        resultados: Dict[int, ParcelaData] = {}
+        total = len(referencias)
+        max_workers = max(1, min(self.config.max_descargas_simultaneas, total))
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="adquisicion") as pool:
+            futuros = {
+                pool.submit(self._adquirir_referencia, rc, carpeta): (i, rc)
+                for i, rc in enumerate(referencias)
+            }
+
+            for completadas, futuro in enumerate(as_completed(futuros), 1):
+                i, rc = futuros[futuro]
+                self.log(f"📍 [{completadas}/{total}] Procesando {rc}...")
+
+                try:
+                    parcela, superficie, xml_disponible, avisos = futuro.result()
+                except Exception as exc:
+                    self.log(f"   ❌ Error procesando la referencia {rc}: {exc}")
+                    continue
+                for aviso in avisos:
+                    self.log(f"   {aviso}")
+
+                if parcela is not None:
                     # Notificar geometría encontrada al frontend
                     if self.geometry_callback:
-                        self.geometry_callback(parcela.refcat, coords)
-                        
-                    parcela.rutas.update({
-                        "xml": str(xml_path),
-                        "pdf": str(pdf_path),
-                    })
-                    parcelas.append(parcela)
+                        self.geometry_callback(parcela.refcat, parcela.forma.exterior.tolist())
+                    resultados[i] = parcela
                     self.log(f"   ✅ Geometría obtenida: {superficie:,.0f} m²")
-                else:
+                elif xml_disponible:
                     self.log(f"   ⚠️ Referencia {rc} no contiene geometría válida en el XML.")
-            else:
-                self.log(f"   ❌ XML no disponible para la referencia {rc}.")
-                
-        return parcelas
-    
-    def _descargar_xml(self, rc: str, destino: Path) -> None:
+                else:
+                    self.log(f"   ❌ XML no disponible para la referencia {rc}.")
+
+        if self.almacen:
+            stats = self.almacen.estadisticas()
+            self.log(
+                f"💾 Caché catastral: {stats['aciertos'] - inicio['aciertos']} aciertos / "
+                f"{stats['fallos'] - inicio['fallos']} fallos "
+                f"({stats['entradas']} entradas, {stats['bytes'] / 1024 / 1024:.1f} MB)"
+            )
+
+        return [resultados[i] for i in sorted(resultados)]
+
+    def _adquirir_referencia(
+        self, rc: str, carpeta: Path
+    ) -> Tuple[Optional[ParcelaData], float, bool, List[str]]:
+        """
+        Descarga XML y PDF de una referencia y extrae su geometría.
+
+        Se ejecuta en un hilo del pool de adquisición, por lo que no emite
+        mensajes de progreso ni llama a geometry_callback: los avisos de la
+        descarga y de la lectura del XML se devuelven para que los registre
+        el hilo que recoge los resultados.
+
+        Args:
+            rc: Referencia catastral
+            carpeta: Carpeta donde guardar los archivos descargados
+
+        Returns:
+            Tupla (parcela o None si no hay geometría, superficie_m2,
+            xml_disponible, avisos)
+        """
+        xml_path = carpeta / f"{rc}_INSPIRE.xml"
+        pdf_path = carpeta / f"{rc}_CDyG.pdf"
+        avisos: List[str] = []
+
+        # Descargar archivos
+        xml_nuevo = self._descargar_xml(rc, xml_path, avisos)
+        self._descargar_pdf(rc, pdf_path, avisos)
+
+        if not xml_path.exists():
+            return None, 0.0, False, avisos
+
+        # Extraer geometría del XML
+        superficie, forma = self._extraer_geometria(xml_path, avisos)
+        if not forma:
+            return None, superficie, True, avisos
+
+        # Solo se comparten XML recién descargados y con geometría válida
+        if self.almacen and xml_nuevo:
+            self.almacen.guardar_archivo("xml", rc, xml_path)
+
+        parcela = ParcelaData(rc)
+        parcela.actualizar_geometria(forma, superficie)
+        parcela.rutas.update({
+            "xml": str(xml_path),
+            "pdf": str(pdf_path),
+        })
+        return parcela, superficie, True, avisos
+
+    def _adquirir_por_bloques(self, referencias: List[str], carpeta: Path) -> None:
+        """
+        Descarga por BBOX los XML de grupos de parcelas rústicas cercanas.
+
+        Las referencias se agrupan por provincia, municipio y polígono. Para
+        cada grupo se pide una parcela semilla con GetParcel y, a partir de su
+        geometría, un GetFeature por BBOX cuya respuesta se reparte en un XML
+        por referencia. Se repite con la siguiente referencia pendiente hasta
+        config.bbox_max_peticiones_grupo veces. Lo que quede sin cubrir se
+        descarga después de forma individual en _procesar_referencias.
+
+        Args:
+            referencias: Lista de referencias catastrales
+            carpeta: Carpeta donde guardar los XML
+        """
+        grupos, _ = wfs_catastro.agrupar_por_poligono(
+            referencias, self.config.bbox_min_referencias
+        )
+        if not grupos:
+            return
+
+        self.log(f"🧩 Modo BBOX: {len(grupos)} grupo(s) de parcelas por polígono")
+        max_workers = max(1, min(self.config.max_descargas_simultaneas, len(grupos)))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bbox") as pool:
+            resumen = list(pool.map(
+                lambda refs: self._adquirir_grupo_bbox(refs, carpeta), grupos.values()
+            ))
+
+        for _, _, avisos in resumen:
+            for aviso in avisos:
+                self.log(f"   {aviso}")
+        peticiones = sum(p for p, _, _ in resumen)
+        cubiertas = sum(c for _, c, _ in resumen)
+        total = sum(len(refs) for refs in grupos.values())
+        self.log(
+            f"   ✓ {peticiones} petición(es) BBOX cubrieron {cubiertas}/{total} referencias "
+            f"agrupadas (el resto se pedirá individualmente)"
+        )
+
+    def _adquirir_grupo_bbox(
+        self, refs: List[str], carpeta: Path
+    ) -> Tuple[int, int, List[str]]:
+        """
+        Descarga por BBOX un grupo de referencias del mismo polígono.
+
+        Se ejecuta en un hilo del pool BBOX: los avisos se devuelven para que
+        los registre _adquirir_por_bloques.
+
+        Args:
+            refs: Referencias del grupo
+            carpeta: Carpeta donde guardar los XML
+
+        Returns:
+            Tupla (peticiones BBOX realizadas, referencias cubiertas por BBOX, avisos)
+        """
+        pendientes = [
+            rc for rc in refs
+            if not (carpeta / f"{rc}_INSPIRE.xml").exists()
+            and not (self.almacen and self.almacen.materializar(
+                "xml", rc, carpeta / f"{rc}_INSPIRE.xml"))
+        ]
+        peticiones = cubiertas = 0
+        avisos: List[str] = []
+
+        while pendientes and peticiones < self.config.bbox_max_peticiones_grupo:
+            semilla = pendientes.pop(0)
+            xml_semilla = carpeta / f"{semilla}_INSPIRE.xml"
+            nuevo = self._descargar_xml(semilla, xml_semilla, avisos)
+            if not xml_semilla.exists():
+                continue
+            _, forma = self._extraer_geometria(xml_semilla, avisos)
+            if not forma:
+                continue
+            if nuevo and self.almacen:
+                self.almacen.guardar_archivo("xml", semilla, xml_semilla)
+            if not pendientes:
+                break
+
+            bbox = wfs_catastro.bbox_alrededor(
+                forma.coords, self.config.bbox_margen_m, self.config.bbox_lado_max_m
+            )
+            try:
+                respuesta = self.cliente.get(wfs_catastro.url_bbox(bbox), timeout=60)
+                respuesta.raise_for_status()
+            except requests.RequestException as exc:
+                avisos.append(f"❌ Error en petición BBOX ({semilla}): {exc}")
+                break
+            peticiones += 1
+
+            partes = wfs_catastro.dividir_por_refcat(respuesta.content)
+            for rc in list(pendientes):
+                contenido = partes.get(rc[:14])
+                if contenido is None:
+                    continue
+                destino = carpeta / f"{rc}_INSPIRE.xml"
+                destino.write_bytes(contenido)
+                # Como en _adquirir_referencia, solo se acepta (y se comparte)
+                # un XML con geometría válida; si no, se pedirá con GetParcel
+                _, forma = self._extraer_geometria(destino, [])
+                if not forma:
+                    destino.unlink()
+                    avisos.append(f"⚠️ XML de {rc} sin geometría válida en la respuesta BBOX")
+                    continue
+                if self.almacen:
+                    self.almacen.guardar_archivo("xml", rc, destino)
+                pendientes.remove(rc)
+                cubiertas += 1
+
+        return peticiones, cubiertas, avisos
+
+    def _descargar_xml(self, rc: str, destino: Path, avisos: List[str]) -> bool:
         """
         Descarga el archivo XML INSPIRE desde el servicio WFS de Catastro.
         
         Args:
             rc: Referencia catastral
             destino: Ruta donde guardar el XML
+            avisos: Lista a la que se añade el mensaje de error, si lo hay
+            
+        Returns:
+            True si el XML se ha descargado ahora del servicio
         """
         if destino.exists():
-            return  # No volver a descargar si ya existe
+            return False  # No volver a descargar si ya existe
+        if self.almacen and self.almacen.materializar("xml", rc, destino):
+            return False  # Reutilizar la descarga de un trabajo anterior
             
-        url = (
-            "https://ovc.catastro.meh.es/INSPIRE/wfsCP.aspx?service=WFS&vrsion=2.0.0"
-            f"&request=GetFeature&STOREDQUERY_ID=GetParcel&refcat={rc}"
-        )
+        url = wfs_catastro.url_getparcel(rc)
         
         try:
-            respuesta = self.session.get(url, timeout=20)
-            respuesta.raise_for_status()
-            destino.write_bytes(respuesta.content)
+            self.cliente.descargar(
+                url, destino, timeout=20,
+                tipos_contenido=("xml",),
+                tamano_maximo=self.config.descarga_max_mb * 1024 * 1024,
+            )
+            return True
         except requests.RequestException as exc:
-            print(f"❌ Error descargando XML {rc}: {exc}")
+            avisos.append(f"❌ Error descargando XML {rc}: {exc}")
+            return False
 
-    def _descargar_pdf(self, rc: str, destino: Path) -> None:
+    def _descargar_pdf(self, rc: str, destino: Path, avisos: List[str]) -> None:
         """
         Descarga el PDF de Croquis y Datos Gráficos desde Catastro.
         
         Args:
             rc: Referencia catastral
             destino: Ruta donde guardar el PDF
+            avisos: Lista a la que se añade el mensaje de error, si lo hay
         """
         if destino.exists():
             return  # No volver a descargar si ya existe
+        if self.almacen and self.almacen.materializar("pdf", rc, destino):
+            return  # Reutilizar la descarga de un trabajo anterior
             
         url = (
             "https://www1.sedecatastro.gob.es/CYCBienInmueble/SECImprimirCroquisYDatos.aspx"
@@ -697,58 +1383,44 @@ class OrquestadorPipeline:
         )
         
         try:
-            respuesta = self.session.get(url, timeout=20)
-            respuesta.raise_for_status()
-            # Verificar que el PDF tiene contenido válido (> 8KB)
-            if len(respuesta.content) > 8000:
-                destino.write_bytes(respuesta.content)
+            # Verificar que el PDF tiene contenido válido (> 8KB) según se recibe
+            self.cliente.descargar(
+                url, destino, timeout=20,
+                tipos_contenido=("pdf", "octet-stream"),
+                tamano_minimo=8001,
+                tamano_maximo=self.config.descarga_max_mb * 1024 * 1024,
+            )
+            if self.almacen:
+                self.almacen.guardar_archivo("pdf", rc, destino)
+        except DescargaInvalidaError:
+            pass  # Croquis no disponible para esta referencia
         except requests.RequestException as exc:
-            print(f"❌ Error descargando PDF {rc}: {exc}")
+            avisos.append(f"❌ Error descargando PDF {rc}: {exc}")
 
-    def _extraer_geometria(self, ruta_xml: Path) -> Tuple[float, List[Tuple[float, float]]]:
+    def _extraer_geometria(
+        self, ruta_xml: Path, avisos: List[str]
+    ) -> Tuple[float, GeometriaParcela]:
         """
-        Extrae la superficie y las coordenadas del polígono desde el XML INSPIRE.
+        Extrae la superficie y la geometría completa desde el XML INSPIRE.
+
+        Conserva todos los anillos (exteriores e interiores) y todas las
+        partes de las parcelas multipolígono (ver geometria_gml).
         
         Args:
             ruta_xml: Ruta al archivo XML
+            avisos: Lista a la que se añade el mensaje si el XML no es válido
             
         Returns:
-            Tupla (superficie_m2, lista_coordenadas)
-            lista_coordenadas es una lista de tuplas (longitud, latitud)
+            Tupla (superficie_m2, GeometriaParcela) con coordenadas (longitud, latitud);
+            la geometría está vacía si el XML no es válido
         """
-        superficie = 0.0
-        coords: List[Tuple[float, float]] = []
-        
         try:
-            tree = ET.parse(str(ruta_xml))
-            root = tree.getroot()
-            
-            # Namespaces del XML INSPIRE
-            ns = {
-                "cp": "http://inspire.ec.europa.eu/schemas/cp/4.0",
-                "gml": "http://www.opengis.net/gml/3.2"
-            }
-            
-            # Extraer superficie
-            area_node = root.find(".//cp:areaValue", ns)
-            if area_node is not None:
-                superficie = float(area_node.text)
-            
-            # Extraer coordenadas (vienen como: lat1 lon1 lat2 lon2 ...)
-            pos_list = root.find(".//gml:posList", ns)
-            if pos_list is not None:
-                raw = pos_list.text.split()
-                for i in range(0, len(raw), 2):
-                    lat = float(raw[i])
-                    lon = float(raw[i + 1])
-                    coords.append((lon, lat))  # Guardamos como (lon, lat)
-                    
+            return leer_geometria(ruta_xml)
         except ET.ParseError as exc:
-            print(f"❌ XML corrupto {ruta_xml.name}: {exc}")
-        except (ValueError, IndexError):
-            print(f"⚠️ Lista de coordenadas incompleta en {ruta_xml.name}.")
-            
-        return superficie, coords
+            avisos.append(f"❌ XML corrupto {ruta_xml.name}: {exc}")
+        except ValueError:
+            avisos.append(f"⚠️ Lista de coordenadas incompleta en {ruta_xml.name}.")
+        return 0.0, GeometriaParcela.vacia()
 
     # ═══════════════════════════════════════════════════════════════════════
     # PASO 4: GENERACIÓN DE KML
@@ -798,8 +1470,22 @@ class OrquestadorPipeline:
         Returns:
             String XML con el Placemark
         """
-        # Convertir coordenadas al formato KML: lon,lat,alt
-        coords = " ".join(f"{lon},{lat},0" for lon, lat in parcela.geometria)
+        # Convertir cada parte a Polygon KML (exterior + huecos interiores)
+        poligonos = []
+        for anillos in parcela.forma.poligonos():
+            limites = [
+                f"<{etiqueta}><LinearRing>"
+                f"<coordinates>{OrquestadorPipeline._coordenadas_kml(anillo)}</coordinates>"
+                f"</LinearRing></{etiqueta}>"
+                for etiqueta, anillo in zip(
+                    ["outerBoundaryIs"] + ["innerBoundaryIs"] * (len(anillos) - 1), anillos
+                )
+            ]
+            poligonos.append(f"<Polygon>{''.join(limites)}</Polygon>")
+        geometria = (
+            poligonos[0] if len(poligonos) == 1
+            else f"<MultiGeometry>{''.join(poligonos)}</MultiGeometry>"
+        )
         
         return (
             f"<Placemark>"
@@ -809,12 +1495,15 @@ class OrquestadorPipeline:
             "<LineStyle><color>ff00ff00</color><width>2</width></LineStyle>"
             "<PolyStyle><color>4d00ff00</color></PolyStyle>"
             "</Style>"
-            f"<Polygon><outerBoundaryIs><LinearRing>"
-            f"<coordinates>{coords}</coordinates>"
-            "</LinearRing></outerBoundaryIs></Polygon>"
+            f"{geometria}"
             "</Placemark>"
         )
 
+    @staticmethod
+    def _coordenadas_kml(anillo) -> str:
+        """Convierte un anillo (N, 2) en el formato KML: lon,lat,alt."""
+        return " ".join(f"{lon},{lat},0" for lon, lat in anillo.tolist())
+
     @staticmethod
     def _envoltorio_kml(contenido: str) -> str:
         """
@@ -851,60 +1540,26 @@ class OrquestadorPipeline:
             carpeta: Carpeta donde guardar los PNG
             parcelas: Lista de parcelas a dibujar
         """
-        siluetas = []
+        con_geometria = [p for p in parcelas if p.has_geometry()]
         
-        for parcela in parcelas:
-            if not parcela.has_geometry():
-                continue
-                
-            # Generar silueta individual
-            ruta = carpeta / f"{parcela.refcat}_silueta.png"
-            self._dibujar_parcelas([parcela.geometria], ruta, title=parcela.refcat)
-            parcela.rutas["png"] = str(ruta)
-            siluetas.append(parcela.geometria)
-        
-        # Generar silueta conjunta
-        if siluetas:
+        # Siluetas individuales, rasterizadas en paralelo
+        trabajos = [
+            (parcela.forma, carpeta / f"{parcela.refcat}_silueta.png", parcela.refcat)
+            for parcela in con_geometria
+        ]
+        generadas = set(siluetas.dibujar_siluetas(trabajos))
+        for parcela, (_, ruta, _) in zip(con_geometria, trabajos):
+            if ruta in generadas:
+                parcela.rutas["png"] = str(ruta)
+        
+        # Silueta conjunta: todas las geometrías en un único lienzo
+        if con_geometria:
             conjunto = carpeta / "CONJUNTO_TOTAL.png"
-            self._dibujar_parcelas(siluetas, conjunto, title="Conjunto total", color="blue")
+            siluetas.dibujar_silueta(
+                [p.forma for p in con_geometria], conjunto, titulo="Conjunto total", color="blue"
+            )
             print(f"🖼️  PNG conjunto generado: {conjunto.name}")
 
-    @staticmethod
-    def _dibujar_parcelas(
-        lista_parcelas: List[List[Tuple[float, float]]],
-        destino: Path,
-        *,
-        color: str = "red",
-        title: str = ""
-    ) -> None:
-        """
-        Dibuja una o más parcelas como siluetas PNG.
-        
-        Args:
-            lista_parcelas: Lista de geometrías (cada una es una lista de coordenadas)
-            destino: Ruta donde guardar el PNG
-            color: Color de relleno y borde
-            title: Título del gráfico
-        """
-        if not lista_parcelas:
-            return
-            
-        fig, ax = plt.subplots(figsize=(6, 6))
-        
-        for coords in lista_parcelas:
-            x, y = zip(*coords)
-            ax.fill(x, y, color=color, alpha=0.3)
-            ax.plot(x, y, color=color, linewidth=2)
-        
-        ax.axis("off")
-        ax.set_aspect("equal", adjustable="box")
-        
-        if title:
-            ax.set_title(title)
-        
-        fig.savefig(destino, transparent=True, bbox_inches="tight", pad_inches=0)
-        plt.close(fig)
-
     # ═══════════════════════════════════════════════════════════════════════
     # PASO 6: CREAR TABLAS EXCEL/CSV
     # ═══════════════════════════════════════════════════════════════════════
@@ -979,23 +1634,386 @@ class OrquestadorPipeline:
     # PASO 8: ANÁLISIS DE AFECCIONES CON CAPAS LOCALES
     # ═══════════════════════════════════════════════════════════════════════
     
-    def _procesar_afecciones(self, carpeta: Path) -> None:
+    def _leer_capa_en_zona(
+        self,
+        capa: EntradaCapa,
+        contexto: ContextoGeometrico,
+        epsg: int = 25830,
+        margen: float = 0,
+        columnas: Optional[List[str]] = None
+    ) -> gpd.GeoDataFrame:
+        """
+        Lee de una capa solo las entidades que tocan la extensión de las parcelas.
+
+        Las capas que caben en la caché de capas del proceso se sirven desde
+        memoria (se cargan completas la primera vez). Con el almacén de capas
+        activo se lee la ventana de la copia FlatGeobuf ya proyectada a `epsg`
+        (o, en las capas grandes, solo de las particiones de las provincias
+        del trabajo); si no, el BBOX se calcula en el CRS nativo de
+        la capa para que GDAL use su índice espacial (R-tree en GPKG, .qix/.sbn
+        en SHP) y se reproyecta el resultado.
+
+        Args:
+            capa: Entrada del catálogo de FUENTES
+            contexto: Contexto geométrico del trabajo
+            epsg: CRS de salida (25830 para superficies, 3857 para mapas)
+            margen: Margen alrededor de la extensión, en unidades de `epsg`
+            columnas: Atributos a leer (por defecto, la columna de etiqueta)
+
+        Returns:
+            GeoDataFrame en `epsg` (capas sin CRS se asumen en EPSG:25830)
+        """
+        if columnas is None:
+            columnas = [capa.columna_etiqueta] if capa.columna_etiqueta else []
+        origen = self.catalogo.ruta_absoluta(capa)
+
+        minx, miny, maxx, maxy = contexto.limites(epsg)
+        ventana = (minx - margen, miny - margen, maxx + margen, maxy + margen)
+
+        if self.particiones is not None and self.particiones.aplica(capa):
+            try:
+                return self.particiones.leer(
+                    capa, origen, epsg, ventana, contexto.provincias(), columnas=columnas
+                )
+            except Exception as e:
+                self.log(f"   ⚠️  Sin particiones provinciales ({e}), leyendo la capa completa")
+        elif self.cache_capas is not None:
+            entrada = self.cache_capas.obtener(
+                capa, origen, epsg, lambda: self._leer_capa_completa(capa, origen, epsg)
+            )
+            if entrada is not None:
+                return entrada.ventana(ventana, columnas)
+
+        if self.almacen_capas is not None:
+            return self.almacen_capas.leer(capa, origen, epsg, ventana, columnas=columnas)
+
+        if capa.crs is None:
+            self.log(f"   ⚠️  Sin CRS, asumiendo EPSG:25830")
+        if margen:
+            zona = box(*contexto.limites(epsg)).buffer(margen, join_style="mitre")
+            bbox = tuple(gpd.GeoSeries([zona], crs=epsg).to_crs(capa.crs or 25830).total_bounds)
+        else:
+            bbox = tuple(contexto.limites(capa.crs or 25830))
+        capa_gdf = gpd.read_file(str(origen), layer=capa.capa, bbox=bbox, columns=columnas)
+        if capa_gdf.crs is None:
+            capa_gdf = capa_gdf.set_crs(epsg=25830)
+        return capa_gdf.to_crs(epsg=epsg)
+
+    def _leer_capa_completa(self, capa: EntradaCapa, origen: Path, epsg: int) -> gpd.GeoDataFrame:
+        """Lee una capa entera en `epsg` (para la caché de capas)."""
+        if self.almacen_capas is not None:
+            return gpd.read_file(str(self.almacen_capas.preparar(capa, origen)[epsg]))
+        capa_gdf = gpd.read_file(str(origen), layer=capa.capa)
+        if capa_gdf.crs is None:
+            capa_gdf = capa_gdf.set_crs(epsg=25830)
+        return capa_gdf.to_crs(epsg=epsg)
+
+    def _afecciones_por_parcela(
+        self,
+        capa: EntradaCapa,
+        parcela_utm: gpd.GeoDataFrame,
+        interseccion: ResultadoInterseccion
+    ) -> pd.DataFrame:
+        """
+        Desglosa una intersección por parcela y etiqueta (formato largo).
+
+        Args:
+            capa: Entrada del catálogo de la capa analizada
+            parcela_utm: Parcelas del trabajo en EPSG:25830 (refcat, geometry)
+            interseccion: Resultado de intersecar(parcela_utm, capa)
+
+        Returns:
+            DataFrame (referencia, capa, archivo, etiqueta, superficie_parcela_ha,
+            superficie_ha, porcentaje) con una fila por parcela y etiqueta
+            afectadas; los pares sin etiqueta figuran como "(sin etiqueta)"
+        """
+        tabla = interseccion.areas_por_zona()
+        superficies = parcela_utm.area.to_numpy()[tabla["zona"]]
+        return pd.DataFrame({
+            "referencia": parcela_utm["refcat"].to_numpy()[tabla["zona"]],
+            "capa": capa.nombre,
+            "archivo": Path(capa.ruta).name,
+            "etiqueta": tabla["etiqueta"].fillna("(sin etiqueta)").astype(str).to_numpy(),
+            "superficie_parcela_ha": np.round(superficies / 10000, 4),
+            "superficie_ha": np.round(tabla["area"].to_numpy() / 10000, 4),
+            "porcentaje": np.round(tabla["area"].to_numpy() / superficies * 100, 2),
+        })
+
+    def _asignar_afecciones(self, parcelas: List[ParcelaData], matriz: pd.DataFrame) -> None:
+        """
+        Guarda en cada ParcelaData sus afecciones (una entrada por capa).
+
+        Args:
+            parcelas: Parcelas del trabajo
+            matriz: Tabla larga de _afecciones_por_parcela de todas las capas
+        """
+        por_refcat = {p.refcat: p for p in parcelas}
+        for parcela in parcelas:
+            parcela.afecciones = []
+        if matriz.empty:
+            return
+        for (refcat, nombre_capa), filas in matriz.groupby(["referencia", "capa"], sort=False):
+            parcela = por_refcat.get(refcat)
+            if parcela is None:
+                continue
+            parcela.afecciones.append({
+                "capa": nombre_capa,
+                "archivo": filas["archivo"].iat[0],
+                "superficie_ha": round(float(filas["superficie_ha"].sum()), 4),
+                "porcentaje": round(float(filas["porcentaje"].sum()), 2),
+                "etiquetas": dict(zip(filas["etiqueta"], filas["superficie_ha"])),
+            })
+
+    def _capa_contexto_mapa(
+        self,
+        capa: EntradaCapa,
+        contexto: ContextoGeometrico,
+        extension: Tuple[float, float, float, float]
+    ) -> gpd.GeoSeries:
+        """
+        Geometrías de la capa preparadas para dibujarse como contexto del mapa.
+
+        Se leen solo las entidades de la vista, se recortan a ella (con unos
+        píxeles de holgura para que el borde del recorte quede fuera del
+        encuadre) y se simplifican a medio píxel, por debajo de lo visible.
+
+        Args:
+            capa: Entrada del catálogo de FUENTES
+            contexto: Contexto geométrico del trabajo
+            extension: Vista del mapa (minx, miny, maxx, maxy) en EPSG:3857
+
+        Returns:
+            GeoSeries en EPSG:3857
+        """
+        minx, miny, maxx, maxy = extension
+        pixel = (maxx - minx) / (TAMANO_MAPA_AFECCION[0] * DPI_MAPA_AFECCION)
+        holgura = 10 * pixel
+        # Margen de lectura alrededor de las parcelas: el mayor de los cuatro
+        # lados de la vista, para que la zona leída la cubra en ambos ejes
+        pminx, pminy, pmaxx, pmaxy = contexto.limites(3857)
+        margen = max(pminx - minx, pminy - miny, maxx - pmaxx, maxy - pmaxy) + holgura
+        geometrias = self._leer_capa_en_zona(capa, contexto, epsg=3857, margen=margen).geometry
+        geometrias = geometrias.clip_by_rect(minx - holgura, miny - holgura, maxx + holgura, maxy + holgura)
+        geometrias = geometrias[~geometrias.is_empty]
+        return geometrias.simplify(pixel / 2)
+
+    def _analizar_capa(
+        self,
+        carpeta: Path,
+        idx: int,
+        total: int,
+        capa: EntradaCapa,
+        mapa_base: Optional[Tuple[np.ndarray, Tuple[float, float, float, float]]] = None,
+        carpeta_mapa: Optional[Path] = None
+    ) -> Dict[str, object]:
+        """
+        Analiza la afección de una capa y genera su mapa de evidencia.
+
+        Es independiente del resto de capas, por lo que puede ejecutarse en
+        un proceso del pool (ver _procesar_afecciones).
+
+        Args:
+            carpeta: Carpeta donde guardar el mapa
+            idx: Posición de la capa (numera el mapa)
+            total: Número de capas analizadas
+            capa: Entrada del catálogo de FUENTES
+            mapa_base: Mosaico común de los mapas de afección
+                (ver _mapa_base_afecciones); sin él, el mapa va sin fondo
+            carpeta_mapa: Carpeta donde guardar el mapa si no es `carpeta`
+                (el pool lo deja en una carpeta temporal, ver _procesar_afecciones)
+
+        Returns:
+            {"fila": fila del informe agregado o None,
+             "matriz": desglose por parcela (DataFrame) o None,
+             "mapa": ruta del mapa guardado o None}
+        """
+        nombre_capa = capa.nombre
+        self.log(f"\n[{idx}/{total}] 📡 Analizando: {nombre_capa}")
+        resultado: Dict[str, object] = {"fila": None, "matriz": None, "mapa": None}
+        contexto = self._obtener_contexto(carpeta)
+        
+        parcela_utm = contexto.gdf(25830)
+        area_total_m2 = parcela_utm.area.sum()
+
+        # Cargar solo la zona de las parcelas (índice espacial de la capa)
+        capa_gdf = self._leer_capa_en_zona(capa, contexto)
+
+        if capa_gdf.empty:
+            self.log(f"   ⚪ Sin geometrías en la zona: {nombre_capa}")
+            return resultado
+
+        self.log(f"   ↪ Geometrías cargadas: {len(capa_gdf)}")
+
+        # CALCULAR INTERSECCIÓN (solo superficies, ver logic/interseccion.py)
+        interseccion = intersecar(parcela_utm, capa_gdf, capa.columna_etiqueta)
+
+        if interseccion.vacio:
+            self.log(f"   ⚪ Sin intersección con {nombre_capa}")
+            return resultado
+
+        # Desglose por parcela (mismo cálculo, sin volver a intersecar)
+        resultado["matriz"] = self._afecciones_por_parcela(capa, parcela_utm, interseccion)
+
+        area_afectada = interseccion.area_total
+        porcentaje = (area_afectada / area_total_m2) * 100
+
+        # Si el porcentaje es despreciable, ignorar
+        if porcentaje < 0.01:
+            self.log(f"   ⚪ Afección despreciable (<0.01%) en {nombre_capa}")
+            return resultado
+
+        # ═══════════════════════════════════════════════════════════
+        # ANÁLISIS DE ATRIBUTOS (detectar columnas relevantes)
+        # ═══════════════════════════════════════════════════════════
+        detalles = []
+
+        # Columna descriptiva detectada al catalogar la capa
+        columna_encontrada = capa.columna_etiqueta
+
+        if columna_encontrada and columna_encontrada in capa_gdf.columns:
+            # Agrupar por tipo
+            grupos = interseccion.areas_por_etiqueta()
+            for etiqueta, sup in grupos.items():
+                detalles.append(f"{etiqueta}: {sup/10000:.4f} ha")
+
+            detalle_texto = " | ".join(detalles[:5])  # Limitar a 5 para legibilidad
+        else:
+            detalle_texto = f"{interseccion.n_geometrias} geometría(s) afectada(s)"
+
+        # Guardar resultado
+        resultado["fila"] = {
+            'capa': nombre_capa,
+            'archivo': Path(capa.ruta).name,
+            'afecta': 'SÍ',
+            'superficie_ha': round(area_afectada / 10000, 4),
+            'porcentaje': round(porcentaje, 2),
+            'detalle': detalle_texto,
+            'geometrias': interseccion.n_geometrias
+        }
+
+        # ═══════════════════════════════════════════════════════════
+        # GENERAR MAPA DE EVIDENCIA
+        # ═══════════════════════════════════════════════════════════
+        fig, ax = _nueva_figura(figsize=TAMANO_MAPA_AFECCION)
+
+        # Extensión fija del mapa: parcelas con margen (en EPSG:3857)
+        extension = _extension_mapa_afeccion(contexto.limites(3857))
+
+        # 1. Capa en la zona (contexto en gris claro): solo lo que se ve,
+        # recortado a la vista y simplificado al tamaño de píxel
+        try:
+            self._capa_contexto_mapa(capa, contexto, extension).plot(
+                ax=ax, 
+                color='lightgray', 
+                alpha=0.3, 
+                edgecolor='gray',
+                linewidth=0.5,
+                zorder=1,
+                label='Capa completa'
+            )
+        except Exception as e:
+            self.log(f"   ⚠️  Capa de contexto no disponible en el mapa: {e}")
+
+        # 2. Intersección (zona afectada en rojo)
+        interseccion.geometrias().to_crs(epsg=3857).plot(
+            ax=ax, 
+            color='red', 
+            alpha=0.6, 
+            edgecolor='darkred',
+            linewidth=1.5,
+            zorder=5,
+            label='Zona afectada'
+        )
+
+        # 3. Parcela (borde azul)
+        contexto.gdf(3857).plot(
+            ax=ax, 
+            facecolor="none", 
+            edgecolor="blue", 
+            linewidth=3,
+            zorder=10,
+            label="Parcela"
+        )
+
+        ax.set_xlim(extension[0], extension[2])
+        ax.set_ylim(extension[1], extension[3])
+
+        # 4. Mapa Base (descargado una vez para todas las capas)
+        if mapa_base is not None:
+            imagen, extension_img = mapa_base
+            teselas.dibujar_mapa_base(ax, imagen, extension_img, source=FUENTE_MAPA_AFECCION)
+
+        ax.set_axis_off()
+        ax.legend(loc='upper right', fontsize=10)
+        ax.set_title(
+            f"{nombre_capa}\n"
+            f"Afección: {porcentaje:.2f}% ({area_afectada/10000:.4f} ha)\n"
+            f"{detalle_texto[:100]}",  # Limitar longitud
+            fontsize=11,
+            pad=20
+        )
+
+        # Guardar mapa
+        nombre_mapa = f"mapa_afeccion_{idx:02d}_{nombre_capa[:30].replace(':', '_')}.png"
+        ruta_mapa = (carpeta_mapa or carpeta) / nombre_mapa
+        fig.savefig(ruta_mapa, dpi=DPI_MAPA_AFECCION, bbox_inches='tight')
+        resultado["mapa"] = ruta_mapa
+
+        self.log(f"   ✅ AFECCIÓN DETECTADA: {porcentaje:.2f}%")
+        self.log(f"      ↪ {detalle_texto[:80]}")
+        self.log(f"      ↪ Mapa guardado: {nombre_mapa}")
+        return resultado
+
+    def _mapa_base_afecciones(
+        self,
+        extension: Tuple[float, float, float, float]
+    ) -> Optional[Tuple[np.ndarray, Tuple[float, float, float, float]]]:
+        """
+        Descarga el mosaico de fondo común a todos los mapas de afección.
+
+        Todos los mapas del trabajo comparten extensión (la de las parcelas
+        con margen), así que las teselas se piden y se unen una sola vez.
+
+        Args:
+            extension: Vista de los mapas (minx, miny, maxx, maxy) en EPSG:3857
+
+        Returns:
+            (imagen RGBA, extensión del mosaico) o None si no se pudo descargar
+        """
+        minx, miny, maxx, maxy = extension
+        try:
+            return teselas.mosaico(
+                self.cliente, (minx, maxx, miny, maxy), zoom='auto', fuente=FUENTE_MAPA_AFECCION,
+                cache=self.cache_teselas,
+            )
+        except Exception as e:
+            self.log(f"   ⚠️  Mapa base no disponible, mapas de afección sin fondo: {e}")
+            return None
+
+    def _procesar_afecciones(
+        self,
+        carpeta: Path,
+        parcelas: Optional[List[ParcelaData]] = None
+    ) -> None:
         """
         Analiza intersecciones usando archivos geoespaciales locales.
         
         Busca automáticamente capas en formato GPKG, SHP, GeoJSON, etc.
         en una carpeta especificada y calcula afecciones con la parcela.
+        Además del informe agregado por capa, genera la matriz parcela × capa
+        (afecciones_por_parcela.csv/.xlsx) y la guarda en cada ParcelaData.
         
         Args:
             carpeta: Carpeta donde guardar los resultados
+            parcelas: Parcelas del trabajo (si se omiten, solo se exporta la matriz)
         """
-        archivo_parcela = carpeta / "MAPA_MAESTRO_TOTAL.kml"
+        contexto = self._obtener_contexto(carpeta)
         
         # Carpeta donde están las capas de afecciones
-        carpeta_capas = Path("/app/FUENTES")
+        carpeta_capas = self.fuentes
         
-        if not archivo_parcela.exists():
-            self.log(f"⚠️  Falta {archivo_parcela.name} para definir zona de búsqueda.")
+        if contexto is None:
+            self.log(f"⚠️  Faltan las parcelas (MAPA_MAESTRO_TOTAL.kml) para definir zona de búsqueda.")
             return
         
         if not carpeta_capas.exists():
@@ -1004,203 +2022,142 @@ class OrquestadorPipeline:
             return
 
         resultados = []
+        matrices: List[pd.DataFrame] = []
 
         try:
             # 1. Cargar Geometría de la Parcela (AOI)
-            self.log(f"📍 Cargando parcela desde {archivo_parcela.name}...")
-            parcela_gdf = gpd.read_file(str(archivo_parcela), driver='KML')
-            if parcela_gdf.crs is None:
-                parcela_gdf.crs = "EPSG:4326"
+            self.log(f"📍 Cargando parcelas del trabajo...")
             
             # Proyectar a UTM 30N (Estándar para España Peninsular)
-            parcela_utm = parcela_gdf.to_crs(epsg=25830)
+            parcela_utm = contexto.gdf(25830)
             area_total_m2 = parcela_utm.area.sum()
             
             self.log(f"   ✓ Área total de la parcela: {area_total_m2/10000:.4f} ha")
 
             # ═══════════════════════════════════════════════════════════════
-            # BUSCAR AUTOMÁTICAMENTE ARCHIVOS GEOESPACIALES
+            # SELECCIONAR CAPAS DEL CATÁLOGO QUE CUBREN LA ZONA
             # ═══════════════════════════════════════════════════════════════
-            extensiones = ['.gpkg', '.shp', '.geojson', '.json', '.kml', '.gml']
-            archivos_capa = []
+            inspeccionados, _ = self.catalogo.actualizar()
+            if inspeccionados:
+                self.log(f"🗂️  Catálogo de FUENTES actualizado ({inspeccionados} archivo(s) inspeccionados)")
             
-            for ext in extensiones:
-                archivos_capa.extend(carpeta_capas.glob(f"*{ext}"))
-                archivos_capa.extend(carpeta_capas.glob(f"**/*{ext}"))  # Buscar en subcarpetas
-            
-            # Eliminar duplicados y ordenar
-            archivos_capa = sorted(list(set(archivos_capa)))
-            
-            if not archivos_capa:
+            todas = self.catalogo.capas()
+            if not todas:
                 self.log(f"❌ No se encontraron capas geoespaciales en {carpeta_capas}")
-                self.log(f"   Extensiones buscadas: {', '.join(extensiones)}")
+                self.log(f"   Extensiones buscadas: {', '.join(EXTENSIONES_CAPA)}")
                 return
             
-            self.log(f"\n🗂️  Encontradas {len(archivos_capa)} capas para analizar:")
-            for arch in archivos_capa:
-                self.log(f"   • {arch.name}")
+            # Los recintos provinciales y el espejo del CMUP (que usa su plano)
+            # no son capas de afección
+            excluidas = {
+                Path(ruta).as_posix()
+                for ruta in (self.config.capa_provincias, self.config.cmup_espejo) if ruta
+            }
+            capas = [
+                c for c in self.catalogo.capas_en_zona(contexto.limites(25830))
+                if c.ruta not in excluidas
+            ]
+            self.log(f"\n🗂️  {len(capas)} de {len(todas)} capas cubren la zona de las parcelas:")
+            for capa in capas:
+                self.log(f"   • {capa.nombre}")
 
             # ═══════════════════════════════════════════════════════════════
             # PROCESAR CADA CAPA
             # ═══════════════════════════════════════════════════════════════
             self.log(f"\n🌍 Iniciando análisis de afecciones con capas locales...")
 
-            for idx, archivo_capa in enumerate(archivos_capa, 1):
-                nombre_capa = archivo_capa.stem
-                self.log(f"\n[{idx}/{len(archivos_capa)}] 📡 Analizando: {nombre_capa}")
-                
-                try:
-                    # Cargar capa
-                    capa_gdf = gpd.read_file(str(archivo_capa))
-                    
-                    if capa_gdf.empty:
-                        self.log(f"   ⚪ Capa vacía: {nombre_capa}")
-                        continue
-                    
-                    # Asegurar proyección correcta
-                    if capa_gdf.crs is None:
-                        self.log(f"   ⚠️  Sin CRS, asumiendo EPSG:25830")
-                        capa_gdf.set_crs(epsg=25830, inplace=True)
-                    else:
-                        capa_gdf = capa_gdf.to_crs(epsg=25830)
-                    
-                    self.log(f"   ↪ Geometrías cargadas: {len(capa_gdf)}")
-
-                    # CALCULAR INTERSECCIÓN
-                    interseccion = gpd.overlay(
-                        parcela_utm, 
-                        capa_gdf, 
-                        how='intersection', 
-                        keep_geom_type=False
-                    )
-                    
-                    if interseccion.empty:
-                        self.log(f"   ⚪ Sin intersección con {nombre_capa}")
-                        continue
-
-                    area_afectada = interseccion.area.sum()
-                    porcentaje = (area_afectada / area_total_m2) * 100
-
-                    # Si el porcentaje es despreciable, ignorar
-                    if porcentaje < 0.01:
-                        self.log(f"   ⚪ Afección despreciable (<0.01%) en {nombre_capa}")
-                        continue
-
-                    # ═══════════════════════════════════════════════════════════
-                    # ANÁLISIS DE ATRIBUTOS (detectar columnas relevantes)
-                    # ═══════════════════════════════════════════════════════════
-                    detalles = []
-                    
-                    # Buscar columnas que puedan contener información útil
-                    columnas_interes = [
-                        'nombre', 'name', 'tipo', 'type', 'uso', 'uso_sigpac', 
-                        'categoria', 'codigo', 'code', 'zona', 'descripcion',
-                        'clase', 'class', 'espacio', 'figura'
-                    ]
-                    
-                    columna_encontrada = None
-                    for col_buscar in columnas_interes:
-                        # Buscar coincidencia case-insensitive
-                        for col_real in interseccion.columns:
-                            if col_buscar.lower() == col_real.lower():
-                                columna_encontrada = col_real
-                                break
-                        if columna_encontrada:
-                            break
-                    
-                    if columna_encontrada and columna_encontrada in interseccion.columns:
-                        # Agrupar por tipo
-                        grupos = interseccion.groupby(columna_encontrada).apply(
-                            lambda x: x.area.sum()
-                        )
-                        for etiqueta, sup in grupos.items():
-                            detalles.append(f"{etiqueta}: {sup/10000:.4f} ha")
-                        
-                        detalle_texto = " | ".join(detalles[:5])  # Limitar a 5 para legibilidad
-                    else:
-                        detalle_texto = f"{len(interseccion)} geometría(s) afectada(s)"
-
-                    # Guardar resultado
-                    resultados.append({
-                        'capa': nombre_capa,
-                        'archivo': archivo_capa.name,
-                        'afecta': 'SÍ',
-                        'superficie_ha': round(area_afectada / 10000, 4),
-                        'porcentaje': round(porcentaje, 2),
-                        'detalle': detalle_texto,
-                        'geometrias': len(interseccion)
-                    })
-
-                    # ═══════════════════════════════════════════════════════════
-                    # GENERAR MAPA DE EVIDENCIA
-                    # ═══════════════════════════════════════════════════════════
-                    fig, ax = plt.subplots(figsize=(12, 10))
-                    
-                    # 1. Capa completa (contexto en gris claro)
+            procesos_pool = self.config.procesos_afecciones or planificador.procesos_por_defecto()
+            procesos = min(procesos_pool, len(capas)) if capas else 1
+            salidas: Dict[int, Dict[str, object]] = {}
+
+            mapa_base = None
+            if capas:
+                mapa_base = self._mapa_base_afecciones(_extension_mapa_afeccion(contexto.limites(3857)))
+
+            if procesos <= 1:
+                for idx, capa in enumerate(capas, 1):
                     try:
-                        capa_gdf.to_crs(epsg=3857).plot(
-                            ax=ax, 
-                            color='lightgray', 
-                            alpha=0.3, 
-                            edgecolor='gray',
-                            linewidth=0.5,
-                            zorder=1,
-                            label='Capa completa'
-                        )
-                    except:
-                        pass
-                    
-                    # 2. Intersección (zona afectada en rojo)
-                    interseccion.to_crs(epsg=3857).plot(
-                        ax=ax, 
-                        color='red', 
-                        alpha=0.6, 
-                        edgecolor='darkred',
-                        linewidth=1.5,
-                        zorder=5,
-                        label='Zona afectada'
-                    )
-                    
-                    # 3. Parcela (borde azul)
-                    parcela_utm.to_crs(epsg=3857).plot(
-                        ax=ax, 
-                        facecolor="none", 
-                        edgecolor="blue", 
-                        linewidth=3,
-                        zorder=10,
-                        label="Parcela"
+                        salidas[idx] = self._analizar_capa(carpeta, idx, len(capas), capa, mapa_base)
+                    except Exception as e:
+                        self.log(f"   ❌ Error procesando {capa.nombre}: {str(e)}")
+                        import traceback
+                        self.log(f"      {traceback.format_exc()}")
+            else:
+                self.log(f"⚙️  {len(capas)} capas en {procesos} procesos")
+                pool = planificador.obtener_pool(planificador.POOL_AFECCIONES, procesos_pool)
+                # Los procesos dejan los mapas fuera de la carpeta del trabajo y
+                # solo se mueven los de las capas aceptadas: una capa descartada
+                # por tiempo que termine más tarde no puede añadir su mapa al
+                # trabajo (al borrar la carpeta temporal, su savefig falla)
+                carpeta_mapas = Path(tempfile.mkdtemp(prefix="mapas_afeccion_"))
+
+                def lanzar(idx: int):
+                    return planificador.enviar(
+                        pool, _ejecutar_paso_en_proceso, "_analizar_capa",
+                        self.base_dir, self.fuentes, self.config, carpeta, contexto,
+                        idx, len(capas), capas[idx - 1], mapa_base, carpeta_mapas,
                     )
-                    
-                    # 4. Mapa Base
-                    try:
-                        cx.add_basemap(ax, source=cx.providers.OpenStreetMap.Mapnik, zoom='auto')
-                    except:
-                        pass  # Si falla internet, mapa sin fondo
-                    
-                    ax.set_axis_off()
-                    ax.legend(loc='upper right', fontsize=10)
-                    ax.set_title(
-                        f"{nombre_capa}\n"
-                        f"Afección: {porcentaje:.2f}% ({area_afectada/10000:.4f} ha)\n"
-                        f"{detalle_texto[:100]}",  # Limitar longitud
-                        fontsize=11,
-                        pad=20
+
+                def al_terminar(idx: int, estado: str, futuro) -> None:
+                    nombre_capa = capas[idx - 1].nombre
+                    if estado == planificador.ESTADO_TIEMPO_AGOTADO:
+                        self.log(
+                            f"\n[{idx}/{len(capas)}] ⏱️  {nombre_capa}: sin respuesta en "
+                            f"{self.config.timeout_capa_s:.0f} s, se descarta"
+                        )
+                        return
+                    if estado == planificador.ESTADO_ERROR:
+                        error = planificador.error_de(futuro)
+                        for mensaje in getattr(error, "mensajes", ()):
+                            self.log(mensaje)
+                        self.log(f"\n[{idx}/{len(capas)}] ❌ Error procesando {nombre_capa}: {error}")
+                        return
+                    salida = futuro.result()
+                    for mensaje in salida["mensajes"]:
+                        self.log(mensaje)
+                    self.cliente.acumular(salida["contadores"])
+                    registrar_estadisticas_proceso(salida["pid"], salida["cache_capas"])
+                    resultado = salida["resultado"]
+                    if resultado["mapa"] is not None:
+                        destino = carpeta / Path(resultado["mapa"]).name
+                        shutil.move(str(resultado["mapa"]), destino)
+                        resultado["mapa"] = destino
+                    salidas[idx] = resultado
+
+                try:
+                    planificador.ejecutar_lote(
+                        range(1, len(capas) + 1), lanzar, al_terminar,
+                        max_en_curso=procesos, timeout_s=self.config.timeout_capa_s,
                     )
-                    
-                    # Guardar mapa
-                    nombre_mapa = f"mapa_afeccion_{idx:02d}_{nombre_capa[:30]}.png"
-                    ruta_mapa = carpeta / nombre_mapa
-                    plt.savefig(ruta_mapa, dpi=150, bbox_inches='tight')
-                    plt.close()
-                    
-                    self.log(f"   ✅ AFECCIÓN DETECTADA: {porcentaje:.2f}%")
-                    self.log(f"      ↪ {detalle_texto[:80]}")
-                    self.log(f"      ↪ Mapa guardado: {nombre_mapa}")
-
-                except Exception as e:
-                    self.log(f"   ❌ Error procesando {nombre_capa}: {str(e)}")
-                    import traceback
-                    self.log(f"      {traceback.format_exc()}")
+                finally:
+                    shutil.rmtree(carpeta_mapas, ignore_errors=True)
+
+            # Fusión en el orden de las capas (independiente del orden de llegada)
+            for idx in sorted(salidas):
+                if salidas[idx]["fila"] is not None:
+                    resultados.append(salidas[idx]["fila"])
+                if salidas[idx]["matriz"] is not None:
+                    matrices.append(salidas[idx]["matriz"])
+
+            # ═══════════════════════════════════════════════════════════════
+            # MATRIZ PARCELA × CAPA
+            # ═══════════════════════════════════════════════════════════════
+            matriz = pd.concat(matrices, ignore_index=True) if matrices else pd.DataFrame()
+            if not matriz.empty:
+                # Mismo umbral que el informe agregado, aplicado por parcela y capa
+                totales = matriz.groupby(["referencia", "capa"])["porcentaje"].transform("sum")
+                matriz = matriz[totales >= 0.01].sort_values(
+                    ["referencia", "porcentaje"], ascending=[True, False]
+                )
+            if parcelas is not None:
+                self._asignar_afecciones(parcelas, matriz)
+            if not matriz.empty:
+                matriz.to_csv(carpeta / "afecciones_por_parcela.csv", index=False, sep=";", encoding='utf-8-sig')
+                matriz.to_excel(carpeta / "afecciones_por_parcela.xlsx", index=False, engine='openpyxl')
+                self.log(
+                    f"\n📄 Matriz parcela × capa: {matriz['referencia'].nunique()} parcelas afectadas, "
+                    f"{len(matriz)} filas (afecciones_por_parcela.xlsx)"
+                )
 
             # ═══════════════════════════════════════════════════════════════
             # EXPORTAR INFORME FINAL
@@ -1209,7 +2166,7 @@ class OrquestadorPipeline:
                 df = pd.DataFrame(resultados)
                 
                 # Ordenar por porcentaje de afección (mayor a menor)
-                df = df.sort_values('porcentaje', ascending=False)
+                df = df.sort_values('porcentaje', ascending=False, kind='stable')
                 
                 csv_path = carpeta / "afecciones_analisis.csv"
                 excel_path = carpeta / "afecciones_analisis.xlsx"
@@ -1245,6 +2202,42 @@ class OrquestadorPipeline:
     # PASO 9: PLANO DE EMPLAZAMIENTO (MAPA BASE)
     # ═══════════════════════════════════════════════════════════════════════
     
+    def _encuadre_emplazamiento(self, contexto: ContextoGeometrico, fuente: teselas.Fuente) -> EncuadreTeselas:
+        """
+        Encuadre de los planos de emplazamiento: margen 1.8x en proporción 4:3.
+
+        Args:
+            contexto: Contexto geométrico del trabajo
+            fuente: Mapa base del plano (OSM u ortofoto)
+        """
+        minx, miny, maxx, maxy = contexto.limites()
+        centro_x, centro_y = (minx + maxx) / 2, (miny + maxy) / 2
+
+        ancho_parcelas = (maxx - minx) * 1.8  # Margen 1.8x
+        alto_parcelas = (maxy - miny) * 1.8
+
+        # Ajustar para mantener proporción 4:3
+        if ancho_parcelas / alto_parcelas > 4/3:
+            alto_final = ancho_parcelas * (3/4)
+            ancho_final = ancho_parcelas
+        else:
+            ancho_final = alto_parcelas * (4/3)
+            alto_final = alto_parcelas
+
+        return EncuadreTeselas(
+            xlim=(centro_x - ancho_final/2, centro_x + ancho_final/2),
+            ylim=(centro_y - alto_final/2, centro_y + alto_final/2),
+            fuente=fuente,
+            crs=contexto.gdf().crs.to_string(),
+        )
+
+    def _anadir_mapa_base(self, ax, encuadre: EncuadreTeselas, **kwargs) -> None:
+        """Añade a `ax` el mapa base de un encuadre (con la caché de teselas)."""
+        teselas.anadir_mapa_base(
+            ax, self.cliente, source=encuadre.fuente, zoom=encuadre.zoom,
+            crs=encuadre.crs, cache=self.cache_teselas, **kwargs
+        )
+
     def _generar_plano_emplazamiento(self, carpeta: Path) -> None:
         """
         Genera plano de emplazamiento sobre mapa base OpenStreetMap.
@@ -1260,55 +2253,28 @@ class OrquestadorPipeline:
         Args:
             carpeta: Carpeta donde guardar el plano
         """
-        ruta_kml = carpeta / "MAPA_MAESTRO_TOTAL.kml"
-        if not ruta_kml.exists():
-            print(f"⚠️  No se encontró {ruta_kml.name}")
-            return
-
-        try:
-            # Cargar KML
-            gdf = gpd.read_file(str(ruta_kml), driver='KML')
-            if gdf.empty:
-                return
-            if gdf.crs is None:
-                gdf.crs = "EPSG:4326"
-            
-            # Configurar figura en formato 4:3
-            fig, ax = plt.subplots(figsize=(12, 9))
-            
-            # Calcular límites con margen
-            minx, miny, maxx, maxy = gdf.total_bounds
-            centro_x, centro_y = (minx + maxx) / 2, (miny + maxy) / 2
-            
-            ancho_parcelas = (maxx - minx) * 1.8  # Margen 1.8x
-            alto_parcelas = (maxy - miny) * 1.8
-            
-            # Ajustar para mantener proporción 4:3
-            if ancho_parcelas / alto_parcelas > 4/3:
-                alto_final = ancho_parcelas * (3/4)
-                ancho_final = ancho_parcelas
-            else:
-                ancho_final = alto_parcelas * (4/3)
-                alto_final = alto_parcelas
-                
-            ax.set_xlim(centro_x - ancho_final/2, centro_x + ancho_final/2)
-            ax.set_ylim(centro_y - alto_final/2, centro_y + alto_final/2)
+        contexto = self._contexto_plano(carpeta)
+        gdf = contexto.gdf()
+        
+        # Configurar figura en formato 4:3
+        fig, ax = _nueva_figura(figsize=(12, 9))
+        
+        # Límites con margen 1.8x en proporción 4:3
+        encuadre = self._encuadre_emplazamiento(contexto, cx.providers.OpenStreetMap.Mapnik)
+        ax.set_xlim(*encuadre.xlim)
+        ax.set_ylim(*encuadre.ylim)
 
-            # Dibujar parcelas en rojo
-            gdf.plot(ax=ax, facecolor='red', alpha=0.3, edgecolor='darkred', linewidth=1.5, zorder=2)
-            
-            # Añadir mapa base OpenStreetMap
-            cx.add_basemap(ax, crs=gdf.crs.to_string(), source=cx.providers.OpenStreetMap.Mapnik, zorder=1)
-            
-            ax.set_axis_off()
-            
-            ruta_jpg = carpeta / "PLANO-EMPLAZAMIENTO.jpg"
-            plt.savefig(ruta_jpg, dpi=300, bbox_inches='tight', pad_inches=0)
-            plt.close()
-            print(f"✅ PLANO-EMPLAZAMIENTO.jpg generado (300 DPI)")
-            
-        except Exception as e:
-            print(f"❌ Error al generar el plano: {e}")
+        # Dibujar parcelas en rojo
+        gdf.plot(ax=ax, facecolor='red', alpha=0.3, edgecolor='darkred', linewidth=1.5, zorder=2)
+        
+        # Añadir mapa base OpenStreetMap
+        self._anadir_mapa_base(ax, encuadre, zorder=1)
+        
+        ax.set_axis_off()
+        
+        ruta_jpg = carpeta / "PLANO-EMPLAZAMIENTO.jpg"
+        fig.savefig(ruta_jpg, dpi=300, bbox_inches='tight', pad_inches=0)
+        self.log(f"✅ PLANO-EMPLAZAMIENTO.jpg generado (300 DPI)")
 
     # ═══════════════════════════════════════════════════════════════════════
     # PASO 10: PLANO DE EMPLAZAMIENTO (ORTOFOTO)
@@ -1330,60 +2296,64 @@ class OrquestadorPipeline:
         Args:
             carpeta: Carpeta donde guardar el plano
         """
-        ruta_kml = carpeta / "MAPA_MAESTRO_TOTAL.kml"
-        if not ruta_kml.exists():
-            print(f"⚠️  No se encontró {ruta_kml.name}")
-            return
-
-        try:
-            # Cargar KML
-            gdf = gpd.read_file(str(ruta_kml), driver='KML')
-            if gdf.empty:
-                return
-            if gdf.crs is None:
-                gdf.crs = "EPSG:4326"
-            
-            # Configurar figura en formato 4:3
-            fig, ax = plt.subplots(figsize=(12, 9))
-            
-            # Calcular límites con margen
-            minx, miny, maxx, maxy = gdf.total_bounds
-            centro_x, centro_y = (minx + maxx) / 2, (miny + maxy) / 2
-            
-            ancho_parcelas = (maxx - minx) * 1.8
-            alto_parcelas = (maxy - miny) * 1.8
-            
-            # Ajustar para mantener proporción 4:3
-            if ancho_parcelas / alto_parcelas > 4/3:
-                alto_final = ancho_parcelas * (3/4)
-                ancho_final = ancho_parcelas
-            else:
-                ancho_final = alto_parcelas * (4/3)
-                alto_final = alto_parcelas
-                
-            ax.set_xlim(centro_x - ancho_final/2, centro_x + ancho_final/2)
-            ax.set_ylim(centro_y - alto_final/2, centro_y + alto_final/2)
+        contexto = self._contexto_plano(carpeta)
+        gdf = contexto.gdf()
+        
+        # Configurar figura en formato 4:3
+        fig, ax = _nueva_figura(figsize=(12, 9))
+        
+        # Límites con margen 1.8x en proporción 4:3
+        encuadre = self._encuadre_emplazamiento(contexto, cx.providers.Esri.WorldImagery)
+        ax.set_xlim(*encuadre.xlim)
+        ax.set_ylim(*encuadre.ylim)
 
-            # Dibujar parcelas en cian (solo borde, sin relleno)
-            gdf.plot(ax=ax, facecolor='none', edgecolor='cyan', linewidth=2.5, zorder=2)
-            
-            # Añadir ortofoto Esri WorldImagery
-            cx.add_basemap(ax, crs=gdf.crs.to_string(), source=cx.providers.Esri.WorldImagery, zorder=1)
-            
-            ax.set_axis_off()
-            
-            ruta_jpg = carpeta / "PLANO-EMPLAZAMIENTO-ORTO.jpg"
-            plt.savefig(ruta_jpg, dpi=300, bbox_inches='tight', pad_inches=0)
-            plt.close()
-            print(f"✅ PLANO-EMPLAZAMIENTO-ORTO.jpg generado (300 DPI)")
-            
-        except Exception as e:
-            print(f"❌ Error al generar la ortofoto: {e}")
+        # Dibujar parcelas en cian (solo borde, sin relleno)
+        gdf.plot(ax=ax, facecolor='none', edgecolor='cyan', linewidth=2.5, zorder=2)
+        
+        # Añadir ortofoto Esri WorldImagery
+        self._anadir_mapa_base(ax, encuadre, zorder=1)
+        
+        ax.set_axis_off()
+        
+        ruta_jpg = carpeta / "PLANO-EMPLAZAMIENTO-ORTO.jpg"
+        fig.savefig(ruta_jpg, dpi=300, bbox_inches='tight', pad_inches=0)
+        self.log(f"✅ PLANO-EMPLAZAMIENTO-ORTO.jpg generado (300 DPI)")
 
     # ═══════════════════════════════════════════════════════════════════════
     # PASO 11: PLANO CATASTRAL (1000m)
     # ═══════════════════════════════════════════════════════════════════════
     
+    def _peticiones_catastral(
+        self,
+        contexto: ContextoGeometrico
+    ) -> Tuple[List[float], Dict[str, PeticionWMS]]:
+        """
+        Encuadre cuadrado de 1000 m (EPSG:25830) y petición WMS del plano catastral.
+
+        Returns:
+            (bbox [xmin, ymin, xmax, ymax], {"mapa": petición})
+        """
+        b = contexto.limites(25830)
+
+        # Calcular encuadre cuadrado de 1000m
+        lado_cuadrado = 1000  # metros
+        centro_x, centro_y = self._centro_encuadre((b[0] + b[2]) / 2, (b[1] + b[3]) / 2, lado_cuadrado)
+
+        xmin = centro_x - (lado_cuadrado / 2)
+        xmax = centro_x + (lado_cuadrado / 2)
+        ymin = centro_y - (lado_cuadrado / 2)
+        ymax = centro_y + (lado_cuadrado / 2)
+
+        bbox_str = f"{xmin},{ymin},{xmax},{ymax}"
+
+        # Petición WMS al servidor de Catastro
+        url = (
+            f"https://ovc.catastro.meh.es/Cartografia/WMS/ServidorWMS.aspx?"
+            f"SERVICE=WMS&VERSION=1.1.1&REQUEST=GetMap&LAYERS=CATASTRO"
+            f"&SRS=EPSG:25830&BBOX={bbox_str}&WIDTH=1800&HEIGHT=1800&FORMAT=image/png"
+        )
+        return [xmin, ymin, xmax, ymax], {"mapa": PeticionWMS(url, timeout=30)}
+
     def _generar_plano_catastral(self, carpeta: Path) -> None:
         """
         Genera plano catastral con encuadre fijo de 1000m usando WMS de Catastro.
@@ -1399,71 +2369,78 @@ class OrquestadorPipeline:
         Args:
             carpeta: Carpeta donde guardar el plano
         """
-        ruta_kml = carpeta / "MAPA_MAESTRO_TOTAL.kml"
-        if not ruta_kml.exists():
-            print(f"⚠️  No se encontró {ruta_kml.name}")
-            return
+        contexto = self._contexto_plano(carpeta)
 
-        try:
-            # Cargar y proyectar a UTM 30N
-            gdf = gpd.read_file(str(ruta_kml), driver='KML').to_crs(epsg=25830)
-            b = gdf.total_bounds
-            
-            # Calcular encuadre cuadrado de 1000m
-            centro_x = (b[0] + b[2]) / 2
-            centro_y = (b[1] + b[3]) / 2
-            lado_cuadrado = 1000  # metros
-            
-            xmin = centro_x - (lado_cuadrado / 2)
-            xmax = centro_x + (lado_cuadrado / 2)
-            ymin = centro_y - (lado_cuadrado / 2)
-            ymax = centro_y + (lado_cuadrado / 2)
-            
-            bbox_str = f"{xmin},{ymin},{xmax},{ymax}"
-            
-            print(f"🌍 Generando plano catastral (1000m)...", end=" ", flush=True)
-            
-            # Petición WMS al servidor de Catastro
-            url = (
-                f"https://ovc.catastro.meh.es/Cartografia/WMS/ServidorWMS.aspx?"
-                f"SERVICE=WMS&VERSION=1.1.1&REQUEST=GetMap&LAYERS=CATASTRO"
-                f"&SRS=EPSG:25830&BBOX={bbox_str}&WIDTH=1800&HEIGHT=1800&FORMAT=image/png"
-            )
-            
-            r = self.session.get(url, timeout=30)
-            if r.status_code == 200:
-                img_mapa = Image.open(BytesIO(r.content))
-                
-                # Crear figura cuadrada
-                fig = plt.figure(figsize=(10, 10))
-                ax = fig.add_axes([0, 0, 1, 1])
-                ax.imshow(img_mapa, extent=[xmin, xmax, ymin, ymax])
-                
-                # Dibujar parcelas en cian
-                gdf.plot(ax=ax, facecolor='none', edgecolor='cyan', linewidth=1.5)
-                
-                ax.set_axis_off()
-                ax.set_xlim(xmin, xmax)
-                ax.set_ylim(ymin, ymax)
-                
-                # Guardar como JPEG
-                buf = BytesIO()
-                plt.savefig(buf, format='png', bbox_inches='tight', pad_inches=0)
-                plt.close()
-                buf.seek(0)
-                final_img = Image.open(buf).convert('RGB')
-                nombre_salida = carpeta / "PLANO-CATASTRAL-map.jpg"
-                final_img.save(nombre_salida, "JPEG", quality=85, optimize=True)
-                print(f"✅")
-            else:
-                print(f"❌ Error del servidor WMS")
-        except Exception as e:
-            print(f"❌ Error: {e}")
+        # Parcelas en UTM 30N
+        gdf = contexto.gdf(25830)
+        (xmin, ymin, xmax, ymax), peticiones = self._peticiones_catastral(contexto)
+        
+        img_mapa = self._descargar_imagenes_wms(peticiones)["mapa"]
+        if img_mapa is None:
+            raise RuntimeError("El servidor WMS de Catastro no ha devuelto el mapa")
+        
+        # Crear figura cuadrada
+        fig = Figure(figsize=(10, 10))
+        ax = fig.add_axes([0, 0, 1, 1])
+        ax.imshow(img_mapa, extent=[xmin, xmax, ymin, ymax])
+        
+        # Dibujar parcelas en cian
+        gdf.plot(ax=ax, facecolor='none', edgecolor='cyan', linewidth=1.5)
+        
+        ax.set_axis_off()
+        ax.set_xlim(xmin, xmax)
+        ax.set_ylim(ymin, ymax)
+        
+        # Guardar como JPEG
+        buf = BytesIO()
+        fig.savefig(buf, format='png', bbox_inches='tight', pad_inches=0)
+        buf.seek(0)
+        final_img = Image.open(buf).convert('RGB')
+        nombre_salida = carpeta / "PLANO-CATASTRAL-map.jpg"
+        final_img.save(nombre_salida, "JPEG", quality=85, optimize=True)
+        self.log(f"✅ PLANO-CATASTRAL-map.jpg generado (1000m)")
 
     # ═══════════════════════════════════════════════════════════════════════
     # PASO 12: PLANOS IGN (V1 y V2)
     # ═══════════════════════════════════════════════════════════════════════
     
+    def _encuadres_ign(self, contexto: ContextoGeometrico) -> List[Tuple[int, str, EncuadreTeselas]]:
+        """
+        Encuadres 4:3 de los planos IGN (márgenes de 500 y 3000 m, zoom 16).
+
+        Returns:
+            Lista de (margen, nombre de archivo, encuadre)
+        """
+        minx, miny, maxx, maxy = contexto.limites(3857)
+
+        # URL del servicio WMTS del IGN
+        ign_url = (
+            "https://www.ign.es/wmts/mapa-raster?"
+            "layer=MTN&style=default&tilematrixset=GoogleMapsCompatible"
+            "&Service=WMTS&Request=GetTile&Version=1.0.0&Format=image/jpeg"
+            "&TileMatrix={z}&TileCol={x}&TileRow={y}"
+        )
+
+        encuadres = []
+        for margen, nombre in [(500, "PLANO-IGN-V1.jpg"), (3000, "PLANO-IGN-V2.jpg")]:
+            # Calcular límites con margen
+            x_min, x_max = minx - margen, maxx + margen
+            y_min, y_max = miny - margen, maxy + margen
+            ancho, alto = x_max - x_min, y_max - y_min
+
+            # Ajustar para mantener proporción 4:3
+            if ancho / alto > 4/3:
+                alto_f = ancho * (3/4)
+                cy = (y_min + y_max) / 2
+                xlim, ylim = (x_min, x_max), (cy - alto_f/2, cy + alto_f/2)
+            else:
+                ancho_f = alto * (4/3)
+                cx_coord = (x_min + x_max) / 2
+                xlim, ylim = (cx_coord - ancho_f/2, cx_coord + ancho_f/2), (y_min, y_max)
+
+            encuadres.append((margen, nombre, EncuadreTeselas(xlim, ylim, ign_url, zoom=16)))
+        return encuadres
+
     def _generar_planos_ign(self, carpeta: Path) -> None:
         """
         Genera planos IGN con zoom fijo 16 y dos variantes de encuadre.
@@ -1486,71 +2463,60 @@ class OrquestadorPipeline:
         Args:
             carpeta: Carpeta donde guardar los planos
         """
-        ruta_kml = carpeta / "MAPA_MAESTRO_TOTAL.kml"
-        if not ruta_kml.exists():
-            print(f"⚠️  No se encontró {ruta_kml.name}")
-            return
+        contexto = self._contexto_plano(carpeta)
 
-        try:
-            # Cargar y proyectar a Web Mercator
-            gdf = gpd.read_file(str(ruta_kml), driver='KML')
-            if gdf.empty:
-                return
-            if gdf.crs is None:
-                gdf.crs = "EPSG:4326"
-            gdf_3857 = gdf.to_crs(epsg=3857)
+        # Parcelas en Web Mercator
+        gdf_3857 = contexto.gdf(3857)
+        
+        # Generar ambas variantes
+        for margen, nombre, encuadre in self._encuadres_ign(contexto):
+            fig, ax = _nueva_figura(figsize=(12, 9))
+            ax.set_xlim(*encuadre.xlim)
+            ax.set_ylim(*encuadre.ylim)
             
-            minx, miny, maxx, maxy = gdf_3857.total_bounds
+            # Añadir mapa IGN con zoom 16 fijo
+            self._anadir_mapa_base(ax, encuadre, zorder=1)
             
-            # URL del servicio WMTS del IGN
-            ign_url = (
-                "https://www.ign.es/wmts/mapa-raster?"
-                "layer=MTN&style=default&tilematrixset=GoogleMapsCompatible"
-                "&Service=WMTS&Request=GetTile&Version=1.0.0&Format=image/jpeg"
-                "&TileMatrix={z}&TileCol={x}&TileRow={y}"
-            )
+            # Dibujar parcelas en cian
+            gdf_3857.plot(ax=ax, facecolor='none', edgecolor='cyan', linewidth=2, zorder=2)
+            ax.set_axis_off()
             
-            # Generar ambas variantes
-            for margen, nombre in [(500, "PLANO-IGN-V1.jpg"), (3000, "PLANO-IGN-V2.jpg")]:
-                print(f"🗺️  Generando {nombre} (margen {margen}m, zoom 16)...", end=" ", flush=True)
-                
-                fig, ax = plt.subplots(figsize=(12, 9))
-                
-                # Calcular límites con margen
-                x_min, x_max = minx - margen, maxx + margen
-                y_min, y_max = miny - margen, maxy + margen
-                ancho, alto = x_max - x_min, y_max - y_min
-                
-                # Ajustar para mantener proporción 4:3
-                if ancho / alto > 4/3:
-                    alto_f = ancho * (3/4)
-                    cy = (y_min + y_max) / 2
-                    ax.set_ylim(cy - alto_f/2, cy + alto_f/2)
-                    ax.set_xlim(x_min, x_max)
-                else:
-                    ancho_f = alto * (4/3)
-                    cx_coord = (x_min + x_max) / 2
-                    ax.set_xlim(cx_coord - ancho_f/2, cx_coord + ancho_f/2)
-                    ax.set_ylim(y_min, y_max)
-                
-                # Añadir mapa IGN con zoom 16 fijo
-                cx.add_basemap(ax, source=ign_url, zorder=1, zoom=16)
-                
-                # Dibujar parcelas en cian
-                gdf_3857.plot(ax=ax, facecolor='none', edgecolor='cyan', linewidth=2, zorder=2)
-                ax.set_axis_off()
-                
-                ruta_final = carpeta / nombre
-                plt.savefig(ruta_final, dpi=150, bbox_inches='tight', pad_inches=0, pil_kwargs={'quality': 80})
-                plt.close()
-                print(f"✅")
-        except Exception as e:
-            print(f"❌ Error: {e}")
+            ruta_final = carpeta / nombre
+            fig.savefig(ruta_final, dpi=150, bbox_inches='tight', pad_inches=0, pil_kwargs={'quality': 80})
+            self.log(f"✅ {nombre} generado (margen {margen}m, zoom 16)")
 
     # ═══════════════════════════════════════════════════════════════════════
     # PASO 13: PLANOS PROVINCIALES (3 variantes)
     # ═══════════════════════════════════════════════════════════════════════
     
+    def _encuadres_provinciales(self, contexto: ContextoGeometrico) -> Dict[str, EncuadreTeselas]:
+        """
+        Encuadres de 100 km (4:3, zoom 10) de las 3 variantes provinciales.
+
+        Returns:
+            {nombre de la variante: encuadre}
+        """
+        minx, miny, maxx, maxy = contexto.limites(3857)
+        centro_x, centro_y = (minx + maxx) / 2, (miny + maxy) / 2
+
+        # Definir las 3 variantes de mapa base
+        variantes = {
+            "STREETS": "https://server.arcgisonline.com/ArcGIS/rest/services/World_Street_Map/MapServer/tile/{z}/{y}/{x}",
+            "TOPO": "https://server.arcgisonline.com/ArcGIS/rest/services/World_Topo_Map/MapServer/tile/{z}/{y}/{x}",
+            "OSM": cx.providers.OpenStreetMap.Mapnik
+        }
+
+        # Encuadre de 100km
+        ancho_vista = 100000  # metros
+        alto_vista = ancho_vista * (3/4)  # Mantener 4:3
+        xlim = (centro_x - ancho_vista/2, centro_x + ancho_vista/2)
+        ylim = (centro_y - alto_vista/2, centro_y + alto_vista/2)
+
+        return {
+            nombre: EncuadreTeselas(xlim, ylim, fuente, zoom=10)
+            for nombre, fuente in variantes.items()
+        }
+
     def _generar_planos_provinciales(self, carpeta: Path) -> None:
         """
         Genera planos de localización provincial con 3 estilos de mapa base.
@@ -1575,64 +2541,86 @@ class OrquestadorPipeline:
         Args:
             carpeta: Carpeta donde guardar los planos
         """
-        ruta_kml = carpeta / "MAPA_MAESTRO_TOTAL.kml"
-        if not ruta_kml.exists():
-            print(f"⚠️  No se encontró {ruta_kml.name}")
-            return
+        contexto = self._contexto_plano(carpeta)
 
-        try:
-            # Cargar y proyectar
-            gdf = gpd.read_file(str(ruta_kml), driver='KML')
-            if gdf.empty:
-                return
-            gdf_3857 = gdf.to_crs(epsg=3857)
-            minx, miny, maxx, maxy = gdf_3857.total_bounds
-            centro_x, centro_y = (minx + maxx) / 2, (miny + maxy) / 2
+        # Parcelas en Web Mercator
+        gdf_3857 = contexto.gdf(3857)
+        minx, miny, maxx, maxy = contexto.limites(3857)
+        centro_x, centro_y = (minx + maxx) / 2, (miny + maxy) / 2
+        
+        for nombre, encuadre in self._encuadres_provinciales(contexto).items():
+            fig, ax = _nueva_figura(figsize=(12, 9))
+            ax.set_xlim(*encuadre.xlim)
+            ax.set_ylim(*encuadre.ylim)
             
-            # Definir las 3 variantes de mapa base
-            variantes = {
-                "STREETS": "https://server.arcgisonline.com/ArcGIS/rest/services/World_Street_Map/MapServer/tile/{z}/{y}/{x}",
-                "TOPO": "https://server.arcgisonline.com/ArcGIS/rest/services/World_Topo_Map/MapServer/tile/{z}/{y}/{x}",
-                "OSM": cx.providers.OpenStreetMap.Mapnik
-            }
+            # Añadir mapa base con zoom 10
+            self._anadir_mapa_base(ax, encuadre, interpolation='lanczos', zorder=1)
             
-            for nombre, fuente in variantes.items():
-                print(f"🗺️  Generando PLANO-PROVINCIAL-V1-{nombre}.jpg...", end=" ", flush=True)
-                
-                fig, ax = plt.subplots(figsize=(12, 9))
-                
-                # Encuadre de 100km
-                ancho_vista = 100000  # metros
-                alto_vista = ancho_vista * (3/4)  # Mantener 4:3
-                
-                ax.set_xlim(centro_x - ancho_vista/2, centro_x + ancho_vista/2)
-                ax.set_ylim(centro_y - alto_vista/2, centro_y + alto_vista/2)
-                
-                # Añadir mapa base con zoom 10
-                cx.add_basemap(ax, source=fuente, zoom=10, interpolation='lanczos', zorder=1)
-                
-                # Dibujar parcelas en cian (relleno y borde)
-                gdf_3857.plot(ax=ax, color='cyan', edgecolor='cyan', linewidth=3, zorder=3)
-                
-                # Añadir chincheta roja en el centro
-                ax.plot(centro_x, centro_y, marker='v', color='red', markersize=20, 
-                        markeredgecolor='white', markeredgewidth=1.5, zorder=4)
-                
-                ax.set_axis_off()
-                
-                nombre_archivo = f"PLANO-PROVINCIAL-V1-{nombre}.jpg"
-                ruta_final = carpeta / nombre_archivo
-                plt.savefig(ruta_final, dpi=120, bbox_inches='tight', pad_inches=0, 
-                           pil_kwargs={'quality': 85, 'optimize': True, 'progressive': True})
-                plt.close()
-                print(f"✅")
-        except Exception as e:
-            print(f"❌ Error provincial: {e}")
+            # Dibujar parcelas en cian (relleno y borde)
+            gdf_3857.plot(ax=ax, color='cyan', edgecolor='cyan', linewidth=3, zorder=3)
+            
+            # Añadir chincheta roja en el centro
+            ax.plot(centro_x, centro_y, marker='v', color='red', markersize=20, 
+                    markeredgecolor='white', markeredgewidth=1.5, zorder=4)
+            
+            ax.set_axis_off()
+            
+            nombre_archivo = f"PLANO-PROVINCIAL-V1-{nombre}.jpg"
+            ruta_final = carpeta / nombre_archivo
+            fig.savefig(ruta_final, dpi=120, bbox_inches='tight', pad_inches=0, 
+                       pil_kwargs={'quality': 85, 'optimize': True, 'progressive': True})
+            self.log(f"✅ {nombre_archivo} generado")
 
     # ═══════════════════════════════════════════════════════════════════════
     # PASO 14: PLANOS HISTÓRICOS (MTN25, MTN50, CATASTRONES)
     # ═══════════════════════════════════════════════════════════════════════
     
+    def _peticiones_historicos(
+        self,
+        contexto: ContextoGeometrico
+    ) -> Tuple[List[float], Dict[str, PeticionWMS]]:
+        """
+        Encuadre de 5 km (EPSG:3857) y peticiones WMS de los planos históricos.
+
+        Returns:
+            (bbox [xmin, ymin, xmax, ymax], {nombre del plano: petición})
+        """
+        minx, miny, maxx, maxy = contexto.limites(3857)
+        cx, cy = (minx + maxx) / 2, (miny + maxy) / 2
+
+        # Encuadre de 5km
+        m = 5000
+        ex, ey = self._centro_encuadre(cx, cy, 2 * m)
+        bbox = [ex - m, ey - m * 0.75, ex + m, ey + m * 0.75]
+
+        # Definir las 3 capas históricas
+        capas = {
+            "MTN25": "MTN25",
+            "MTN50": "MTN50",
+            "CATASTRONES": "catastrones"
+        }
+
+        url_wms = "https://www.ign.es/wms/primera-edicion-mtn"
+
+        peticiones = {}
+        for nombre_file, id_capa in capas.items():
+            # Parámetros de la petición WMS
+            params = {
+                "SERVICE": "WMS",
+                "VERSION": "1.3.0",
+                "REQUEST": "GetMap",
+                "LAYERS": id_capa,
+                "STYLES": "",
+                "CRS": "EPSG:3857",
+                "BBOX": f"{bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]}",
+                "WIDTH": "1200",
+                "HEIGHT": "900",
+                "FORMAT": "image/jpeg",
+                "TRANSPARENT": "FALSE"
+            }
+            peticiones[nombre_file] = PeticionWMS(url_wms, params, timeout=30)
+        return bbox, peticiones
+
     def _generar_planos_historicos(self, carpeta: Path) -> None:
         """
         Genera planos con cartografía histórica del IGN.
@@ -1657,86 +2645,105 @@ class OrquestadorPipeline:
         Args:
             carpeta: Carpeta donde guardar los planos
         """
-        ruta_kml = carpeta / "MAPA_MAESTRO_TOTAL.kml"
-        if not ruta_kml.exists():
-            print(f"⚠️  No se encontró {ruta_kml.name}")
-            return
+        contexto = self._contexto_plano(carpeta)
 
-        try:
-            # Cargar y proyectar
-            gdf = gpd.read_file(str(ruta_kml), driver='KML')
-            if gdf.empty:
-                return
-            gdf_3857 = gdf.to_crs(epsg=3857)
-            minx, miny, maxx, maxy = gdf_3857.total_bounds
-            cx, cy = (minx + maxx) / 2, (miny + maxy) / 2
-            
-            # Encuadre de 5km
-            m = 5000
-            bbox = [cx - m, cy - m * 0.75, cx + m, cy + m * 0.75]
-            
-            # Definir las 3 capas históricas
-            capas = {
-                "MTN25": "MTN25",
-                "MTN50": "MTN50",
-                "CATASTRONES": "catastrones"
-            }
-            
-            url_wms = "https://www.ign.es/wms/primera-edicion-mtn"
-            
-            for nombre_file, id_capa in capas.items():
-                print(f"🛰️  Capturando {nombre_file}...", end=" ", flush=True)
+        # Parcelas en Web Mercator
+        gdf_3857 = contexto.gdf(3857)
+        minx, miny, maxx, maxy = contexto.limites(3857)
+        cx, cy = (minx + maxx) / 2, (miny + maxy) / 2
+        
+        # Las 3 capas se piden a la vez
+        bbox, peticiones = self._peticiones_historicos(contexto)
+        imagenes = self._descargar_imagenes_wms(peticiones)
+        
+        # Un plano que falla no impide generar los demás
+        fallidos = []
+        for nombre_file, img in imagenes.items():
+            nombre_archivo = f"PLANO-{nombre_file}.jpg"
+            if img is None:
+                self.log(f"❌ {nombre_archivo}: error del servidor")
+                fallidos.append(nombre_archivo)
+                continue
+            try:
+                fig, ax = _nueva_figura(figsize=(12, 9))
+                ax.imshow(img, extent=[bbox[0], bbox[2], bbox[1], bbox[3]], interpolation='lanczos')
                 
-                # Parámetros de la petición WMS
-                params = {
-                    "SERVICE": "WMS",
-                    "VERSION": "1.3.0",
-                    "REQUEST": "GetMap",
-                    "LAYERS": id_capa,
-                    "STYLES": "",
-                    "CRS": "EPSG:3857",
-                    "BBOX": f"{bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]}",
-                    "WIDTH": "1200",
-                    "HEIGHT": "900",
-                    "FORMAT": "image/jpeg",
-                    "TRANSPARENT": "FALSE"
-                }
+                # Dibujar parcelas en cian
+                gdf_3857.plot(ax=ax, facecolor='none', edgecolor='cyan', linewidth=1.5, zorder=10)
                 
-                try:
-                    response = self.session.get(url_wms, params=params, timeout=30)
-                    if response.status_code == 200 and 'image' in response.headers.get('Content-Type', ''):
-                        img = Image.open(BytesIO(response.content))
-                        
-                        fig, ax = plt.subplots(figsize=(12, 9))
-                        ax.imshow(img, extent=[bbox[0], bbox[2], bbox[1], bbox[3]], interpolation='lanczos')
-                        
-                        # Dibujar parcelas en cian
-                        gdf_3857.plot(ax=ax, facecolor='none', edgecolor='cyan', linewidth=1.5, zorder=10)
-                        
-                        # Añadir chincheta roja semi-transparente
-                        ax.plot(cx, cy, marker='v', color='red', markersize=18, 
-                                markeredgecolor='white', markeredgewidth=1.5, alpha=0.5, zorder=11)
-                        
-                        ax.set_xlim(bbox[0], bbox[2])
-                        ax.set_ylim(bbox[1], bbox[3])
-                        ax.set_axis_off()
-                        
-                        nombre_archivo = f"PLANO-{nombre_file}.jpg"
-                        ruta_final = carpeta / nombre_archivo
-                        plt.savefig(ruta_final, dpi=150, bbox_inches='tight', pad_inches=0, pil_kwargs={'quality': 90})
-                        plt.close()
-                        print(f"✅")
-                    else:
-                        print(f"❌ Error del servidor")
-                except Exception as e:
-                    print(f"❌ Error: {e}")
-        except Exception as e:
-            print(f"❌ Error crítico: {e}")
+                # Añadir chincheta roja semi-transparente
+                ax.plot(cx, cy, marker='v', color='red', markersize=18, 
+                        markeredgecolor='white', markeredgewidth=1.5, alpha=0.5, zorder=11)
+                
+                ax.set_xlim(bbox[0], bbox[2])
+                ax.set_ylim(bbox[1], bbox[3])
+                ax.set_axis_off()
+                
+                ruta_final = carpeta / nombre_archivo
+                fig.savefig(ruta_final, dpi=150, bbox_inches='tight', pad_inches=0, pil_kwargs={'quality': 90})
+                self.log(f"✅ {nombre_archivo} generado")
+            except Exception as e:
+                self.log(f"❌ {nombre_archivo}: {e}")
+                fallidos.append(nombre_archivo)
+        
+        if fallidos:
+            raise RuntimeError(f"No se generaron: {', '.join(fallidos)}")
 
     # ═══════════════════════════════════════════════════════════════════════
     # PASO 16: PLANO DE PENDIENTES CON LEYENDA
     # ═══════════════════════════════════════════════════════════════════════
     
+    def _peticiones_pendientes(
+        self,
+        contexto: ContextoGeometrico
+    ) -> Tuple[List[float], Dict[str, PeticionWMS]]:
+        """
+        Encuadre de 500 m (EPSG:3857) y peticiones WMS del plano de pendientes.
+
+        Returns:
+            (bbox [xmin, ymin, xmax, ymax], {"mapa": petición, "leyenda": petición})
+        """
+        minx, miny, maxx, maxy = contexto.limites(3857)
+        cx, cy = (minx + maxx) / 2, (miny + maxy) / 2
+
+        # Encuadre cercano de 500m
+        m = 500
+        ex, ey = self._centro_encuadre(cx, cy, 2 * m)
+        bbox = [ex - m, ey - m * 0.75, ex + m, ey + m * 0.75]
+
+        url_wms = "https://wms-pendientes.idee.es/pendientes"
+
+        # Parámetros para el mapa de pendientes
+        params_mapa = {
+            "SERVICE": "WMS",
+            "VERSION": "1.1.1",
+            "REQUEST": "GetMap",
+            "LAYERS": "MDP05",
+            "STYLES": "",
+            "SRS": "EPSG:3857",
+            "BBOX": f"{bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]}",
+            "WIDTH": "1500",
+            "HEIGHT": "1125",
+            "FORMAT": "image/png",
+            "TRANSPARENT": "FALSE"
+        }
+
+        # Parámetros para la leyenda
+        params_leyenda = {
+            "SERVICE": "WMS",
+            "VERSION": "1.1.1",
+            "REQUEST": "GetLegendGraphic",
+            "LAYER": "MDP05",
+            "FORMAT": "image/png",
+            "WIDTH": "200",
+            "HEIGHT": "400"
+        }
+
+        return bbox, {
+            "mapa": PeticionWMS(url_wms, params_mapa, timeout=45),
+            "leyenda": PeticionWMS(url_wms, params_leyenda, timeout=45),
+        }
+
     def _generar_plano_pendientes(self, carpeta: Path) -> None:
         """
         Genera plano de pendientes del terreno con leyenda superpuesta.
@@ -1755,97 +2762,117 @@ class OrquestadorPipeline:
         Args:
             carpeta: Carpeta donde guardar el plano
         """
-        ruta_kml = carpeta / "MAPA_MAESTRO_TOTAL.kml"
-        if not ruta_kml.exists():
-            print(f"⚠️  No se encontró {ruta_kml.name}")
-            return
+        contexto = self._contexto_plano(carpeta)
 
-        try:
-            # Cargar y proyectar
-            gdf = gpd.read_file(str(ruta_kml), driver='KML')
-            if gdf.empty:
-                return
-            gdf_3857 = gdf.to_crs(epsg=3857)
-            minx, miny, maxx, maxy = gdf_3857.total_bounds
-            cx, cy = (minx + maxx) / 2, (miny + maxy) / 2
-            
-            # Encuadre cercano de 500m
-            m = 500
-            bbox = [cx - m, cy - m * 0.75, cx + m, cy + m * 0.75]
-            
-            url_wms = "https://wms-pendientes.idee.es/pendientes"
-            
-            # Parámetros para el mapa de pendientes
-            params_mapa = {
-                "SERVICE": "WMS",
-                "VERSION": "1.1.1",
-                "REQUEST": "GetMap",
-                "LAYERS": "MDP05",
-                "STYLES": "",
-                "SRS": "EPSG:3857",
-                "BBOX": f"{bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]}",
-                "WIDTH": "1500",
-                "HEIGHT": "1125",
-                "FORMAT": "image/png",
-                "TRANSPARENT": "FALSE"
-            }
-            
-            # Parámetros para la leyenda
-            params_leyenda = {
-                "SERVICE": "WMS",
-                "VERSION": "1.1.1",
-                "REQUEST": "GetLegendGraphic",
-                "LAYER": "MDP05",
-                "FORMAT": "image/png",
-                "WIDTH": "200",
-                "HEIGHT": "400"
-            }
-            
-            print(f"🛰️  Capturando Pendientes y Leyenda...", end=" ", flush=True)
-            
-            response_mapa = self.session.get(url_wms, params=params_mapa, timeout=45)
-            response_leyenda = self.session.get(url_wms, params=params_leyenda, timeout=45)
-            
-            if response_mapa.status_code == 200 and 'image' in response_mapa.headers.get('Content-Type', ''):
-                img_mapa = Image.open(BytesIO(response_mapa.content))
-                img_leyenda = None
-                
-                if response_leyenda.status_code == 200 and 'image' in response_leyenda.headers.get('Content-Type', ''):
-                    img_leyenda = Image.open(BytesIO(response_leyenda.content))
-                
-                fig, ax = plt.subplots(figsize=(12, 9))
-                ax.imshow(img_mapa, extent=[bbox[0], bbox[2], bbox[1], bbox[3]], interpolation='lanczos')
-                
-                # Dibujar parcelas en azul
-                gdf_3857.plot(ax=ax, facecolor='none', edgecolor='#0000FF', linewidth=1.5, zorder=10)
-                
-                # Chincheta roja con transparencia
-                ax.plot(cx, cy, marker='v', color='#CC0000', markersize=22, 
-                        markeredgecolor='white', markeredgewidth=2.5, alpha=0.7, zorder=11)
-                
-                # Añadir leyenda si se descargó correctamente
-                if img_leyenda:
-                    ax_leg = fig.add_axes([0.75, 0.15, 0.15, 0.3])
-                    ax_leg.imshow(img_leyenda)
-                    ax_leg.axis('off')
-                    ax_leg.patch.set_facecolor('white')
-                    ax_leg.patch.set_alpha(0.8)
-                
-                ax.set_xlim(bbox[0], bbox[2])
-                ax.set_ylim(bbox[1], bbox[3])
-                ax.set_axis_off()
-                
-                ruta_final = carpeta / "PLANO-PENDIENTES-LEYENDA.jpg"
-                plt.savefig(ruta_final, dpi=150, bbox_inches='tight', pad_inches=0)
-                plt.close()
-                print(f"✅")
-        except Exception as e:
-            print(f"❌ Error: {e}")
+        # Parcelas en Web Mercator
+        gdf_3857 = contexto.gdf(3857)
+        minx, miny, maxx, maxy = contexto.limites(3857)
+        cx, cy = (minx + maxx) / 2, (miny + maxy) / 2
+        bbox, peticiones = self._peticiones_pendientes(contexto)
+        
+        imagenes = self._descargar_imagenes_wms(peticiones)
+        img_mapa, img_leyenda = imagenes["mapa"], imagenes["leyenda"]
+        if img_mapa is None:
+            raise RuntimeError("El servidor WMS de pendientes no ha devuelto el mapa")
+        
+        fig, ax = _nueva_figura(figsize=(12, 9))
+        ax.imshow(img_mapa, extent=[bbox[0], bbox[2], bbox[1], bbox[3]], interpolation='lanczos')
+        
+        # Dibujar parcelas en azul
+        gdf_3857.plot(ax=ax, facecolor='none', edgecolor='#0000FF', linewidth=1.5, zorder=10)
+        
+        # Chincheta roja con transparencia
+        ax.plot(cx, cy, marker='v', color='#CC0000', markersize=22, 
+                markeredgecolor='white', markeredgewidth=2.5, alpha=0.7, zorder=11)
+        
+        # Añadir leyenda si se descargó correctamente
+        if img_leyenda:
+            ax_leg = fig.add_axes([0.75, 0.15, 0.15, 0.3])
+            ax_leg.imshow(img_leyenda)
+            ax_leg.axis('off')
+            ax_leg.patch.set_facecolor('white')
+            ax_leg.patch.set_alpha(0.8)
+        else:
+            self.log("⚠️  Leyenda de pendientes no disponible")
+        
+        ax.set_xlim(bbox[0], bbox[2])
+        ax.set_ylim(bbox[1], bbox[3])
+        ax.set_axis_off()
+        
+        ruta_final = carpeta / "PLANO-PENDIENTES-LEYENDA.jpg"
+        fig.savefig(ruta_final, dpi=150, bbox_inches='tight', pad_inches=0)
+        self.log(f"✅ PLANO-PENDIENTES-LEYENDA.jpg generado")
 
     # ═══════════════════════════════════════════════════════════════════════
     # PASO 17: PLANO RED NATURA 2000
     # ═══════════════════════════════════════════════════════════════════════
     
+    def _peticiones_natura2000(
+        self,
+        contexto: ContextoGeometrico
+    ) -> Tuple[List[float], Dict[str, PeticionWMS]]:
+        """
+        Encuadre de 5 km (EPSG:3857) y peticiones WMS del plano Natura 2000.
+
+        Returns:
+            (bbox [xmin, ymin, xmax, ymax], {"base", "natura", "leyenda": petición})
+        """
+        minx, miny, maxx, maxy = contexto.limites(3857)
+        cx, cy = (minx + maxx) / 2, (miny + maxy) / 2
+
+        # Encuadre de 5km
+        m = 5000
+        ex, ey = self._centro_encuadre(cx, cy, 2 * m)
+        bbox = [ex - m, ey - m * 0.75, ex + m, ey + m * 0.75]
+
+        url_pnoa = "https://www.ign.es/wms-inspire/pnoa-ma"
+        url_natura = "https://wms.mapama.gob.es/sig/Biodiversidad/RedNatura/wms.aspx"
+        capa_natura = "PS.ProtectedSite"
+
+        # Parámetros para la ortofoto base
+        params_base = {
+            "SERVICE": "WMS",
+            "VERSION": "1.1.1",
+            "REQUEST": "GetMap",
+            "LAYERS": "OI.OrthoimageCoverage",
+            "STYLES": "",
+            "SRS": "EPSG:3857",
+            "BBOX": f"{bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]}",
+            "WIDTH": "1500",
+            "HEIGHT": "1125",
+            "FORMAT": "image/jpeg"
+        }
+
+        # Parámetros para la capa de Red Natura
+        params_natura = {
+            "SERVICE": "WMS",
+            "VERSION": "1.1.1",
+            "REQUEST": "GetMap",
+            "LAYERS": capa_natura,
+            "STYLES": "",
+            "SRS": "EPSG:3857",
+            "BBOX": f"{bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]}",
+            "WIDTH": "1500",
+            "HEIGHT": "1125",
+            "FORMAT": "image/png",
+            "TRANSPARENT": "TRUE"
+        }
+
+        # Parámetros para la leyenda
+        params_leyenda = {
+            "SERVICE": "WMS",
+            "VERSION": "1.1.1",
+            "REQUEST": "GetLegendGraphic",
+            "LAYER": capa_natura,
+            "FORMAT": "image/png"
+        }
+
+        return bbox, {
+            "base": PeticionWMS(url_pnoa, params_base, timeout=45),
+            "natura": PeticionWMS(url_natura, params_natura, timeout=45),
+            "leyenda": PeticionWMS(url_natura, params_leyenda, timeout=45),
+        }
+
     def _generar_plano_natura2000(self, carpeta: Path) -> None:
         """
         Genera plano de Red Natura 2000 sobre ortofoto PNOA con leyenda.
@@ -1866,295 +2893,387 @@ class OrquestadorPipeline:
         Args:
             carpeta: Carpeta donde guardar el plano
         """
-        ruta_kml = carpeta / "MAPA_MAESTRO_TOTAL.kml"
-        if not ruta_kml.exists():
-            print(f"⚠️  No se encontró {ruta_kml.name}")
-            return
+        contexto = self._contexto_plano(carpeta)
 
-        try:
-            # Cargar y proyectar
-            gdf = gpd.read_file(str(ruta_kml), driver='KML')
-            if gdf.empty:
-                return
-            gdf_3857 = gdf.to_crs(epsg=3857)
-            minx, miny, maxx, maxy = gdf_3857.total_bounds
-            cx, cy = (minx + maxx) / 2, (miny + maxy) / 2
-            
-            # Encuadre de 5km
-            m = 5000
-            bbox = [cx - m, cy - m * 0.75, cx + m, cy + m * 0.75]
-            
-            url_pnoa = "https://www.ign.es/wms-inspire/pnoa-ma"
-            url_natura = "https://wms.mapama.gob.es/sig/Biodiversidad/RedNatura/wms.aspx"
-            capa_natura = "PS.ProtectedSite"
-            
-            # Parámetros para la ortofoto base
-            params_base = {
-                "SERVICE": "WMS",
-                "VERSION": "1.1.1",
-                "REQUEST": "GetMap",
-                "LAYERS": "OI.OrthoimageCoverage",
-                "STYLES": "",
-                "SRS": "EPSG:3857",
-                "BBOX": f"{bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]}",
-                "WIDTH": "1500",
-                "HEIGHT": "1125",
-                "FORMAT": "image/jpeg"
-            }
-            
-            # Parámetros para la capa de Red Natura
-            params_natura = {
-                "SERVICE": "WMS",
-                "VERSION": "1.1.1",
-                "REQUEST": "GetMap",
-                "LAYERS": capa_natura,
-                "STYLES": "",
-                "SRS": "EPSG:3857",
-                "BBOX": f"{bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]}",
-                "WIDTH": "1500",
-                "HEIGHT": "1125",
-                "FORMAT": "image/png",
-                "TRANSPARENT": "TRUE"
-            }
-            
-            # Parámetros para la leyenda
-            params_leyenda = {
-                "SERVICE": "WMS",
-                "VERSION": "1.1.1",
-                "REQUEST": "GetLegendGraphic",
-                "LAYER": capa_natura,
-                "FORMAT": "image/png"
-            }
-            
-            print(f"🛰️  Generando Plano Natura 2000...", end=" ", flush=True)
-            
-            response_base = self.session.get(url_pnoa, params=params_base, timeout=45)
-            response_natura = self.session.get(url_natura, params=params_natura, timeout=45)
-            response_leyenda = self.session.get(url_natura, params=params_leyenda, timeout=45)
-            
-            if (response_base.status_code == 200 and response_natura.status_code == 200 and
-                'image' in response_base.headers.get('Content-Type', '') and
-                'image' in response_natura.headers.get('Content-Type', '')):
-                
-                img_base = Image.open(BytesIO(response_base.content))
-                img_natura = Image.open(BytesIO(response_natura.content))
-                img_leyenda = None
-                
-                if response_leyenda.status_code == 200 and 'image' in response_leyenda.headers.get('Content-Type', ''):
-                    img_leyenda = Image.open(BytesIO(response_leyenda.content))
-                
-                # Crear figura sin márgenes
-                fig = plt.figure(figsize=(12, 9))
-                ax = fig.add_axes([0, 0, 1, 1])
-                
-                # Capa base: ortofoto PNOA
-                ax.imshow(img_base, extent=[bbox[0], bbox[2], bbox[1], bbox[3]])
-                
-                # Capa de Red Natura 2000 con transparencia 70%
-                ax.imshow(img_natura, extent=[bbox[0], bbox[2], bbox[1], bbox[3]], alpha=0.7)
-                
-                # Dibujar parcelas en azul
-                gdf_3857.plot(ax=ax, facecolor='none', edgecolor='#0000FF', linewidth=1.5, zorder=10)
-                
-                # Chincheta roja con alta opacidad
-                ax.plot(cx, cy, marker='v', color='#CC0000', markersize=22,
-                        markeredgecolor='white', markeredgewidth=2.5, alpha=0.9, zorder=11)
-                
-                # Añadir leyenda reducida en esquina inferior izquierda
-                if img_leyenda:
-                    ax_leg = fig.add_axes([0.01, 0.01, 0.10, 0.12])
-                    ax_leg.imshow(img_leyenda, aspect='equal')
-                    ax_leg.axis('off')
-                
-                ax.set_xlim(bbox[0], bbox[2])
-                ax.set_ylim(bbox[1], bbox[3])
-                ax.set_axis_off()
-                
-                ruta_final = carpeta / "PLANO-NATURA-2000.jpg"
-                plt.savefig(ruta_final, dpi=150, bbox_inches=None, pad_inches=0, pil_kwargs={'quality': 95})
-                plt.close()
-                print(f"✅")
-        except Exception as e:
-            print(f"❌ Error: {e}")
+        # Parcelas en Web Mercator
+        gdf_3857 = contexto.gdf(3857)
+        minx, miny, maxx, maxy = contexto.limites(3857)
+        cx, cy = (minx + maxx) / 2, (miny + maxy) / 2
+        
+        bbox, peticiones = self._peticiones_natura2000(contexto)
+        
+        # Ortofoto, capa y leyenda se piden a la vez
+        imagenes = self._descargar_imagenes_wms(peticiones)
+        img_base, img_natura, img_leyenda = imagenes["base"], imagenes["natura"], imagenes["leyenda"]
+        if img_base is None or img_natura is None:
+            raise RuntimeError("Los servidores WMS no han devuelto la ortofoto o la capa Natura 2000")
+        
+        # Crear figura sin márgenes
+        fig = Figure(figsize=(12, 9))
+        ax = fig.add_axes([0, 0, 1, 1])
+        
+        # Capa base: ortofoto PNOA
+        ax.imshow(img_base, extent=[bbox[0], bbox[2], bbox[1], bbox[3]])
+        
+        # Capa de Red Natura 2000 con transparencia 70%
+        ax.imshow(img_natura, extent=[bbox[0], bbox[2], bbox[1], bbox[3]], alpha=0.7)
+        
+        # Dibujar parcelas en azul
+        gdf_3857.plot(ax=ax, facecolor='none', edgecolor='#0000FF', linewidth=1.5, zorder=10)
+        
+        # Chincheta roja con alta opacidad
+        ax.plot(cx, cy, marker='v', color='#CC0000', markersize=22,
+                markeredgecolor='white', markeredgewidth=2.5, alpha=0.9, zorder=11)
+        
+        # Añadir leyenda reducida en esquina inferior izquierda
+        if img_leyenda:
+            ax_leg = fig.add_axes([0.01, 0.01, 0.10, 0.12])
+            ax_leg.imshow(img_leyenda, aspect='equal')
+            ax_leg.axis('off')
+        else:
+            self.log("⚠️  Leyenda de Natura 2000 no disponible")
+        
+        ax.set_xlim(bbox[0], bbox[2])
+        ax.set_ylim(bbox[1], bbox[3])
+        ax.set_axis_off()
+        
+        ruta_final = carpeta / "PLANO-NATURA-2000.jpg"
+        fig.savefig(ruta_final, dpi=150, bbox_inches=None, pad_inches=0, pil_kwargs={'quality': 95})
+        self.log(f"✅ PLANO-NATURA-2000.jpg generado")
 
     # ═══════════════════════════════════════════════════════════════════════
     # PASO 18: PLANO MONTES PÚBLICOS (CMUP) 🆕
     # ═══════════════════════════════════════════════════════════════════════
 
-    def _descargar_imagen_wms(self, url: str, params: dict) -> Optional[Image.Image]:
+    def _centro_encuadre(self, cx: float, cy: float, lado: float) -> Tuple[float, float]:
         """
-        Descarga una imagen desde un servicio WMS.
+        Centro del encuadre de un plano WMS, ajustado a la rejilla configurada.
+
+        Con config.wms_rejilla > 0 el centro se redondea a una rejilla de paso
+        wms_rejilla × lado, de modo que trabajos con parcelas a pocos metros
+        piden el mismo BBOX y comparten la respuesta de la caché WMS. Las
+        parcelas y la chincheta se siguen dibujando en su posición real.
+
+        Args:
+            cx, cy: Centro exacto de las parcelas
+            lado: Anchura del encuadre (unidades del CRS)
+        """
+        paso = self.config.wms_rejilla * lado
+        if paso <= 0:
+            return cx, cy
+        return round(cx / paso) * paso, round(cy / paso) * paso
+
+    def _descargar_imagen_wms(
+        self,
+        url: str,
+        params: Optional[dict] = None,
+        timeout: float = 60
+    ) -> Optional[Image.Image]:
+        """
+        Descarga una imagen desde un servicio WMS (GetMap o GetLegendGraphic).
+        
+        Las respuestas válidas se guardan en la caché WMS compartida entre
+        trabajos, con una clave de parámetros normalizados (ver _clave_wms);
+        las leyendas, con una caducidad mucho mayor que los mapas. Consulta
+        y descarga se hacen en la sección exclusiva de la clave, de modo que
+        varios planos o trabajos que piden a la vez el mismo mapa (p. ej. el
+        PNOA de los planos Natura 2000 y montes) lo descargan una sola vez.
         
         Args:
-            url: URL del servicio WMS
+            url: URL del servicio WMS (puede incluir ya la consulta)
             params: Parámetros de la petición
+            timeout: Tiempo máximo de la petición en segundos
             
         Returns:
             Imagen PIL o None si hay error
         """
+        espacio, clave = _clave_wms(url, params)
+        if self.cache_wms is None:
+            return self._pedir_imagen_wms(url, params, timeout, espacio, clave)
+
+        with self.cache_wms.exclusivo(espacio, clave):
+            datos = self.cache_wms.leer_bytes(espacio, clave)
+            if datos is not None:
+                try:
+                    return Image.open(BytesIO(datos))
+                except OSError:
+                    pass  # entrada corrupta: se vuelve a descargar
+            return self._pedir_imagen_wms(url, params, timeout, espacio, clave)
+
+    def _descargar_imagenes_wms(
+        self,
+        peticiones: Dict[str, PeticionWMS]
+    ) -> Dict[str, Optional[Image.Image]]:
+        """
+        Descarga a la vez las imágenes WMS de un plano (ver _descargar_imagen_wms).
+
+        Args:
+            peticiones: {nombre: petición}
+
+        Returns:
+            {nombre: imagen PIL o None si hay error}
+        """
+        with ThreadPoolExecutor(max_workers=max(1, len(peticiones))) as pool:
+            futuros = {
+                nombre: pool.submit(self._descargar_imagen_wms, p.url, p.params, p.timeout)
+                for nombre, p in peticiones.items()
+            }
+        return {nombre: futuro.result() for nombre, futuro in futuros.items()}
+
+    def _pedir_imagen_wms(
+        self,
+        url: str,
+        params: Optional[dict],
+        timeout: float,
+        espacio: str,
+        clave: str
+    ) -> Optional[Image.Image]:
+        """Pide una imagen WMS al servicio y, si es válida, la guarda en la caché WMS."""
         try:
-            response = self.session.get(url, params=params, timeout=60)
+            response = self.cliente.get(url, params=params, timeout=timeout)
             if response.status_code == 200 and 'image' in response.headers.get('Content-Type', ''):
-                return Image.open(BytesIO(response.content))
+                imagen = Image.open(BytesIO(response.content))
+                if self.cache_wms is not None:
+                    horas = (
+                        self.config.ttl_leyendas_wms_horas if espacio == ESPACIO_LEYENDAS_WMS
+                        else self.config.ttl_wms_horas
+                    )
+                    self.cache_wms.guardar_bytes(espacio, clave, response.content, ttl_segundos=horas * 3600)
+                return imagen
         except Exception as e:
-            print(f"Error WMS: {e}", end=" ")
+            self.log(f"   ⚠️  Error WMS ({urlsplit(url).hostname}): {e}")
         return None
 
-    def _descargar_cmup_wfs(self) -> Optional[gpd.GeoDataFrame]:
+    def _montes_publicos(
+        self,
+        contexto: ContextoGeometrico,
+        bbox: List[float]
+    ) -> gpd.GeoDataFrame:
         """
-        Descarga los polígonos del Catálogo de Montes de Utilidad Pública vía WFS.
-        
+        Polígonos del CMUP de la zona del trabajo.
+
+        Con espejo local (config.cmup_espejo) se leen de él, por índice
+        espacial, las entidades del encuadre del plano; si no (o si falla la
+        lectura del espejo), se piden al WFS.
+
+        Args:
+            contexto: Contexto geométrico del trabajo
+            bbox: Encuadre del plano [xmin, ymin, xmax, ymax] en EPSG:3857
+
         Returns:
-            GeoDataFrame con los polígonos CMUP o None si hay error
+            GeoDataFrame con los polígonos CMUP (vacío si no hay montes)
+
+        Raises:
+            requests.RequestException, DescargaInvalidaError: Si falla el WFS
         """
-        url_wfs = "https://wms.mapama.gob.es/sig/Biodiversidad/IEPF_CMUP"
-        capa_wfs = "IEPF_CMUP:CMUP_Poligono"
-        
+        capa = self._capa_espejo_cmup()
+        if capa is None:
+            return self._descargar_cmup_wfs(bbox)
         try:
-            url = (
-                f"{url_wfs}?SERVICE=WFS&VERSION=2.0.0&REQUEST=GetFeature&"
-                f"TYPENAME={capa_wfs}&SRSNAME=EPSG:4326"
-            )
-            
-            print("Descargando CMUP vía WFS...", end=" ", flush=True)
-            
-            response = self.session.get(url, timeout=60)
-            response.raise_for_status()
-            
-            # Guardar GML temporal
-            tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".gml")
-            tmp.write(response.content)
-            tmp.close()
-            
-            # Leer con GeoPandas
-            gdf = gpd.read_file(tmp.name, driver="GML")
-            
-            # Limpiar archivo temporal
-            Path(tmp.name).unlink()
-            
-            print(f"{len(gdf)} polígonos descargados...", end=" ", flush=True)
-            return gdf
-            
+            # Mismo encuadre que la consulta WFS: ampliar la zona hasta el BBOX
+            minx, miny, maxx, maxy = contexto.limites(3857)
+            margen = max(minx - bbox[0], miny - bbox[1], bbox[2] - maxx, bbox[3] - maxy, 0)
+            gdf = self._leer_capa_en_zona(capa, contexto, epsg=3857, margen=margen, columnas=[])
+            return gdf.cx[bbox[0]:bbox[2], bbox[1]:bbox[3]].reset_index(drop=True)
         except Exception as e:
-            print(f"Error WFS: {e}", end=" ")
+            self.log(f"   ⚠️  Error en el espejo CMUP ({e}), usando WFS")
+            return self._descargar_cmup_wfs(bbox)
+
+    def _capa_espejo_cmup(self) -> Optional[EntradaCapa]:
+        """Entrada del catálogo del espejo local del CMUP, o None si no hay espejo."""
+        if not self.config.cmup_espejo:
+            return None
+        relativa = Path(self.config.cmup_espejo).as_posix()
+        if not (self.fuentes / relativa).exists():
             return None
+        capa = self.catalogo.buscar(relativa)
+        if capa is None:
+            self.catalogo.actualizar()
+            capa = self.catalogo.buscar(relativa)
+        return capa
+
+    def _descargar_cmup_wfs(self, bbox: List[float]) -> gpd.GeoDataFrame:
+        """
+        Descarga vía WFS los polígonos del Catálogo de Montes de Utilidad Pública de un encuadre.
+        
+        Se pide solo el BBOX del encuadre, por páginas de config.cmup_pagina
+        entidades, y cada página queda en la caché WMS (ver _gml_wfs).
+        
+        Args:
+            bbox: Encuadre [xmin, ymin, xmax, ymax] en EPSG:3857
+            
+        Returns:
+            GeoDataFrame con los polígonos CMUP (vacío si no hay montes)
+
+        Raises:
+            requests.RequestException, DescargaInvalidaError: Si falla el WFS
+        """
+        return cmup.descargar_paginas(self._gml_wfs, bbox, self.config.cmup_pagina)
+
+    def _gml_wfs(self, url: str, destino: Path) -> None:
+        """
+        Coloca en `destino` una respuesta WFS (GML), desde la caché WMS o descargándola.
+
+        La respuesta se guarda en la caché WMS (espacio ESPACIO_WFS, con la
+        caducidad de los mapas) para que la precarga, el plano y los trabajos
+        siguientes con el mismo encuadre no la descarguen de nuevo.
+
+        Raises:
+            requests.RequestException, DescargaInvalidaError: Si falla la descarga
+        """
+        def descargar() -> None:
+            # Volcar el GML por bloques, sin pasar por memoria
+            self.cliente.descargar(
+                url, destino, timeout=60,
+                tipos_contenido=("xml", "gml"),
+                tamano_maximo=self.config.descarga_max_mb * 1024 * 1024,
+            )
+
+        if self.cache_wms is None:
+            descargar()
+            return
+        with self.cache_wms.exclusivo(ESPACIO_WFS, url):
+            if self.cache_wms.materializar(ESPACIO_WFS, url, destino):
+                return
+            descargar()
+            self.cache_wms.guardar_archivo(
+                ESPACIO_WFS, url, destino, ttl_segundos=self.config.ttl_wms_horas * 3600
+            )
+
+    def _peticiones_montes_publicos(
+        self,
+        contexto: ContextoGeometrico
+    ) -> Tuple[List[float], Dict[str, PeticionWMS]]:
+        """
+        Encuadre de 5 km (EPSG:3857) y peticiones WMS del plano de montes públicos.
+
+        Returns:
+            (bbox [xmin, ymin, xmax, ymax], {"base": ortofoto, "leyenda": leyenda CMUP})
+        """
+        minx, miny, maxx, maxy = contexto.limites(3857)
+        cx, cy = (minx + maxx) / 2, (miny + maxy) / 2
+
+        margin = 5000
+        ex, ey = self._centro_encuadre(cx, cy, 2 * margin)
+        bbox = [ex - margin, ey - margin * 0.75, ex + margin, ey + margin * 0.75]
+
+        # Ortofoto PNOA
+        url_pnoa = "https://www.ign.es/wms-inspire/pnoa-ma"
+        params_base = {
+            "SERVICE": "WMS",
+            "VERSION": "1.1.1",
+            "REQUEST": "GetMap",
+            "LAYERS": "OI.OrthoimageCoverage",
+            "STYLES": "",
+            "SRS": "EPSG:3857",
+            "BBOX": f"{bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]}",
+            "WIDTH": "1500",
+            "HEIGHT": "1125",
+            "FORMAT": "image/jpeg"
+        }
+
+        # Leyenda del WMS de CMUP
+        url_wms = "https://wms.mapama.gob.es/sig/Biodiversidad/IEPF_CMUP"
+        capa_wms = "AM.ForestManagementArea"
+
+        params_leyenda = {
+            "SERVICE": "WMS",
+            "VERSION": "1.1.1",
+            "REQUEST": "GetLegendGraphic",
+            "LAYER": capa_wms,
+            "FORMAT": "image/png"
+        }
+        return bbox, {
+            "base": PeticionWMS(url_pnoa, params_base),
+            "leyenda": PeticionWMS(url_wms, params_leyenda),
+        }
 
     def _generar_plano_montes_publicos(self, carpeta: Path) -> None:
         """
         Genera plano de Montes de Utilidad Pública (CMUP/IEPF).
         
-        Descarga los polígonos oficiales vía WFS del MITECO y los superpone
-        sobre ortofoto PNOA con la leyenda oficial.
+        Obtiene los polígonos oficiales de la zona (del espejo local o vía
+        WFS del MITECO, solo el encuadre del plano) y los superpone sobre
+        ortofoto PNOA con la leyenda oficial.
         
         Args:
             carpeta: Carpeta con KML y donde guardar el plano
         """
-        print(f"🌲 Generando Plano Montes Públicos (CMUP)...", end=" ", flush=True)
-        
-        kml = carpeta / "MAPA_MAESTRO_TOTAL.kml"
+        contexto = self._contexto_plano(carpeta)
+
+        # 1) Parcelas del trabajo en Web Mercator
+        gdf_kml_3857 = contexto.gdf(3857)
+        minx, miny, maxx, maxy = contexto.limites(3857)
+        cx, cy = (minx + maxx) / 2, (miny + maxy) / 2
+        bbox, peticiones = self._peticiones_montes_publicos(contexto)
         
-        if not kml.exists():
-            print("⚠️ KML no encontrado")
+        # 2) Polígonos CMUP de la zona (espejo local o WFS por BBOX)
+        gdf_cmup = self._montes_publicos(contexto, bbox)
+        if gdf_cmup.empty:
+            self.log("⚠️  Sin montes públicos (CMUP) en la zona: no se genera el plano")
             return
+        self.log(f"   🌲 {len(gdf_cmup)} montes públicos en el encuadre")
         
-        try:
-            # 1) Leer KML de las parcelas
-            gdf_kml = gpd.read_file(str(kml), driver="KML")
-            if gdf_kml.empty:
-                print("⚠️ KML vacío")
-                return
-            
-            gdf_kml_3857 = gdf_kml.to_crs(3857)
-            minx, miny, maxx, maxy = gdf_kml_3857.total_bounds
-            cx, cy = (minx + maxx) / 2, (miny + maxy) / 2
-            
-            margin = 5000
-            bbox = [cx - margin, cy - margin * 0.75, cx + margin, cy + margin * 0.75]
-            
-            # 2) Descargar CMUP vía WFS
-            gdf_cmup = self._descargar_cmup_wfs()
-            if gdf_cmup is None or gdf_cmup.empty:
-                print("⚠️ Sin datos CMUP")
-                return
-            
-            # 3) Recortar CMUP al área del KML
-            gdf_cmup = gdf_cmup.to_crs(3857)
-            gdf_clip = gpd.overlay(gdf_cmup, gdf_kml_3857, how="intersection")
-            
-            # 4) Descargar ortofoto PNOA
-            url_pnoa = "https://www.ign.es/wms-inspire/pnoa-ma"
-            params_base = {
-                "SERVICE": "WMS",
-                "VERSION": "1.1.1",
-                "REQUEST": "GetMap",
-                "LAYERS": "OI.OrthoimageCoverage",
-                "STYLES": "",
-                "SRS": "EPSG:3857",
-                "BBOX": f"{bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]}",
-                "WIDTH": "1500",
-                "HEIGHT": "1125",
-                "FORMAT": "image/jpeg"
-            }
-            img_base = self._descargar_imagen_wms(url_pnoa, params_base)
-            
-            # 5) Descargar leyenda del WMS de CMUP
-            url_wms = "https://wms.mapama.gob.es/sig/Biodiversidad/IEPF_CMUP"
-            capa_wms = "AM.ForestManagementArea"
-            
-            params_leyenda = {
-                "SERVICE": "WMS",
-                "VERSION": "1.1.1",
-                "REQUEST": "GetLegendGraphic",
-                "LAYER": capa_wms,
-                "FORMAT": "image/png"
-            }
-            img_leyenda = self._descargar_imagen_wms(url_wms, params_leyenda)
-            
-            # 6) Dibujar plano
-            fig = plt.figure(figsize=(12, 9))
-            ax = fig.add_axes([0, 0, 1, 1])
-            
-            # Fondo: ortofoto
-            if img_base:
-                ax.imshow(img_base, extent=[bbox[0], bbox[2], bbox[1], bbox[3]])
-            
-            # Polígonos CMUP reales (WFS) en verde
-            if not gdf_clip.empty:
-                gdf_clip.plot(ax=ax, facecolor="none", edgecolor="#00AA00",
-                              linewidth=2.0, zorder=10)
-            
-            # Parcelas KML en azul
-            gdf_kml_3857.plot(ax=ax, facecolor="none", edgecolor="#0000FF",
-                              linewidth=1.5, zorder=11)
-            
-            # Marcador rojo
-            ax.plot(cx, cy, marker='v', color='#CC0000', markersize=22,
-                    markeredgecolor='white', markeredgewidth=2.5, alpha=0.9, zorder=12)
-            
-            # Leyenda en esquina inferior izquierda
-            if img_leyenda:
-                ax_leg = fig.add_axes([0.01, 0.01, 0.12, 0.15])
-                ax_leg.imshow(img_leyenda)
-                ax_leg.axis("off")
-            
-            ax.set_xlim(bbox[0], bbox[2])
-            ax.set_ylim(bbox[1], bbox[3])
-            ax.set_axis_off()
-            
-            ruta_final = carpeta / "PLANO-MONTES-PUBLICOS.jpg"
-            plt.savefig(ruta_final, dpi=150, bbox_inches=None, pad_inches=0,
-                        pil_kwargs={'quality': 95})
-            plt.close()
-            
-            print("✅")
-            
-        except Exception as e:
-            print(f"❌ Error: {e}")
+        # 3) Recortar CMUP al área del KML
+        gdf_cmup = gdf_cmup.to_crs(3857)
+        gdf_clip = gpd.overlay(gdf_cmup, gdf_kml_3857, how="intersection")
+        
+        # 4-5) Descargar a la vez ortofoto PNOA y leyenda del WMS de CMUP
+        imagenes = self._descargar_imagenes_wms(peticiones)
+        img_base, img_leyenda = imagenes["base"], imagenes["leyenda"]
+        
+        # 6) Dibujar plano
+        fig = Figure(figsize=(12, 9))
+        ax = fig.add_axes([0, 0, 1, 1])
+        
+        # Fondo: ortofoto
+        if img_base:
+            ax.imshow(img_base, extent=[bbox[0], bbox[2], bbox[1], bbox[3]])
+        else:
+            self.log("⚠️  Ortofoto PNOA no disponible")
+        
+        # Polígonos CMUP reales (WFS) en verde
+        if not gdf_clip.empty:
+            gdf_clip.plot(ax=ax, facecolor="none", edgecolor="#00AA00",
+                          linewidth=2.0, zorder=10)
+        
+        # Parcelas KML en azul
+        gdf_kml_3857.plot(ax=ax, facecolor="none", edgecolor="#0000FF",
+                          linewidth=1.5, zorder=11)
+        
+        # Marcador rojo
+        ax.plot(cx, cy, marker='v', color='#CC0000', markersize=22,
+                markeredgecolor='white', markeredgewidth=2.5, alpha=0.9, zorder=12)
+        
+        # Leyenda en esquina inferior izquierda
+        if img_leyenda:
+            ax_leg = fig.add_axes([0.01, 0.01, 0.12, 0.15])
+            ax_leg.imshow(img_leyenda)
+            ax_leg.axis("off")
+        
+        ax.set_xlim(bbox[0], bbox[2])
+        ax.set_ylim(bbox[1], bbox[3])
+        ax.set_axis_off()
+        
+        ruta_final = carpeta / "PLANO-MONTES-PUBLICOS.jpg"
+        fig.savefig(ruta_final, dpi=150, bbox_inches=None, pad_inches=0,
+                    pil_kwargs={'quality': 95})
+        self.log("✅ PLANO-MONTES-PUBLICOS.jpg generado")
 
     # ═══════════════════════════════════════════════════════════════════════
     # PASO 19: PLANO VÍAS PECUARIAS 🆕
     # ═══════════════════════════════════════════════════════════════════════
 
+    def _encuadre_vias_pecuarias(self, contexto: ContextoGeometrico) -> EncuadreTeselas:
+        """Encuadre del plano de vías pecuarias: parcelas con 5 km de margen sobre OSM."""
+        minx, miny, maxx, maxy = contexto.limites(3857)
+        margen = 5000  # 5km de margen
+        return EncuadreTeselas(
+            xlim=(minx - margen, maxx + margen),
+            ylim=(miny - margen, maxy + margen),
+            fuente=cx.providers.OpenStreetMap.Mapnik,
+        )
+
     def _generar_plano_vias_pecuarias(self, carpeta: Path) -> None:
         """
         Genera plano de Vías Pecuarias desde GPKG local.
@@ -2165,96 +3284,167 @@ class OrquestadorPipeline:
         Args:
             carpeta: Carpeta con KML y donde guardar el plano
         """
-        print(f"🐄 Generando Plano Vías Pecuarias...", end=" ", flush=True)
+        contexto = self._contexto_plano(carpeta)
         
-        kml = carpeta / "MAPA_MAESTRO_TOTAL.kml"
-        
-        if not kml.exists():
-            print("⚠️ KML no encontrado")
-            return
-        
-        # Ruta al GPKG de Vías Pecuarias
+        # GPKG de Vías Pecuarias (entrada del catálogo de FUENTES)
         gpkg_vvpp = self.fuentes / "CAPAS_gpkg" / "afecciones" / "RGVP2024.gpkg"
         
         if not gpkg_vvpp.exists():
-            print(f"⚠️ GPKG no encontrado: {gpkg_vvpp}")
+            self.log(f"⚠️  GPKG de vías pecuarias no encontrado: {gpkg_vvpp}")
             return
         
+        relativa = gpkg_vvpp.relative_to(self.fuentes).as_posix()
+        capa_vvpp = self.catalogo.buscar(relativa)
+        if capa_vvpp is None:
+            self.catalogo.actualizar()
+            capa_vvpp = self.catalogo.buscar(relativa)
+        if capa_vvpp is None:
+            raise ValueError(f"GPKG sin capas legibles: {gpkg_vvpp}")
+        
+        # 1) Parcelas del trabajo en EPSG:3857
+        gdf_3857 = contexto.gdf(3857)
+        
+        # 2) Calcular área de búsqueda
+        margen = 5000  # 5km de margen
+        encuadre = self._encuadre_vias_pecuarias(contexto)
+        
+        # 3) Cargar Vías Pecuarias de la zona, ya en EPSG:3857
+        columnas = ["FC_CLASIF"] if "FC_CLASIF" in capa_vvpp.esquema else []
+        vvpp_3857 = self._leer_capa_en_zona(
+            capa_vvpp, contexto, epsg=3857, margen=margen, columnas=columnas
+        )
+        
+        # 4) Crear figura
+        fig = Figure(figsize=(12, 12))
+        ax = fig.add_axes([0, 0, 1, 1])
+        
+        # Establecer límites antes del basemap
+        ax.set_xlim(*encuadre.xlim)
+        ax.set_ylim(*encuadre.ylim)
+        
+        # 5) Añadir fondo OpenStreetMap
         try:
-            # 1) Leer KML y convertir a EPSG:3857
-            print("Leyendo KML...", end=" ", flush=True)
-            gdf = gpd.read_file(str(kml), driver="KML")
-            gdf_3857 = gdf.to_crs(epsg=3857)
-            
-            # 2) Calcular área de búsqueda
-            minx, miny, maxx, maxy = gdf_3857.total_bounds
-            margen = 5000  # 5km de margen
-            area_busqueda = box(minx - margen, miny - margen, maxx + margen, maxy + margen)
-            
-            # 3) Cargar Vías Pecuarias con filtro espacial
-            print("Cargando Vías Pecuarias...", end=" ", flush=True)
-            vvpp = gpd.read_file(str(gpkg_vvpp), bbox=area_busqueda)
-            vvpp_3857 = vvpp.to_crs(epsg=3857)
-            
-            # 4) Crear figura
-            fig = plt.figure(figsize=(12, 12))
-            ax = fig.add_axes([0, 0, 1, 1])
-            
-            # Establecer límites antes del basemap
-            ax.set_xlim(minx - margen, maxx + margen)
-            ax.set_ylim(miny - margen, maxy + margen)
-            
-            # 5) Añadir fondo OpenStreetMap
-            print("Añadiendo basemap...", end=" ", flush=True)
-            try:
-                cx.add_basemap(ax, source=cx.providers.OpenStreetMap.Mapnik)
-            except Exception as e:
-                print(f"⚠️ Error basemap: {e}...", end=" ")
-            
-            # 6) Dibujar Vías Pecuarias si existen
-            if not vvpp_3857.empty:
-                print(f"Encontradas {len(vvpp_3857)} vías...", end=" ", flush=True)
-                
-                # Usar columna de clasificación si existe
-                columna_label = "FC_CLASIF" if "FC_CLASIF" in vvpp_3857.columns else None
-                
-                vvpp_3857.plot(
-                    ax=ax,
-                    linewidth=4,
-                    column=columna_label,
-                    cmap="viridis",
-                    zorder=5,
-                    alpha=0.7,
-                    legend=True,
-                    legend_kwds={
-                        'loc': 'lower left',
-                        'title': 'Vías Pecuarias',
-                        'fontsize': 'large'
-                    }
-                )
-            else:
-                print("⚠️ Sin vías pecuarias en esta zona...", end=" ", flush=True)
-            
-            # 7) Dibujar parcela (KML) en azul
-            gdf_3857.plot(ax=ax, facecolor="none", edgecolor="blue",
-                          linewidth=3, zorder=10)
-            
-            # 8) Marcador en centroide
-            centro = gdf_3857.geometry.centroid.iloc[0]
-            ax.plot(centro.x, centro.y, marker="v", color="red", markersize=25,
-                    markeredgecolor="white", markeredgewidth=2, zorder=15)
-            
-            ax.set_axis_off()
-            
-            # 9) Guardar
-            ruta_final = carpeta / "PLANO-VIAS-PECUARIAS.jpg"
-            plt.savefig(ruta_final, dpi=150, bbox_inches=None, pad_inches=0)
-            plt.close()
-            
-            print("✅")
-            
+            self._anadir_mapa_base(ax, encuadre)
         except Exception as e:
-            print(f"❌ Error: {e}")
+            self.log(f"⚠️  Mapa base de vías pecuarias no disponible: {e}")
+        
+        # 6) Dibujar Vías Pecuarias si existen
+        if not vvpp_3857.empty:
+            self.log(f"   🐄 {len(vvpp_3857)} vías pecuarias en la zona")
+            
+            # Usar columna de clasificación si existe
+            columna_label = "FC_CLASIF" if "FC_CLASIF" in vvpp_3857.columns else None
+            
+            vvpp_3857.plot(
+                ax=ax,
+                linewidth=4,
+                column=columna_label,
+                cmap="viridis",
+                zorder=5,
+                alpha=0.7,
+                legend=True,
+                legend_kwds={
+                    'loc': 'lower left',
+                    'title': 'Vías Pecuarias',
+                    'fontsize': 'large'
+                }
+            )
+        else:
+            self.log("   🐄 Sin vías pecuarias en esta zona")
+        
+        # 7) Dibujar parcela (KML) en azul
+        gdf_3857.plot(ax=ax, facecolor="none", edgecolor="blue",
+                      linewidth=3, zorder=10)
+        
+        # 8) Marcador en centroide
+        centro = contexto.centroides(3857).iloc[0]
+        ax.plot(centro.x, centro.y, marker="v", color="red", markersize=25,
+                markeredgecolor="white", markeredgewidth=2, zorder=15)
+        
+        ax.set_axis_off()
+        
+        # 9) Guardar
+        ruta_final = carpeta / "PLANO-VIAS-PECUARIAS.jpg"
+        fig.savefig(ruta_final, dpi=150, bbox_inches=None, pad_inches=0)
+        self.log("✅ PLANO-VIAS-PECUARIAS.jpg generado")
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# GRAFO DE PLANOS (FASES 6-12) Y EJECUCIÓN EN PROCESOS
+# ═══════════════════════════════════════════════════════════════════════════
+
+# Todos los planos dependen solo de la geometría del trabajo (contexto), que
+# ya existe al llegar aquí; las dependencias entre planos se declaran con
+# depende_de si algún paso pasa a consumir la salida de otro.
+PASOS_PLANOS: Tuple[planificador.Paso, ...] = (
+    planificador.Paso("_generar_plano_emplazamiento", "FASE 6 · Plano de emplazamiento"),
+    planificador.Paso("_generar_plano_ortofoto", "FASE 6 · Plano sobre ortofoto"),
+    planificador.Paso("_generar_plano_catastral", "FASE 7 · Plano catastral"),
+    planificador.Paso("_generar_planos_ign", "FASE 8 · Planos IGN"),
+    planificador.Paso("_generar_planos_provinciales", "FASE 9 · Planos provinciales"),
+    planificador.Paso("_generar_planos_historicos", "FASE 10 · Planos históricos"),
+    planificador.Paso("_generar_plano_pendientes", "FASE 11 · Plano de pendientes"),
+    planificador.Paso("_generar_plano_natura2000", "FASE 11 · Plano Natura 2000"),
+    planificador.Paso("_generar_plano_montes_publicos", "FASE 12 · Plano de montes públicos"),
+    planificador.Paso("_generar_plano_vias_pecuarias", "FASE 12 · Plano de vías pecuarias"),
+)
+
+# Orquestador reutilizado por cada proceso del pool (sesión HTTP incluida)
+_orquestadores_proceso: Dict[Tuple[str, str, str], OrquestadorPipeline] = {}
+
+
+def _ejecutar_paso_en_proceso(
+    metodo: str,
+    base_dir: Path,
+    fuentes_dir: Path,
+    config: ConfiguracionPipeline,
+    carpeta: Path,
+    contexto: Optional[ContextoGeometrico],
+    *args,
+) -> dict:
+    """
+    Ejecuta un método del orquestador dentro de un proceso del pool.
+
+    Se llama como metodo(carpeta, *args) (un plano, el análisis de una capa...).
+
+    Returns:
+        Diccionario con los mensajes de log del paso, los contadores del
+        cliente remoto, la duración en segundos, el valor devuelto y las
+        estadísticas de la caché de capas del proceso
+
+    Raises:
+        planificador.ErrorPaso: Si el método falla (con los mensajes que emitió)
+    """
+    clave = (str(base_dir), str(fuentes_dir), repr(config))
+    orquestador = _orquestadores_proceso.get(clave)
+    if orquestador is None:
+        orquestador = OrquestadorPipeline(
+            base_dir=base_dir, fuentes_dir=fuentes_dir,
+            progress_callback=lambda _: None, config=config,
+        )
+        _orquestadores_proceso[clave] = orquestador
+
+    mensajes: List[str] = []
+    orquestador.progress_callback = mensajes.append
+    orquestador.cliente = orquestador._crear_cliente()
+    orquestador.contexto = contexto
+    orquestador._carpeta_contexto = carpeta if contexto is not None else None
+
+    inicio = datetime.now()
+    try:
+        resultado = getattr(orquestador, metodo)(carpeta, *args)
+    except Exception as exc:
+        raise planificador.ErrorPaso(str(exc) or type(exc).__name__, mensajes)
+    return {
+        "mensajes": mensajes,
+        "contadores": orquestador.cliente.contadores(),
+        "segundos": (datetime.now() - inicio).total_seconds(),
+        "resultado": resultado,
+        "pid": os.getpid(),
+        "cache_capas": (
+            orquestador.cache_capas.estadisticas() if orquestador.cache_capas is not None else None
+        ),
+    }
 
 
 # ═══════════════════════════════════════════════════════════════════════════
@@ -2265,8 +3455,10 @@ if __name__ == "__main__":
     """
     Ejecuta el orquestador desde el directorio donde se encuentra el script.
     
-    Uso:
-        python orquestador_completo_final.py
+    Uso (desde backend/; el módulo importa el resto del paquete logic con
+    importaciones relativas, por lo que no se puede lanzar como
+    `python orquestador2.py`):
+        python -m logic.orquestador2
     
     El script buscará archivos .txt en la carpeta INPUTS y generará todos
     los productos cartográficos en OUTPUTS.
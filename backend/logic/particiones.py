@@ -0,0 +1,375 @@
+"""
+Particiones provinciales de las capas nacionales de FUENTES.
+
+Muchas capas de FUENTES son un único archivo para toda España, pero cada
+trabajo toca una o dos provincias. Las capas grandes se dividen una sola vez
+en una partición por provincia (FlatGeobuf con su propio índice espacial,
+en los CRS del almacén de capas) y los trabajos leen solo las particiones de
+sus provincias, de modo que la E/S y la memoria dependen de la zona del
+trabajo y no del tamaño de la capa nacional.
+
+Las provincias se toman de una capa de recintos provinciales de FUENTES
+cuya columna de código es el código INE de dos cifras, el mismo que las
+dos primeras cifras de la referencia catastral (ParcelaData.provincia).
+Una entidad que cruza un límite provincial se guarda en todas las
+provincias que toca; al leer varias particiones se eliminan los duplicados
+por su posición en la copia del almacén (columna _fid). Las entidades que
+no tocan ningún recinto (p. ej. espacios marinos o dominio público
+marítimo-terrestre mar adentro) van a una partición aparte, "resto", que se
+lee siempre que su extensión toca la ventana del trabajo.
+
+Estructura en disco (dentro del almacén de capas):
+    [raiz]/[huella capa]/provincias-v[versión]-[huella recintos]/
+    ├── indice.json              ← {codigo: {"entidades", "limites": {epsg: [...]}}}
+    └── [codigo]/[epsg].fgb      ← Partición reproyectada y ordenada (o "resto")
+
+Uso (desde backend/, particiona todas las capas grandes del catálogo):
+    python -m logic.particiones --recintos limites/provincias.gpkg --columna CPRO
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from .almacen_capas import EPSG_ALMACEN, AlmacenCapas, huella_archivo, obtener_almacen_capas
+from .catalogo_fuentes import EPSG_ANALISIS, CatalogoFuentes, EntradaCapa, obtener_catalogo
+
+# Columna con la posición de cada entidad en la copia EPSG:25830 del almacén
+COLUMNA_FID = "_fid"
+
+# Partición de las entidades que no tocan ningún recinto provincial
+CODIGO_RESTO = "resto"
+
+# Cambia si cambia el contenido de las particiones (se vuelven a generar)
+VERSION_PARTICIONES = 2
+
+
+def codigo_provincia(valor) -> str:
+    """Normaliza un código INE de provincia a dos cifras ("8" → "08")."""
+    texto = str(valor).strip()
+    if texto.endswith(".0"):  # columnas numéricas leídas como float
+        texto = texto[:-2]
+    return texto.zfill(2)
+
+
+def _toca(a: Sequence[float], b: Sequence[float]) -> bool:
+    return not (a[2] < b[0] or a[0] > b[2] or a[3] < b[1] or a[1] > b[3])
+
+
+class ParticionesProvinciales:
+    """
+    División por provincias de las capas grandes del almacén de capas.
+
+    Como el almacén, es seguro entre hilos (un lock por capa) y entre
+    procesos (cada partición se escribe en una carpeta temporal que se
+    renombra al terminar; indice.json marca la capa como particionada).
+    """
+
+    def __init__(
+        self,
+        almacen: AlmacenCapas,
+        recintos: Path,
+        columna: str,
+        min_entidades: int
+    ) -> None:
+        """
+        Args:
+            almacen: Almacén de capas donde se guardan las particiones
+            recintos: Capa de recintos provinciales
+            columna: Columna de `recintos` con el código INE de provincia
+            min_entidades: Entidades mínimas de una capa para particionarla
+        """
+        self.almacen = almacen
+        self.recintos = Path(recintos)
+        self.columna = columna
+        self.min_entidades = min_entidades
+        self._lock = threading.Lock()
+        self._locks_capa: Dict[str, threading.Lock] = {}
+        self._provincias: Optional[gpd.GeoDataFrame] = None
+        self._huella_recintos: Optional[str] = None
+        self._estado_recintos: Optional[tuple] = None
+        self._indices: Dict[Path, Dict[str, dict]] = {}
+
+    def aplica(self, capa: EntradaCapa) -> bool:
+        """Si la capa es lo bastante grande para leerse por particiones."""
+        return capa.entidades >= self.min_entidades
+
+    # ───────────────────────────────────────────────────────────────────────
+    # Recintos provinciales
+    # ───────────────────────────────────────────────────────────────────────
+
+    def _cargar_recintos(self) -> None:
+        """Lee los recintos (y su huella) si es la primera vez o han cambiado."""
+        estado = self.recintos.stat()
+        estado = (estado.st_mtime, estado.st_size)
+        with self._lock:
+            if self._estado_recintos == estado:
+                return
+            provincias = gpd.read_file(str(self.recintos), columns=[self.columna])
+            if provincias.crs is None:
+                provincias = provincias.set_crs(epsg=EPSG_ANALISIS)
+            provincias = provincias.to_crs(epsg=EPSG_ANALISIS)
+            provincias["codigo"] = provincias[self.columna].map(codigo_provincia)
+            # Una fila por provincia (los recintos pueden venir en varios polígonos)
+            self._provincias = provincias[["codigo", "geometry"]].dissolve(by="codigo").reset_index()
+            self._huella_recintos = huella_archivo(self.recintos)[:12]
+            self._estado_recintos = estado
+            self._indices.clear()
+
+    def _carpeta(self, capa: EntradaCapa, origen: Path) -> Path:
+        self._cargar_recintos()
+        return (
+            self.almacen.raiz / self.almacen.huella(capa, origen)
+            / f"provincias-v{VERSION_PARTICIONES}-{self._huella_recintos}"
+        )
+
+    def _lock_capa(self, clave: str) -> threading.Lock:
+        with self._lock:
+            return self._locks_capa.setdefault(clave, threading.Lock())
+
+    # ───────────────────────────────────────────────────────────────────────
+    # Particionado
+    # ───────────────────────────────────────────────────────────────────────
+
+    def particionar(self, capa: EntradaCapa, origen: Path) -> Dict[str, dict]:
+        """
+        Divide la capa por provincias si aún no lo está.
+
+        Args:
+            capa: Entrada del catálogo
+            origen: Ruta absoluta del archivo de origen
+
+        Returns:
+            Índice {codigo: {"entidades", "limites": {epsg: [minx, miny, maxx, maxy]}}}
+        """
+        carpeta = self._carpeta(capa, origen)
+        with self._lock_capa(f"{capa.ruta}::{capa.capa}"):
+            if carpeta in self._indices:
+                return self._indices[carpeta]
+            ruta_indice = carpeta / "indice.json"
+            try:
+                indice = json.loads(ruta_indice.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                indice = self._escribir_particiones(capa, origen, carpeta)
+            self._indices[carpeta] = indice
+            return indice
+
+    def _escribir_particiones(self, capa: EntradaCapa, origen: Path, carpeta: Path) -> Dict[str, dict]:
+        # La copia del almacén ya está en EPSG:25830 (sin reproyectar la capa nacional)
+        gdf = gpd.read_file(str(self.almacen.preparar(capa, origen)[EPSG_ANALISIS]))
+        gdf[COLUMNA_FID] = np.arange(len(gdf))
+
+        provincias = self._provincias
+        arbol = shapely.STRtree(provincias.geometry.values)
+        indices_capa, indices_provincia = arbol.query(gdf.geometry.values, predicate="intersects")
+
+        carpeta.mkdir(parents=True, exist_ok=True)
+        indice: Dict[str, dict] = {}
+        for posicion in np.unique(indices_provincia):
+            codigo = provincias["codigo"].iat[posicion]
+            filas = indices_capa[indices_provincia == posicion]
+            indice[codigo] = self._escribir_particion(carpeta, codigo, gdf.iloc[np.sort(filas)])
+
+        # Entidades fuera de todos los recintos: se conservan en su propia partición
+        fuera = np.setdiff1d(np.arange(len(gdf)), indices_capa)
+        if len(fuera):
+            indice[CODIGO_RESTO] = self._escribir_particion(carpeta, CODIGO_RESTO, gdf.iloc[fuera])
+
+        fd, temporal = tempfile.mkstemp(dir=carpeta, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(indice, f, ensure_ascii=False)
+        os.replace(temporal, carpeta / "indice.json")
+        return indice
+
+    @staticmethod
+    def _escribir_particion(carpeta: Path, codigo: str, particion: gpd.GeoDataFrame) -> dict:
+        """Escribe una partición en los CRS del almacén y devuelve su entrada del índice."""
+        temporal = Path(tempfile.mkdtemp(dir=carpeta, prefix=f".{codigo}."))
+        limites = {}
+        for epsg in EPSG_ALMACEN:
+            proyectada = particion if epsg == EPSG_ANALISIS else particion.to_crs(epsg=epsg)
+            proyectada = proyectada.iloc[proyectada.geometry.hilbert_distance().argsort()]
+            proyectada.to_file(str(temporal / f"{epsg}.fgb"), driver="FlatGeobuf", SPATIAL_INDEX="YES")
+            limites[str(epsg)] = [float(v) for v in proyectada.total_bounds]
+
+        destino = carpeta / codigo
+        if destino.exists():
+            shutil.rmtree(destino, ignore_errors=True)
+        os.replace(temporal, destino)
+        return {"entidades": int(len(particion)), "limites": limites}
+
+    # ───────────────────────────────────────────────────────────────────────
+    # Lectura
+    # ───────────────────────────────────────────────────────────────────────
+
+    def particiones_para(
+        self,
+        capa: EntradaCapa,
+        origen: Path,
+        provincias: Iterable[str],
+        epsg: int,
+        limites: Sequence[float]
+    ) -> List[str]:
+        """
+        Particiones que necesita un trabajo.
+
+        Son las de sus provincias más las vecinas cuya extensión toca la
+        ventana (parcelas junto a un límite provincial o mapas con margen),
+        y la partición "resto" (entidades fuera de los recintos) si también
+        la toca.
+
+        Args:
+            capa: Entrada del catálogo
+            origen: Ruta absoluta del archivo de origen
+            provincias: Códigos de provincia del trabajo
+            epsg: Uno de EPSG_ALMACEN
+            limites: Ventana (minx, miny, maxx, maxy) en `epsg`
+
+        Returns:
+            Códigos de provincia ordenados (y CODIGO_RESTO al final si se lee)
+        """
+        indice = self.particionar(capa, origen)
+        provincias = {codigo_provincia(p) for p in provincias}
+        codigos = sorted(
+            codigo for codigo, datos in indice.items()
+            if codigo != CODIGO_RESTO
+            and (codigo in provincias or _toca(datos["limites"][str(epsg)], limites))
+        )
+        resto = indice.get(CODIGO_RESTO)
+        if resto is not None and _toca(resto["limites"][str(epsg)], limites):
+            codigos.append(CODIGO_RESTO)
+        return codigos
+
+    def leer(
+        self,
+        capa: EntradaCapa,
+        origen: Path,
+        epsg: int,
+        limites: Sequence[float],
+        provincias: Iterable[str],
+        columnas: Optional[List[str]] = None
+    ) -> gpd.GeoDataFrame:
+        """
+        Lee la ventana `limites` de las particiones de un trabajo.
+
+        Args:
+            capa: Entrada del catálogo
+            origen: Ruta absoluta del archivo de origen
+            epsg: Uno de EPSG_ALMACEN
+            limites: (minx, miny, maxx, maxy) en `epsg`
+            provincias: Códigos de provincia del trabajo
+            columnas: Atributos a leer (None = todos)
+
+        Returns:
+            GeoDataFrame en `epsg` con las entidades que tocan la ventana, sin
+            duplicados y en el orden de la copia del almacén
+        """
+        if epsg not in EPSG_ALMACEN:
+            raise ValueError(f"EPSG:{epsg} no está en el almacén de capas")
+        carpeta = self._carpeta(capa, origen)
+        codigos = self.particiones_para(capa, origen, provincias, epsg, limites)
+        leer_columnas = None if columnas is None else list(columnas) + [COLUMNA_FID]
+        partes = [
+            gpd.read_file(str(carpeta / codigo / f"{epsg}.fgb"), bbox=tuple(limites), columns=leer_columnas)
+            for codigo in codigos
+        ]
+        if not partes:
+            return gpd.GeoDataFrame({c: [] for c in columnas or []}, geometry=[], crs=epsg)
+        gdf = pd.concat(partes, ignore_index=True)
+        gdf = gdf.drop_duplicates(COLUMNA_FID).sort_values(COLUMNA_FID)
+        return gdf.drop(columns=COLUMNA_FID).reset_index(drop=True)
+
+    def particionar_catalogo(self, catalogo: CatalogoFuentes) -> Dict[str, int]:
+        """
+        Particiona todas las capas grandes del catálogo.
+
+        Returns:
+            {nombre de capa: número de particiones} (-1 si falló)
+        """
+        resultado = {}
+        for capa in catalogo.capas():
+            if not self.aplica(capa):
+                continue
+            try:
+                resultado[capa.nombre] = len(self.particionar(capa, catalogo.ruta_absoluta(capa)))
+            except Exception:
+                resultado[capa.nombre] = -1
+        return resultado
+
+
+_particiones: Dict[str, ParticionesProvinciales] = {}
+_lock_particiones = threading.Lock()
+
+
+def obtener_particiones(
+    almacen: AlmacenCapas,
+    recintos: Path,
+    columna: str,
+    min_entidades: int
+) -> ParticionesProvinciales:
+    """
+    Devuelve las particiones de un almacén y unos recintos, creándolas si es necesario.
+
+    Todos los trabajos del proceso comparten instancia, de modo que los
+    recintos se leen una sola vez y una capa nunca se particiona dos veces a
+    la vez.
+    """
+    clave = f"{almacen.raiz.resolve()}::{Path(recintos).resolve()}::{columna}::{min_entidades}"
+    with _lock_particiones:
+        particiones = _particiones.get(clave)
+        if particiones is None:
+            particiones = ParticionesProvinciales(almacen, Path(recintos), columna, min_entidades)
+            _particiones[clave] = particiones
+        return particiones
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# HERRAMIENTA DE LÍNEA DE COMANDOS
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def main() -> None:
+    from .configuracion import ConfiguracionPipeline
+
+    config = ConfiguracionPipeline()
+    base = Path.cwd()  # mismas rutas que main.py
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fuentes", type=Path, default=base / "FUENTES")
+    parser.add_argument("--cache", type=Path, default=base / "data" / "CACHE")
+    parser.add_argument("--recintos", default=config.capa_provincias,
+                        help="Capa de recintos provinciales (ruta dentro de FUENTES)")
+    parser.add_argument("--columna", default=config.columna_provincia)
+    parser.add_argument("--min-entidades", type=int, default=config.particion_min_entidades)
+    args = parser.parse_args()
+
+    if not args.recintos:
+        parser.error("Indica la capa de recintos provinciales (--recintos o CAPA_PROVINCIAS)")
+
+    catalogo = obtener_catalogo(args.fuentes, args.cache / "catalogo_fuentes.json")
+    inspeccionados, _ = catalogo.actualizar()
+    print(f"🗂️  Catálogo de FUENTES: {len(catalogo.capas())} capas ({inspeccionados} inspeccionadas)")
+
+    particiones = obtener_particiones(
+        obtener_almacen_capas(args.cache / "capas"),
+        args.fuentes / args.recintos, args.columna, args.min_entidades,
+    )
+    for nombre, n in particiones.particionar_catalogo(catalogo).items():
+        if n < 0:
+            print(f"   ⚠️  No se pudo particionar: {nombre}")
+        else:
+            print(f"   ✓ {nombre}: {n} provincias")
+
+
+if __name__ == "__main__":
+    main()
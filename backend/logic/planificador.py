@@ -0,0 +1,402 @@
+"""
+Ejecución de pasos del pipeline como grafo de dependencias.
+
+Cada paso declara de qué otros pasos depende; los que tienen sus
+dependencias resueltas se lanzan a la vez sobre un ejecutor (normalmente el
+pool de procesos compartido). El fallo de un paso no detiene a los demás:
+solo se omiten los pasos que dependen de él.
+
+Para lotes de tareas independientes con tiempo máximo por tarea (p. ej. una
+por capa de afecciones) está ejecutar_lote. El tiempo de una tarea enviada
+con `enviar` se cuenta desde que un proceso del pool empieza a ejecutarla
+(el proceso lo avisa por una cola), no desde que entra en la cola del pool,
+que comparten todos los trabajos.
+
+Los pools de procesos son compartidos por todos los trabajos del proceso,
+uno por uso (planos y afecciones), y nunca se cierran mientras tienen
+tareas en curso: una tarea cancelada o perdida cuenta como error de su paso.
+"""
+from __future__ import annotations
+
+import atexit
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+ESTADO_OK = "ok"
+ESTADO_ERROR = "error"
+ESTADO_OMITIDO = "omitido"
+ESTADO_TIEMPO_AGOTADO = "tiempo_agotado"
+
+# Cada cuánto comprueba ejecutar_lote si una tarea en cola ha empezado
+ESPERA_INICIO_S = 0.2
+
+# Usos de los pools de procesos compartidos
+POOL_PLANOS = "planos"
+POOL_AFECCIONES = "afecciones"
+
+
+class ErrorPaso(Exception):
+    """
+    Fallo de un paso ejecutado en otro proceso.
+
+    Lleva los mensajes de log que el paso emitió antes de fallar, para que
+    el trabajo los muestre igual que los de un paso correcto.
+    """
+
+    def __init__(self, mensaje: str, mensajes: Sequence[str] = ()) -> None:
+        # Ambos en args para que la excepción sobreviva al pickle entre procesos
+        super().__init__(mensaje, list(mensajes))
+        self.mensajes = list(mensajes)
+
+    def __str__(self) -> str:
+        return self.args[0]
+
+
+@dataclass(frozen=True)
+class Paso:
+    """
+    Nodo del grafo de ejecución.
+
+    Attributes:
+        nombre: Identificador del paso (p. ej. el método del orquestador)
+        titulo: Texto para los mensajes de progreso
+        depende_de: Pasos que deben terminar correctamente antes
+    """
+    nombre: str
+    titulo: str
+    depende_de: Tuple[str, ...] = ()
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# GRAFO
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def ejecutar_en_linea(funcion: Callable[..., Any], *args) -> Future:
+    """
+    Ejecuta funcion(*args) en este hilo y devuelve su Future ya resuelto.
+
+    Sirve como `lanzar` de ejecutar_grafo sin pool: los pasos se ejecutan
+    uno a uno pero respetando igualmente sus dependencias.
+    """
+    futuro: Future = Future()
+    futuro.set_running_or_notify_cancel()
+    try:
+        futuro.set_result(funcion(*args))
+    except Exception as exc:
+        futuro.set_exception(exc)
+    return futuro
+
+
+def error_de(futuro: Future) -> Optional[BaseException]:
+    """
+    Error de un Future terminado (None si terminó bien).
+
+    Un Future cancelado (p. ej. si se cerró el pool) devuelve un
+    CancelledError en lugar de lanzarlo, para tratarlo como un error más.
+    """
+    if futuro.cancelled():
+        return CancelledError("tarea cancelada antes de terminar")
+    return futuro.exception()
+
+
+def orden_topologico(pasos: Iterable[Paso]) -> List[Paso]:
+    """
+    Ordena los pasos respetando sus dependencias (estable respecto a la entrada).
+
+    Raises:
+        ValueError: Si hay dependencias desconocidas o ciclos
+    """
+    pasos = list(pasos)
+    por_nombre = {p.nombre: p for p in pasos}
+    for paso in pasos:
+        desconocidas = set(paso.depende_de) - por_nombre.keys()
+        if desconocidas:
+            raise ValueError(f"{paso.nombre} depende de pasos desconocidos: {sorted(desconocidas)}")
+
+    ordenados: List[Paso] = []
+    hechos: set = set()
+    pendientes = list(pasos)
+    while pendientes:
+        listos = [p for p in pendientes if hechos.issuperset(p.depende_de)]
+        if not listos:
+            raise ValueError(f"Ciclo de dependencias entre: {[p.nombre for p in pendientes]}")
+        for paso in listos:
+            ordenados.append(paso)
+            hechos.add(paso.nombre)
+            pendientes.remove(paso)
+    return ordenados
+
+
+def ejecutar_grafo(
+    pasos: Iterable[Paso],
+    lanzar: Callable[[Paso], Future],
+    al_terminar: Optional[Callable[[Paso, str, Optional[Future]], None]] = None,
+) -> Dict[str, str]:
+    """
+    Ejecuta un grafo de pasos lanzando a la vez todos los que estén listos.
+
+    Args:
+        pasos: Pasos del grafo
+        lanzar: Envía un paso al ejecutor y devuelve su Future
+        al_terminar: Se llama (en este hilo) con (paso, estado, future) al
+            terminar cada paso; future es None para los pasos omitidos
+
+    Returns:
+        {nombre del paso: "ok" | "error" | "omitido"}
+    """
+    orden = orden_topologico(pasos)
+    pendientes = list(orden)
+    estados: Dict[str, str] = {}
+    en_curso: Dict[Future, Paso] = {}
+
+    def _notificar(paso: Paso, estado: str, futuro: Optional[Future]) -> None:
+        estados[paso.nombre] = estado
+        if al_terminar:
+            al_terminar(paso, estado, futuro)
+
+    while pendientes or en_curso:
+        for paso in list(pendientes):
+            dependencias = [estados.get(d) for d in paso.depende_de]
+            if any(e in (ESTADO_ERROR, ESTADO_OMITIDO) for e in dependencias):
+                pendientes.remove(paso)
+                _notificar(paso, ESTADO_OMITIDO, None)
+            elif all(e == ESTADO_OK for e in dependencias):
+                pendientes.remove(paso)
+                futuro = lanzar(paso)
+                if futuro.done():  # p. ej. ejecutar_en_linea: se notifica ya
+                    _notificar(paso, ESTADO_ERROR if error_de(futuro) is not None else ESTADO_OK, futuro)
+                else:
+                    en_curso[futuro] = paso
+
+        if not en_curso:
+            continue
+        terminados, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+        for futuro in terminados:
+            paso = en_curso.pop(futuro)
+            estado = ESTADO_ERROR if error_de(futuro) is not None else ESTADO_OK
+            _notificar(paso, estado, futuro)
+
+    # Resultado en el orden del grafo, independiente del orden de llegada
+    return {paso.nombre: estados[paso.nombre] for paso in orden}
+
+
+def ejecutar_lote(
+    tareas: Iterable[Any],
+    lanzar: Callable[[Any], Future],
+    al_terminar: Callable[[Any, str, Optional[Future]], None],
+    max_en_curso: int,
+    timeout_s: Optional[float] = None,
+) -> Dict[Any, str]:
+    """
+    Ejecuta tareas independientes con un máximo en curso y tiempo límite.
+
+    El tiempo de cada tarea se cuenta desde que empieza a ejecutarse (ver
+    inicio_de), no desde que se envía: con el pool compartido, las tareas de
+    un trabajo pueden esperar en cola detrás de las de otro. Una tarea que
+    supera `timeout_s` se descarta (su resultado se ignora); el proceso que
+    la ejecuta no se interrumpe, porque el pool es compartido con otros
+    trabajos, y la tarea descartada no debe escribir en la carpeta del
+    trabajo (su salida se ignora).
+
+    Args:
+        tareas: Identificadores de las tareas (en el orden de envío)
+        lanzar: Envía una tarea al ejecutor y devuelve su Future (con
+            `enviar` para que el tiempo cuente desde el inicio real)
+        al_terminar: Se llama (en este hilo) con (tarea, estado, future) al
+            terminar o descartar cada tarea
+        max_en_curso: Tareas enviadas a la vez
+        timeout_s: Segundos máximos por tarea (None = sin límite)
+
+    Returns:
+        {tarea: "ok" | "error" | "tiempo_agotado"} en el orden de `tareas`
+    """
+    tareas = list(tareas)
+    pendientes = list(reversed(tareas))
+    estados: Dict[Any, str] = {}
+    # Future -> [tarea, inicio de la ejecución o None si sigue en cola]
+    en_curso: Dict[Future, List[Any]] = {}
+
+    while pendientes or en_curso:
+        while pendientes and len(en_curso) < max_en_curso:
+            tarea = pendientes.pop()
+            en_curso[lanzar(tarea)] = [tarea, None]
+
+        espera = None
+        if timeout_s is not None:
+            for futuro, entrada in en_curso.items():
+                if entrada[1] is None:
+                    entrada[1] = inicio_de(futuro)
+            inicios = [inicio for _, inicio in en_curso.values() if inicio is not None]
+            espera = max(0.0, min(inicios) + timeout_s - time.monotonic()) if inicios else None
+            if len(inicios) < len(en_curso):
+                # Hay tareas en cola: se vuelve a mirar si ya han empezado
+                espera = min(espera, ESPERA_INICIO_S) if espera is not None else ESPERA_INICIO_S
+        terminados, _ = wait(en_curso, timeout=espera, return_when=FIRST_COMPLETED)
+
+        for futuro in terminados:
+            tarea, _ = en_curso.pop(futuro)
+            estado = ESTADO_ERROR if error_de(futuro) is not None else ESTADO_OK
+            estados[tarea] = estado
+            al_terminar(tarea, estado, futuro)
+
+        if timeout_s is not None:
+            ahora = time.monotonic()
+            for futuro, (tarea, inicio) in list(en_curso.items()):
+                if inicio is not None and ahora - inicio >= timeout_s:
+                    futuro.cancel()
+                    del en_curso[futuro]
+                    estados[tarea] = ESTADO_TIEMPO_AGOTADO
+                    al_terminar(tarea, ESTADO_TIEMPO_AGOTADO, None)
+
+    return {tarea: estados[tarea] for tarea in tareas}
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# POOLS DE PROCESOS COMPARTIDOS
+# ═══════════════════════════════════════════════════════════════════════════
+
+_pools: Dict[str, ProcessPoolExecutor] = {}
+_pool_lock = threading.Lock()
+
+# Avisos de inicio de las tareas enviadas con `enviar`: cada proceso del pool
+# pone en la cola de su pool el número de la tarea al empezarla, y un hilo de
+# este proceso anota el instante de llegada (en su propio reloj monotónico)
+_colas_inicio: Dict[str, Any] = {}
+_numeros_tarea = itertools.count()
+_tarea_de: Dict[Future, int] = {}
+_pendientes_inicio: set = set()
+_inicios: Dict[int, float] = {}
+_inicios_lock = threading.Lock()
+
+# Cola de avisos del pool al que pertenece este proceso (solo en los hijos)
+_cola_inicio_proceso = None
+
+
+def _iniciar_proceso(cola) -> None:
+    """Inicializador de cada proceso del pool: guarda la cola de avisos."""
+    global _cola_inicio_proceso
+    _cola_inicio_proceso = cola
+
+
+def _ejecutar_avisando(numero: int, funcion: Callable[..., Any], *args) -> Any:
+    """Avisa del inicio de la tarea `numero` y ejecuta funcion(*args) (en el hijo)."""
+    if _cola_inicio_proceso is not None:
+        _cola_inicio_proceso.put(numero)
+    return funcion(*args)
+
+
+def _escuchar_inicios(cola) -> None:
+    """Hilo que anota los avisos de inicio de un pool hasta recibir None."""
+    while True:
+        numero = cola.get()
+        if numero is None:
+            return
+        with _inicios_lock:
+            if numero in _pendientes_inicio:
+                _inicios[numero] = time.monotonic()
+
+
+def _olvidar_tarea(futuro: Future) -> None:
+    with _inicios_lock:
+        numero = _tarea_de.pop(futuro, None)
+        _pendientes_inicio.discard(numero)
+        _inicios.pop(numero, None)
+
+
+def enviar(pool: ProcessPoolExecutor, funcion: Callable[..., Any], *args) -> Future:
+    """
+    Envía funcion(*args) a un pool de obtener_pool con aviso de inicio (ver inicio_de).
+
+    Args:
+        pool: Pool devuelto por obtener_pool
+        funcion: Función a ejecutar (debe poder enviarse a otro proceso)
+    """
+    numero = next(_numeros_tarea)
+    with _inicios_lock:
+        _pendientes_inicio.add(numero)
+    futuro = pool.submit(_ejecutar_avisando, numero, funcion, *args)
+    with _inicios_lock:
+        _tarea_de[futuro] = numero
+    futuro.add_done_callback(_olvidar_tarea)
+    return futuro
+
+
+def inicio_de(futuro: Future) -> Optional[float]:
+    """
+    Instante (time.monotonic de este proceso) en que empezó a ejecutarse una tarea.
+
+    Para las tareas enviadas con `enviar` es la llegada del aviso del proceso
+    que la ejecuta; para cualquier otro Future, el momento actual si ya está
+    en marcha (el Future de un pool de procesos pasa a "running" al entrar en
+    la cola interna, así que es solo una aproximación). None si no ha empezado.
+    """
+    with _inicios_lock:
+        numero = _tarea_de.get(futuro)
+        if numero is not None:
+            return _inicios.get(numero)
+    return time.monotonic() if futuro.running() else None
+
+
+def procesos_por_defecto() -> int:
+    """Número de procesos según la máquina."""
+    return max(1, os.cpu_count() or 1)
+
+
+def obtener_pool(uso: str, procesos: int) -> ProcessPoolExecutor:
+    """
+    Pool de procesos de un uso (POOL_PLANOS, POOL_AFECCIONES) compartido por los trabajos.
+
+    Usa el método "spawn" (seguro con hilos y en Windows/PyInstaller). El
+    tamaño se fija al crearlo: si otro trabajo pide otro tamaño se le da el
+    mismo pool (las tareas en curso las limita quien las envía), porque
+    cerrarlo cancelaría las tareas pendientes de los demás trabajos. Solo se
+    sustituye si un proceso hijo ha muerto, cuando ya han fallado todas sus
+    tareas.
+
+    Args:
+        uso: Uso del pool (cada uso tiene el suyo)
+        procesos: Procesos del pool si hay que crearlo
+    """
+    with _pool_lock:
+        pool = _pools.get(uso)
+        if pool is not None and getattr(pool, "_broken", False):
+            pool.shutdown(wait=False)
+            pool = None
+        if pool is None:
+            contexto = multiprocessing.get_context("spawn")
+            cola = contexto.Queue()
+            _cerrar_cola(uso)
+            _colas_inicio[uso] = cola
+            threading.Thread(target=_escuchar_inicios, args=(cola,), daemon=True).start()
+            pool = ProcessPoolExecutor(
+                max_workers=max(1, procesos),
+                mp_context=contexto,
+                initializer=_iniciar_proceso,
+                initargs=(cola,),
+            )
+            _pools[uso] = pool
+        return pool
+
+
+def _cerrar_cola(uso: str) -> None:
+    """Detiene el hilo de avisos del pool anterior de `uso` (con _pool_lock tomado)."""
+    cola = _colas_inicio.pop(uso, None)
+    if cola is not None:
+        cola.put(None)
+
+
+@atexit.register
+def cerrar_pool() -> None:
+    """Detiene los pools compartidos (al salir del proceso)."""
+    with _pool_lock:
+        for uso, pool in _pools.items():
+            pool.shutdown(wait=False, cancel_futures=True)
+            _cerrar_cola(uso)
+        _pools.clear()
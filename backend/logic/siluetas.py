@@ -0,0 +1,191 @@
+"""
+Renderizado rápido de siluetas PNG de parcelas.
+
+Dibuja los polígonos directamente en un búfer RGBA con PIL (sin figuras de
+matplotlib): se rasteriza a una resolución `supermuestreo` veces mayor y se
+reduce promediando bloques para obtener bordes suavizados, con el relleno
+semitransparente y el fondo transparente.
+"""
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+
+from .geometria_gml import GeometriaParcela
+
+# Lado máximo del dibujo (equivalente a la figura de 6" a 100 DPI anterior)
+LADO_PX = 600
+MARGEN_PX = 8
+SUPERMUESTREO = 4
+ANCHO_BORDE_PX = 2
+ALFA_RELLENO = round(0.3 * 255)
+ALTO_TITULO_PX = 28
+COMPRESION_PNG = 1  # zlib rápido: las siluetas son casi todo transparente
+
+Trabajo = Tuple[GeometriaParcela, Path, str]
+
+# ═══════════════════════════════════════════════════════════════════════════
+# RASTERIZADO
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def _transformacion(
+    coords: np.ndarray, lado_px: int, margen_px: int
+) -> Tuple[float, np.ndarray, Tuple[int, int]]:
+    """Escala uniforme (mismo aspecto que antes: 1 grado = 1 grado) y tamaño del lienzo."""
+    minimo = coords.min(axis=0)
+    maximo = coords.max(axis=0)
+    extension = np.maximum(maximo - minimo, 1e-12)
+    escala = (lado_px - 2 * margen_px) / extension.max()
+    ancho, alto = np.ceil(extension * escala).astype(int) + 2 * margen_px
+    origen = np.array([minimo[0], maximo[1]])
+    return escala, origen, (int(ancho), int(alto))
+
+
+def rasterizar(
+    formas: Sequence[GeometriaParcela],
+    color: str = "red",
+    lado_px: int = LADO_PX,
+    margen_px: int = MARGEN_PX,
+    supermuestreo: int = SUPERMUESTREO,
+) -> Optional[Image.Image]:
+    """
+    Dibuja una o varias geometrías en una imagen RGBA transparente.
+
+    Todas las coordenadas se transforman a píxeles en una sola operación
+    vectorizada; los anillos interiores se dibujan como huecos.
+
+    Args:
+        formas: Geometrías a dibujar (juntas, en el mismo lienzo)
+        color: Color de relleno y borde (nombre o #rrggbb)
+        lado_px: Lado mayor del dibujo en píxeles
+        margen_px: Margen transparente alrededor
+        supermuestreo: Factor de sobremuestreo para el suavizado de bordes
+
+    Returns:
+        Imagen RGBA o None si no hay geometría
+    """
+    formas = [f for f in formas if f]
+    if not formas:
+        return None
+
+    coords = np.concatenate([f.coords for f in formas])
+    escala, origen, (ancho, alto) = _transformacion(coords, lado_px, margen_px)
+    factor = escala * supermuestreo
+    pixeles = (coords - origen) * (factor, -factor) + margen_px * supermuestreo
+
+    # Máscara alfa única: primero todos los rellenos (con sus huecos) y
+    # después todos los bordes, para que un hueco no borre ningún borde
+    alfa = Image.new("L", (ancho * supermuestreo, alto * supermuestreo), 0)
+    dibujo = ImageDraw.Draw(alfa)
+    anillos = list(_anillos_en_pixeles(formas, pixeles))
+    for anillo, exterior in anillos:
+        dibujo.polygon(anillo, fill=ALFA_RELLENO if exterior else 0)
+    for anillo, _ in anillos:
+        dibujo.line(anillo + anillo[:2], fill=255, width=ANCHO_BORDE_PX * supermuestreo, joint="curve")
+
+    # Reducción por bloques: promedio exacto de las supermuestras (suavizado)
+    alfa = alfa.reduce(supermuestreo)
+
+    r, g, b = ImageColor.getrgb(color)[:3]
+    return Image.merge("RGBA", (
+        Image.new("L", alfa.size, r),
+        Image.new("L", alfa.size, g),
+        Image.new("L", alfa.size, b),
+        alfa,
+    ))
+
+
+def _anillos_en_pixeles(
+    formas: Sequence[GeometriaParcela], pixeles: np.ndarray
+) -> Iterable[Tuple[List[float], bool]]:
+    """Recorre los anillos ya transformados como listas planas [x0, y0, x1, y1, ...]."""
+    inicio = 0
+    for forma in formas:
+        puntos = pixeles[inicio:inicio + len(forma)]
+        inicio += len(forma)
+        for p in range(forma.num_partes):
+            for r in range(forma.partes[p], forma.partes[p + 1]):
+                anillo = puntos[forma.anillos[r]:forma.anillos[r + 1]].ravel().tolist()
+                if len(anillo) >= 6:
+                    yield anillo, r == forma.partes[p]
+
+
+def _con_titulo(imagen: Image.Image, titulo: str) -> Image.Image:
+    """Añade el título centrado en una banda transparente superior."""
+    lienzo = Image.new("RGBA", (imagen.width, imagen.height + ALTO_TITULO_PX), (0, 0, 0, 0))
+    lienzo.paste(imagen, (0, ALTO_TITULO_PX))
+    dibujo = ImageDraw.Draw(lienzo)
+    fuente = ImageFont.load_default(size=16)
+    izquierda, _, derecha, _ = dibujo.textbbox((0, 0), titulo, font=fuente)
+    x = max(0, (imagen.width - (derecha - izquierda)) // 2)
+    dibujo.text((x, 4), titulo, fill=(0, 0, 0, 255), font=fuente)
+    return lienzo
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# API
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def dibujar_silueta(
+    formas: Sequence[GeometriaParcela],
+    destino: Path,
+    *,
+    color: str = "red",
+    titulo: str = ""
+) -> bool:
+    """
+    Guarda la silueta PNG de una o varias geometrías.
+
+    Args:
+        formas: Geometrías a dibujar en el mismo lienzo
+        destino: Ruta del PNG
+        color: Color de relleno y borde
+        titulo: Título sobre la silueta
+
+    Returns:
+        True si se ha generado el PNG
+    """
+    imagen = rasterizar(formas, color=color)
+    if imagen is None:
+        return False
+    if titulo:
+        imagen = _con_titulo(imagen, titulo)
+    imagen.save(destino, compress_level=COMPRESION_PNG)
+    return True
+
+
+def dibujar_siluetas(
+    trabajos: Iterable[Trabajo],
+    *,
+    color: str = "red",
+    max_workers: Optional[int] = None
+) -> List[Path]:
+    """
+    Genera en paralelo una silueta por geometría.
+
+    Args:
+        trabajos: Tuplas (geometría, destino, título)
+        color: Color de relleno y borde
+        max_workers: Hilos (PIL libera el GIL al reducir y comprimir)
+
+    Returns:
+        Rutas de los PNG generados, en el orden de entrada
+    """
+    trabajos = list(trabajos)
+    if not trabajos:
+        return []
+    hilos = max_workers or min(8, os.cpu_count() or 1)
+
+    def _uno(trabajo: Trabajo) -> Optional[Path]:
+        forma, destino, titulo = trabajo
+        return destino if dibujar_silueta([forma], destino, color=color, titulo=titulo) else None
+
+    with ThreadPoolExecutor(max_workers=min(hilos, len(trabajos)), thread_name_prefix="siluetas") as pool:
+        return [ruta for ruta in pool.map(_uno, trabajos) if ruta is not None]
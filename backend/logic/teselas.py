@@ -0,0 +1,374 @@
+"""
+Mapas base de teselas XYZ/WMTS descargados con el cliente común.
+
+Sustituye a contextily.add_basemap en el pipeline: calcula las teselas igual
+que contextily (zoom automático, mosaico, reproyección opcional) pero las
+descarga a través de ClienteUpstream, de modo que los reintentos, límites por
+host y el cortocircuito también se aplican a los mapas base.
+
+Con una CacheTeselas, las teselas se guardan en un AlmacenDisco compartido
+por todos los trabajos y procesos (un espacio por fuente, caducidad por
+fuente, límite de tamaño con expulsión LRU) y solo se descargan las que
+faltan o han caducado.
+"""
+from __future__ import annotations
+
+import hashlib
+import math
+import re
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import contextily as cx
+import mercantile as mt
+import numpy as np
+from PIL import Image
+from rasterio.warp import transform_bounds
+from xyzservices import TileProvider
+
+from .almacen_disco import AlmacenDisco
+from .cliente_upstream import ClienteUpstream
+
+Fuente = Union[str, TileProvider, dict]
+Extension = Tuple[float, float, float, float]  # (left, right, bottom, top)
+
+# Teselas descargadas en paralelo por mosaico (el límite por host lo
+# aplica además el cliente)
+MAX_TESELAS_SIMULTANEAS = 8
+
+# ═══════════════════════════════════════════════════════════════════════════
+# CÁLCULO DE TESELAS
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def proveedor(fuente: Optional[Fuente]) -> TileProvider:
+    """Normaliza una fuente (URL o TileProvider) como hace contextily."""
+    if fuente is None:
+        return cx.providers.OpenStreetMap.HOT
+    if isinstance(fuente, str):
+        return TileProvider(url=fuente, attribution="", name="url")
+    return fuente
+
+
+def calcular_zoom(w: float, s: float, e: float, n: float) -> int:
+    """Zoom automático (mismo criterio que contextily) para un BBOX lon/lat."""
+    zoom_lon = math.ceil(math.log2(360 * 2.0 / abs(e - w)))
+    zoom_lat = math.ceil(math.log2(360 * 2.0 / abs(n - s)))
+    return int(min(zoom_lon, zoom_lat))
+
+
+def teselas_para_extension(
+    extension: Extension,
+    zoom: Union[int, str] = "auto",
+    fuente: Optional[Fuente] = None,
+    zoom_adjust: Optional[int] = None
+) -> Tuple[List[mt.Tile], TileProvider]:
+    """
+    Lista las teselas necesarias para cubrir una extensión en EPSG:3857.
+
+    Args:
+        extension: (left, right, bottom, top) en EPSG:3857
+        zoom: Nivel de zoom o "auto"
+        fuente: URL XYZ o TileProvider
+        zoom_adjust: Ajuste sobre el zoom automático
+
+    Returns:
+        Tupla (teselas, proveedor normalizado)
+    """
+    left, right, bottom, top = extension
+    w, s = mt.lnglat(left, bottom)
+    e, n = mt.lnglat(right, top)
+    prov = proveedor(fuente)
+
+    automatico = zoom == "auto"
+    if automatico:
+        zoom = calcular_zoom(w, s, e, n)
+    if zoom_adjust:
+        zoom += zoom_adjust
+    zoom_min = prov.get("min_zoom", 0)
+    zoom_max = prov.get("max_zoom", 30)
+    if automatico:
+        zoom = max(zoom_min, min(zoom, zoom_max))
+    elif not zoom_min <= zoom <= zoom_max:
+        raise ValueError(f"Zoom {zoom} no válido para la fuente ({zoom_min}-{zoom_max})")
+
+    return list(mt.tiles(w, s, e, n, [zoom])), prov
+
+
+def extension_ejes(
+    xmin: float,
+    xmax: float,
+    ymin: float,
+    ymax: float,
+    crs: Optional[str] = None
+) -> Extension:
+    """Extensión (left, right, bottom, top) en EPSG:3857 de unos ejes en `crs`."""
+    if crs is None:
+        return (xmin, xmax, ymin, ymax)
+    left, bottom, right, top = transform_bounds(crs, "EPSG:3857", xmin, ymin, xmax, ymax)
+    return (left, right, bottom, top)
+
+
+def url_tesela(prov: TileProvider, tesela: mt.Tile) -> str:
+    """URL de una tesela concreta del proveedor."""
+    return prov.build_url(x=tesela.x, y=tesela.y, z=tesela.z)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# CACHÉ DE TESELAS
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+class CacheTeselas:
+    """
+    Teselas descargadas guardadas en un AlmacenDisco, con caducidad por fuente.
+
+    Cada fuente es un espacio del almacén (su nombre en xyzservices o, para
+    las URL sueltas, un resumen de la plantilla) y cada tesela una entrada
+    "z/x/y" con los bytes tal como los sirve la fuente.
+    """
+
+    def __init__(
+        self,
+        almacen: AlmacenDisco,
+        ttl_horas_por_fuente: Dict[str, float],
+        ttl_horas_defecto: float
+    ) -> None:
+        """
+        Args:
+            almacen: Almacén en disco de las teselas
+            ttl_horas_por_fuente: Caducidad por fuente; la clave se busca (sin
+                distinguir mayúsculas) en el nombre y la URL de la fuente
+            ttl_horas_defecto: Caducidad de las fuentes no listadas
+        """
+        self.almacen = almacen
+        self.ttl_horas_por_fuente = {k.lower(): v for k, v in ttl_horas_por_fuente.items()}
+        self.ttl_horas_defecto = ttl_horas_defecto
+
+    @staticmethod
+    def espacio(prov: TileProvider) -> str:
+        """Espacio del almacén para una fuente (nombre apto para carpeta)."""
+        nombre = prov.name
+        if not nombre or nombre == "url":
+            nombre = "url-" + hashlib.sha1(prov.url.encode("utf-8")).hexdigest()[:12]
+        return re.sub(r"[^A-Za-z0-9._-]", "_", nombre)
+
+    def ttl_segundos(self, prov: TileProvider) -> float:
+        descripcion = f"{prov.name} {prov.url}".lower()
+        for patron, horas in self.ttl_horas_por_fuente.items():
+            if patron in descripcion:
+                return horas * 3600
+        return self.ttl_horas_defecto * 3600
+
+    def leer(self, prov: TileProvider, tesela: mt.Tile) -> Optional[bytes]:
+        return self.almacen.leer_bytes(self.espacio(prov), f"{tesela.z}/{tesela.x}/{tesela.y}")
+
+    def contiene(self, prov: TileProvider, tesela: mt.Tile) -> bool:
+        return self.almacen.ruta(self.espacio(prov), f"{tesela.z}/{tesela.x}/{tesela.y}") is not None
+
+    def exclusivo(self, prov: TileProvider, tesela: mt.Tile):
+        """Sección exclusiva de una tesela entre trabajos y procesos (ver AlmacenDisco.exclusivo)."""
+        return self.almacen.exclusivo(self.espacio(prov), f"{tesela.z}/{tesela.x}/{tesela.y}")
+
+    def guardar(self, prov: TileProvider, tesela: mt.Tile, datos: bytes) -> None:
+        self.almacen.guardar_bytes(
+            self.espacio(prov), f"{tesela.z}/{tesela.x}/{tesela.y}", datos,
+            ttl_segundos=self.ttl_segundos(prov),
+        )
+
+    def estadisticas(self) -> dict:
+        """Aciertos/fallos por fuente (de este proceso) y ocupación del almacén."""
+        return self.almacen.estadisticas()
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# DESCARGA Y MOSAICO
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def _decodificar(datos: bytes) -> np.ndarray:
+    with Image.open(BytesIO(datos)) as imagen:
+        return np.asarray(imagen.convert("RGBA"))
+
+
+def descargar_tesela(
+    cliente: ClienteUpstream,
+    prov: TileProvider,
+    tesela: mt.Tile,
+    cache: Optional[CacheTeselas] = None
+) -> np.ndarray:
+    """
+    Devuelve una tesela como array RGBA (de la caché o descargándola).
+
+    Con caché, la consulta y la descarga se hacen en la sección exclusiva
+    de la tesela: si otro trabajo o proceso ya la está descargando, se
+    espera y se lee de la caché en lugar de pedirla otra vez.
+    """
+    if cache is None:
+        return _descargar_tesela(cliente, prov, tesela)
+
+    with cache.exclusivo(prov, tesela):
+        datos = cache.leer(prov, tesela)
+        if datos is not None:
+            try:
+                return _decodificar(datos)
+            except OSError:
+                pass  # entrada corrupta: se vuelve a descargar
+        return _descargar_tesela(cliente, prov, tesela, cache)
+
+
+def precargar_tesela(
+    cliente: ClienteUpstream,
+    prov: TileProvider,
+    tesela: mt.Tile,
+    cache: CacheTeselas
+) -> bool:
+    """
+    Descarga una tesela a la caché si no está ya (sin decodificarla).
+
+    Returns:
+        True si se ha descargado, False si ya estaba en la caché
+    """
+    with cache.exclusivo(prov, tesela):
+        if cache.contiene(prov, tesela):
+            return False
+        respuesta = cliente.get(url_tesela(prov, tesela), timeout=30)
+        respuesta.raise_for_status()
+        cache.guardar(prov, tesela, respuesta.content)
+        return True
+
+
+def _descargar_tesela(
+    cliente: ClienteUpstream,
+    prov: TileProvider,
+    tesela: mt.Tile,
+    cache: Optional[CacheTeselas] = None
+) -> np.ndarray:
+    respuesta = cliente.get(url_tesela(prov, tesela), timeout=30)
+    respuesta.raise_for_status()
+    array = _decodificar(respuesta.content)
+    if cache is not None:
+        cache.guardar(prov, tesela, respuesta.content)
+    return array
+
+
+def mosaico(
+    cliente: ClienteUpstream,
+    extension: Extension,
+    zoom: Union[int, str] = "auto",
+    fuente: Optional[Fuente] = None,
+    zoom_adjust: Optional[int] = None,
+    cache: Optional[CacheTeselas] = None
+) -> Tuple[np.ndarray, Extension]:
+    """
+    Descarga (o lee de la caché) y une las teselas que cubren una extensión en EPSG:3857.
+
+    Returns:
+        Tupla (imagen RGBA, extensión (left, right, bottom, top) en EPSG:3857)
+    """
+    teselas, prov = teselas_para_extension(extension, zoom, fuente, zoom_adjust)
+    with ThreadPoolExecutor(max_workers=min(MAX_TESELAS_SIMULTANEAS, len(teselas))) as pool:
+        arrays = list(pool.map(lambda t: descargar_tesela(cliente, prov, t, cache), teselas))
+    return unir_teselas(teselas, arrays)
+
+
+def unir_teselas(teselas: Sequence[mt.Tile], arrays: Sequence[np.ndarray]) -> Tuple[np.ndarray, Extension]:
+    """Une teselas en una sola imagen y calcula su extensión en EPSG:3857."""
+    xys = np.array([(t.x, t.y) for t in teselas])
+    indices = xys - xys.min(axis=0)
+    alto, ancho, bandas = arrays[0].shape
+    n_x, n_y = (indices + 1).max(axis=0)
+
+    imagen = np.zeros((alto * n_y, ancho * n_x, bandas), dtype=np.uint8)
+    for (x, y), array in zip(indices, arrays):
+        imagen[y * alto:(y + 1) * alto, x * ancho:(x + 1) * ancho, :] = array
+
+    limites = np.array([mt.xy_bounds(t) for t in teselas])
+    extension = (
+        limites[:, 0].min(), limites[:, 2].max(),
+        limites[:, 1].min(), limites[:, 3].max(),
+    )
+    return imagen, extension
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# EQUIVALENTE A contextily.add_basemap
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def anadir_mapa_base(
+    ax,
+    cliente: ClienteUpstream,
+    source: Optional[Fuente] = None,
+    zoom: Union[int, str] = "auto",
+    crs: Optional[str] = None,
+    interpolation: str = "bilinear",
+    attribution: Optional[Union[str, bool]] = None,
+    zoom_adjust: Optional[int] = None,
+    cache: Optional[CacheTeselas] = None,
+    **extra_imshow_args
+) -> None:
+    """
+    Añade un mapa base de teselas a `ax` (misma interfaz que cx.add_basemap).
+
+    Args:
+        ax: Ejes de matplotlib (en EPSG:3857 salvo que se indique `crs`)
+        cliente: Cliente HTTP común
+        source: URL XYZ o TileProvider
+        zoom: Nivel de zoom o "auto"
+        crs: CRS de los ejes si no es EPSG:3857 (se reproyecta el mosaico)
+        interpolation: Interpolación de imshow
+        attribution: Texto de atribución (None = el del proveedor, False = ninguno)
+        zoom_adjust: Ajuste sobre el zoom automático
+        cache: Caché de teselas en disco (None = descargar siempre)
+        **extra_imshow_args: Argumentos adicionales para imshow (zorder, ...)
+    """
+    extension = extension_ejes(*ax.axis(), crs=crs)
+    imagen, extension_img = mosaico(cliente, extension, zoom, source, zoom_adjust, cache)
+    dibujar_mapa_base(
+        ax, imagen, extension_img, source, crs=crs, interpolation=interpolation,
+        attribution=attribution, **extra_imshow_args
+    )
+
+
+def dibujar_mapa_base(
+    ax,
+    imagen: np.ndarray,
+    extension: Extension,
+    source: Optional[Fuente] = None,
+    crs: Optional[str] = None,
+    interpolation: str = "bilinear",
+    attribution: Optional[Union[str, bool]] = None,
+    **extra_imshow_args
+) -> None:
+    """
+    Dibuja en `ax` un mosaico ya descargado, conservando los límites de los ejes.
+
+    Args:
+        ax: Ejes de matplotlib
+        imagen: Mosaico RGBA en EPSG:3857
+        extension: Extensión del mosaico en EPSG:3857
+        source: Fuente del mosaico (para la atribución)
+        crs: CRS de los ejes si no es EPSG:3857
+        interpolation: Interpolación de imshow
+        attribution: Texto de atribución (None = el del proveedor, False = ninguno)
+    """
+    xmin, xmax, ymin, ymax = ax.axis()
+    if crs is not None:
+        imagen, extension = cx.warp_tiles(imagen, extension, t_crs=crs)
+
+    ax.imshow(
+        imagen,
+        extent=extension,
+        interpolation=interpolation,
+        aspect=ax.get_aspect(),
+        **extra_imshow_args,
+    )
+    ax.axis((xmin, xmax, ymin, ymax))
+
+    prov = proveedor(source)
+    if attribution is None:
+        attribution = prov.get("attribution")
+    if attribution:
+        cx.add_attribution(ax, attribution)
@@ -0,0 +1,176 @@
+"""
+Utilidades para el servicio WFS INSPIRE de Parcelas Catastrales (CP).
+
+Permite agrupar referencias rústicas por municipio y polígono, construir
+peticiones GetFeature por BBOX y repartir la respuesta en un XML por
+referencia con el mismo formato que devuelve GetParcel.
+"""
+from __future__ import annotations
+
+import math
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+URL_WFS_CP = "https://ovc.catastro.meh.es/INSPIRE/wfsCP.aspx"
+
+NS = {
+    "wfs": "http://www.opengis.net/wfs/2.0",
+    "cp": "http://inspire.ec.europa.eu/schemas/cp/4.0",
+    "gml": "http://www.opengis.net/gml/3.2",
+    "base": "http://inspire.ec.europa.eu/schemas/base/3.3",
+    "xlink": "http://www.w3.org/1999/xlink",
+    "xsi": "http://www.w3.org/2001/XMLSchema-instance",
+}
+
+# Mantener prefijos legibles al serializar los XML individuales
+for _prefijo, _uri in NS.items():
+    ET.register_namespace(_prefijo, _uri)
+
+METROS_POR_GRADO = 111_320.0
+
+# ═══════════════════════════════════════════════════════════════════════════
+# AGRUPACIÓN DE REFERENCIAS
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def es_rustica(rc: str) -> bool:
+    """Las referencias rústicas llevan la letra de sector en la posición 6."""
+    return len(rc) >= 14 and rc[5].isalpha()
+
+
+def agrupar_por_poligono(
+    referencias: Sequence[str],
+    min_referencias: int = 3
+) -> Tuple[Dict[Tuple[str, str, str], List[str]], List[str]]:
+    """
+    Agrupa referencias rústicas por provincia, municipio y polígono.
+
+    Args:
+        referencias: Referencias catastrales
+        min_referencias: Tamaño mínimo de un grupo para merecer peticiones BBOX
+
+    Returns:
+        Tupla (grupos, sueltas): grupos indexados por (provincia, municipio,
+        polígono) y referencias que deben pedirse individualmente
+    """
+    grupos: Dict[Tuple[str, str, str], List[str]] = OrderedDict()
+    sueltas: List[str] = []
+
+    for rc in referencias:
+        if es_rustica(rc):
+            grupos.setdefault((rc[:2], rc[2:5], rc[6:9]), []).append(rc)
+        else:
+            sueltas.append(rc)
+
+    for clave in [c for c, refs in grupos.items() if len(refs) < min_referencias]:
+        sueltas.extend(grupos.pop(clave))
+
+    return grupos, sueltas
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# PETICIONES
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def bbox_alrededor(
+    coords: Sequence[Tuple[float, float]],
+    margen_m: float,
+    lado_max_m: float
+) -> Tuple[float, float, float, float]:
+    """
+    Calcula un BBOX (lat_min, lon_min, lat_max, lon_max) en EPSG:4258.
+
+    El encuadre rodea la geometría semilla con `margen_m` metros y se recorta
+    a un cuadrado de `lado_max_m` metros como máximo alrededor de su centro,
+    para no superar el área máxima admitida por el servicio.
+
+    Args:
+        coords: Coordenadas (lon, lat) de la parcela semilla (secuencia o array (N, 2))
+        margen_m: Margen alrededor de la parcela en metros
+        lado_max_m: Lado máximo del encuadre en metros
+    """
+    puntos = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    lon_min, lat_min = puntos.min(axis=0)
+    lon_max, lat_max = puntos.max(axis=0)
+    lat_c = (lat_min + lat_max) / 2
+    lon_c = (lon_min + lon_max) / 2
+
+    m_lat = METROS_POR_GRADO
+    m_lon = METROS_POR_GRADO * max(math.cos(math.radians(lat_c)), 1e-6)
+
+    semi_alto = min((lat_max - lat_min) * m_lat / 2 + margen_m, lado_max_m / 2)
+    semi_ancho = min((lon_max - lon_min) * m_lon / 2 + margen_m, lado_max_m / 2)
+
+    return (
+        float(lat_c - semi_alto / m_lat),
+        float(lon_c - semi_ancho / m_lon),
+        float(lat_c + semi_alto / m_lat),
+        float(lon_c + semi_ancho / m_lon),
+    )
+
+
+def url_getparcel(rc: str) -> str:
+    """URL GetParcel para una referencia (respuesta en EPSG:4258, lat/lon)."""
+    return (
+        f"{URL_WFS_CP}?service=WFS&vrsion=2.0.0"
+        f"&request=GetFeature&STOREDQUERY_ID=GetParcel&refcat={rc}"
+    )
+
+
+def url_bbox(bbox: Tuple[float, float, float, float]) -> str:
+    """
+    URL GetFeature por BBOX en EPSG:4258 (orden de ejes lat/lon).
+
+    Se pide la misma proyección que devuelve GetParcel para que los XML
+    repartidos sean intercambiables con los individuales.
+    """
+    lat_min, lon_min, lat_max, lon_max = bbox
+    return (
+        f"{URL_WFS_CP}?service=WFS&version=2.0.0&request=GetFeature"
+        f"&typeNames=CP:CadastralParcel&SRSname=EPSG::4258"
+        f"&bbox={lat_min:.7f},{lon_min:.7f},{lat_max:.7f},{lon_max:.7f}"
+    )
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# REPARTO DE LA RESPUESTA
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def dividir_por_refcat(contenido: bytes) -> Dict[str, bytes]:
+    """
+    Reparte una FeatureCollection de parcelas en un XML por referencia.
+
+    Args:
+        contenido: Respuesta GetFeature del WFS CP
+
+    Returns:
+        Diccionario {refcat de 14 caracteres: XML con un único wfs:member}
+    """
+    try:
+        raiz = ET.fromstring(contenido)
+    except ET.ParseError:
+        return {}
+
+    partes: Dict[str, bytes] = {}
+    for miembro in raiz.findall("wfs:member", NS):
+        ref = miembro.find(".//cp:nationalCadastralReference", NS)
+        if ref is None or not ref.text:
+            ref = miembro.find(".//base:localId", NS)
+        if ref is None or not ref.text:
+            continue
+
+        coleccion = ET.Element(raiz.tag, dict(raiz.attrib))
+        for atributo in ("numberMatched", "numberReturned"):
+            if atributo in coleccion.attrib:
+                coleccion.set(atributo, "1")
+        coleccion.append(miembro)
+        partes[ref.text.strip().upper()[:14]] = ET.tostring(
+            coleccion, encoding="utf-8", xml_declaration=True
+        )
+
+    return partes
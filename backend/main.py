@@ -22,7 +22,15 @@ from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
-from logic.orquestador2 import OrquestadorPipeline
+from logic.orquestador2 import OrquestadorPipeline, USER_AGENT
+from logic.cliente_upstream import crear_cliente, crear_sesion, estado_hosts
+from logic.almacen_capas import obtener_almacen_capas
+from logic.almacen_disco import obtener_almacen
+from logic.cache_capas import estadisticas_cache_capas
+from logic.catalogo_fuentes import obtener_catalogo
+from logic.cmup import EspejoCMUP
+from logic.particiones import obtener_particiones
+from logic.configuracion import ConfiguracionPipeline
 
 # ═══════════════════════════════════════════════════════════════════════════
 # CONFIGURACIÓN DE RUTAS PARA MODO PORTABLE (PyInstaller)
@@ -81,12 +89,54 @@ app.add_middleware(
 # Estado de los procesos
 procesos_activos = {}
 
+# Catálogo de capas de FUENTES (compartido con los orquestadores del proceso)
+catalogo_fuentes = obtener_catalogo(FUENTES_DIR, BASE_DIR / "CACHE" / "catalogo_fuentes.json")
+
 # Imprimir rutas al iniciar para depuración
 @app.on_event("startup")
 async def startup_event():
     print("🚀 API Iniciada. Rutas registradas:")
     for route in app.routes:
         print(f"   - {route.path} [{route.name}]")
+    
+    # Catalogar FUENTES en segundo plano (solo abre archivos nuevos o modificados)
+    # y preparar las copias reproyectadas de las capas que aún no las tengan
+    # (y sus particiones provinciales, si hay capa de recintos)
+    def catalogar():
+        inspeccionados, eliminados = catalogo_fuentes.actualizar()
+        print(f"🗂️  Catálogo de FUENTES: {inspeccionados} archivo(s) inspeccionados, {eliminados} eliminados")
+        config = ConfiguracionPipeline()
+        if config.almacen_capas:
+            almacen = obtener_almacen_capas(BASE_DIR / "CACHE" / "capas")
+            preparadas, fallidas = almacen.preparar_catalogo(catalogo_fuentes)
+            print(f"🗂️  Almacén de capas: {preparadas} capa(s) listas")
+            for nombre in fallidas:
+                print(f"   ⚠️  No se pudo preparar: {nombre}")
+            if config.capa_provincias:
+                particiones = obtener_particiones(
+                    almacen, FUENTES_DIR / config.capa_provincias,
+                    config.columna_provincia, config.particion_min_entidades,
+                )
+                for nombre, n in particiones.particionar_catalogo(catalogo_fuentes).items():
+                    if n < 0:
+                        print(f"   ⚠️  No se pudo particionar: {nombre}")
+                    else:
+                        print(f"🗺️  {nombre}: {n} particiones provinciales")
+    threading.Thread(target=catalogar, daemon=True).start()
+
+    # Mantener el espejo local del CMUP (si está configurado): se descarga
+    # al arrancar si falta o ha caducado y después cada CMUP_ESPEJO_REFRESCO_HORAS
+    config = ConfiguracionPipeline()
+    if config.cmup_espejo:
+        espejo = EspejoCMUP(
+            FUENTES_DIR / config.cmup_espejo, config.cmup_espejo_refresco_horas, config.cmup_pagina
+        )
+        cliente = crear_cliente(crear_sesion(USER_AGENT, 1), config, log=print)
+        threading.Thread(
+            target=espejo.mantener,
+            args=(cliente, print, config.descarga_max_mb * 1024 * 1024),
+            daemon=True,
+        ).start()
 
 # ═══════════════════════════════════════════════════════════════════════════
 # ENDPOINTS API (Prefijo /api para coincidir con el frontend)
@@ -104,8 +154,7 @@ async def health():
 
 @api_router.get("/info")
 async def info():
-    fuentes_ok = FUENTES_DIR.exists()
-    fuentes_archivos = len(list(FUENTES_DIR.rglob("*.gpkg"))) if fuentes_ok else 0
+    catalogo = catalogo_fuentes.resumen()
     return {
         "servicio": "Pipeline GIS Catastral",
         "version": "1.0.0",
@@ -115,11 +164,36 @@ async def info():
             "outputs": str(OUTPUTS_DIR)
         },
         "estadisticas": {
-            "fuentes_gpkg_count": fuentes_archivos,
+            "fuentes_gpkg_count": catalogo["por_extension"].get(".gpkg", 0),
             "procesos_activos": len(procesos_activos)
-        }
+        },
+        "catalogo_fuentes": catalogo
     }
 
+@api_router.get("/metricas")
+async def metricas():
+    """
+    Estado de los servicios remotos (límite de concurrencia y circuito por host)
+    y uso de las cachés de teselas de los mapas base y de respuestas WMS.
+    """
+    config = ConfiguracionPipeline()
+    cache_teselas = None
+    if config.cache_teselas_mb > 0:
+        cache_teselas = obtener_almacen(
+            BASE_DIR / "CACHE" / "teselas", max_bytes=config.cache_teselas_mb * 1024 * 1024
+        ).estadisticas()
+    cache_wms = None
+    if config.cache_wms_mb > 0:
+        cache_wms = obtener_almacen(
+            BASE_DIR / "CACHE" / "wms", max_bytes=config.cache_wms_mb * 1024 * 1024
+        ).estadisticas()
+    return {"hosts": estado_hosts(), "cache_teselas": cache_teselas, "cache_wms": cache_wms}
+
+@api_router.get("/cache-capas")
+async def cache_capas():
+    """Memoria y tasa de aciertos de la caché de capas (servidor y procesos del pool)."""
+    return estadisticas_cache_capas()
+
 @api_router.post("/upload")
 async def upload_file(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     if not file.filename.endswith('.txt'):
@@ -209,6 +283,7 @@ def procesar_archivo_task(proceso_id: str, archivo_path: Path):
         shutil.copy(archivo_path, dest_path)
         
         res = orquestador.procesar_archivo_txt(dest_path)
+        procesos_activos[proceso_id]["metricas_upstream"] = orquestador.cliente.estadisticas()
         if res:
             procesos_activos[proceso_id]["estado"] = "completado"
             procesos_activos[proceso_id]["progreso"] = 100
@@ -243,9 +318,13 @@ else:
         return {"error": "Frontend no encontrado. Asegúrate de compilarlo con 'npm run build'."}
 
 if __name__ == "__main__":
+    import multiprocessing
     import uvicorn
     import webbrowser
     
+    # Necesario para el pool de procesos de los planos en el ejecutable portable
+    multiprocessing.freeze_support()
+    
     port = 8000
     # Abrir el navegador automáticamente en modo portable
     if hasattr(sys, '_MEIPASS'):
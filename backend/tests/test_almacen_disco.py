@@ -0,0 +1,82 @@
+"""
+Pruebas del almacén en disco (logic.almacen_disco): caducidad y expulsión LRU.
+
+El reloj del almacén se sustituye por uno controlado para que los accesos
+tengan marcas de tiempo distintas sin esperar.
+"""
+import pytest
+
+from logic import almacen_disco
+from logic.almacen_disco import AlmacenDisco
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    """Reloj manual: reloj[0] es la hora que ve el almacén."""
+    ahora = [1_000_000.0]
+    monkeypatch.setattr(almacen_disco.time, "time", lambda: ahora[0])
+    return ahora
+
+
+def test_entrada_caduca_tras_su_ttl(tmp_path, reloj):
+    almacen = AlmacenDisco(tmp_path, max_bytes=10_000, ttl_segundos=60)
+    almacen.guardar_bytes("xml", "rc", b"contenido")
+
+    reloj[0] += 59
+    assert almacen.leer_bytes("xml", "rc") == b"contenido"
+
+    reloj[0] += 2
+    assert almacen.leer_bytes("xml", "rc") is None
+    assert almacen.estadisticas()["entradas"] == 0
+
+
+def test_ttl_por_entrada_sustituye_al_del_almacen(tmp_path, reloj):
+    almacen = AlmacenDisco(tmp_path, max_bytes=10_000, ttl_segundos=60)
+    almacen.guardar_bytes("wms", "larga", b"a", ttl_segundos=3600)
+    almacen.guardar_bytes("wms", "defecto", b"b")
+
+    reloj[0] += 120
+    assert almacen.leer_bytes("wms", "larga") == b"a"
+    assert almacen.leer_bytes("wms", "defecto") is None
+
+
+def test_sin_ttl_no_caduca(tmp_path, reloj):
+    almacen = AlmacenDisco(tmp_path, max_bytes=10_000)
+    almacen.guardar_bytes("pdf", "rc", b"x")
+    reloj[0] += 10 * 365 * 86400
+    assert almacen.leer_bytes("pdf", "rc") == b"x"
+
+
+def test_expulsa_la_entrada_menos_usada(tmp_path, reloj):
+    almacen = AlmacenDisco(tmp_path, max_bytes=250)
+    for clave in ("a", "b"):
+        reloj[0] += 1
+        almacen.guardar_bytes("xml", clave, b"x" * 100)
+
+    # "a" pasa a ser la más reciente; al superar el límite sale "b"
+    reloj[0] += 1
+    assert almacen.ruta("xml", "a") is not None
+    reloj[0] += 1
+    almacen.guardar_bytes("xml", "c", b"x" * 100)
+
+    assert almacen.leer_bytes("xml", "b") is None
+    assert almacen.leer_bytes("xml", "a") is not None
+    assert almacen.leer_bytes("xml", "c") is not None
+    estadisticas = almacen.estadisticas()
+    assert estadisticas["expulsiones"] == 1
+    assert estadisticas["bytes"] <= almacen.max_bytes
+
+
+def test_materializar_y_contadores(tmp_path, reloj):
+    almacen = AlmacenDisco(tmp_path / "almacen", max_bytes=10_000)
+    origen = tmp_path / "origen.xml"
+    origen.write_bytes(b"<xml/>")
+    almacen.guardar_archivo("xml", "rc", origen)
+
+    destino = tmp_path / "copia.xml"
+    assert almacen.materializar("xml", "rc", destino)
+    assert destino.read_bytes() == b"<xml/>"
+    assert not almacen.materializar("xml", "otra", tmp_path / "nada.xml")
+
+    estadisticas = almacen.estadisticas()
+    assert (estadisticas["aciertos"], estadisticas["fallos"]) == (1, 1)
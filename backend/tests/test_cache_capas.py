@@ -0,0 +1,133 @@
+"""
+Pruebas de la caché de capas en memoria (logic.cache_capas): expulsión LRU,
+invalidación por cambio del archivo de origen y capas demasiado grandes.
+"""
+import os
+
+import geopandas as gpd
+import pytest
+from shapely.geometry import box
+
+from logic.cache_capas import CacheCapas, estimar_bytes
+from logic.catalogo_fuentes import EntradaCapa
+
+
+def _capa(nombre: str) -> EntradaCapa:
+    return EntradaCapa(
+        ruta=f"{nombre}.gpkg", capa=nombre, nombre=nombre, crs="EPSG:25830",
+        limites=None, entidades=1, esquema={}, columna_etiqueta=None, indice_espacial=True,
+    )
+
+
+def _gdf(entidades: int) -> gpd.GeoDataFrame:
+    return gpd.GeoDataFrame(
+        {"id": range(entidades)},
+        geometry=[box(i, 0, i + 1, 1) for i in range(entidades)],
+        crs=25830,
+    )
+
+
+class Cargador:
+    """Función de carga que cuenta sus llamadas."""
+
+    def __init__(self, entidades: int) -> None:
+        self.entidades = entidades
+        self.llamadas = 0
+
+    def __call__(self) -> gpd.GeoDataFrame:
+        self.llamadas += 1
+        return _gdf(self.entidades)
+
+
+@pytest.fixture
+def origen(tmp_path):
+    ruta = tmp_path / "capa.gpkg"
+    ruta.write_bytes(b"x")
+    return ruta
+
+
+def test_acierto_tras_la_primera_carga(origen):
+    cache = CacheCapas(max_bytes=10**6)
+    cargar = Cargador(5)
+    primera = cache.obtener(_capa("a"), origen, 25830, cargar)
+    segunda = cache.obtener(_capa("a"), origen, 25830, cargar)
+    assert primera is segunda
+    assert cargar.llamadas == 1
+    estadisticas = cache.estadisticas()
+    assert (estadisticas["aciertos"], estadisticas["fallos"]) == (1, 1)
+
+
+def test_expulsa_la_capa_menos_usada_y_su_lock(origen):
+    tamano = estimar_bytes(_gdf(5))
+    cache = CacheCapas(max_bytes=int(tamano * 2.5))
+    for nombre in ("a", "b"):
+        cache.obtener(_capa(nombre), origen, 25830, Cargador(5))
+    cache.obtener(_capa("a"), origen, 25830, Cargador(5))  # "a" pasa a ser la más reciente
+    cache.obtener(_capa("c"), origen, 25830, Cargador(5))
+
+    claves = {capa["clave"] for capa in cache.estadisticas()["capas"]}
+    assert claves == {CacheCapas.clave(_capa(n), origen, 25830) for n in ("a", "c")}
+    assert cache.estadisticas()["expulsiones"] == 1
+    assert CacheCapas.clave(_capa("b"), origen, 25830) not in cache._locks_clave
+
+
+def test_cambio_del_archivo_invalida_la_entrada(origen):
+    cache = CacheCapas(max_bytes=10**6)
+    cargar = Cargador(5)
+    cache.obtener(_capa("a"), origen, 25830, cargar)
+
+    estado = origen.stat()
+    os.utime(origen, (estado.st_atime, estado.st_mtime + 10))
+    cache.obtener(_capa("a"), origen, 25830, cargar)
+
+    assert cargar.llamadas == 2
+    assert cache.estadisticas()["invalidaciones"] == 1
+    assert cache.estadisticas()["entradas"] == 1
+
+
+def test_capa_demasiado_grande_no_se_vuelve_a_cargar(origen):
+    cache = CacheCapas(max_bytes=estimar_bytes(_gdf(5)))
+    cargar = Cargador(50)
+
+    assert cache.obtener(_capa("grande"), origen, 25830, cargar) is not None
+    assert cache.obtener(_capa("grande"), origen, 25830, cargar) is None
+    assert cargar.llamadas == 1
+    assert cache.estadisticas()["entradas"] == 0
+
+    # Con un límite mayor vuelve a cargarse y a guardarse
+    cache.max_bytes = 10**6
+    assert cache.obtener(_capa("grande"), origen, 25830, cargar) is not None
+    assert cargar.llamadas == 2
+    assert cache.estadisticas()["entradas"] == 1
+
+
+def test_vaciar_libera_entradas_y_locks(origen):
+    cache = CacheCapas(max_bytes=10**6)
+    for nombre in ("a", "b"):
+        cache.obtener(_capa(nombre), origen, 25830, Cargador(3))
+    cache.vaciar()
+    assert cache.estadisticas()["entradas"] == 0
+    assert cache.estadisticas()["bytes"] == 0
+    assert not cache._locks_clave
+
+
+def test_ventana_como_lectura_por_bbox(origen):
+    cache = CacheCapas(max_bytes=10**6)
+    entrada = cache.obtener(_capa("a"), origen, 25830, Cargador(10))
+    ventana = entrada.ventana((2.5, 0, 4.5, 1), columnas=["id"])
+    assert list(ventana["id"]) == [2, 3, 4]
+    assert list(ventana.columns) == ["id", "geometry"]
+
+
+def test_limite_repartido_entre_el_servidor_y_los_pools():
+    from logic.configuracion import ConfiguracionPipeline
+    from logic.orquestador2 import _bytes_cache_capas
+
+    config = ConfiguracionPipeline()
+    config.cache_capas_mb = 800
+    config.procesos_planos, config.procesos_afecciones = 4, 3
+    assert _bytes_cache_capas(config) == 800 * 1024 * 1024 // 8
+
+    # Con ejecución secuencial solo hay la caché del servidor
+    config.procesos_planos = config.procesos_afecciones = 1
+    assert _bytes_cache_capas(config) == 800 * 1024 * 1024
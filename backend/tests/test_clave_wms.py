@@ -0,0 +1,75 @@
+"""
+Pruebas de la normalización de claves de la caché WMS y del ajuste del
+encuadre a la rejilla (logic.orquestador2).
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from logic.orquestador2 import (
+    ESPACIO_LEYENDAS_WMS,
+    ESPACIO_MAPAS_WMS,
+    OrquestadorPipeline,
+    _clave_wms,
+)
+
+URL = "https://WMS.Example.ES/geoserver/wms"
+
+
+def test_misma_peticion_escrita_distinto_comparte_clave():
+    a = _clave_wms(URL + "?service=WMS&request=GetMap", {"layers": "rios", "bbox": "1,2,3,4"})
+    b = _clave_wms(
+        "HTTPS://wms.example.es/geoserver/wms",
+        {"BBOX": "1.0000001,2,3,4.0", "LAYERS": " rios ", "REQUEST": "GetMap", "SERVICE": "WMS"},
+    )
+    assert a == b
+
+
+def test_clave_ordenada_en_mayusculas_y_con_bbox_fijo():
+    espacio, clave = _clave_wms(URL, {"width": 800, "bbox": "10.5,20,30,40.25"})
+    assert espacio == ESPACIO_MAPAS_WMS
+    assert clave == (
+        "https://wms.example.es/geoserver/wms?"
+        "BBOX=10.500000%2C20.000000%2C30.000000%2C40.250000&WIDTH=800"
+    )
+
+
+def test_parametros_sustituyen_a_la_consulta_de_la_url():
+    _, clave = _clave_wms(URL + "?LAYERS=viejo", {"layers": "nuevo"})
+    assert "LAYERS=nuevo" in clave
+    assert "viejo" not in clave
+
+
+def test_bbox_distinto_da_clave_distinta():
+    assert _clave_wms(URL, {"BBOX": "1,2,3,4"}) != _clave_wms(URL, {"BBOX": "1,2,3,4.00001"})
+
+
+@pytest.mark.parametrize("request_wms, espacio", [
+    ("GetLegendGraphic", ESPACIO_LEYENDAS_WMS),
+    ("getlegendgraphic", ESPACIO_LEYENDAS_WMS),
+    ("GetMap", ESPACIO_MAPAS_WMS),
+])
+def test_espacio_segun_tipo_de_peticion(request_wms, espacio):
+    assert _clave_wms(URL, {"REQUEST": request_wms})[0] == espacio
+
+
+def _orquestador(rejilla: float) -> SimpleNamespace:
+    return SimpleNamespace(config=SimpleNamespace(wms_rejilla=rejilla))
+
+
+def test_centro_ajustado_a_la_rejilla():
+    # Paso 0.1 × 1000 = 100 m
+    centro = OrquestadorPipeline._centro_encuadre(_orquestador(0.1), 450_049.0, 4_200_151.0, 1000)
+    assert centro == pytest.approx((450_000.0, 4_200_200.0))
+
+
+def test_parcelas_cercanas_comparten_encuadre():
+    orquestador = _orquestador(0.1)
+    a = OrquestadorPipeline._centro_encuadre(orquestador, 450_010.0, 4_200_010.0, 1000)
+    b = OrquestadorPipeline._centro_encuadre(orquestador, 450_040.0, 4_199_970.0, 1000)
+    assert a == b
+
+
+def test_sin_rejilla_el_centro_es_exacto():
+    centro = OrquestadorPipeline._centro_encuadre(_orquestador(0), 450_049.3, 4_200_151.7, 1000)
+    assert centro == (450_049.3, 4_200_151.7)
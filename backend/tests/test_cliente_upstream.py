@@ -0,0 +1,160 @@
+"""
+Pruebas del cortocircuito y del límite AIMD del cliente remoto (logic.cliente_upstream).
+
+El estado de cada host es global al proceso, así que cada prueba usa un
+host propio.
+"""
+import io
+import itertools
+from urllib.parse import urlsplit
+
+import pytest
+import requests
+
+from logic import cliente_upstream
+from logic.cliente_upstream import CircuitoAbiertoError, ClienteUpstream, EstadoHost
+
+_hosts = (f"host-{n}.prueba" for n in itertools.count())
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    """Reloj monótono manual: reloj[0] es el instante que ve el circuito."""
+    ahora = [1000.0]
+    monkeypatch.setattr(cliente_upstream.time, "monotonic", lambda: ahora[0])
+    return ahora
+
+
+class SesionFalsa:
+    """Sesión que responde con la siguiente acción de la lista (código HTTP o excepción)."""
+
+    def __init__(self, acciones):
+        self.acciones = list(acciones)
+        self.peticiones = 0
+
+    def get(self, url, params=None, timeout=None, **kwargs):
+        self.peticiones += 1
+        accion = self.acciones.pop(0)
+        if isinstance(accion, BaseException):
+            raise accion
+        respuesta = requests.Response()
+        respuesta.status_code = accion
+        respuesta._content = b"ok"
+        respuesta.raw = io.BytesIO(b"ok")
+        return respuesta
+
+
+def _cliente(sesion, **opciones) -> ClienteUpstream:
+    opciones = {"max_reintentos": 0, "backoff_base_s": 0.0, "umbral_fallos": 2,
+                "reapertura_s": 30.0, **opciones}
+    return ClienteUpstream(sesion, limites_por_host={}, **opciones)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# ESTADO DEL HOST
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def test_circuito_se_abre_al_llegar_al_umbral(reloj):
+    estado = EstadoHost(next(_hosts), 4, 8)
+    assert estado.registrar(False, umbral=3, reapertura_s=30) is None
+    assert estado.registrar(False, umbral=3, reapertura_s=30) is None
+    assert estado.registrar(False, umbral=3, reapertura_s=30) == EstadoHost.ABIERTO
+    assert not estado.permitir()
+    assert estado.aperturas == 1
+
+
+def test_semiabierto_admite_una_sola_sonda(reloj):
+    estado = EstadoHost(next(_hosts), 4, 8)
+    estado.registrar(False, umbral=1, reapertura_s=30)
+
+    reloj[0] += 29
+    assert not estado.permitir()
+    reloj[0] += 2
+    assert estado.permitir()
+    assert estado.circuito == EstadoHost.SEMIABIERTO
+    assert not estado.permitir()  # la sonda sigue en curso
+
+    assert estado.registrar(True, umbral=1, reapertura_s=30) == EstadoHost.CERRADO
+    assert estado.permitir()
+
+
+def test_sonda_fallida_vuelve_a_abrir(reloj):
+    estado = EstadoHost(next(_hosts), 4, 8)
+    estado.registrar(False, umbral=5, reapertura_s=30)
+    for _ in range(4):
+        estado.registrar(False, umbral=5, reapertura_s=30)
+    assert estado.circuito == EstadoHost.ABIERTO
+
+    reloj[0] += 31
+    assert estado.permitir()
+    assert estado.registrar(False, umbral=5, reapertura_s=30) == EstadoHost.ABIERTO
+    assert estado.aperturas == 2
+    assert not estado.permitir()
+
+
+def test_aimd_sube_con_exitos_y_se_divide_con_fallos():
+    estado = EstadoHost(next(_hosts), 4, 8)
+    estado.adquirir()
+    estado.liberar(True)
+    assert estado.limite == pytest.approx(4.25)
+    estado.adquirir()
+    estado.liberar(False)
+    assert estado.limite == pytest.approx(2.125)
+    for _ in range(5):
+        estado.adquirir()
+        estado.liberar(False)
+    assert estado.limite == 1.0
+    assert estado.en_vuelo == 0
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# CLIENTE
+# ═══════════════════════════════════════════════════════════════════════════
+
+
+def test_cliente_rechaza_sin_enviar_con_el_circuito_abierto(reloj):
+    url = f"https://{next(_hosts)}/wms"
+    sesion = SesionFalsa([requests.ConnectionError("caído")] * 2)
+    cliente = _cliente(sesion)
+
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            cliente.get(url)
+    with pytest.raises(CircuitoAbiertoError):
+        cliente.get(url)
+    assert sesion.peticiones == 2
+
+
+def test_cliente_reintenta_codigos_transitorios():
+    url = f"https://{next(_hosts)}/wms"
+    sesion = SesionFalsa([503, 502, 200])
+    cliente = _cliente(sesion, max_reintentos=3, umbral_fallos=5)
+
+    assert cliente.get(url).status_code == 200
+    contadores = next(iter(cliente.contadores().values()))
+    assert (contadores["peticiones"], contadores["reintentos"]) == (3, 2)
+
+
+def test_error_inesperado_en_la_sonda_no_bloquea_el_circuito(reloj):
+    url = f"https://{next(_hosts)}/wms"
+    sesion = SesionFalsa([
+        requests.ConnectionError("caído"),
+        requests.exceptions.ChunkedEncodingError("cortado"),
+        200,
+    ])
+    cliente = _cliente(sesion, umbral_fallos=1)
+
+    with pytest.raises(requests.ConnectionError):
+        cliente.get(url)
+    reloj[0] += 31
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        cliente.get(url)  # la sonda falla con un error que no se reintenta
+
+    # El fallo de la sonda se ha registrado: el circuito vuelve a abrirse y,
+    # pasada la espera, admite una sonda nueva en lugar de quedarse bloqueado
+    with pytest.raises(CircuitoAbiertoError):
+        cliente.get(url)
+    reloj[0] += 31
+    assert cliente.get(url).status_code == 200
+    assert cliente._estado(urlsplit(url).hostname).circuito == EstadoHost.CERRADO
@@ -0,0 +1,174 @@
+"""
+Pruebas de la paginación WFS del CMUP (logic.cmup) contra un servidor falso
+que responde GML según los parámetros de cada URL.
+"""
+from pathlib import Path
+from typing import List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from logic import cmup
+
+EXCEPCION_SORTBY = (
+    b'<?xml version="1.0"?><ows:ExceptionReport xmlns:ows="http://www.opengis.net/ows/1.1">'
+    b'<ows:Exception><ows:ExceptionText>Illegal property name: OBJECTID</ows:ExceptionText>'
+    b'</ows:Exception></ows:ExceptionReport>'
+)
+
+
+def _gml(inicio: int, cantidad: int, total: Optional[int]) -> bytes:
+    """FeatureCollection WFS 2.0 con los montes inicio..inicio+cantidad-1."""
+    miembros = "".join(
+        f'<wfs:member><c:CMUP gml:id="c.{i}"><c:nombre>M{i}</c:nombre><c:geom>'
+        f'<gml:Polygon srsName="urn:ogc:def:crs:EPSG::4326"><gml:exterior><gml:LinearRing>'
+        f'<gml:posList>40.40 -3.70 40.40 -3.69 40.41 -3.69 40.41 -3.70 40.40 -3.70</gml:posList>'
+        f'</gml:LinearRing></gml:exterior></gml:Polygon></c:geom></c:CMUP></wfs:member>'
+        for i in range(inicio, inicio + cantidad)
+    )
+    coincidentes = "unknown" if total is None else total
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<wfs:FeatureCollection xmlns:wfs="http://www.opengis.net/wfs/2.0" '
+        'xmlns:gml="http://www.opengis.net/gml/3.2" xmlns:c="http://cmup" '
+        f'numberMatched="{coincidentes}" numberReturned="{cantidad}">{miembros}'
+        '</wfs:FeatureCollection>'
+    ).encode()
+
+
+class ServidorFalso:
+    """
+    Descargador (url, destino) que simula el WFS.
+
+    Args:
+        total: Montes de la capa
+        limite_count: COUNT máximo que respeta el servidor
+        anuncia_total: Si declara numberMatched (si no, "unknown")
+        acepta_orden: Si False, responde ExceptionReport a cualquier SORTBY
+    """
+
+    def __init__(self, total: int, limite_count: int = 10**6,
+                 anuncia_total: bool = True, acepta_orden: bool = True) -> None:
+        self.total = total
+        self.limite_count = limite_count
+        self.anuncia_total = anuncia_total
+        self.acepta_orden = acepta_orden
+        self.peticiones: List[dict] = []
+
+    def __call__(self, url: str, destino: Path, **_) -> None:
+        consulta = {k: v[0] for k, v in parse_qs(urlsplit(url).query).items()}
+        self.peticiones.append(consulta)
+        if "SORTBY" in consulta and not self.acepta_orden:
+            Path(destino).write_bytes(EXCEPCION_SORTBY)
+            return
+        inicio = int(consulta["STARTINDEX"])
+        cantidad = max(0, min(int(consulta["COUNT"]), self.limite_count, self.total - inicio))
+        total = self.total if self.anuncia_total else None
+        Path(destino).write_bytes(_gml(inicio, cantidad, total))
+
+    def inicios(self) -> List[int]:
+        return [int(p["STARTINDEX"]) for p in self.peticiones]
+
+
+def test_url_pagina_con_orden_y_bbox():
+    consulta = parse_qs(urlsplit(cmup.url_pagina(2000, 500, [1.234, 2, 3, 4.5])).query)
+    assert consulta["COUNT"] == ["500"]
+    assert consulta["STARTINDEX"] == ["2000"]
+    assert consulta["SORTBY"] == [f"{cmup.ORDEN_WFS_CMUP} ASC"]
+    assert consulta["BBOX"] == ["1.23,2.00,3.00,4.50,urn:ogc:def:crs:EPSG::3857"]
+    assert consulta["TYPENAME"] == [cmup.CAPA_WFS_CMUP]
+
+
+def test_url_pagina_sin_orden_ni_bbox():
+    consulta = parse_qs(urlsplit(cmup.url_pagina(0, 100, orden=None)).query)
+    assert "SORTBY" not in consulta
+    assert "BBOX" not in consulta
+
+
+def test_termina_con_la_pagina_vacia():
+    servidor = ServidorFalso(2500, anuncia_total=False)
+    gdf = cmup.descargar_paginas(servidor, [0, 0, 1, 1], 1000)
+    assert len(gdf) == 2500
+    assert str(gdf.crs) == "EPSG:4326"
+    assert servidor.inicios() == [0, 1000, 2000, 2500]
+
+
+def test_termina_al_completar_number_matched():
+    servidor = ServidorFalso(2000)
+    assert len(cmup.descargar_paginas(servidor, None, 1000)) == 2000
+    assert servidor.inicios() == [0, 1000]
+
+
+def test_count_limitado_por_el_servidor():
+    # Pide 1000 por página pero el servidor solo devuelve 300: cada página
+    # empieza tras las entidades recibidas, sin huecos
+    servidor = ServidorFalso(1000, limite_count=300)
+    gdf = cmup.descargar_paginas(servidor, None, 1000)
+    assert len(gdf) == 1000
+    assert gdf["gml_id"].is_unique
+    assert servidor.inicios() == [0, 300, 600, 900]
+
+
+def test_sin_montes_en_el_bbox():
+    gdf = cmup.descargar_paginas(ServidorFalso(0, anuncia_total=False), [0, 0, 1, 1])
+    assert gdf.empty
+
+
+def test_repite_sin_orden_si_el_servidor_lo_rechaza():
+    servidor = ServidorFalso(500, limite_count=300, acepta_orden=False)
+    gdf = cmup.descargar_paginas(servidor, None, 1000)
+    assert len(gdf) == 500
+    assert "SORTBY" in servidor.peticiones[0]
+    assert all("SORTBY" not in p for p in servidor.peticiones[1:])
+
+
+def test_error_wfs_sin_orden_se_propaga():
+    def rechazar(url, destino, **_):
+        Path(destino).write_bytes(EXCEPCION_SORTBY)
+
+    with pytest.raises(cmup.ErrorWFS):
+        cmup.descargar_paginas(rechazar, None, 1000, orden=None)
+
+
+def test_limite_de_paginas_no_devuelve_capa_parcial():
+    with pytest.raises(cmup.PaginacionIncompletaError):
+        cmup.descargar_paginas(ServidorFalso(5000, anuncia_total=False), None, 300, max_paginas=3)
+
+
+def test_faltan_entidades_respecto_a_number_matched():
+    # Páginas solapadas (el servidor reordena): los gml:id repetidos se
+    # descartan y el total distinto queda por debajo de numberMatched
+    class Solapado(ServidorFalso):
+        def __call__(self, url, destino, **_):
+            consulta = {k: v[0] for k, v in parse_qs(urlsplit(url).query).items()}
+            self.peticiones.append(consulta)
+            inicio = max(0, int(consulta["STARTINDEX"]) - 100)
+            cantidad = max(0, min(int(consulta["COUNT"]), self.total - int(consulta["STARTINDEX"])))
+            Path(destino).write_bytes(_gml(inicio, cantidad, self.total))
+
+    with pytest.raises(cmup.PaginacionIncompletaError):
+        cmup.descargar_paginas(Solapado(1000), None, 500)
+
+
+class _Cliente:
+    def __init__(self, servidor: ServidorFalso) -> None:
+        self.servidor = servidor
+
+    def descargar(self, url, destino, **opciones):
+        self.servidor(url, destino)
+
+
+def test_espejo_se_crea_y_no_se_sustituye_por_una_capa_parcial(tmp_path, monkeypatch):
+    espejo = cmup.EspejoCMUP(tmp_path / "espejos" / "CMUP.gpkg", refresco_horas=168, tamano_pagina=1000)
+    assert not espejo.vigente()
+    assert espejo.actualizar(_Cliente(ServidorFalso(1500))) == 1500
+    assert espejo.vigente()
+
+    contenido = espejo.ruta.read_bytes()
+    monkeypatch.setattr(cmup, "MAX_PAGINAS_ESPEJO", 3)
+    espejo.tamano_pagina = 300
+    with pytest.raises(cmup.PaginacionIncompletaError):
+        espejo.actualizar(_Cliente(ServidorFalso(5000, anuncia_total=False)))
+
+    assert espejo.ruta.read_bytes() == contenido
+    assert [p.name for p in espejo.ruta.parent.iterdir()] == ["CMUP.gpkg"]
@@ -0,0 +1,89 @@
+"""
+Pruebas del lector de geometrías INSPIRE (logic.geometria_gml).
+
+Se compara con el parser anterior (ElementTree), copiado en el benchmark, sobre
+XML sintéticos con la estructura de las respuestas GetParcel de Catastro.
+"""
+import io
+import random
+import warnings
+
+import numpy as np
+import pytest
+
+from benchmarks.benchmark_geometria_gml import (
+    generar_lote,
+    parser_anterior,
+    parser_anterior_completo,
+)
+from logic.geometria_gml import GeometriaParcela, leer_geometria
+
+
+@pytest.fixture(scope="module")
+def lote(tmp_path_factory):
+    """15 parcelas: multiparte (1 de cada 5) y con huecos (1 de cada 3)."""
+    random.seed(1234)
+    return generar_lote(tmp_path_factory.mktemp("gml"), parcelas=15, vertices=40)
+
+
+def test_exterior_y_superficie_iguales_al_parser_anterior(lote):
+    for ruta in lote:
+        superficie_anterior, exterior_anterior = parser_anterior(ruta)
+        superficie, forma = leer_geometria(ruta)
+        assert superficie == superficie_anterior
+        np.testing.assert_array_equal(forma.exterior, np.array(exterior_anterior))
+
+
+def test_todos_los_anillos_iguales_al_parser_anterior(lote):
+    for ruta in lote:
+        _, anillos_anteriores = parser_anterior_completo(ruta)
+        _, forma = leer_geometria(ruta)
+        assert forma.num_anillos == len(anillos_anteriores)
+        for i, anillo in enumerate(anillos_anteriores):
+            np.testing.assert_array_equal(forma.anillo(i), np.array(anillo))
+
+
+def test_partes_y_huecos(lote):
+    # generar_lote: la parcela 0 tiene dos partes con un hueco cada una
+    _, forma = leer_geometria(lote[0])
+    assert (forma.num_partes, forma.num_anillos) == (2, 4)
+    geometria = forma.to_shapely()
+    assert geometria.geom_type == "MultiPolygon"
+    assert all(len(poligono.interiors) == 1 for poligono in geometria.geoms)
+
+    # La parcela 1 es un polígono simple sin huecos
+    _, forma = leer_geometria(lote[1])
+    assert (forma.num_partes, forma.num_anillos) == (1, 1)
+    assert forma.to_shapely().geom_type == "Polygon"
+
+
+def test_crs_proyectado_conserva_el_orden_de_ejes(tmp_path, lote):
+    texto = lote[1].read_text(encoding="utf-8")
+    proyectado = tmp_path / "proyectado.xml"
+    proyectado.write_text(
+        texto.replace("http://www.opengis.net/def/crs/EPSG/0/4258", "urn:ogc:def:crs:EPSG::25830"),
+        encoding="utf-8",
+    )
+    _, geografica = leer_geometria(lote[1])
+    _, forma = leer_geometria(proyectado)
+    np.testing.assert_array_equal(forma.coords, geografica.coords[:, ::-1])
+
+
+def test_poslist_no_numerica_es_un_error(tmp_path, lote):
+    roto = tmp_path / "roto.xml"
+    texto = lote[1].read_text(encoding="utf-8")
+    roto.write_text(texto.replace("</gml:posList>", " x1 </gml:posList>", 1), encoding="utf-8")
+    filtros = list(warnings.filters)
+
+    with pytest.raises(ValueError):
+        leer_geometria(roto)
+
+    # El filtro que convierte el aviso de NumPy en error no sale de _a_numeros
+    assert warnings.filters == filtros
+
+
+def test_xml_sin_geometria():
+    superficie, forma = leer_geometria(io.BytesIO(b'<?xml version="1.0"?><FeatureCollection/>'))
+    assert superficie == 0.0
+    assert forma == GeometriaParcela.vacia()
+    assert not forma
@@ -0,0 +1,86 @@
+"""
+Pruebas de las particiones provinciales (logic.particiones): selección de
+particiones por ventana, partición "resto" y eliminación de duplicados.
+
+Dos provincias cuadradas contiguas, "08" (x 0-100) y "17" (x 100-200), y una
+capa con una entidad en cada una, otra que cruza el límite y otra fuera de
+ambas (mar).
+"""
+import geopandas as gpd
+import pytest
+from shapely.geometry import box
+
+from logic.almacen_capas import AlmacenCapas
+from logic.catalogo_fuentes import CatalogoFuentes
+from logic.particiones import CODIGO_RESTO, ParticionesProvinciales, codigo_provincia
+
+
+@pytest.fixture
+def escenario(tmp_path):
+    fuentes = tmp_path / "FUENTES"
+    fuentes.mkdir()
+    gpd.GeoDataFrame(
+        {"CPRO": [8, 17]}, geometry=[box(0, 0, 100, 100), box(100, 0, 200, 100)], crs=25830
+    ).to_file(fuentes / "provincias.gpkg")
+    gpd.GeoDataFrame(
+        {"nombre": ["a", "b", "cruza", "mar"]},
+        geometry=[box(10, 10, 20, 20), box(150, 10, 160, 20), box(90, 50, 110, 60), box(50, 120, 60, 130)],
+        crs=25830,
+    ).to_file(fuentes / "capa.gpkg")
+
+    catalogo = CatalogoFuentes(fuentes, tmp_path / "catalogo.json")
+    catalogo.actualizar()
+    capa = next(c for c in catalogo.capas() if c.ruta == "capa.gpkg")
+    almacen = AlmacenCapas(tmp_path / "almacen")
+    particiones = ParticionesProvinciales(almacen, fuentes / "provincias.gpkg", "CPRO", 1)
+    return particiones, capa, catalogo.ruta_absoluta(capa), almacen
+
+
+def _nombres(gdf):
+    return sorted(gdf["nombre"])
+
+
+def test_codigo_provincia():
+    assert codigo_provincia(8) == "08"
+    assert codigo_provincia("8.0") == "08"
+    assert codigo_provincia(" 17 ") == "17"
+
+
+def test_indice_con_resto(escenario):
+    particiones, capa, origen, _ = escenario
+    indice = particiones.particionar(capa, origen)
+    assert sorted(indice) == ["08", "17", CODIGO_RESTO]
+    # La entidad que cruza el límite está en las dos provincias
+    assert (indice["08"]["entidades"], indice["17"]["entidades"], indice[CODIGO_RESTO]["entidades"]) == (2, 2, 1)
+
+
+@pytest.mark.parametrize("limites, esperadas", [
+    ((0, 0, 30, 30), ["08"]),                      # solo su provincia
+    ((0, 0, 100, 100), ["08", "17"]),              # toca la vecina
+    ((40, 110, 70, 140), ["08", CODIGO_RESTO]),    # toca la extensión del resto
+])
+def test_particiones_para_la_ventana(escenario, limites, esperadas):
+    particiones, capa, origen, _ = escenario
+    assert particiones.particiones_para(capa, origen, ["8"], 25830, limites) == esperadas
+
+
+def test_lectura_sin_duplicados_e_igual_a_la_capa_completa(escenario):
+    particiones, capa, origen, almacen = escenario
+    for limites in [(0, 0, 100, 100), (0, 0, 200, 140), (40, 110, 70, 140), (300, 300, 400, 400)]:
+        leidas = particiones.leer(capa, origen, 25830, limites, ["08"], ["nombre"])
+        completa = almacen.leer(capa, origen, 25830, limites, ["nombre"])
+        assert _nombres(leidas) == _nombres(completa)
+        assert leidas["nombre"].is_unique
+
+
+def test_resto_no_se_lee_lejos_de_su_extension(escenario):
+    particiones, capa, origen, _ = escenario
+    leidas = particiones.leer(capa, origen, 25830, (0, 0, 30, 30), ["08"], ["nombre"])
+    assert _nombres(leidas) == ["a"]
+
+
+def test_lectura_en_web_mercator(escenario):
+    particiones, capa, origen, almacen = escenario
+    limites = almacen.leer(capa, origen, 3857, (-1e9, -1e9, 1e9, 1e9)).total_bounds
+    leidas = particiones.leer(capa, origen, 3857, limites, ["17"], ["nombre"])
+    assert _nombres(leidas) == ["a", "b", "cruza", "mar"]
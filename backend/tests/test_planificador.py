@@ -0,0 +1,56 @@
+"""
+Pruebas del tiempo límite de ejecutar_lote sobre un pool de procesos
+compartido (logic.planificador).
+"""
+import threading
+import time
+
+import pytest
+
+from logic import planificador
+
+USO_PRUEBAS = "pruebas"
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = planificador.obtener_pool(USO_PRUEBAS, 1)
+    pool.submit(time.sleep, 0).result()  # arranque del proceso hijo
+    yield pool
+
+
+def _lote(pool, segundos: float, timeout_s: float, tareas=(1, 2)) -> dict:
+    return planificador.ejecutar_lote(
+        tareas, lambda _: planificador.enviar(pool, time.sleep, segundos),
+        lambda *_: None, max_en_curso=len(tareas), timeout_s=timeout_s,
+    )
+
+
+def test_la_espera_en_cola_no_cuenta_como_tiempo(pool):
+    # Un solo proceso y dos trabajos a la vez: cada tarea espera en cola
+    # detrás de las del otro trabajo más de lo que permite el límite
+    resultados = {}
+
+    def trabajo(nombre):
+        resultados[nombre] = _lote(pool, 0.7, timeout_s=1.0)
+
+    hilos = [threading.Thread(target=trabajo, args=(n,)) for n in "AB"]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    ok = {1: planificador.ESTADO_OK, 2: planificador.ESTADO_OK}
+    assert resultados == {"A": ok, "B": ok}
+
+
+def test_tarea_lenta_se_descarta(pool):
+    estados = _lote(pool, 1.5, timeout_s=0.3, tareas=(1,))
+    assert estados == {1: planificador.ESTADO_TIEMPO_AGOTADO}
+    time.sleep(1.5)
+    assert not planificador._tarea_de and not planificador._inicios
+
+
+def test_inicio_de_un_future_ajeno():
+    futuro = planificador.ejecutar_en_linea(sum, [1, 2])
+    assert planificador.inicio_de(futuro) is None